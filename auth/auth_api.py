@@ -1,38 +1,25 @@
 import os
-from supabase import create_client, Client
+from supabase import Client
 from typing import Dict, Any, Optional
 from dotenv import load_dotenv
 import asyncio
 from fastapi import HTTPException
+from .token_verifier import verify_access_token, InvalidTokenError
+from .profile_cache import profile_cache
+from db.supabase_pool import get_anon_client, get_service_client, get_auth_client, get_user_client, UserScopedClient
+from db.supabase_async import run_sync, execute
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Supabase client once
 SUPABASE_URL = os.environ.get("SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
 def get_supabase_client(use_service_role: bool = False) -> Client:
-    """Initialize and validate Supabase client connection."""
-    url = os.environ.get("SUPABASE_URL")
-    
+    """Return the shared, long-lived Supabase client (anon or service role)."""
     if use_service_role:
-        key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
-        if not key:
-            raise EnvironmentError("SUPABASE_SERVICE_ROLE_KEY not configured")
-    else:
-        key = os.environ.get("SUPABASE_KEY")
-        if not key:
-            raise EnvironmentError("SUPABASE_KEY not configured")
-    
-    if not url:
-        raise EnvironmentError("SUPABASE_URL not configured")
-        
-    return create_client(url, key)
-
-# Initialize default client
-supabase: Client = get_supabase_client()
+        return get_service_client()
+    return get_anon_client()
 
 async def signup(email: str, password: str, username: str, role: str = "user", invite_code: Optional[str] = None, timeout: int = 15) -> Dict[str, Any]:
     """
@@ -67,18 +54,16 @@ async def _signup_internal(email: str, password: str, username: str, role: str,
         print(f"Username: {username}")
         print(f"Role: {role}")
         print(f"Invite code: {invite_code}")
-        # Create service client for bypassing RLS
-        service_role_key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
-        if not service_role_key:
+        # Shared service client for bypassing RLS
+        try:
+            service_client = get_service_client()
+        except EnvironmentError:
             print("❌ Error: SUPABASE_SERVICE_ROLE_KEY not found in environment variables")
             raise Exception("Service role key not configured")
-            
-        service_client = create_client(SUPABASE_URL, service_role_key)
-        print("✓ Service client created successfully")
         
         # Create the user in Supabase Auth
         print("\n=== Creating User ===")
-        auth_response = supabase.auth.sign_up({
+        auth_response = await run_sync(get_auth_client().auth.sign_up, {
             "email": email,
             "password": password,
         })
@@ -100,9 +85,12 @@ async def _signup_internal(email: str, password: str, username: str, role: str,
                 }
                 print(f"Inserting profile data: {profile_data}")
                 
-                profile_response = service_client.table("profiles").insert(profile_data).execute()
+                profile_response = await execute(service_client.table("profiles").insert(profile_data))
                 print(f"✓ Profile created successfully: {profile_response}")
                 
+                # Drop anything cached for this id before the new profile existed
+                profile_cache.invalidate(user_id)
+                
                 # Return Supabase's JWT token directly
                 return {
                     "success": True,
@@ -155,17 +143,22 @@ async def _login_internal(email: str, password: str):
     """Internal login function wrapped with timeout"""
     try:
         # Sign in the user
-        auth_response = supabase.auth.sign_in_with_password({
+        auth_response = await run_sync(get_auth_client().auth.sign_in_with_password, {
             "email": email,
             "password": password
         })
         
         if auth_response.user and auth_response.session:
             # Get the user's profile data
-            profile_response = supabase.table("profiles").select("*").eq("id", auth_response.user.id).execute()
+            user_client = get_user_client(auth_response.session.access_token)
+            profile_response = await execute(user_client.table("profiles").select("*").eq("id", auth_response.user.id))
             
             if profile_response.data and len(profile_response.data) > 0:
                 profile = profile_response.data[0]
+                profile_cache.set(auth_response.user.id, {
+                    "username": profile.get("username"),
+                    "role": profile.get("role")
+                })
                 
                 user_data = {
                     "id": auth_response.user.id,
@@ -201,6 +194,10 @@ async def get_user_from_token(access_token: str) -> Dict[str, Any]:
     """
     Get user information from Supabase JWT token.
     
+    The token is verified locally (signature, expiry, audience) whenever the
+    signing key is available; Supabase Auth is only asked to validate it when
+    local verification is inconclusive.
+    
     Args:
         access_token: Supabase JWT access token
         
@@ -208,52 +205,58 @@ async def get_user_from_token(access_token: str) -> Dict[str, Any]:
         Dict containing user data
     """
     try:
-        # Create a new client with the user's token
-        user_client = create_client(SUPABASE_URL, SUPABASE_KEY)
-        
-        # Don't set session, just get user directly from token
-        user_response = user_client.auth.get_user(access_token)
+        try:
+            claims = await verify_access_token(access_token)
+        except InvalidTokenError as e:
+            print(f"Token rejected by local verification: {str(e)}")
+            return {
+                "success": False,
+                "error": "Invalid or expired token"
+            }
         
-        if user_response.user:
+        if claims:
+            user_id = claims["sub"]
+            email = claims.get("email")
+        else:
+            # Local verification was inconclusive, ask Supabase Auth directly
+            user_response = await run_sync(get_auth_client().auth.get_user, access_token)
+            if not user_response.user:
+                return {
+                    "success": False,
+                    "error": "Invalid or expired token"
+                }
             user_id = user_response.user.id
-            
-            # Get the user's profile data using the authenticated client
-            # Set the Authorization header manually for this request
-            user_client.postgrest.auth(access_token)
-            profile_response = user_client.table("profiles").select("*").eq("id", user_id).execute()
+            email = user_response.user.email
+        
+        profile = profile_cache.get(user_id)
+        if profile is None:
+            # Get the user's profile data with the user's token so RLS applies
+            user_client = get_user_client(access_token)
+            profile_response = await execute(user_client.table("profiles").select("*").eq("id", user_id))
             
             if profile_response.data and len(profile_response.data) > 0:
-                profile = profile_response.data[0]
-                
-                user_data = {
-                    "id": user_id,
-                    "email": user_response.user.email,
-                    "username": profile.get("username"),
-                    "role": profile.get("role")
-                }
-                
-                return {
-                    "success": True,
-                    "user": user_data
+                profile = {
+                    "username": profile_response.data[0].get("username"),
+                    "role": profile_response.data[0].get("role")
                 }
+                profile_cache.set(user_id, profile)
             else:
-                # Fallback to basic user data if no profile
-                user_data = {
-                    "id": user_id,
-                    "email": user_response.user.email,
+                # Fallback to basic user data if no profile (not cached, it may appear shortly)
+                profile = {
                     "username": None,
                     "role": None
                 }
-                
-                return {
-                    "success": True,
-                    "user": user_data
-                }
-        else:
-            return {
-                "success": False,
-                "error": "Invalid or expired token"
-            }
+        
+        user_data = {
+            "id": user_id,
+            "email": email,
+            **profile
+        }
+        
+        return {
+            "success": True,
+            "user": user_data
+        }
             
     except Exception as e:
         print(f"Error getting user from token: {str(e)}")
@@ -292,14 +295,44 @@ async def logout(timeout: int = 15) -> Dict[str, Any]:
             "error": str(e)
         }
 
-def get_authenticated_client(access_token: str) -> Client:
-    """Get a Supabase client with the user's JWT token"""
+async def update_user_role(user_id: str, role: str) -> Dict[str, Any]:
+    """
+    Change a user's role and invalidate their cached profile.
+    
+    Args:
+        user_id: ID of the user whose role changes
+        role: New role ("user", "student", "teacher" or "admin")
+        
+    Returns:
+        Dict containing the updated profile
+    """
     try:
-        # Create client with user's token
-        user_client = create_client(SUPABASE_URL, SUPABASE_KEY)
-        user_client.auth.set_session(access_token, None)
+        service_client = get_supabase_client(use_service_role=True)
+        result = await execute(service_client.table("profiles").update({"role": role}).eq("id", user_id))
+        profile_cache.invalidate(user_id)
         
-        return user_client
+        if not result.data:
+            return {
+                "success": False,
+                "error": f"Profile for user {user_id} not found"
+            }
+        
+        print(f"Role for user {user_id} changed to '{role}'")
+        return {
+            "success": True,
+            "profile": result.data[0]
+        }
+    except Exception as e:
+        print(f"Role update error: {str(e)}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+def get_authenticated_client(access_token: str) -> UserScopedClient:
+    """Get a Supabase query interface that sends the user's JWT token"""
+    try:
+        return get_user_client(access_token)
         
     except Exception as e:
         print(f"Authentication error: {str(e)}")
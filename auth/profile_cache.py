@@ -0,0 +1,126 @@
+import os
+import time
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+
+class ProfileCache:
+    """
+    Bounded in-process LRU cache of `profiles` rows keyed by user id, with a TTL.
+
+    Every gunicorn worker has its own cache, so an invalidation also rewrites a
+    shared stamp file. Each worker checks the stamp on lookup and drops all of
+    its entries when the stamp has changed, so a role change takes effect
+    everywhere on the next request instead of after the TTL.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 300,
+                 stamp_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.stamp_path = stamp_path
+        self._entries: "OrderedDict[str, tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stamp = self._read_stamp()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _read_stamp(self) -> Optional[tuple]:
+        if not self.stamp_path:
+            return None
+        try:
+            stat = os.stat(self.stamp_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns)
+
+    def _check_stamp(self) -> None:
+        """Drop every entry if another worker invalidated since the last check (caller holds the lock)."""
+        stamp = self._read_stamp()
+        if stamp != self._stamp:
+            self._stamp = stamp
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def _bump_stamp(self) -> None:
+        if not self.stamp_path:
+            return
+        os.makedirs(os.path.dirname(self.stamp_path) or ".", exist_ok=True)
+        # A fresh file (new inode) per bump, so two bumps in one mtime tick still differ
+        tmp_path = f"{self.stamp_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(uuid.uuid4().hex)
+        os.replace(tmp_path, self.stamp_path)
+        self._stamp = self._read_stamp()
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Return the cached profile for a user, or None on a miss or expired entry."""
+        with self._lock:
+            self._check_stamp()
+            entry = self._entries.get(user_id)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            stored_at, profile = entry
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[user_id]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return dict(profile)
+
+    def set(self, user_id: str, profile: Dict[str, Any]) -> None:
+        """Store a profile, evicting the least recently used entry when full."""
+        with self._lock:
+            self._check_stamp()
+            self._entries[user_id] = (time.monotonic(), dict(profile))
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id: str) -> None:
+        """
+        Drop a user's profile, e.g. after signup or a role change. Other workers
+        drop their whole cache on their next lookup (see the stamp file).
+        """
+        with self._lock:
+            if self._entries.pop(user_id, None) is not None:
+                self.invalidations += 1
+            self._bump_stamp()
+
+    def clear(self) -> None:
+        """Drop every cached profile."""
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and current occupancy."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+# Shared instance used by auth_api
+profile_cache = ProfileCache(
+    max_entries=int(os.environ.get("PROFILE_CACHE_MAX_ENTRIES", "1024")),
+    ttl_seconds=float(os.environ.get("PROFILE_CACHE_TTL_SECONDS", "300")),
+    stamp_path=os.environ.get("PROFILE_CACHE_STAMP_PATH", "session-data/profile_cache.stamp"),
+)
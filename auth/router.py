@@ -1,8 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, Header
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Literal
 from . import auth_api
 from .dependencies import get_current_user, get_admin_user
+from .profile_cache import profile_cache
+from db.supabase_pool import pool_stats
 
 # Create router
 router = APIRouter(
@@ -23,6 +25,9 @@ class UserLogin(BaseModel):
     email: str
     password: str
 
+class RoleUpdate(BaseModel):
+    role: Literal["user", "student", "teacher", "admin"]
+
 # Routes
 @router.post("/signup", response_model=Dict[str, Any])
 async def signup(user: UserCreate):
@@ -81,4 +86,30 @@ async def admin_check_route(admin_user: dict = Depends(get_admin_user)):
         "success": True,
         "message": f"Admin access confirmed for {admin_user['username']}",
         "user": admin_user
-    } 
\ No newline at end of file
+    }
+
+@router.put("/users/{user_id}/role", response_model=Dict[str, Any])
+async def update_user_role(user_id: str, update: RoleUpdate, admin_user: dict = Depends(get_admin_user)):
+    """
+    Change a user's role (admin only). Invalidates the user's cached profile.
+    """
+    result = await auth_api.update_user_role(user_id, update.role)
+    if not result.get("success"):
+        raise HTTPException(status_code=400, detail=result.get("error", "Role update failed"))
+    return result
+
+@router.get("/profile-cache/stats")
+async def profile_cache_stats(admin_user: dict = Depends(get_admin_user)):
+    """Get hit/miss statistics for the in-process profile cache"""
+    return {
+        "success": True,
+        "stats": profile_cache.stats()
+    }
+
+@router.get("/supabase-pool/stats")
+async def supabase_pool_stats(admin_user: dict = Depends(get_admin_user)):
+    """Get usage and connection statistics for the shared Supabase clients"""
+    return {
+        "success": True,
+        "stats": pool_stats()
+    }
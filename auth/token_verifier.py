@@ -0,0 +1,131 @@
+import asyncio
+import os
+import time
+from typing import Dict, Any, Optional
+
+import requests
+from jose import jwt, JWTError, ExpiredSignatureError
+from jose.exceptions import JWTClaimsError
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+SUPABASE_URL = os.environ.get("SUPABASE_URL")
+SUPABASE_JWT_SECRET = os.environ.get("SUPABASE_JWT_SECRET")
+SUPABASE_JWT_AUDIENCE = os.environ.get("SUPABASE_JWT_AUDIENCE", "authenticated")
+
+# How long a fetched JWKS document is trusted before it is re-fetched
+JWKS_CACHE_TTL_SECONDS = int(os.environ.get("SUPABASE_JWKS_CACHE_TTL", "600"))
+# Minimum gap between forced refreshes triggered by an unknown key id
+JWKS_MIN_REFRESH_INTERVAL_SECONDS = 30
+JWKS_FETCH_TIMEOUT_SECONDS = 5
+
+ASYMMETRIC_ALGORITHMS = ["RS256", "ES256"]
+
+
+class InvalidTokenError(Exception):
+    """Raised when a token is definitively invalid (bad signature, expired, wrong audience)."""
+
+
+class _JWKSCache:
+    """Caches the Supabase JWKS document and refreshes it on expiry or unknown key ids."""
+
+    def __init__(self, jwks_url: Optional[str]):
+        self.jwks_url = jwks_url
+        self._keys: Dict[str, Dict[str, Any]] = {}
+        self._fetched_at = 0.0
+        self._attempted_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _fetch(self) -> Dict[str, Dict[str, Any]]:
+        response = requests.get(self.jwks_url, timeout=JWKS_FETCH_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        keys = response.json().get("keys", [])
+        return {key["kid"]: key for key in keys if key.get("kid")}
+
+    def _needs_refresh(self, kid: str) -> bool:
+        now = time.monotonic()
+        if now - self._attempted_at <= JWKS_MIN_REFRESH_INTERVAL_SECONDS:
+            return False
+        return now - self._fetched_at > JWKS_CACHE_TTL_SECONDS or kid not in self._keys
+
+    async def get_key(self, kid: str) -> Optional[Dict[str, Any]]:
+        """Return the JWK for a key id, or None if it cannot be resolved."""
+        if not self.jwks_url or not kid:
+            return None
+
+        if self._needs_refresh(kid) or self._lock.locked():
+            # One fetch at a time; requests that arrive during it wait for its result
+            async with self._lock:
+                if self._needs_refresh(kid):
+                    self._attempted_at = time.monotonic()
+                    try:
+                        # requests is blocking, keep it off the event loop
+                        self._keys = await asyncio.to_thread(self._fetch)
+                        self._fetched_at = time.monotonic()
+                        print(f"✓ Loaded {len(self._keys)} signing key(s) from JWKS")
+                    except Exception as e:
+                        print(f"❌ Failed to fetch JWKS: {str(e)}")
+        return self._keys.get(kid)
+
+
+_jwks_cache = _JWKSCache(f"{SUPABASE_URL}/auth/v1/.well-known/jwks.json" if SUPABASE_URL else None)
+
+
+async def verify_access_token(access_token: str) -> Optional[Dict[str, Any]]:
+    """
+    Verify a Supabase access token locally.
+
+    HS256 tokens are checked against SUPABASE_JWT_SECRET; asymmetric tokens are
+    checked against the project's cached JWKS. Signature, expiry and audience
+    are all validated.
+
+    Args:
+        access_token: Supabase JWT access token
+
+    Returns:
+        The verified claims, or None when the token cannot be verified locally
+        (no secret configured, unknown signing key) and a remote check is needed.
+
+    Raises:
+        InvalidTokenError: If the token is malformed, expired, has the wrong
+            audience or fails signature verification.
+    """
+    try:
+        header = jwt.get_unverified_header(access_token)
+    except JWTError as e:
+        raise InvalidTokenError(f"Malformed token: {str(e)}")
+
+    algorithm = header.get("alg")
+    if algorithm == "HS256":
+        if not SUPABASE_JWT_SECRET:
+            return None
+        key = SUPABASE_JWT_SECRET
+        algorithms = ["HS256"]
+    elif algorithm in ASYMMETRIC_ALGORITHMS:
+        key = await _jwks_cache.get_key(header.get("kid"))
+        if key is None:
+            return None
+        algorithms = [algorithm]
+    else:
+        return None
+
+    try:
+        claims = jwt.decode(
+            access_token,
+            key,
+            algorithms=algorithms,
+            audience=SUPABASE_JWT_AUDIENCE,
+        )
+    except ExpiredSignatureError:
+        raise InvalidTokenError("Token has expired")
+    except JWTClaimsError as e:
+        raise InvalidTokenError(f"Invalid token claims: {str(e)}")
+    except JWTError as e:
+        raise InvalidTokenError(f"Invalid token signature: {str(e)}")
+
+    if not claims.get("sub"):
+        raise InvalidTokenError("Token has no subject")
+
+    return claims
@@ -0,0 +1,54 @@
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# The supabase-py clients are synchronous. Every call goes through this bounded
+# executor so a slow PostgREST/GoTrue round trip never runs on the event loop,
+# and the number of in-flight Supabase calls per worker stays capped.
+SUPABASE_MAX_WORKERS = int(os.environ.get("SUPABASE_MAX_WORKERS", "16"))
+SUPABASE_DEFAULT_TIMEOUT_SECONDS = float(os.environ.get("SUPABASE_TIMEOUT_SECONDS", "15"))
+
+_executor = ThreadPoolExecutor(max_workers=SUPABASE_MAX_WORKERS, thread_name_prefix="supabase")
+
+
+class SupabaseTimeoutError(Exception):
+    """Raised when a Supabase call does not finish within its deadline."""
+
+
+async def run_sync(func: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs) -> Any:
+    """
+    Run a blocking Supabase client call on the bounded executor.
+
+    Args:
+        func: Synchronous callable (e.g. `client.auth.get_user`)
+        *args, **kwargs: Arguments passed to func
+        timeout: Deadline in seconds (defaults to SUPABASE_TIMEOUT_SECONDS)
+
+    Returns:
+        Whatever func returns
+
+    Raises:
+        SupabaseTimeoutError: If the deadline expires. The worker thread finishes
+            the call in the background, but the caller is released immediately.
+    """
+    deadline = SUPABASE_DEFAULT_TIMEOUT_SECONDS if timeout is None else timeout
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+    try:
+        return await asyncio.wait_for(future, timeout=deadline)
+    except asyncio.TimeoutError:
+        name = getattr(func, "__qualname__", repr(func))
+        print(f"[SUPABASE_ASYNC] ⏱️ {name} exceeded {deadline}s deadline")
+        raise SupabaseTimeoutError(f"Supabase call timed out after {deadline} seconds")
+
+
+async def execute(query, timeout: Optional[float] = None):
+    """Await a PostgREST query builder's `.execute()` without blocking the event loop."""
+    return await run_sync(query.execute, timeout=timeout)
@@ -0,0 +1,186 @@
+import os
+import threading
+from typing import Dict, Any, Optional
+
+from supabase import create_client, Client
+from supabase.lib.client_options import ClientOptions
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+SUPABASE_URL = os.environ.get("SUPABASE_URL")
+SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
+SUPABASE_SERVICE_ROLE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+POSTGREST_TIMEOUT_SECONDS = int(os.environ.get("SUPABASE_POSTGREST_TIMEOUT", "30"))
+
+# Request builder methods whose returned query gets the caller's Authorization header
+_QUERY_METHODS = ("select", "insert", "update", "upsert", "delete")
+
+
+class _AuthorizedTableBuilder:
+    """Wraps a shared PostgREST request builder and stamps the caller's JWT on each query."""
+
+    def __init__(self, builder, auth_header: str, stats: "SupabasePool"):
+        self._builder = builder
+        self._auth_header = auth_header
+        self._stats = stats
+
+    def __getattr__(self, name):
+        attr = getattr(self._builder, name)
+        if name not in _QUERY_METHODS:
+            return attr
+
+        def build(*args, **kwargs):
+            query = attr(*args, **kwargs)
+            # Per-request header; the shared session headers stay on the anon key
+            query.headers["Authorization"] = self._auth_header
+            self._stats._record("user_scoped_queries")
+            return query
+
+        return build
+
+
+class UserScopedClient:
+    """
+    Per-request view over the shared anon client that sends the user's JWT,
+    so row level security applies without building a new client (and new
+    HTTP session) for every request.
+    """
+
+    def __init__(self, base_client: Client, access_token: str, stats: "SupabasePool"):
+        self._base_client = base_client
+        self._auth_header = f"Bearer {access_token}"
+        self._stats = stats
+
+    def table(self, table_name: str) -> _AuthorizedTableBuilder:
+        return _AuthorizedTableBuilder(self._base_client.postgrest.from_(table_name), self._auth_header, self._stats)
+
+    from_ = table
+
+
+class SupabasePool:
+    """
+    Owns the process-wide Supabase clients.
+
+    - anon: data queries with the anon key (and user-scoped queries via `for_user`)
+    - service: service-role queries that bypass RLS
+    - auth: GoTrue operations (sign up, sign in, get_user). Kept separate because
+      signing in rewrites a client's Authorization header, which must never leak
+      into the shared data client.
+
+    Each client keeps its underlying httpx sessions alive, so connections and
+    TLS sessions are reused across requests.
+    """
+
+    def __init__(self, url: Optional[str], anon_key: Optional[str], service_role_key: Optional[str]):
+        self.url = url
+        self.anon_key = anon_key
+        self.service_role_key = service_role_key
+        self._clients: Dict[str, Client] = {}
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {
+            "clients_created": 0,
+            "anon_checkouts": 0,
+            "service_checkouts": 0,
+            "auth_checkouts": 0,
+            "user_scoped_checkouts": 0,
+            "user_scoped_queries": 0,
+        }
+
+    def _record(self, counter: str) -> None:
+        with self._lock:
+            self._counters[counter] += 1
+
+    def _get(self, name: str, key_env: str, key: Optional[str]) -> Client:
+        client = self._clients.get(name)
+        if client is not None:
+            self._record(f"{name}_checkouts")
+            return client
+
+        if not self.url:
+            raise EnvironmentError("SUPABASE_URL not configured")
+        if not key:
+            raise EnvironmentError(f"{key_env} not configured")
+
+        with self._lock:
+            client = self._clients.get(name)
+            if client is None:
+                options = ClientOptions(
+                    auto_refresh_token=False,
+                    persist_session=False,
+                    postgrest_client_timeout=POSTGREST_TIMEOUT_SECONDS,
+                )
+                client = create_client(self.url, key, options=options)
+                self._clients[name] = client
+                self._counters["clients_created"] += 1
+                print(f"[SUPABASE_POOL] Created long-lived '{name}' client")
+            self._counters[f"{name}_checkouts"] += 1
+        return client
+
+    def anon(self) -> Client:
+        return self._get("anon", "SUPABASE_KEY", self.anon_key)
+
+    def service(self) -> Client:
+        return self._get("service", "SUPABASE_SERVICE_ROLE_KEY", self.service_role_key)
+
+    def auth(self) -> Client:
+        return self._get("auth", "SUPABASE_KEY", self.anon_key)
+
+    def for_user(self, access_token: str) -> UserScopedClient:
+        self._record("user_scoped_checkouts")
+        return UserScopedClient(self.anon(), access_token, self)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return checkout counters and live keep-alive connection counts per client."""
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._counters)
+            clients = dict(self._clients)
+
+        connections = {}
+        for name, client in clients.items():
+            connections[name] = _count_connections(client)
+        stats["clients"] = sorted(clients)
+        stats["connections"] = connections
+        return stats
+
+
+def _count_connections(client: Client) -> Dict[str, Optional[int]]:
+    """Best-effort count of pooled connections held by a client's PostgREST session."""
+    try:
+        pool = client.postgrest.session._transport._pool
+        connections = list(pool.connections)
+        return {
+            "open": len(connections),
+            "idle": sum(1 for conn in connections if conn.is_idle()),
+        }
+    except Exception:
+        return {"open": None, "idle": None}
+
+
+_pool = SupabasePool(SUPABASE_URL, SUPABASE_KEY, SUPABASE_SERVICE_ROLE_KEY)
+
+
+def get_anon_client() -> Client:
+    """Shared client authenticated with the anon key."""
+    return _pool.anon()
+
+
+def get_service_client() -> Client:
+    """Shared client authenticated with the service role key (bypasses RLS)."""
+    return _pool.service()
+
+
+def get_auth_client() -> Client:
+    """Shared client reserved for GoTrue calls (sign up, sign in, get_user)."""
+    return _pool.auth()
+
+
+def get_user_client(access_token: str) -> UserScopedClient:
+    """Query interface that sends the user's JWT so RLS policies apply."""
+    return _pool.for_user(access_token)
+
+
+def pool_stats() -> Dict[str, Any]:
+    """Return usage and connection statistics for the shared clients."""
+    return _pool.stats()
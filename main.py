@@ -1,12 +1,13 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from pathlib import Path
 import os
 from routers.api import api_router
 from auth.router import router as auth_router
 from routers import google_docs_router
+from utils.search_gateway import search_gateway
+from utils.static_files import PublicStaticFiles
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -52,12 +53,12 @@ if not CASE_DATA_DIR.exists():
 UPLOAD_DIR = os.getenv("UPLOADS_DIR", "case-data/uploads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-# Mount the static files directories
+# Mount the static files directories (dotfiles are never served)
 try:
-    app.mount("/static", StaticFiles(directory=static_dir), name="static")
-    app.mount("/case-files", StaticFiles(directory=str(CASE_DATA_DIR)), name="case-data")
-    app.mount("/case-images", StaticFiles(directory="case-data"), name="case-images")
-    app.mount("/files", StaticFiles(directory=UPLOAD_DIR), name="files")
+    app.mount("/static", PublicStaticFiles(directory=static_dir), name="static")
+    app.mount("/case-files", PublicStaticFiles(directory=str(CASE_DATA_DIR)), name="case-data")
+    app.mount("/case-images", PublicStaticFiles(directory="case-data"), name="case-images")
+    app.mount("/files", PublicStaticFiles(directory=UPLOAD_DIR), name="files")
 except RuntimeError as e:
     print(f"Error mounting static files: {e}")
 
@@ -93,6 +94,11 @@ app.include_router(api_router)
 app.include_router(auth_router)
 app.include_router(google_docs_router.router, prefix="/api", tags=["Google Docs"])
 
+@app.on_event("shutdown")
+async def close_search_sessions():
+    """Close the image search providers' HTTP sessions"""
+    await search_gateway.close()
+
 # Root endpoint
 @app.get("/")
 async def root():
@@ -14,6 +14,7 @@ from routers.case_creator.create_clinical_findings_context import router as crea
 from routers.case_creator.create_diagnosis_context import router as create_diagnosis_context_router
 from routers.case_creator.create_cover_image import router as create_cover_image_router
 from routers.case_creator.create_diff_diagnosis import router as create_diff_diagnosis_router
+from routers.case_creator.case_builder import router as case_builder_router
 from routers.case_player.patient_simulation import router as patient_simulation_router
 from routers.case_player.get_case_data_routes import case_router
 from routers.case_creator.upload_test_image import router as upload_test_image_router
@@ -50,6 +51,7 @@ from auth.router import router as auth_router
 from fastapi import HTTPException
 from routers.case_creator.edit_physical_exam import router as edit_physical_exam_router
 from routers.case_creator.edit_lab_test import router as edit_lab_test_router
+from routers.llm_gateway_router import router as llm_gateway_router
 
 api_router = APIRouter()
 
@@ -85,6 +87,7 @@ api_router.include_router(create_clinical_findings_context_router)
 api_router.include_router(create_diagnosis_context_router)
 api_router.include_router(create_cover_image_router)
 api_router.include_router(create_diff_diagnosis_router)
+api_router.include_router(case_builder_router)
 api_router.include_router(upload_test_image_router)     
 api_router.include_router(image_search_router)
 api_router.include_router(intelligent_image_search_router)
@@ -118,5 +121,6 @@ api_router.include_router(treatment_final_feedback_router)
 api_router.include_router(auth_router)
 api_router.include_router(edit_physical_exam_router)
 api_router.include_router(edit_lab_test_router)
+api_router.include_router(llm_gateway_router)
 
  
\ No newline at end of file
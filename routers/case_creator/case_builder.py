@@ -0,0 +1,187 @@
+from typing import Any, Dict, List, Optional
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from datetime import datetime
+import os
+import re
+from pathlib import Path
+from pydantic import BaseModel
+from auth.auth_api import get_user_from_token
+from utils.case_build_jobs import BuildStage, CaseBuildRunner
+from utils.case_repository import case_repository
+from utils.case_utils import get_next_case_id
+from utils.pdf_utils import extract_text_from_path
+from routers.case_creator.create_patient_persona import save_case_document, save_case_cover, generate_patient_persona
+from routers.case_creator.create_exam_test_data import generate_exam_test_data
+from routers.case_creator.create_history_context import generate_history_context
+from routers.case_creator.create_treatment_context import generate_treatment_context
+from routers.case_creator.create_clinical_findings_context import generate_clinical_findings_context
+from routers.case_creator.create_diagnosis_context import generate_diagnosis_context
+from routers.case_creator.create_diff_diagnosis import generate_diff_diagnosis
+from routers.case_creator.create_cover_image import create_cover_image, CoverImageRequest
+
+# Define the security scheme
+security = HTTPBearer()
+
+router = APIRouter(
+    prefix="/case_build",
+    tags=["create-data"]
+)
+
+MAX_UPLOAD_SIZE = 50 * 1024 * 1024  # 50MB, same limit as the patient persona route
+
+class CreateCaseBuildRequest(BaseModel):
+    file_name: str
+    case_id: Optional[Any] = None
+    department: Optional[str] = None
+    google_doc_link: Optional[str] = None
+    stages: Optional[List[str]] = None  # Defaults to every stage
+
+async def authenticate_case_creator(credentials: HTTPAuthorizationCredentials) -> Dict[str, Any]:
+    """Authenticate the caller and require the admin or teacher role."""
+    try:
+        user_response = await get_user_from_token(credentials.credentials)
+        if not user_response["success"]:
+            error_message = user_response.get("error", "Authentication required")
+            print(f"[CASE_BUILD] ❌ Authentication failed: {error_message}")
+            raise HTTPException(status_code=401, detail=error_message)
+
+        user = user_response["user"]
+        if user.get("role", "") not in ["admin", "teacher"]:
+            print(f"[CASE_BUILD] ❌ Access denied: User role '{user.get('role', '')}' is not authorized")
+            raise HTTPException(status_code=403, detail="Only teachers and admins can build cases")
+        return user
+    except HTTPException:
+        raise
+    except Exception as auth_error:
+        print(f"[CASE_BUILD] ❌ Unexpected error during authentication: {str(auth_error)}")
+        raise HTTPException(status_code=401, detail="Authentication failed")
+
+def resolve_upload(file_name: str) -> Path:
+    """Path of an uploaded case document, using the upload route's safe filename convention."""
+    uploads_dir = Path(os.getenv("UPLOADS_DIR", "case-data/uploads"))
+    return uploads_dir / re.sub(r'[^a-zA-Z0-9-_.]', '_', file_name)
+
+def load_case_document(job: Dict[str, Any]) -> str:
+    return case_repository.load_text(job["case_id"], "case_doc.txt")
+
+# Stage functions: each takes the job record and returns a small artifact summary
+
+async def build_case_document(job: Dict[str, Any]) -> Dict[str, Any]:
+    inputs = job["inputs"]
+    file_path = resolve_upload(inputs["file_name"])
+    if not file_path.exists():
+        raise FileNotFoundError(f"File not found in uploads directory: {file_path.name}")
+    # The full text is kept; the persona stage handles long documents in chunks
+    case_document = await extract_text_from_path(file_path)
+    doc_path = save_case_document(job["case_id"], case_document)
+    cover_path = save_case_cover(job["case_id"], file_path.name, inputs.get("department"), inputs.get("google_doc_link"))
+    case_repository.invalidate(job["case_id"])
+    return {"file_path": doc_path, "case_cover_path": cover_path, "characters": len(case_document)}
+
+def document_stage(generate):
+    """Stage that runs one of the case creator generators on the saved case document."""
+    async def run(job: Dict[str, Any]) -> Dict[str, Any]:
+        result = await generate(job["case_id"], load_case_document(job))
+        return {"file_path": result["file_path"]}
+    return run
+
+async def build_patient_persona(job: Dict[str, Any]) -> Dict[str, Any]:
+    result = await generate_patient_persona(load_case_document(job), job["case_id"])
+    return {"file_path": result["file_path"], "mode": result["mode"], "chunks": result["chunks"]}
+
+async def build_cover_image(job: Dict[str, Any]) -> Dict[str, Any]:
+    result = await create_cover_image(CoverImageRequest(case_id=str(job["case_id"])))
+    return {"image_url": result["image_url"], "title": result["title"]}
+
+# Every stage except the cover reads only case_doc.txt, so they run side by side.
+# The cover reads the persona and rewrites case_cover.json, which diff_diagnosis
+# also updates, so it runs after both.
+CASE_BUILD_STAGES = [
+    BuildStage("case_document", build_case_document, uses_llm=False),
+    BuildStage("patient_persona", build_patient_persona, ["case_document"]),
+    BuildStage("exam_test_data", document_stage(generate_exam_test_data), ["case_document"]),
+    BuildStage("history_context", document_stage(generate_history_context), ["case_document"]),
+    BuildStage("treatment_context", document_stage(generate_treatment_context), ["case_document"]),
+    BuildStage("clinical_findings_context", document_stage(generate_clinical_findings_context), ["case_document"]),
+    BuildStage("diagnosis_context", document_stage(generate_diagnosis_context), ["case_document"]),
+    BuildStage("diff_diagnosis", document_stage(generate_diff_diagnosis), ["case_document"]),
+    BuildStage("cover_image", build_cover_image, ["patient_persona", "diff_diagnosis"]),
+]
+
+case_build_runner = CaseBuildRunner(CASE_BUILD_STAGES)
+
+@router.post("/create", status_code=202)
+async def create_case_build(
+    request: CreateCaseBuildRequest,
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    """
+    Start building a case from an uploaded document in the background.
+
+    Returns the job record right away; poll GET /case_build/{job_id} for
+    per-stage status and artifacts.
+    """
+    user = await authenticate_case_creator(credentials)
+
+    file_path = resolve_upload(request.file_name)
+    if not file_path.exists():
+        print(f"[CASE_BUILD] ❌ File not found: {file_path}")
+        raise HTTPException(status_code=404, detail=f"File not found in uploads directory: {file_path.name}")
+    if file_path.stat().st_size > MAX_UPLOAD_SIZE:
+        raise HTTPException(status_code=413, detail=f"File too large. Maximum size is {MAX_UPLOAD_SIZE / 1024 / 1024:.0f}MB")
+
+    case_id = request.case_id if request.case_id is not None else get_next_case_id()
+    # Reserve the case folder so another build does not pick the same ID
+    os.makedirs(f"case-data/case{case_id}", exist_ok=True)
+
+    try:
+        job = case_build_runner.create_job(
+            case_id,
+            inputs={
+                "file_name": file_path.name,
+                "department": request.department,
+                "google_doc_link": request.google_doc_link,
+            },
+            created_by=user["id"],
+            stages=request.stages,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    case_build_runner.start(job)
+    print(f"[{datetime.now()}] 🏗️ Queued case build {job['job_id']} for case {case_id} by user {user['id']}")
+    return job
+
+@router.get("/{job_id}")
+async def get_case_build(
+    job_id: str,
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    """
+    Return the status, per-stage progress and artifacts of a case build.
+
+    A build whose worker stopped mid-run is reported with status "interrupted";
+    POST /case_build/{job_id}/resume continues it.
+    """
+    await authenticate_case_creator(credentials)
+    job = case_build_runner.load_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Case build {job_id} not found")
+    return job
+
+@router.post("/{job_id}/resume", status_code=202)
+async def resume_case_build(
+    job_id: str,
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    """Re-run the failed, blocked or interrupted stages of a case build; completed stages are kept."""
+    await authenticate_case_creator(credentials)
+    try:
+        job = case_build_runner.resume(job_id)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Case build {job_id} not found")
+    print(f"[{datetime.now()}] 🔁 Resumed case build {job_id} for case {job['case_id']}")
+    return job
@@ -10,6 +10,7 @@ from dotenv import load_dotenv
 from pydantic import BaseModel
 from routers.case_creator.helpers.image_downloader import download_image
 from utils.text_cleaner import extract_code_blocks  # Import the utility function
+from utils.case_repository import case_repository
 import asyncio
 
 
@@ -139,7 +140,7 @@ async def create_cover_image(
             ])
             
             chain = prompt_template | model
-            cover_image_prompt = chain.invoke({"patient_persona": patient_persona})
+            cover_image_prompt = await chain.ainvoke({"patient_persona": patient_persona})
             cleaned_response = extract_code_blocks(cover_image_prompt.content)
             responseJSON = json.loads(cleaned_response[0])
             
@@ -279,6 +280,8 @@ async def add_phrase_to_avoid(case_id: str, phrase_data: PhraseRequest):
         # Update both files
         updated_phrases = update_case_cover_phrases(case_folder, phrase_data.phrase)
         update_patient_persona_phrases(case_folder, phrase_data.phrase)
+        # Patient chains are compiled from the persona; make the next message pick up the change
+        case_repository.invalidate(case_id)
 
         return {
             "message": "Phrase added successfully to both case cover and patient persona",
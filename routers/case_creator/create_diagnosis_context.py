@@ -8,9 +8,8 @@ from dotenv import load_dotenv
 from pathlib import Path
 import json
 import re
-import asyncio
-import google.generativeai as genai
-from utils.pdf_utils import extract_text_from_document
+from utils.llm_gateway import llm_gateway
+from utils.pdf_utils import extract_text_from_document_async
 from utils.text_cleaner import clean_code_block
 from pydantic import BaseModel
 from auth.auth_api import get_user_from_token
@@ -18,9 +17,6 @@ from auth.auth_api import get_user_from_token
 # Load environment variables
 load_dotenv()
 
-# Configure Gemini
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-
 # Define the security scheme
 security = HTTPBearer()
 
@@ -41,6 +37,74 @@ class CreateDiagnosisContextRequest(BaseModel):
     file_name: str
     case_id: Optional[int] = None
 
+async def generate_diagnosis_context(case_id, case_document: str) -> dict:
+    """Generate the diagnosis context for a case document with Gemini and save it to the case folder."""
+    print(f"[{datetime.now()}] Loading prompt...")
+    prompt = load_prompt("prompts/diagnosis_context_v2.txt")
+
+    # Format the prompt with the case document
+    formatted_prompt = prompt.format(full_case_document=case_document)
+
+    print(f"[{datetime.now()}] Calling Gemini model...")
+
+    # Configure Gemini model
+    model = llm_gateway.model('gemini-2.0-flash', route="create_diagnosis_context")
+    generation_config = {
+        "temperature": 0.7,
+        "top_p": 0.8,
+        "top_k": 40
+    }
+
+    # Generate content using Gemini
+    content = {
+        "contents": [
+            {
+                "parts": [
+                    {"text": formatted_prompt}
+                ]
+            }
+        ],
+        "generation_config": generation_config
+    }
+
+    response = await model.generate_content(**content)
+    print(f"[{datetime.now()}] ✅ Received response from Gemini model")
+
+    # Process and clean the response
+    print(f"[{datetime.now()}] Processing Gemini response...")
+    cleaned_json = clean_code_block(response.text)
+
+    try:
+        # Parse the JSON response
+        diagnosis_context = json.loads(cleaned_json)
+        print(f"[{datetime.now()}] ✅ Successfully parsed JSON response")
+
+        # Save the data to file
+        case_dir = Path(f"case-data/case{case_id}")
+        case_dir.mkdir(parents=True, exist_ok=True)
+
+        output_file = case_dir / "diagnosis_context.json"
+        with open(output_file, 'w') as f:
+            json.dump(diagnosis_context, f, indent=2)
+
+        print(f"[{datetime.now()}] ✅ Saved diagnosis context to {output_file}")
+
+        # Format response
+        formatted_response = {
+            "case_id": case_id,
+            "content": diagnosis_context,
+            "file_path": str(output_file),
+            "timestamp": datetime.now().isoformat(),
+            "type": "ai"
+        }
+
+        return formatted_response
+
+    except json.JSONDecodeError as e:
+        print(f"[{datetime.now()}] ❌ Failed to parse JSON: {str(e)}")
+        print(f"Raw response: {response.text}")
+        raise HTTPException(status_code=500, detail=f"Invalid JSON response from Gemini: {str(e)}")
+
 @router.post("/create")
 async def create_diagnosis_context(
     request: CreateDiagnosisContextRequest,
@@ -103,79 +167,15 @@ async def create_diagnosis_context(
 
         try:
             file_wrapper = FileWrapper(file_path)
-            case_document = extract_text_from_document(file_wrapper)
+            case_document = await extract_text_from_document_async(file_wrapper)
             file_wrapper.file.close()
             print(f"[{datetime.now()}] ✅ Successfully extracted text from document")
         except IOError as e:
             print(f"[{datetime.now()}] ❌ Failed to read file: {str(e)}")
             raise HTTPException(status_code=400, detail=f"Failed to read file: {str(e)}")
 
-        print(f"[{datetime.now()}] Loading prompt...")
-        prompt = load_prompt("prompts/diagnosis_context_v2.txt")
-        
-        # Format the prompt with the case document
-        formatted_prompt = prompt.format(full_case_document=case_document)
-        
-        print(f"[{datetime.now()}] Calling Gemini model...")
-        
-        # Configure Gemini model
-        model = genai.GenerativeModel('gemini-2.0-flash')
-        generation_config = {
-            "temperature": 0.7,
-            "top_p": 0.8,
-            "top_k": 40
-        }
-        
-        # Generate content using Gemini
-        content = {
-            "contents": [
-                {
-                    "parts": [
-                        {"text": formatted_prompt}
-                    ]
-                }
-            ],
-            "generation_config": generation_config
-        }
-        
-        response = await asyncio.to_thread(model.generate_content, **content)
-        print(f"[{datetime.now()}] ✅ Received response from Gemini model")
-        
-        # Process and clean the response
-        print(f"[{datetime.now()}] Processing Gemini response...")
-        cleaned_json = clean_code_block(response.text)
-        
-        try:
-            # Parse the JSON response
-            diagnosis_context = json.loads(cleaned_json)
-            print(f"[{datetime.now()}] ✅ Successfully parsed JSON response")
-            
-            # Save the data to file
-            case_dir = Path(f"case-data/case{request.case_id}")
-            case_dir.mkdir(parents=True, exist_ok=True)
-            
-            output_file = case_dir / "diagnosis_context.json"
-            with open(output_file, 'w') as f:
-                json.dump(diagnosis_context, f, indent=2)
-            
-            print(f"[{datetime.now()}] ✅ Saved diagnosis context to {output_file}")
-            
-            # Format response
-            formatted_response = {
-                "case_id": request.case_id,
-                "content": diagnosis_context,
-                "file_path": str(output_file),
-                "timestamp": datetime.now().isoformat(),
-                "type": "ai"
-            }
-            
-            return formatted_response
-        
-        except json.JSONDecodeError as e:
-            print(f"[{datetime.now()}] ❌ Failed to parse JSON: {str(e)}")
-            print(f"Raw response: {response.text}")
-            raise HTTPException(status_code=500, detail=f"Invalid JSON response from Gemini: {str(e)}")
-        
+        return await generate_diagnosis_context(request.case_id, case_document)
+
     except Exception as e:
         error_timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         print(f"[{error_timestamp}] ❌ Error in create_diagnosis_context: {str(e)}")
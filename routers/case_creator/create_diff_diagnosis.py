@@ -7,7 +7,7 @@ from langchain_core.prompts import ChatPromptTemplate
 from datetime import datetime
 import os
 from dotenv import load_dotenv
-from utils.pdf_utils import extract_text_from_document
+from utils.pdf_utils import extract_text_from_document_async
 from utils.case_utils import get_next_case_id
 from utils.text_cleaner import extract_code_blocks
 from routers.case_creator.helpers.save_data_to_file import save_differential_diagnosis
@@ -52,6 +52,43 @@ class CreateDiffDiagnosisRequest(BaseModel):
     file_name: str
     case_id: Optional[int] = None
 
+async def generate_diff_diagnosis(case_id, case_document: str) -> dict:
+    """Generate the differential diagnoses for a case document and save them to the case cover."""
+    # Load the meta prompt
+    prompt = load_prompt("prompts/diagnosis_context_v2.txt")
+
+    # Escape curly braces in the meta prompt
+    prompt = prompt.replace("{", "{{").replace("}", "}}")
+
+    # Define the chat prompt template
+    prompt_template = ChatPromptTemplate.from_messages([
+        ("system", prompt),
+        ("human", "Case Details:\n{case_document}")
+    ])
+
+    # Call the model
+    response = await model.ainvoke(prompt_template.invoke({
+        "case_document": case_document
+    }))
+
+    # Extract and parse the JSON response
+    response_data = response.content
+    cleaned_response = json.loads(extract_code_blocks(response_data)[0])
+
+    # Save the differential diagnosis data
+    result = await save_differential_diagnosis(case_id, cleaned_response)
+
+    # Format the response
+    formatted_response = {
+        "case_id": case_id,
+        "content": cleaned_response,
+        "file_path": result["file_path"],
+        "timestamp": datetime.now().isoformat(),
+        "type": "ai"
+    }
+
+    return formatted_response
+
 @router.post("/create")
 async def create_diff_diagnosis(
     request: CreateDiffDiagnosisRequest,
@@ -114,51 +151,18 @@ async def create_diff_diagnosis(
 
         try:
             file_wrapper = FileWrapper(file_path)
-            case_document = extract_text_from_document(file_wrapper)
+            case_document = await extract_text_from_document_async(file_wrapper)
             file_wrapper.file.close()
         except IOError as e:
             raise HTTPException(status_code=400, detail=f"Failed to read file: {str(e)}")
 
-        # Load the meta prompt
-        prompt = load_prompt("prompts/diagnosis_context_v2.txt")
-        
-        # Escape curly braces in the meta prompt
-        prompt = prompt.replace("{", "{{").replace("}", "}}")
-        
         # If no case_id provided, get the next available one
         if request.case_id is None:
             case_id = get_next_case_id()
         else:
             case_id = request.case_id
         
-        # Define the chat prompt template
-        prompt_template = ChatPromptTemplate.from_messages([
-            ("system", prompt),
-            ("human", "Case Details:\n{case_document}")
-        ])
-        
-        # Call the model
-        response = model.invoke(prompt_template.invoke({
-            "case_document": case_document
-        }))
-        
-        # Extract and parse the JSON response
-        response_data = response.content
-        cleaned_response = json.loads(extract_code_blocks(response_data)[0])
-        
-        # Save the differential diagnosis data
-        result = await save_differential_diagnosis(case_id, cleaned_response)
-        
-        # Format the response
-        formatted_response = {
-            "case_id": case_id,
-            "content": cleaned_response,
-            "file_path": result["file_path"],
-            "timestamp": datetime.now().isoformat(),
-            "type": "ai"
-        }
-        
-        return formatted_response
+        return await generate_diff_diagnosis(case_id, case_document)
 
     except Exception as e:
         error_timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -225,7 +229,7 @@ async def create_differential_diagnosis_from_url(request: CreateDiffDiagnosisFro
         # Extract text from the file in uploads directory
         try:
             file_wrapper = FileWrapper(file_path)
-            case_document = extract_text_from_document(file_wrapper)
+            case_document = await extract_text_from_document_async(file_wrapper)
             file_wrapper.file.close()
         except IOError as e:
             raise HTTPException(status_code=400, detail=f"Failed to read file: {str(e)}")
@@ -7,7 +7,7 @@ from datetime import datetime
 import uuid
 import os
 from dotenv import load_dotenv
-from utils.pdf_utils import extract_text_from_document  # Import the utility function
+from utils.pdf_utils import extract_text_from_document_async  # Import the utility function
 import io
 import json  # Import json for saving data
 from pathlib import Path
@@ -68,6 +68,58 @@ class CreateExamTestDataRequest(BaseModel):
     file_name: str
     case_id: Optional[int] = None
 
+async def generate_exam_test_data(case_id, case_document: str) -> dict:
+    """Generate the physical exam and lab test data for a case document and save it to the case folder."""
+    print(f"[{datetime.now()}] Loading meta prompt...")
+    prompt = load_prompt("prompts/exam_test_data2.txt")
+
+    # Escape curly braces in the meta prompt
+    prompt = prompt.replace("{", "{{").replace("}", "}}")
+
+    # Define the chat prompt template with placeholders
+    prompt_template = ChatPromptTemplate.from_messages([
+        ("system", prompt),
+        ("human", "Case Details:\n{case_document}")
+    ])
+
+    print(f"[{datetime.now()}] Calling AI model...")
+    response = await model.ainvoke(prompt_template.invoke({
+        "case_document": case_document 
+    }))
+    print(f"[{datetime.now()}] ✅ Received response from AI model")
+
+    print(f"[{datetime.now()}] Processing AI response...")
+    response_data = response.content
+    cleaned_response = json.loads(extract_code_blocks(response_data)[0])
+    print(f"[{datetime.now()}] ✅ Successfully processed AI response")
+
+    # Parse the response content into structured JSON
+    structured_response = {
+        "physical_exam": {},  # Placeholder for physical examination data
+        "lab_test": {}        # Placeholder for lab test data
+    }
+
+    # Populate the structured response
+    if isinstance(cleaned_response, dict):
+        structured_response["physical_exam"] = cleaned_response.get("physical_exam", {})
+        structured_response["lab_test"] = cleaned_response.get("lab_test", {})
+        structured_response["validation"] = cleaned_response.get("validation", {})
+
+    # Save the structured response to a text file
+    result = await save_examination_data(case_id, structured_response)
+
+    # Format response as a dict
+    formatted_response = {
+        "case_id": case_id,
+        "content": structured_response,
+        "file_path": result["file_path"],
+        "timestamp": datetime.now().isoformat(),
+        "type": "ai"
+    }
+
+    print(f"[{datetime.now()}] ✅ Successfully completed exam test data creation")
+    return formatted_response
+
 @router.post("/create")
 async def create_exam_test_data(
     request: CreateExamTestDataRequest,
@@ -132,62 +184,14 @@ async def create_exam_test_data(
 
         try:
             file_wrapper = FileWrapper(file_path)
-            case_document = extract_text_from_document(file_wrapper)
+            case_document = await extract_text_from_document_async(file_wrapper)
             file_wrapper.file.close()
             print(f"[{datetime.now()}] ✅ Successfully extracted text from document")
         except IOError as e:
             print(f"[{datetime.now()}] ❌ Failed to read file: {str(e)}")
             raise HTTPException(status_code=400, detail=f"Failed to read file: {str(e)}")
 
-        print(f"[{datetime.now()}] Loading meta prompt...")
-        prompt = load_prompt("prompts/exam_test_data2.txt")
-        
-        # Escape curly braces in the meta prompt
-        prompt = prompt.replace("{", "{{").replace("}", "}}")
-        
-        # Define the chat prompt template with placeholders
-        prompt_template = ChatPromptTemplate.from_messages([
-            ("system", prompt),
-            ("human", "Case Details:\n{case_document}")
-        ])
-        
-        print(f"[{datetime.now()}] Calling AI model...")
-        response = model.invoke(prompt_template.invoke({
-            "case_document": case_document 
-        }))
-        print(f"[{datetime.now()}] ✅ Received response from AI model")
-        
-        print(f"[{datetime.now()}] Processing AI response...")
-        response_data = response.content
-        cleaned_response = json.loads(extract_code_blocks(response_data)[0])
-        print(f"[{datetime.now()}] ✅ Successfully processed AI response")
-        
-        # Parse the response content into structured JSON
-        structured_response = {
-            "physical_exam": {},  # Placeholder for physical examination data
-            "lab_test": {}        # Placeholder for lab test data
-        }
-        
-        # Populate the structured response
-        if isinstance(cleaned_response, dict):
-            structured_response["physical_exam"] = cleaned_response.get("physical_exam", {})
-            structured_response["lab_test"] = cleaned_response.get("lab_test", {})
-            structured_response["validation"] = cleaned_response.get("validation", {})
-        
-        # Save the structured response to a text file
-        result = await save_examination_data(request.case_id, structured_response)
-        
-        # Format response as a dict
-        formatted_response = {
-            "case_id": request.case_id,
-            "content": structured_response,
-            "file_path": result["file_path"],
-            "timestamp": datetime.now().isoformat(),
-            "type": "ai"
-        }
-        
-        print(f"[{datetime.now()}] ✅ Successfully completed exam test data creation")
-        return formatted_response
+        return await generate_exam_test_data(request.case_id, case_document)
 
     except Exception as e:
         error_timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
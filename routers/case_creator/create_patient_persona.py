@@ -7,9 +7,9 @@ import uuid
 import os
 from dotenv import load_dotenv
 from pathlib import Path
-from typing import Optional, Any
+from typing import Optional, Any, Dict, List, Tuple
 from utils.case_utils import get_next_case_id
-from utils.pdf_utils import extract_text_from_document
+from utils.pdf_utils import extract_text_from_document_async
 from pydantic import BaseModel, model_validator
 from routers.case_creator.helpers.save_data_to_file import save_patient_persona
 import re
@@ -18,6 +18,8 @@ from auth.auth_api import get_user_from_token
 import asyncio
 import google.generativeai as genai
 from utils.text_cleaner import clean_code_block
+from utils.llm_gateway import llm_gateway
+from utils.document_chunker import split_document
 import gc  # For garbage collection
 
 # Load environment variables
@@ -34,6 +36,13 @@ router = APIRouter(
     tags=["create-data"]
 )
 
+# Single-call timeout; longer documents are handled in long-document (chunked) mode
+PERSONA_TIMEOUT_SECONDS = float(os.getenv("PERSONA_TIMEOUT_SECONDS", "90"))
+PERSONA_CHUNKED_THRESHOLD = int(os.getenv("PERSONA_CHUNKED_THRESHOLD", "60000"))
+PERSONA_CHUNK_CHARS = int(os.getenv("PERSONA_CHUNK_CHARS", "12000"))
+PERSONA_CHUNK_OVERLAP = int(os.getenv("PERSONA_CHUNK_OVERLAP", "300"))
+PERSONA_FACTS_MODEL = os.getenv("PERSONA_FACTS_MODEL", "gpt-4o-mini")
+
 # Initialize the model
 model = ChatOpenAI(
     model_name="gpt-4o-mini",
@@ -110,47 +119,130 @@ def create_case_name(filename: str) -> str:
 
 async def process_patient_persona(case_document: str, case_id: Any, filename: str, department: str, google_doc_link: Optional[str] = None):
     """Common processing logic for both routes"""
+    # Save case document and cover
+    case_folder = f"case-data/case{case_id}"
+    os.makedirs(case_folder, exist_ok=True)
+    save_case_document(case_id, case_document)
+    save_case_cover(case_id, filename, department, google_doc_link)
+
+    return await generate_patient_persona(case_document, case_id)
+
+async def extract_persona_facts(case_document: str) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Map step of long-document mode: pull persona-relevant facts out of each
+    section of the case document concurrently.
+
+    Args:
+        case_document: Full case document text
+
+    Returns:
+        Tuple of (facts from every section in document order, per-chunk stats)
+    """
+    chunks = split_document(case_document, PERSONA_CHUNK_CHARS, PERSONA_CHUNK_OVERLAP)
+    fact_prompt = load_meta_prompt("prompts/meta_prompts/patient_persona_facts.txt")
+    fact_model = llm_gateway.model(PERSONA_FACTS_MODEL, provider="openai", route="persona_chunk_facts")
+    print(f"[PATIENT_PERSONA] 🧩 Long-document mode: {len(case_document)} characters in {len(chunks)} chunks")
+
+    async def extract(index: int, chunk: str):
+        content = {
+            "contents": [{"parts": [{"text": fact_prompt.format(
+                chunk_number=index + 1, chunk_count=len(chunks), case_section=chunk
+            )}]}],
+            "generation_config": {"temperature": 0.2}
+        }
+        return await fact_model.generate_content(**content)
+
+    # Bounded by the LLM gateway's OpenAI concurrency limit
+    results = await asyncio.gather(*[extract(i, chunk) for i, chunk in enumerate(chunks)], return_exceptions=True)
+
+    failed = [i + 1 for i, result in enumerate(results) if isinstance(result, Exception)]
+    if failed:
+        print(f"[PATIENT_PERSONA] ❌ Fact extraction failed for chunks {failed}: {results[failed[0] - 1]}")
+        raise HTTPException(status_code=502, detail=f"Fact extraction failed for chunks {failed} of {len(chunks)}")
+
+    sections = []
+    chunk_stats = []
+    for i, (chunk, response) in enumerate(zip(chunks, results)):
+        facts = response.text.strip()
+        chunk_stats.append({
+            "chunk": i + 1,
+            "characters": len(chunk),
+            "latency_seconds": round(response.latency, 2),
+            "attempts": response.attempts,
+            "fact_characters": len(facts),
+        })
+        print(f"[PATIENT_PERSONA] ⏱️ Chunk {i + 1}/{len(chunks)}: {len(chunk)} chars -> "
+              f"{len(facts)} chars of facts in {response.latency:.2f}s")
+        if facts and facts != "NO RELEVANT FACTS":
+            sections.append(f"### Section {i + 1} of {len(chunks)}\n{facts}")
+    return "\n\n".join(sections), chunk_stats
+
+async def generate_patient_persona(case_document: str, case_id: Any):
+    """
+    Generate the patient persona for a case document and save it to the case folder.
+
+    Documents longer than PERSONA_CHUNKED_THRESHOLD characters, and shorter ones
+    whose single call times out, go through long-document mode: facts are
+    extracted from every chunk concurrently and one synthesis call writes the
+    persona from them, so nothing is truncated.
+    """
     try:
         # Load prompts
         meta_prompt = load_meta_prompt("prompts/meta_prompts/patient_persona.txt")
         example_persona = load_example_persona("prompts/examples/example_patient_persona.txt")
-        
-        # Save case document and cover
-        case_folder = f"case-data/case{case_id}"
-        os.makedirs(case_folder, exist_ok=True)
-        save_case_document(case_id, case_document)
-        save_case_cover(case_id, filename, department, google_doc_link)
 
         # Create prompt and get response with timeout handling
         prompt_template = ChatPromptTemplate.from_messages([
             ("system", meta_prompt),
             ("human", "Example Persona:\n{example_persona}\n\nCase Details:\n{case_document}")
         ])
-        
-        # Use async API call with timeout (120 seconds)
+        synthesis_template = ChatPromptTemplate.from_messages([
+            ("system", meta_prompt),
+            ("human", "Example Persona:\n{example_persona}\n\n"
+                      "Case Details (facts extracted section by section from the full case document):\n{case_document}")
+        ])
+
+        mode = "single"
+        chunk_stats = None
+        if len(case_document) > PERSONA_CHUNKED_THRESHOLD:
+            mode = "chunked"
+            case_facts, chunk_stats = await extract_persona_facts(case_document)
+
         try:
-            response = await asyncio.wait_for(
-                async_model.ainvoke(prompt_template.invoke({
-                    "example_persona": example_persona,
-                    "case_document": case_document
-                })),
-                timeout=90.0  # Reduced to 90 seconds to prevent hanging
-            )
+            if mode == "single":
+                response = await asyncio.wait_for(
+                    async_model.ainvoke(prompt_template.invoke({
+                        "example_persona": example_persona,
+                        "case_document": case_document
+                    })),
+                    timeout=PERSONA_TIMEOUT_SECONDS
+                )
+            else:
+                response = await asyncio.wait_for(
+                    async_model.ainvoke(synthesis_template.invoke({
+                        "example_persona": example_persona,
+                        "case_document": case_facts
+                    })),
+                    timeout=PERSONA_TIMEOUT_SECONDS
+                )
         except asyncio.TimeoutError:
-            print(f"[{datetime.now()}] ⏰ OpenAI API call timed out after 90 seconds, trying with shorter document...")
-            # Try again with truncated document
-            truncated_doc = case_document[:50000] + "\n[Document truncated due to timeout]"
+            if mode == "chunked":
+                print(f"[{datetime.now()}] ❌ Persona synthesis timed out after {PERSONA_TIMEOUT_SECONDS:g} seconds")
+                raise HTTPException(status_code=504, detail="AI processing timed out while writing the persona. Please try again.")
+            print(f"[{datetime.now()}] ⏰ OpenAI API call timed out after {PERSONA_TIMEOUT_SECONDS:g} seconds, switching to long-document mode...")
+            mode = "chunked"
+            case_facts, chunk_stats = await extract_persona_facts(case_document)
             try:
                 response = await asyncio.wait_for(
-                    async_model.ainvoke(prompt_template.invoke({
+                    async_model.ainvoke(synthesis_template.invoke({
                         "example_persona": example_persona,
-                        "case_document": truncated_doc
+                        "case_document": case_facts
                     })),
-                    timeout=60.0  # Even shorter timeout for retry
+                    timeout=PERSONA_TIMEOUT_SECONDS
                 )
-                print(f"[{datetime.now()}] ✅ Retry with truncated document succeeded")
+                print(f"[{datetime.now()}] ✅ Long-document mode succeeded")
             except asyncio.TimeoutError:
-                print(f"[{datetime.now()}] ❌ Retry also timed out")
+                print(f"[{datetime.now()}] ❌ Persona synthesis also timed out")
                 raise HTTPException(status_code=504, detail="AI processing timed out. Document may be too complex. Please try with a shorter document.")
         
         # Clean up memory
@@ -168,7 +260,9 @@ async def process_patient_persona(case_document: str, case_id: Any, filename: st
             "timestamp": datetime.now().isoformat(),
             "type": "ai",
             "file_path": save_result["file_path"],
-            "case_id": case_id
+            "case_id": case_id,
+            "mode": mode,
+            "chunks": chunk_stats
         }
 
     except HTTPException:
@@ -176,7 +270,7 @@ async def process_patient_persona(case_document: str, case_id: Any, filename: st
         raise
     except Exception as e:
         error_timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        print(f"[{error_timestamp}] ❌ Error in process_patient_persona: {str(e)}")
+        print(f"[{error_timestamp}] ❌ Error in generate_patient_persona: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/create")
@@ -255,15 +349,9 @@ async def create_patient_persona(
         try:
             print(f"[PATIENT_PERSONA] 📄 Extracting text from document...")
             file_wrapper = FileWrapper(file_path)
-            case_document = extract_text_from_document(file_wrapper)
+            case_document = await extract_text_from_document_async(file_wrapper)
             file_wrapper.file.close()
-            
-            # Check document length to prevent timeout
-            doc_length = len(case_document)
-            max_doc_length = 100000  # 100k characters
-            if doc_length > max_doc_length:
-                print(f"[PATIENT_PERSONA] ⚠️ Document is very long: {doc_length} characters, truncating...")
-                case_document = case_document[:max_doc_length] + "\n[Document truncated due to length]"
+            # Long documents are not truncated: generate_patient_persona switches to long-document mode
             
             extraction_time = datetime.now()
             extraction_duration = (extraction_time - auth_time).total_seconds()
@@ -4,6 +4,7 @@ import os
 from pathlib import Path
 import json
 from datetime import datetime
+from utils.case_repository import case_repository
 
 case_router = APIRouter(
     prefix="/cases",
@@ -56,6 +57,7 @@ async def save_patient_persona(case_id: str, request: PatientPersonaRequest):
 
         # Write the persona prompt content to the file
         await write_to_file(file_path, request.persona_prompt)
+        case_repository.invalidate(case_id, "patient_prompts/patient_persona.txt")
 
         return {
             "success": True,
@@ -10,9 +10,9 @@ import json
 from enum import Enum
 from .helpers.image_downloader import download_image
 from .helpers.image_extractor import extract_and_save
-import time
 import traceback
 from auth.auth_api import get_user_from_token
+from utils.upload_store import ContentAddressedStore
 
 # Define the security scheme
 security = HTTPBearer()
@@ -242,16 +242,10 @@ async def upload_test_image(
         new_image_urls = []
         
         for file in files:
-            # Generate a unique filename
-            timestamp = int(time.time() * 1000)
-            filename = f"{test_name.replace(' ', '_')}_{timestamp}_{file.filename}"
-            
-            # Save the file to assets directory
-            file_path = f"{assets_dir}/{filename}"
-            
-            with open(file_path, "wb") as f:
-                content = await file.read()
-                f.write(content)
+            # Stream the file into the case's content-addressed assets store;
+            # re-uploading the same image reuses its file and URL
+            stored = await ContentAddressedStore(assets_dir).save(file, f"{test_name.replace(' ', '_')}_{file.filename}")
+            filename = stored["filename"]
             
             # Create the relative URL for the image (using assets path)
             image_url = f"/case-images/case{case_id}/assets/{filename}"
@@ -1,23 +1,22 @@
-from typing import List, Dict, Any
-from fastapi import APIRouter, HTTPException, Depends
+from typing import List, Dict, Any, Optional
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from datetime import datetime
-import os
 from dotenv import load_dotenv
 import json
-from pathlib import Path
-import google.generativeai as genai
-from utils.text_cleaner import clean_code_block
+import asyncio
+from utils.llm_gateway import llm_gateway
+from utils.text_cleaner import clean_code_block, is_json_response
 from utils.session_manager import SessionManager
+from utils.case_repository import case_repository
 from utils.auth_utils import get_authenticated_session_data
 from auth.auth_api import get_user, get_user_from_token
-import asyncio
 
 # Load environment variables
 load_dotenv()
 
 # Constants
-CASE_DATA_PATH_PATTERN = "case-data/case{}"
 DIAGNOSIS_CONTEXT_FILENAME = "diagnosis_context.json"
 HISTORY_CONTEXT_FILENAME = "history_context.json"
 
@@ -29,8 +28,7 @@ router = APIRouter(
     tags=["case-player"]
 )
 
-# Initialize the Gemini client and SessionManager
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+# Initialize the SessionManager
 session_manager = SessionManager()
 
 def load_prompt(file_path: str) -> str:
@@ -49,12 +47,10 @@ EDUCATIONAL_CAPSULES_PROMPT = load_prompt("prompts/diagnosis_feedback_new3.txt")
 async def load_diagnosis_context(case_id: int) -> Dict[str, Any]:
     """Load the diagnosis context from the case file."""
     try:
-        file_path = Path(f"{CASE_DATA_PATH_PATTERN.format(case_id)}/{DIAGNOSIS_CONTEXT_FILENAME}")
-        if not file_path.exists():
+        if not case_repository.exists(case_id, DIAGNOSIS_CONTEXT_FILENAME):
             raise FileNotFoundError(f"Diagnosis context not found for case {case_id}")
         
-        with open(file_path, 'r') as file:
-            return json.load(file)
+        return case_repository.load_json(case_id, DIAGNOSIS_CONTEXT_FILENAME)
     except Exception as e:
         raise HTTPException(
             status_code=404, 
@@ -64,12 +60,10 @@ async def load_diagnosis_context(case_id: int) -> Dict[str, Any]:
 async def load_history_context(case_id: int) -> Dict[str, Any]:
     """Load the history context from the case file."""
     try:
-        file_path = Path(f"{CASE_DATA_PATH_PATTERN.format(case_id)}/{HISTORY_CONTEXT_FILENAME}")
-        if not file_path.exists():
+        if not case_repository.exists(case_id, HISTORY_CONTEXT_FILENAME):
             raise FileNotFoundError(f"History context not found for case {case_id}")
         
-        with open(file_path, 'r') as file:
-            return json.load(file)
+        return case_repository.load_json(case_id, HISTORY_CONTEXT_FILENAME)
     except Exception as e:
         raise HTTPException(
             status_code=404, 
@@ -95,7 +89,7 @@ async def generate_feedback(prompt_template: str, diagnosis_context: Dict[str, A
                      student_input: Dict[str, Any], history_context: Dict[str, Any] = None) -> Dict[str, Any]:
     """Generate feedback using the Gemini model."""
     # Configure the model
-    model = genai.GenerativeModel('gemini-2.0-flash')
+    model = llm_gateway.model('gemini-2.0-flash', route="diagnosis_feedback")
     generation_config = {
         "temperature": 0.7,
         "top_p": 0.8,
@@ -135,7 +129,7 @@ async def generate_feedback(prompt_template: str, diagnosis_context: Dict[str, A
         "generation_config": generation_config
     }
     
-    response = await asyncio.to_thread(model.generate_content, **content)
+    response = await model.generate_content(**content)
     
     # Process the response
     cleaned_content = clean_code_block(response.text)
@@ -146,7 +140,7 @@ async def generate_feedback(prompt_template: str, diagnosis_context: Dict[str, A
 async def generate_educational_capsules(diagnosis_context: Dict[str, Any]) -> Dict[str, Any]:
     """Generate educational capsules using the Gemini model - simplified version for educational content only."""
     # Configure the model
-    model = genai.GenerativeModel('gemini-2.0-flash')
+    model = llm_gateway.model('gemini-2.0-flash', route="educational_capsules")
     generation_config = {
         "temperature": 0.7,
         "top_p": 0.8,
@@ -172,7 +166,8 @@ async def generate_educational_capsules(diagnosis_context: Dict[str, Any]) -> Di
         "generation_config": generation_config
     }
     
-    response = await asyncio.to_thread(model.generate_content, **content)
+    # Capsules depend only on the case, so every student of a cohort shares one response
+    response = await model.generate_content(**content, cache=True, cache_validator=is_json_response)
     
     # Process the response
     cleaned_content = clean_code_block(response.text)
@@ -251,7 +246,7 @@ async def get_primary_diagnosis_feedback(
         
         # Save feedback to session
         try:
-            session_manager.add_diagnosis_feedback(
+            await session_manager.add_diagnosis_feedback(
                 student_id=student_id,
                 feedback_result={"primaryDiagnosis": feedback_result}
             )
@@ -308,7 +303,7 @@ async def get_differential_diagnosis_feedback(
         # Save feedback to session
         try:
             # Use the session manager method to add feedback
-            session_manager.add_diagnosis_feedback(
+            await session_manager.add_diagnosis_feedback(
                 student_id=student_id,
                 feedback_result={"differentialDiagnosis": feedback_result}
             )
@@ -357,7 +352,7 @@ async def get_educational_resources(
         
         # Save feedback to session
         try:
-            session_manager.add_diagnosis_feedback(
+            await session_manager.add_diagnosis_feedback(
                 student_id=student_id,
                 feedback_result={"educationalCapsules": feedback_result}
             )
@@ -380,4 +375,145 @@ async def get_educational_resources(
     except Exception as e:
         error_msg = f"Error in get_educational_capsules: {str(e)}"
         print(f"[{datetime.now()}] ❌ {error_msg}")
-        raise HTTPException(status_code=500, detail=error_msg) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=error_msg) 
+# Sections of the combined evaluation: session feedback key -> (feedback_type, prompt; None for capsules)
+DIAGNOSIS_SECTIONS = {
+    "primaryDiagnosis": ("primary_diagnosis", PRIMARY_DIAGNOSIS_PROMPT),
+    "differentialDiagnosis": ("differential_diagnosis", DIFFERENTIAL_DIAGNOSIS_PROMPT),
+    "educationalCapsules": ("educational_capsules", None),
+}
+
+_STREAM_HEADERS = {"Cache-Control": "no-cache", "Connection": "keep-alive", "X-Accel-Buffering": "no"}
+
+def _format_event(payload: Dict[str, Any], stream_format: str) -> str:
+    """Encode one event as an SSE frame or an NDJSON line."""
+    if stream_format == "ndjson":
+        return json.dumps(payload) + "\n"
+    return f"data: {json.dumps(payload)}\n\n"
+
+async def _run_section(section: str, diagnosis_context: Dict[str, Any], student_input: Dict[str, Any],
+                       history_context: Dict[str, Any]) -> Dict[str, Any]:
+    _, prompt_template = DIAGNOSIS_SECTIONS[section]
+    if prompt_template is None:
+        return await generate_educational_capsules(diagnosis_context=diagnosis_context)
+    return await generate_feedback(
+        prompt_template=prompt_template,
+        diagnosis_context=diagnosis_context,
+        student_input=student_input,
+        history_context=history_context
+    )
+
+async def stream_diagnosis_feedback(student_id: str, case_id: str, sections: List[str],
+                                    diagnosis_context: Dict[str, Any], history_context: Dict[str, Any],
+                                    student_input: Dict[str, Any], stream_format: str):
+    """
+    Run the feedback sections concurrently and yield each one as soon as it is ready.
+
+    Emits `{"type": "section", "section": ..., "feedback_result": ...}` per finished
+    section (or `{"type": "section_error", ...}`), then one `{"type": "done", ...}`
+    event once every section has finished and the results were saved to the
+    session in a single write.
+    """
+    start_time = datetime.now()
+    tasks = {
+        asyncio.create_task(_run_section(section, diagnosis_context, student_input, history_context)): section
+        for section in sections
+    }
+    results = {}
+    failed = []
+    try:
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                section = tasks[task]
+                feedback_type = DIAGNOSIS_SECTIONS[section][0]
+                elapsed = (datetime.now() - start_time).total_seconds()
+                if task.exception() is not None:
+                    failed.append(section)
+                    print(f"[DIAGNOSIS_FEEDBACK_V2] ❌ Section {section} failed: {str(task.exception())}")
+                    yield _format_event({
+                        "type": "section_error",
+                        "section": section,
+                        "feedback_type": feedback_type,
+                        "error": str(task.exception())
+                    }, stream_format)
+                    continue
+                results[section] = task.result()
+                print(f"[DIAGNOSIS_FEEDBACK_V2] ✅ Section {section} ready after {elapsed:.2f}s")
+                yield _format_event({
+                    "type": "section",
+                    "section": section,
+                    "feedback_type": feedback_type,
+                    "feedback_result": results[section],
+                    "processing_time_seconds": elapsed
+                }, stream_format)
+        
+        # Persist every finished section in one session write
+        saved = False
+        if results:
+            try:
+                await session_manager.add_diagnosis_feedback(student_id=student_id, feedback_result=results)
+                saved = True
+                print(f"[DEBUG] Successfully saved {len(results)} diagnosis feedback sections to session")
+            except Exception as save_error:
+                print(f"[WARNING] Failed to save diagnosis feedback to session: {str(save_error)}")
+        
+        yield _format_event({
+            "type": "done",
+            "case_id": case_id,
+            "student_id": student_id,
+            "timestamp": datetime.now().isoformat(),
+            "sections": list(results),
+            "failed_sections": failed,
+            "saved": saved,
+            "metadata": {
+                "processing_time_seconds": (datetime.now() - start_time).total_seconds(),
+                "model_version": "gemini-2.0-flash"
+            }
+        }, stream_format)
+    finally:
+        # Client went away: stop the sections that are still running
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+@router.get("/evaluate-all")
+async def evaluate_all_sections(
+    stream_format: str = Query("sse", alias="format", pattern="^(sse|ndjson)$"),
+    sections: Optional[str] = Query(None, description="Comma-separated subset of " + ", ".join(DIAGNOSIS_SECTIONS)),
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    """
+    Generate primary diagnosis, differential diagnosis and educational capsule feedback in one request.
+    
+    The case context is loaded once and the sections run concurrently, so the
+    total time is that of the slowest section rather than the sum of all three.
+    Each section is streamed as soon as it is ready, as Server-Sent Events
+    (`format=sse`, default) or newline-delimited JSON (`format=ndjson`).
+    """
+    print(f"\n[{datetime.now()}] 🔍 Starting combined diagnosis feedback generation")
+    
+    # Authentication and context errors are returned as regular HTTP errors, before the stream starts
+    token = credentials.credentials
+    student_id, session_data = await get_authenticated_session_data(token)
+    case_id = session_data["case_id"]
+    
+    selected = list(DIAGNOSIS_SECTIONS)
+    if sections:
+        selected = [section.strip() for section in sections.split(",") if section.strip()]
+        unknown = [section for section in selected if section not in DIAGNOSIS_SECTIONS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown feedback sections: {', '.join(unknown)}")
+    
+    # Load context data once for all sections
+    diagnosis_context = await load_diagnosis_context(int(case_id))
+    history_context = await load_history_context(int(case_id))
+    student_input = prepare_student_input(session_data)
+    
+    return StreamingResponse(
+        stream_diagnosis_feedback(student_id, case_id, selected, diagnosis_context, history_context,
+                                  student_input, stream_format),
+        media_type="application/x-ndjson" if stream_format == "ndjson" else "text/event-stream",
+        headers=_STREAM_HEADERS
+    )
@@ -6,9 +6,8 @@ from dotenv import load_dotenv
 import json
 from pathlib import Path
 from pydantic import BaseModel
-import google.generativeai as genai
+from utils.llm_gateway import llm_gateway
 from utils.text_cleaner import clean_code_block
-import asyncio
 
 # Load environment variables
 load_dotenv()
@@ -101,7 +100,7 @@ async def get_osce_feedback(request: OSCEFeedbackRequest):
         start_time = datetime.now()
         
         # Configure the model
-        model = genai.GenerativeModel('gemini-2.0-flash')
+        model = llm_gateway.model('gemini-2.0-flash', route="osce_feedback")
         generation_config = {
             "temperature": 0.7,
             "top_p": 0.8,
@@ -128,7 +127,7 @@ async def get_osce_feedback(request: OSCEFeedbackRequest):
         
         # Generate the response
         print("[DEBUG] Sending prompt to Gemini model...")
-        response = await asyncio.to_thread(model.generate_content, **content)
+        response = await model.generate_content(**content)
         print("[DEBUG] Received response from Gemini model")
         
         # Process the response content
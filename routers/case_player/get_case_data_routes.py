@@ -9,6 +9,9 @@ from pathlib import Path
 from datetime import datetime
 from utils.session_manager import SessionManager
 from auth.auth_api import get_user, get_authenticated_client, get_user_from_token
+from auth.dependencies import get_admin_user
+from db.supabase_async import execute
+from utils.case_repository import case_repository
 
 case_router = APIRouter()
 session_manager = SessionManager()
@@ -72,21 +75,20 @@ async def list_cases(credentials: HTTPAuthorizationCredentials = Depends(securit
             cover_file = case_dir / "case_cover.json"
             if cover_file.exists():
                 try:
-                    with open(cover_file, "r") as f:
-                        cover_data = json.load(f)
-                        case_info = CaseInfo(
-                            case_id=cover_data.get("case_id", 0),
-                            case_name=cover_data["case_name"],
-                            title=cover_data.get("title"),
-                            quote=cover_data.get("quote"),
-                            image_url=cover_data.get("image_url"),
-                            last_updated=cover_data.get("last_updated"),
-                            differential_diagnosis=cover_data.get("differential_diagnosis"),
-                            department=cover_data.get("department"),
-                            published=cover_data.get("published"),
-                            deleted=cover_data.get("deleted")
-                        )
-                        cases.append(case_info)
+                    cover_data = case_repository.load_json(case_dir.name[len("case"):], "case_cover.json")
+                    case_info = CaseInfo(
+                        case_id=cover_data.get("case_id", 0),
+                        case_name=cover_data["case_name"],
+                        title=cover_data.get("title"),
+                        quote=cover_data.get("quote"),
+                        image_url=cover_data.get("image_url"),
+                        last_updated=cover_data.get("last_updated"),
+                        differential_diagnosis=cover_data.get("differential_diagnosis"),
+                        department=cover_data.get("department"),
+                        published=cover_data.get("published"),
+                        deleted=cover_data.get("deleted")
+                    )
+                    cases.append(case_info)
                 except json.JSONDecodeError as e:
                     print(f"Error parsing JSON in {cover_file}: {e}")
                     continue
@@ -106,6 +108,14 @@ async def list_cases(credentials: HTTPAuthorizationCredentials = Depends(securit
         print(f"[CASE_ROUTER] ❌ Error retrieving cases: {error_msg}")
         raise HTTPException(status_code=500, detail=f"Error retrieving case list: {error_msg}")
 
+@case_router.get("/case-repository/stats")
+async def case_repository_stats(admin_user: dict = Depends(get_admin_user)):
+    """Get hit/miss statistics for the in-process case artifact cache"""
+    return {
+        "success": True,
+        "stats": case_repository.stats()
+    }
+
 @case_router.get("/cases/{case_id}", response_model=CaseData)
 async def get_case_data(case_id: str, credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Get case data including physical exam and lab test data"""
@@ -134,7 +144,7 @@ async def get_case_data(case_id: str, credentials: HTTPAuthorizationCredentials
 
     try:
         # Clear the session for this student-case combination
-        session_manager.clear_session(student_id, case_id)
+        await session_manager.clear_session(student_id, case_id)
         
         # Define paths for the case data and case cover
         data_file_path = os.path.join('case-data', f'case{case_id}', 'test_exam_data.json')
@@ -149,17 +159,14 @@ async def get_case_data(case_id: str, credentials: HTTPAuthorizationCredentials
         
         try:
             # Load the case data
-            with open(data_file_path, 'r') as file:
-                data = json.load(file)
-            with open(cover_file_path, 'r') as cover_file:
-                case_cover_data = json.load(cover_file)
+            data = case_repository.load_json(case_id, 'test_exam_data.json')
+            case_cover_data = case_repository.load_json(case_id, 'case_cover.json')
                 
             # Load diagnosis context if available
             diagnosis_context_data = {}
             if os.path.exists(diagnosis_context_path):
                 try:
-                    with open(diagnosis_context_path, 'r') as context_file:
-                        diagnosis_context_data = json.load(context_file)
+                    diagnosis_context_data = case_repository.load_json(case_id, 'diagnosis_context.json')
                 except json.JSONDecodeError as json_error:
                     print(f"Invalid JSON in diagnosis_context.json: {str(json_error)}")
                 except Exception as file_error:
@@ -230,8 +237,7 @@ async def update_case_cover(case_id: str, update_data: CaseCoverUpdate, credenti
         
         try:
             # Read existing case cover data
-            with open(cover_file_path, 'r') as f:
-                case_cover_data = json.load(f)
+            case_cover_data = case_repository.load_json(case_id, 'case_cover.json', copy=True)
         except json.JSONDecodeError as e:
             raise HTTPException(
                 status_code=500,
@@ -244,8 +250,7 @@ async def update_case_cover(case_id: str, update_data: CaseCoverUpdate, credenti
         
         try:
             # Write updated data back to the file
-            with open(cover_file_path, 'w') as f:
-                json.dump(case_cover_data, f, indent=2)
+            case_repository.save_json(case_id, 'case_cover.json', case_cover_data)
         except Exception as write_error:
             raise HTTPException(
                 status_code=500,
@@ -254,13 +259,14 @@ async def update_case_cover(case_id: str, update_data: CaseCoverUpdate, credenti
         
         # Reset the last_modified_time in Supabase
         try:
-            supabase = get_authenticated_client()
+            supabase = get_authenticated_client(token)
             case_name = case_cover_data.get("case_name")
             if case_name:
-                result = supabase.table("documents")\
-                    .update({"last_modified_time": None})\
-                    .eq("title", case_name)\
-                    .execute()
+                result = await execute(
+                    supabase.table("documents")
+                    .update({"last_modified_time": None})
+                    .eq("title", case_name)
+                )
                 print(f"Reset result: {result.data}")
         except Exception as db_error:
             print(f"WARNING: Could not reset last_modified_time in Supabase: {str(db_error)}")
@@ -314,8 +320,7 @@ async def unpublish_case(case_id: str, credentials: HTTPAuthorizationCredentials
         
         try:
             # Read existing case cover data
-            with open(cover_file_path, 'r') as f:
-                case_cover_data = json.load(f)
+            case_cover_data = case_repository.load_json(case_id, 'case_cover.json', copy=True)
         except json.JSONDecodeError as e:
             raise HTTPException(
                 status_code=500,
@@ -328,8 +333,7 @@ async def unpublish_case(case_id: str, credentials: HTTPAuthorizationCredentials
         
         try:
             # Write updated data back to the file
-            with open(cover_file_path, 'w') as f:
-                json.dump(case_cover_data, f, indent=2)
+            case_repository.save_json(case_id, 'case_cover.json', case_cover_data)
         except Exception as write_error:
             raise HTTPException(
                 status_code=500,
@@ -338,13 +342,14 @@ async def unpublish_case(case_id: str, credentials: HTTPAuthorizationCredentials
         
         # Reset the last_modified_time in Supabase
         try:
-            supabase = get_authenticated_client()
+            supabase = get_authenticated_client(token)
             case_name = case_cover_data.get("case_name")
             if case_name:
-                result = supabase.table("documents")\
-                    .update({"last_modified_time": None})\
-                    .eq("title", case_name)\
-                    .execute()
+                result = await execute(
+                    supabase.table("documents")
+                    .update({"last_modified_time": None})
+                    .eq("title", case_name)
+                )
                 print(f"Reset result: {result.data}")
         except Exception as db_error:
             print(f"WARNING: Could not reset last_modified_time in Supabase: {str(db_error)}")
@@ -403,8 +408,7 @@ async def soft_delete_case(case_id: str, update_data: CaseDeleteUpdate, credenti
         
         try:
             # Read existing case cover data
-            with open(cover_file_path, 'r') as f:
-                case_cover_data = json.load(f)
+            case_cover_data = case_repository.load_json(case_id, 'case_cover.json', copy=True)
         except json.JSONDecodeError as e:
             raise HTTPException(
                 status_code=500,
@@ -418,8 +422,7 @@ async def soft_delete_case(case_id: str, update_data: CaseDeleteUpdate, credenti
             
             # Write updated data back to the file before moving
             try:
-                with open(cover_file_path, 'w') as f:
-                    json.dump(case_cover_data, f, indent=2)
+                case_repository.save_json(case_id, 'case_cover.json', case_cover_data)
             except Exception as write_error:
                 raise HTTPException(
                     status_code=500,
@@ -439,6 +442,7 @@ async def soft_delete_case(case_id: str, update_data: CaseDeleteUpdate, credenti
             
             try:
                 shutil.move(case_folder_path, destination_path)
+                case_repository.invalidate(case_id)
                 print(f"[CASE_ROUTER] ✅ Case folder moved to deleted directory: {destination_path}")
             except Exception as move_error:
                 raise HTTPException(
@@ -455,6 +459,7 @@ async def soft_delete_case(case_id: str, update_data: CaseDeleteUpdate, credenti
                 # Move back from deleted folder
                 try:
                     shutil.move(deleted_case_path, case_folder_path)
+                    case_repository.invalidate(case_id)
                     print(f"[CASE_ROUTER] ✅ Case folder restored from deleted directory: {case_folder_path}")
                 except Exception as move_error:
                     raise HTTPException(
@@ -463,16 +468,13 @@ async def soft_delete_case(case_id: str, update_data: CaseDeleteUpdate, credenti
                     )
                 
                 # Update the case cover file in the restored location
-                restored_cover_file_path = os.path.join(case_folder_path, 'case_cover.json')
                 try:
-                    with open(restored_cover_file_path, 'r') as f:
-                        case_cover_data = json.load(f)
+                    case_cover_data = case_repository.load_json(case_id, 'case_cover.json', copy=True)
                     
                     case_cover_data["deleted"] = False
                     case_cover_data["last_updated"] = datetime.now().isoformat()
                     
-                    with open(restored_cover_file_path, 'w') as f:
-                        json.dump(case_cover_data, f, indent=2)
+                    case_repository.save_json(case_id, 'case_cover.json', case_cover_data)
                 except Exception as restore_error:
                     raise HTTPException(
                         status_code=500,
@@ -484,8 +486,7 @@ async def soft_delete_case(case_id: str, update_data: CaseDeleteUpdate, credenti
                 case_cover_data["last_updated"] = datetime.now().isoformat()
                 
                 try:
-                    with open(cover_file_path, 'w') as f:
-                        json.dump(case_cover_data, f, indent=2)
+                    case_repository.save_json(case_id, 'case_cover.json', case_cover_data)
                 except Exception as write_error:
                     raise HTTPException(
                         status_code=500,
@@ -8,6 +8,7 @@ import traceback
 import dateutil.parser
 import shutil
 from auth.auth_api import get_user_from_token
+from utils.case_repository import case_repository
 
 from routers.curriculum import get_db_connection
 
@@ -41,9 +42,8 @@ def update_case_doc_from_uploads(case_id: str) -> bool:
             return False
             
         # Read case_cover.json to get case_name
-        with open(cover_file_path, 'r') as file:
-            case_data = json.load(file)
-            case_name = case_data.get('case_name')
+        case_data = case_repository.load_json(case_id, 'case_cover.json')
+        case_name = case_data.get('case_name')
             
         if not case_name:
             print(f"ERROR: No case_name found in case cover file")
@@ -146,22 +146,19 @@ async def get_case_details(
             
             # Load the case exam data
             print("Loading exam data...")
-            with open(data_file_path, 'r') as file:
-                exam_data = json.load(file)
+            exam_data = case_repository.load_json(case_id, 'test_exam_data.json')
             
             # Load the case cover data
             print("Loading cover data...")
-            with open(cover_file_path, 'r') as cover_file:
-                case_cover_data = json.load(cover_file)
+            case_cover_data = case_repository.load_json(case_id, 'case_cover.json')
                 
             # Load patient persona from the correct path
             patient_persona = {"content": ""}  # Initialize with empty content
             if os.path.exists(persona_file_path):
                 print("Loading patient persona...")
-                with open(persona_file_path, 'r', encoding='utf-8') as persona_file:
-                    persona_text = persona_file.read().strip()
-                    patient_persona["content"] = persona_text
-                    print(f"Persona content length: {len(persona_text)} characters")
+                persona_text = case_repository.load_text(case_id, 'patient_prompts/patient_persona.txt').strip()
+                patient_persona["content"] = persona_text
+                print(f"Persona content length: {len(persona_text)} characters")
             else:
                 print(f"WARNING: Patient persona not found at: {persona_file_path}")
                 
@@ -169,10 +166,8 @@ async def get_case_details(
             history_context = {"content": {}}  # Initialize with empty content object
             if os.path.exists(history_context_path):
                 print("Loading history context...")
-                with open(history_context_path, 'r', encoding='utf-8') as history_file:
-                    history_data = json.load(history_file)
-                    history_context["content"] = history_data
-                    print(f"History context loaded successfully")
+                history_context["content"] = case_repository.load_json(case_id, 'history_context.json')
+                print(f"History context loaded successfully")
             else:
                 print(f"WARNING: History context not found at: {history_context_path}")
                 
@@ -180,10 +175,8 @@ async def get_case_details(
             treatment_context = {"content": {}}  # Initialize with empty content object
             if os.path.exists(treatment_context_path):
                 print("Loading treatment context...")
-                with open(treatment_context_path, 'r', encoding='utf-8') as treatment_file:
-                    treatment_data = json.load(treatment_file)
-                    treatment_context["content"] = treatment_data
-                    print(f"Treatment context loaded successfully")
+                treatment_context["content"] = case_repository.load_json(case_id, 'treatment_context.json')
+                print(f"Treatment context loaded successfully")
             else:
                 print(f"WARNING: Treatment context not found at: {treatment_context_path}")
                 
@@ -191,10 +184,8 @@ async def get_case_details(
             clinical_findings_context = {"content": {}}  # Initialize with empty content object
             if os.path.exists(clinical_findings_context_path):
                 print("Loading clinical findings context...")
-                with open(clinical_findings_context_path, 'r', encoding='utf-8') as findings_file:
-                    findings_data = json.load(findings_file)
-                    clinical_findings_context["content"] = findings_data
-                    print(f"Clinical findings context loaded successfully")
+                clinical_findings_context["content"] = case_repository.load_json(case_id, 'clinical_findings_context.json')
+                print(f"Clinical findings context loaded successfully")
             else:
                 print(f"WARNING: Clinical findings context not found at: {clinical_findings_context_path}")
                 
@@ -202,10 +193,8 @@ async def get_case_details(
             diagnosis_context = {"content": {}}  # Initialize with empty content object
             if os.path.exists(diagnosis_context_path):
                 print("Loading diagnosis context...")
-                with open(diagnosis_context_path, 'r', encoding='utf-8') as diagnosis_file:
-                    diagnosis_data = json.load(diagnosis_file)
-                    diagnosis_context["content"] = diagnosis_data
-                    print(f"Diagnosis context loaded successfully")
+                diagnosis_context["content"] = case_repository.load_json(case_id, 'diagnosis_context.json')
+                print(f"Diagnosis context loaded successfully")
             else:
                 print(f"WARNING: Diagnosis context not found at: {diagnosis_context_path}")
 
@@ -282,8 +271,7 @@ async def get_test_data_only(
             
             # Load the test exam data
             print("Loading test exam data...")
-            with open(data_file_path, 'r') as file:
-                exam_data = json.load(file)
+            exam_data = case_repository.load_json(case_id, 'test_exam_data.json')
             
             print(f"Test data loaded successfully for case {case_id}")
             
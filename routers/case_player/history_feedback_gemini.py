@@ -2,22 +2,19 @@ from typing import List, Dict, Any
 from fastapi import APIRouter, HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from datetime import datetime
-import os
 from dotenv import load_dotenv
 import json
-from pathlib import Path
-import google.generativeai as genai
+from utils.llm_gateway import llm_gateway
 from utils.text_cleaner import clean_code_block
 from utils.session_manager import SessionManager
+from utils.case_repository import case_repository
 from utils.auth_utils import get_authenticated_session_data
 from auth.auth_api import get_user, get_user_from_token
-import asyncio
 
 # Load environment variables
 load_dotenv()
 
 # Constants
-CASE_DATA_PATH_PATTERN = "case-data/case{}"
 HISTORY_CONTEXT_FILENAME = "history_context.json"
 
 # Define the security scheme
@@ -28,8 +25,7 @@ router = APIRouter(
     tags=["case-player"]
 )
 
-# Initialize the Gemini client and SessionManager
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+# Initialize the SessionManager
 session_manager = SessionManager()
 
 def load_prompt(file_path: str) -> str:
@@ -47,30 +43,28 @@ HISTORY_AETCOM_PROMPT = load_prompt("prompts/history_aetcom.txt")      # Prompt
 async def load_case_context(case_id: int) -> str:
     """Load the case context from the case file."""
     try:
-        file_path = Path(f"{CASE_DATA_PATH_PATTERN.format(case_id)}/{HISTORY_CONTEXT_FILENAME}")
-        if not file_path.exists():
+        if not case_repository.exists(case_id, HISTORY_CONTEXT_FILENAME):
             raise FileNotFoundError(f"Case document not found for case {case_id}")
         
-        with open(file_path, 'r') as file:
-            data = json.load(file)
-            # Format the JSON as a more readable string for the LLM
-            case_summary = data["case_summary_history"]
-            formatted_text = ""
-            
-            for key, value in case_summary.items():
-                if isinstance(value, dict):
-                    formatted_text += f"\n{key.replace('_', ' ').title()}:\n"
-                    for sub_key, sub_value in value.items():
-                        if sub_value is not None:
-                            formatted_text += f"  - {sub_key.replace('_', ' ').title()}: {sub_value}\n"
-                elif isinstance(value, list):
-                    formatted_text += f"\n{key.replace('_', ' ').title()}:\n"
-                    for item in value:
-                        formatted_text += f"  - {item}\n"
-                else:
-                    formatted_text += f"\n{key.replace('_', ' ').title()}: {value}\n"
-            
-            return formatted_text
+        data = case_repository.load_json(case_id, HISTORY_CONTEXT_FILENAME)
+        # Format the JSON as a more readable string for the LLM
+        case_summary = data["case_summary_history"]
+        formatted_text = ""
+        
+        for key, value in case_summary.items():
+            if isinstance(value, dict):
+                formatted_text += f"\n{key.replace('_', ' ').title()}:\n"
+                for sub_key, sub_value in value.items():
+                    if sub_value is not None:
+                        formatted_text += f"  - {sub_key.replace('_', ' ').title()}: {sub_value}\n"
+            elif isinstance(value, list):
+                formatted_text += f"\n{key.replace('_', ' ').title()}:\n"
+                for item in value:
+                    formatted_text += f"  - {item}\n"
+            else:
+                formatted_text += f"\n{key.replace('_', ' ').title()}: {value}\n"
+        
+        return formatted_text
     except Exception as e:
         raise HTTPException(
             status_code=404, 
@@ -80,17 +74,15 @@ async def load_case_context(case_id: int) -> str:
 async def load_expected_questions(case_id: int) -> List[str]:
     """Load the expected questions from the history context file."""
     try:
-        file_path = Path(f"{CASE_DATA_PATH_PATTERN.format(case_id)}/{HISTORY_CONTEXT_FILENAME}")
-        if not file_path.exists():
+        if not case_repository.exists(case_id, HISTORY_CONTEXT_FILENAME):
             raise FileNotFoundError(f"History context not found for case {case_id}")
         
-        with open(file_path, 'r') as file:
-            data = json.load(file)
-            # Extract just the expected_questions array from the JSON
-            if "expected_questions_with_domains" in data:
-                return data["expected_questions_with_domains"]
-            else:
-                raise ValueError("No 'expected_questions_with_domains' field found in history context file")
+        data = case_repository.load_json(case_id, HISTORY_CONTEXT_FILENAME)
+        # Extract just the expected_questions array from the JSON
+        if "expected_questions_with_domains" in data:
+            return list(data["expected_questions_with_domains"])
+        else:
+            raise ValueError("No 'expected_questions_with_domains' field found in history context file")
     except Exception as e:
         raise HTTPException(
             status_code=404,
@@ -124,7 +116,7 @@ async def get_history_analysis(
         ]
         
         # Configure the model
-        model = genai.GenerativeModel('gemini-2.0-flash')
+        model = llm_gateway.model('gemini-2.0-flash', route="history_analysis")
         generation_config = {
             "temperature": 0.7,
             "top_p": 0.8,
@@ -151,13 +143,13 @@ async def get_history_analysis(
             "generation_config": generation_config
         }
         
-        response = await asyncio.to_thread(model.generate_content, **content)
+        response = await model.generate_content(**content)
         
         # Process and return the response
         cleaned_content = clean_code_block(response.text)
         analysis_result = json.loads(cleaned_content)
         #add analysis_result to session
-        session_manager.add_history_analysis(student_id, analysis_result)
+        await session_manager.add_history_analysis(student_id, analysis_result)
         print(f"[DEBUG] Successfully saved analysis results to session")
         return {
             "case_id": case_id,
@@ -262,7 +254,7 @@ async def get_history_aetcom_feedback(
         
         # Configure the model
         try:
-            model = genai.GenerativeModel('gemini-2.0-flash')
+            model = llm_gateway.model('gemini-2.0-flash', route="history_aetcom_feedback")
             generation_config = {
                 "temperature": 0.7,
                 "top_p": 0.8,
@@ -302,7 +294,7 @@ async def get_history_aetcom_feedback(
             }
             
             print(f"[{datetime.now()}] 🔄 Sending request to Gemini API...")
-            response = await asyncio.to_thread(model.generate_content, **content)
+            response = await model.generate_content(**content)
             print(f"[{datetime.now()}] ✅ Received response from Gemini API, length: {len(response.text)} characters")
         except Exception as api_error:
             print(f"[{datetime.now()}] ❌ Error calling Gemini API: {str(api_error)}")
@@ -329,7 +321,7 @@ async def get_history_aetcom_feedback(
         
         # Save both analysis and domain feedback to session
         try:
-            session_manager.add_history_feedback(
+            await session_manager.add_history_feedback(
                 student_id=student_id,
                 analysis_result=analysis_result,
                 domain_feedback=feedback_result
@@ -109,7 +109,7 @@ async def get_session_data():
         raise HTTPException(status_code=401, detail="Authentication required")
     
     student_id = user_response["user"]["id"]
-    session_data = session_manager.get_session(student_id)
+    session_data = await session_manager.get_session(student_id)
     if not session_data:
         raise HTTPException(status_code=404, detail="No active session found")
     
@@ -199,7 +199,7 @@ async def get_history_analysis():
         analysis_result = json.loads(cleaned_content)
         
         # Add analysis_result to session
-        session_manager.add_history_analysis(student_id, analysis_result)
+        await session_manager.add_history_analysis(student_id, analysis_result)
         print(f"[DEBUG] Successfully saved analysis results to session")
         
         return {
@@ -422,7 +422,7 @@ async def get_history_aetcom_feedback():
         
         # Save both analysis and domain feedback to session
         try:
-            session_manager.add_history_feedback(
+            await session_manager.add_history_feedback(
                 student_id=student_id,
                 analysis_result=analysis_result,
                 domain_feedback=feedback_result
@@ -1,16 +1,16 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 from fastapi import APIRouter, HTTPException, Body, Query, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from datetime import datetime
-import os
 from dotenv import load_dotenv
 import json
-from pathlib import Path
-import google.generativeai as genai
+import hashlib
+from utils.llm_gateway import llm_gateway
 from utils.text_cleaner import clean_code_block
 from auth.auth_api import get_user_from_token
 from utils.session_manager import SessionManager
-import asyncio
+from utils.case_repository import case_repository
+from utils.history_matcher import HISTORY_PREMATCH_ENABLED, get_history_matcher
 from collections import Counter
 from pydantic import BaseModel
 
@@ -21,16 +21,15 @@ load_dotenv()
 security = HTTPBearer()
 
 # Constants
-CASE_DATA_PATH_PATTERN = "case-data/case{}"
 HISTORY_CONTEXT_FILENAME = "history_context.json"
+HISTORY_MATCH_MODEL = "gemini-2.0-flash"
 
 router = APIRouter(
     prefix="/history-match",
     tags=["case-player"]
 )
 
-# Initialize the Gemini client and SessionManager
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+# Initialize the SessionManager
 session_manager = SessionManager()
 
 def load_prompt(file_path: str) -> str:
@@ -50,23 +49,231 @@ HISTORY_MATCH_QA_PROMPT = load_prompt("prompts/history_qanda.txt")
 async def load_expected_questions(case_id: int) -> List[Dict[str, str]]:
     """Load the expected questions with domains from the history context file."""
     try:
-        file_path = Path(f"{CASE_DATA_PATH_PATTERN.format(case_id)}/{HISTORY_CONTEXT_FILENAME}")
-        if not file_path.exists():
+        if not case_repository.exists(case_id, HISTORY_CONTEXT_FILENAME):
             raise FileNotFoundError(f"History context not found for case {case_id}")
         
-        with open(file_path, 'r') as file:
-            data = json.load(file)
-            # Extract the expected_questions_with_domains array from the JSON
-            if "expected_questions_with_domains" in data:
-                return data["expected_questions_with_domains"]
-            else:
-                raise ValueError("No 'expected_questions_with_domains' field found in history context file")
+        data = case_repository.load_json(case_id, HISTORY_CONTEXT_FILENAME)
+        # Extract the expected_questions_with_domains array from the JSON
+        if "expected_questions_with_domains" in data:
+            return list(data["expected_questions_with_domains"])
+        else:
+            raise ValueError("No 'expected_questions_with_domains' field found in history context file")
     except Exception as e:
         raise HTTPException(
             status_code=404,
             detail=f"Failed to load expected questions for case {case_id}: {str(e)}"
         )
 
+def question_key(question: Dict[str, str]) -> tuple:
+    return (question.get("question"), question.get("domain"))
+
+def prematch_questions(case_id, all_questions: List[Dict[str, str]], interactions: List[Dict[str, str]],
+                       questions: List[Dict[str, str]]) -> Dict[str, Any]:
+    """
+    Settle clear matches and clear non-matches locally before asking Gemini.
+
+    Args:
+        case_id: Case identifier (the pre-matcher is built once per case)
+        all_questions: All expected questions of the case
+        interactions: Student interactions (student_question, patient_reply)
+        questions: Expected questions still to be checked
+
+    Returns:
+        Dict with "covered", "uncovered" and "ambiguous" question lists, the
+        interactions relevant to the ambiguous questions, the best-scoring
+        interaction per question key, and counters for the response metadata
+    """
+    if not HISTORY_PREMATCH_ENABLED:
+        return {
+            "covered": [], "uncovered": [], "ambiguous": list(questions), "interactions": list(interactions),
+            "best_interaction": {}, "stats": {"enabled": False}
+        }
+    
+    split = get_history_matcher(case_id, all_questions).classify(interactions, questions)
+    relevant_interactions = [interactions[i] for i in sorted(split["relevant_interactions"])]
+    print(f"[HISTORY_MATCH] 🧮 Pre-match: {len(split['covered'])} covered, {len(split['uncovered'])} uncovered, "
+          f"{len(split['ambiguous'])} escalated to Gemini")
+    return {
+        "covered": split["covered"],
+        "uncovered": split["uncovered"],
+        "ambiguous": split["ambiguous"],
+        "interactions": relevant_interactions,
+        "best_interaction": {question_key(questions[i]): best for i, best in split["best_interaction"].items()},
+        "stats": {
+            "enabled": True,
+            "local_covered": len(split["covered"]),
+            "local_uncovered": len(split["uncovered"]),
+            "escalated": len(split["ambiguous"]),
+            "escalated_interactions": len(relevant_interactions)
+        }
+    }
+
+def questions_fingerprint(questions: List[Dict[str, str]]) -> str:
+    """Identify a version of the expected questions, so stored coverage is dropped when the case changes."""
+    return hashlib.sha1(json.dumps([question_key(q) for q in questions]).encode("utf-8")).hexdigest()
+
+def load_coverage(session_data: Dict[str, Any], fingerprint: str) -> Tuple[Dict[str, Dict[str, Any]], int, bool]:
+    """
+    Read the coverage state stored in the session.
+
+    Returns:
+        (covered questions keyed by question index, number of interactions already
+        evaluated, whether the stored state is missing or for other expected questions)
+    """
+    state = session_data.get("history_coverage") or {}
+    if state.get("fingerprint") != fingerprint:
+        return {}, 0, True
+    # Entries copied from client-sent lists were never evaluated; they do not count as coverage
+    covered = {
+        index: entry for index, entry in state.get("covered", {}).items() if entry.get("method") != "client"
+    }
+    return covered, int(state.get("evaluated_interactions", 0)), False
+
+def coverage_entry(question: Dict[str, str], interaction_index: Optional[int], method: str) -> Dict[str, Any]:
+    return {
+        "question": question.get("question"),
+        "domain": question.get("domain"),
+        "interaction_index": interaction_index,
+        "method": method,
+        "timestamp": datetime.now().isoformat()
+    }
+
+def filter_to_client_list(questions: List[Dict[str, str]],
+                          client_questions: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """
+    Narrow a response list to the questions a client sent.
+
+    Coverage is only ever decided by evaluating the session's interactions; a
+    client list just limits which questions the response reports.
+    """
+    if not client_questions:
+        return questions
+    client_keys = {question_key(q) for q in client_questions}
+    return [question for question in questions if question_key(question) in client_keys]
+
+def coverage_list(covered: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [dict(covered[index], question_index=int(index)) for index in sorted(covered, key=int)]
+
+def build_domain_stats(all_questions: List[Dict[str, str]], remaining: List[Dict[str, str]]) -> Dict[str, Dict[str, Any]]:
+    """Per-domain and overall completion counts."""
+    total_by_domain = Counter(question.get("domain", "Unknown") for question in all_questions)
+    remaining_by_domain = Counter(question.get("domain", "Unknown") for question in remaining)
+    
+    domain_stats = {}
+    for domain, total in total_by_domain.items():
+        remaining_count = remaining_by_domain.get(domain, 0)
+        completed = total - remaining_count
+        domain_stats[domain] = {
+            "total": total,
+            "remaining": remaining_count,
+            "completed": completed,
+            "percent_complete": int(round((completed / total) * 100)) if total > 0 else 0
+        }
+    
+    # Add overall statistics
+    overall_total = len(all_questions)
+    overall_completed = overall_total - len(remaining)
+    domain_stats["Overall"] = {
+        "total": overall_total,
+        "remaining": len(remaining),
+        "completed": overall_completed,
+        "percent_complete": int(round((overall_completed / overall_total) * 100)) if overall_total > 0 else 0
+    }
+    return domain_stats
+
+async def evaluate_coverage(case_id, all_questions: List[Dict[str, str]], interactions: List[Dict[str, str]],
+                            first_index: Optional[int], candidates: List[Tuple[int, Dict[str, str]]],
+                            route: str) -> Dict[str, Any]:
+    """
+    Find which still-uncovered questions the given interactions cover.
+
+    Args:
+        case_id: Case identifier
+        all_questions: All expected questions of the case
+        interactions: New interactions (student_question, patient_reply)
+        first_index: Session history index of interactions[0], or None if unknown
+        candidates: (question index, question) pairs not yet covered
+        route: Gateway route label
+
+    Returns:
+        Dict with "covered" (coverage entries keyed by question index),
+        "model_called" and "prematch" counters. Questions the pre-matcher
+        rejected stay uncovered and are checked against later interactions.
+    """
+    questions = [question for _, question in candidates]
+    index_by_key = {question_key(question): index for index, question in candidates}
+    prematch = prematch_questions(case_id, all_questions, interactions, questions)
+    
+    def interaction_for(question: Dict[str, str]) -> Optional[int]:
+        if first_index is None:
+            return None
+        if len(interactions) == 1:
+            return first_index
+        best = prematch["best_interaction"].get(question_key(question))
+        return first_index + best if best is not None else None
+    
+    covered = {
+        str(index_by_key[question_key(q)]): coverage_entry(q, interaction_for(q), "local")
+        for q in prematch["covered"]
+    }
+    
+    if prematch["ambiguous"]:
+        model = llm_gateway.model(HISTORY_MATCH_MODEL, route=route)
+        generation_config = {
+            "temperature": 0.3,
+            "top_p": 0.95,
+            "top_k": 40
+        }
+        
+        # A single turn asks which questions it covers; several turns ask which remain unmatched
+        if len(interactions) == 1:
+            formatted_prompt = HISTORY_MATCH_QA_PROMPT.format(
+                student_interactions=json.dumps(interactions[0], indent=2),
+                uncovered_expected_questions=json.dumps(prematch["ambiguous"], indent=2)
+            )
+        else:
+            formatted_prompt = HISTORY_MATCH_PROMPT.format(
+                expected_questions_with_domains=json.dumps(prematch["ambiguous"], indent=2),
+                student_interactions=json.dumps(prematch["interactions"], indent=2)
+            )
+        
+        content = {
+            "contents": [
+                {
+                    "parts": [
+                        {"text": formatted_prompt}
+                    ]
+                }
+            ],
+            "generation_config": generation_config
+        }
+        
+        response = await model.generate_content(**content)
+        
+        # Process the response
+        cleaned_content = clean_code_block(response.text)
+        try:
+            model_result = json.loads(cleaned_content)
+        except json.JSONDecodeError as json_error:
+            raise HTTPException(
+                status_code=500, 
+                detail=f"Failed to parse Gemini response as JSON: {str(json_error)}"
+            )
+        
+        result_keys = {question_key(q) for q in model_result}
+        for question in prematch["ambiguous"]:
+            is_covered = question_key(question) in result_keys
+            if len(interactions) != 1:
+                is_covered = not is_covered
+            if is_covered:
+                covered[str(index_by_key[question_key(question)])] = coverage_entry(question, interaction_for(question), "model")
+    
+    return {
+        "covered": covered,
+        "model_called": bool(prematch["ambiguous"]),
+        "prematch": prematch["stats"]
+    }
+
 class UnmatchedQuestionsRequest(BaseModel):
     remaining_unmatched_questions: List[Dict[str, str]] = []
 
@@ -85,13 +292,16 @@ async def get_unmatched_questions(
     This endpoint:
     1. Gets student ID from authentication
     2. Gets case ID from the current session
-    3. Extracts student interactions from the session
-    4. Uses AI to compare against expected questions (either provided or loaded from file)
-    5. Returns unmatched questions with their domains
+    3. Extracts the interactions added to the session since the last call
+    4. Compares them against the expected questions not yet covered (the coverage state is kept
+       in the session): clear matches and clear non-matches are settled by the local
+       pre-matcher, only the remaining questions are sent to the AI
+    5. Returns unmatched questions with their domains, and which interaction covered each covered question
     
-    Request body (optional):
-    - remaining_unmatched_questions: A list of previously unmatched questions with domains
-      to check against instead of loading all expected questions from file
+    Request body (optional, only needed by clients that track coverage themselves):
+    - remaining_unmatched_questions: A list of previously unmatched questions with domains;
+      the response only lists unmatched questions from it (coverage is still decided from the
+      session's interactions)
     
     Example request body:
     ```json
@@ -169,7 +379,7 @@ async def get_unmatched_questions(
         print(f"[HISTORY_MATCH] ✅ User authenticated successfully. Student ID: {student_id}")
         
         # Get session data and case ID
-        session_data = session_manager.get_session(student_id)
+        session_data = await session_manager.get_session(student_id)
         if not session_data:
             raise HTTPException(status_code=404, detail="No active session found")
         
@@ -177,155 +387,63 @@ async def get_unmatched_questions(
         
         # Load ALL expected questions for the case (for total counts)
         all_expected_questions = await load_expected_questions(int(case_id))
+        fingerprint = questions_fingerprint(all_expected_questions)
         
-        # Extract the list from the request model
-        remaining_unmatched_questions = request.remaining_unmatched_questions
-        
-        # Use remaining unmatched questions if provided (non-empty), otherwise use all expected questions
-        if len(remaining_unmatched_questions) > 0:
-            expected_questions_with_domains = remaining_unmatched_questions
-            print(f"[{datetime.now()}] 📝 Using {len(remaining_unmatched_questions)} remaining questions from API parameter")
-        else:
-            # Use all expected questions as the current unmatched set
-            expected_questions_with_domains = all_expected_questions
-            print(f"[{datetime.now()}] 📝 Loaded {len(expected_questions_with_domains)} questions from case file")
-        
-        # Calculate domain totals
-        total_by_domain = Counter()
-        for question in expected_questions_with_domains:
-            domain = question.get("domain", "Unknown")
-            total_by_domain[domain] += 1
-        
-        # Create domain statistics for the empty case
-        domain_stats = {}
-        for domain in total_by_domain:
-            total = total_by_domain[domain]
-            domain_stats[domain] = {
-                "total": total,
-                "remaining": total,
-                "completed": 0,
-                "percent_complete": 0
-            }
-        
-        # Add overall statistics
-        overall_total = len(expected_questions_with_domains)
-        domain_stats["Overall"] = {
-            "total": overall_total,
-            "remaining": overall_total,
-            "completed": 0,
-            "percent_complete": 0
-        }
+        # Coverage recorded by earlier calls; only interactions added since then are evaluated
+        covered, evaluated_interactions, stale = load_coverage(session_data, fingerprint)
+        newly_covered = {}
         
-        # Extract interactions from session data (including both questions and responses)
-        student_interactions = [
+        history = session_data["interactions"]["history_taking"]
+        if evaluated_interactions > len(history):
+            evaluated_interactions = 0
+        new_interactions = [
             {
                 "student_question": interaction["question"],
                 "patient_reply": interaction["response"]
             }
-            for interaction in session_data["interactions"]["history_taking"]
+            for interaction in history[evaluated_interactions:]
         ]
+        candidates = [
+            (index, question) for index, question in enumerate(all_expected_questions)
+            if str(index) not in covered
+        ]
+        print(f"[{datetime.now()}] 📋 Evaluating {len(new_interactions)} new interactions against "
+              f"{len(candidates)} uncovered questions")
         
-        if not student_interactions:
-            return {
-                "case_id": case_id,
-                "student_id": student_id,
-                "timestamp": datetime.now().isoformat(),
-                "unmatched_questions": expected_questions_with_domains,  # Return all questions as unmatched
-                "domain_stats": domain_stats,  # Return domain stats with 0% completion
-                "metadata": {
-                    "total_expected_questions": len(expected_questions_with_domains),
-                    "total_student_questions": 0,
-                    "total_unmatched_questions": len(expected_questions_with_domains),
-                    "error": "No interactions found in session"
-                }
-            }
-        
-        # Keep only these three print statements
-        print(f"[{datetime.now()}] 📋 Expected Questions:\n{json.dumps(expected_questions_with_domains, indent=2)}")
-        print(f"[{datetime.now()}] 🧑‍🎓 Student Interactions:\n{json.dumps(student_interactions, indent=2)}")
-        
-        # Configure the model
-        model = genai.GenerativeModel('gemini-2.0-flash')
-        generation_config = {
-            "temperature": 0.3,
-            "top_p": 0.95,
-            "top_k": 40
-        }
-        
-        # Format the prompt with the required data
-        formatted_prompt = HISTORY_MATCH_PROMPT.format(
-            expected_questions_with_domains=json.dumps(expected_questions_with_domains, indent=2),
-            student_interactions=json.dumps(student_interactions, indent=2)
-        )
-        
-        # Generate the response
         start_time = datetime.now()
-        content = {
-            "contents": [
-                {
-                    "parts": [
-                        {"text": formatted_prompt}
-                    ]
-                }
-            ],
-            "generation_config": generation_config
-        }
-        
-        response = await asyncio.to_thread(model.generate_content, **content)
-        
-        # Process and return the response
-        cleaned_content = clean_code_block(response.text)
-        
-        # Parse the JSON response
-        try:
-            unmatched_questions = json.loads(cleaned_content)
-            # Keep this print statement for output
-            print(f"[{datetime.now()}] 📊 Unmatched Questions Result:\n{json.dumps(unmatched_questions, indent=2)}")
-        except json.JSONDecodeError as json_error:
-            raise HTTPException(
-                status_code=500, 
-                detail=f"Failed to parse Gemini response as JSON: {str(json_error)}"
+        evaluation = {"covered": {}, "model_called": False, "prematch": None}
+        if new_interactions and candidates:
+            evaluation = await evaluate_coverage(
+                case_id, all_expected_questions, new_interactions, evaluated_interactions, candidates,
+                route="history_unmatched_questions"
             )
+            newly_covered.update(evaluation["covered"])
         
-        # Calculate domain statistics
-        # 1. Count total questions per domain from ALL questions
-        total_by_domain = Counter()
-        for question in all_expected_questions:
-            domain = question.get("domain", "Unknown")
-            total_by_domain[domain] += 1
-        
-        # 2. Count remaining questions per domain
-        remaining_by_domain = Counter()
-        for question in unmatched_questions:
-            domain = question.get("domain", "Unknown")
-            remaining_by_domain[domain] += 1
-        
-        # 3. Create domain statistics with percentages
-        domain_stats = {}
-        overall_total = len(all_expected_questions)
-        overall_remaining = len(unmatched_questions)
-        overall_completed = overall_total - overall_remaining
-        
-        for domain in total_by_domain:
-            total = total_by_domain[domain]
-            remaining = remaining_by_domain.get(domain, 0)
-            completed = total - remaining
-            percent_complete = int(round((completed / total) * 100)) if total > 0 else 0
-            
-            domain_stats[domain] = {
-                "total": total,
-                "remaining": remaining,
-                "completed": completed,
-                "percent_complete": percent_complete
-            }
+        if newly_covered or stale or evaluated_interactions != len(history):
+            await session_manager.update_history_coverage(
+                student_id, fingerprint, newly_covered, evaluated_interactions=len(history), reset=stale
+            )
+        covered.update(newly_covered)
         
-        # Add overall statistics
-        domain_stats["Overall"] = {
-            "total": overall_total,
-            "remaining": overall_remaining,
-            "completed": overall_completed,
-            "percent_complete": int(round((overall_completed / overall_total) * 100)) if overall_total > 0 else 0
+        unmatched_questions = filter_to_client_list(
+            [question for index, question in enumerate(all_expected_questions) if str(index) not in covered],
+            request.remaining_unmatched_questions
+        )
+        # Keep this print statement for output
+        print(f"[{datetime.now()}] 📊 Unmatched Questions Result:\n{json.dumps(unmatched_questions, indent=2)}")
+        
+        metadata = {
+            "total_expected_questions": len(all_expected_questions),
+            "total_student_questions": len(history),
+            "newly_evaluated_interactions": len(new_interactions),
+            "total_unmatched_questions": len(unmatched_questions),
+            "processing_time_seconds": (datetime.now() - start_time).total_seconds(),
+            "model_version": HISTORY_MATCH_MODEL,
+            "model_called": evaluation["model_called"],
+            "prematch": evaluation["prematch"]
         }
+        if not history:
+            metadata["error"] = "No interactions found in session"
         
         return {
             "case_id": case_id,
@@ -333,14 +451,9 @@ async def get_unmatched_questions(
             "timestamp": datetime.now().isoformat(),
             "unmatched_questions": unmatched_questions,
             "all_questions": all_expected_questions,
-            "domain_stats": domain_stats,
-            "metadata": {
-                "total_expected_questions": overall_total,
-                "total_student_questions": len(student_interactions),
-                "total_unmatched_questions": len(unmatched_questions),
-                "processing_time_seconds": (datetime.now() - start_time).total_seconds(),
-                "model_version": model.model_name
-            }
+            "domain_stats": build_domain_stats(all_expected_questions, unmatched_questions),
+            "coverage": coverage_list(covered),
+            "metadata": metadata
         }
         
     except HTTPException as auth_error:
@@ -360,12 +473,15 @@ async def match_single_interaction(
     
     This endpoint:
     1. Takes a single student-patient interaction (question and answer)
-    2. Takes a list of currently uncovered expected questions
-    3. Returns which of those questions are now considered covered by this interaction
+    2. Reads the expected questions still uncovered from the coverage state kept in the session
+    3. Settles clear matches locally and asks the AI about the remaining questions
+    4. Records and returns which of those questions are now considered covered by this interaction
     
     Request body:
     - current_interaction: Object with student_question and patient_reply fields
-    - uncovered_questions: List of previously unmatched questions with domains
+    - uncovered_questions (optional): List of previously unmatched questions with domains, for
+      clients that track coverage themselves; the response only lists questions from it (coverage
+      is still decided from the session's interactions)
     
     Example request body:
     ```json
@@ -462,7 +578,6 @@ async def match_single_interaction(
         
         # Validate input
         current_interaction = request.current_interaction
-        uncovered_questions = request.uncovered_questions
         
         # Ensure the current_interaction has the right fields
         if "student_question" not in current_interaction or "patient_reply" not in current_interaction:
@@ -472,7 +587,7 @@ async def match_single_interaction(
             )
             
         # Get session data and case ID
-        session_data = session_manager.get_session(student_id)
+        session_data = await session_manager.get_session(student_id)
         if not session_data:
             raise HTTPException(status_code=404, detail="No active session found")
         
@@ -480,116 +595,56 @@ async def match_single_interaction(
         
         # Get all questions from the case
         all_questions = await load_expected_questions(int(case_id))
+        fingerprint = questions_fingerprint(all_questions)
         
-        # If there are no uncovered questions, use all questions
-        if not uncovered_questions:
-            uncovered_questions = all_questions
-            print(f"[{datetime.now()}] 📝 No questions provided, loaded {len(uncovered_questions)} questions from case file")
+        covered, evaluated_interactions, stale = load_coverage(session_data, fingerprint)
+        newly_covered = {}
         
-        # Log the inputs
-        print(f"[{datetime.now()}] 🧑‍🎓 Current Interaction:\n{json.dumps(current_interaction, indent=2)}")
-        print(f"[{datetime.now()}] 📋 Uncovered Questions:\n{json.dumps(uncovered_questions, indent=2)}")
+        # The patient routes store each turn before the client asks for a match, so this is
+        # normally the latest history entry
+        history = session_data["interactions"]["history_taking"]
+        interaction_index = None
+        if history and history[-1].get("question") == current_interaction["student_question"]:
+            interaction_index = len(history) - 1
         
-        # Configure the model
-        model = genai.GenerativeModel('gemini-2.0-flash')
-        generation_config = {
-            "temperature": 0.3,
-            "top_p": 0.95,
-            "top_k": 40
-        }
+        candidates = [
+            (index, question) for index, question in enumerate(all_questions)
+            if str(index) not in covered
+        ]
         
-        # Format the prompt with the required data
-        formatted_prompt = HISTORY_MATCH_QA_PROMPT.format(
-            student_interactions=json.dumps(current_interaction, indent=2),
-            uncovered_expected_questions=json.dumps(uncovered_questions, indent=2)
-        )
+        # Log the inputs
+        print(f"[{datetime.now()}] 🧑‍🎓 Current Interaction:\n{json.dumps(current_interaction, indent=2)}")
+        print(f"[{datetime.now()}] 📋 Checking {len(candidates)} uncovered questions")
         
-        # Generate the response
         start_time = datetime.now()
-        content = {
-            "contents": [
-                {
-                    "parts": [
-                        {"text": formatted_prompt}
-                    ]
-                }
-            ],
-            "generation_config": generation_config
-        }
-        
-        response = await asyncio.to_thread(model.generate_content, **content)
-        
-        # Process and return the response
-        cleaned_content = clean_code_block(response.text)
-        
-        # Parse the JSON response
-        try:
-            covered_questions = json.loads(cleaned_content)
-            print(f"[{datetime.now()}] 📊 Covered Questions Result:\n{json.dumps(covered_questions, indent=2)}")
-        except json.JSONDecodeError as json_error:
-            raise HTTPException(
-                status_code=500, 
-                detail=f"Failed to parse Gemini response as JSON: {str(json_error)}"
+        evaluation = {"covered": {}, "model_called": False, "prematch": None}
+        if candidates:
+            evaluation = await evaluate_coverage(
+                case_id, all_questions, [current_interaction], interaction_index, candidates,
+                route="history_match_single"
             )
+            newly_covered.update(evaluation["covered"])
+        
+        # Advance the evaluated pointer only when this turn is the next unevaluated one
+        advance = (interaction_index is not None and interaction_index == evaluated_interactions
+                   and not stale)
+        if newly_covered or stale or advance:
+            await session_manager.update_history_coverage(
+                student_id, fingerprint, newly_covered,
+                evaluated_interactions=interaction_index + 1 if advance else None, reset=stale
+            )
+        covered.update(newly_covered)
         
-        # Calculate remaining unmatched questions (those not covered by this interaction)
-        covered_question_texts = [(q["question"], q["domain"]) for q in covered_questions]
-        remaining_unmatched = []
-        for q in uncovered_questions:
-            if (q["question"], q["domain"]) not in covered_question_texts:
-                remaining_unmatched.append(q)
-        
-        # Calculate domain statistics
-        # 1. Count total questions per domain from ALL questions
-        total_by_domain = Counter()
-        for question in all_questions:
-            domain = question.get("domain", "Unknown")
-            total_by_domain[domain] += 1
-        
-        # 2. Count remaining questions per domain
-        remaining_by_domain = Counter()
-        for question in remaining_unmatched:
-            domain = question.get("domain", "Unknown")
-            remaining_by_domain[domain] += 1
-        
-        # 3. Create domain statistics with percentages
-        domain_stats = {}
-        for domain in total_by_domain:
-            total = total_by_domain[domain]
-            
-            # For this domain, count how many questions were in the uncovered list
-            domain_uncovered = sum(1 for q in uncovered_questions if q.get("domain") == domain)
-            
-            # For this domain, count how many questions remain uncovered after this interaction
-            domain_remaining = remaining_by_domain.get(domain, 0)
-            
-            # Calculate how many questions were covered in this domain by this interaction
-            newly_covered = sum(1 for q in covered_questions if q.get("domain") == domain)
-            
-            # Calculate how many questions are completed overall for this domain
-            # This means: total questions - remaining after this interaction
-            completed = total - domain_remaining
-            
-            percent_complete = int(round((completed / total) * 100)) if total > 0 else 0
-            
-            domain_stats[domain] = {
-                "total": total,
-                "remaining": domain_remaining,
-                "completed": completed,
-                "percent_complete": percent_complete
-            }
-        
-        # Add overall statistics
-        overall_total = len(all_questions)
-        overall_remaining = len(remaining_unmatched)
-        overall_completed = overall_total - overall_remaining
+        covered_questions = filter_to_client_list(
+            [all_questions[int(index)] for index in sorted(evaluation["covered"], key=int)],
+            request.uncovered_questions
+        )
+        print(f"[{datetime.now()}] 📊 Covered Questions Result:\n{json.dumps(covered_questions, indent=2)}")
         
-        domain_stats["Overall"] = {
-            "total": overall_total,
-            "remaining": overall_remaining,
-            "completed": overall_completed,
-            "percent_complete": int(round((overall_completed / overall_total) * 100)) if overall_total > 0 else 0
-        }
+        remaining_unmatched = filter_to_client_list(
+            [question for index, question in enumerate(all_questions) if str(index) not in covered],
+            request.uncovered_questions
+        )
         
         return {
             "case_id": case_id,
@@ -598,13 +653,16 @@ async def match_single_interaction(
             "covered_questions": covered_questions,
             "unmatched_questions": remaining_unmatched,
             "all_questions": all_questions,
-            "domain_stats": domain_stats,
+            "domain_stats": build_domain_stats(all_questions, remaining_unmatched),
+            "coverage": coverage_list(covered),
             "metadata": {
-                "total_expected_questions": len(uncovered_questions),
+                "total_expected_questions": len(candidates),
                 "total_newly_covered_questions": len(covered_questions),
                 "total_remaining_questions": len(remaining_unmatched),
                 "processing_time_seconds": (datetime.now() - start_time).total_seconds(),
-                "model_version": model.model_name
+                "model_version": HISTORY_MATCH_MODEL,
+                "model_called": evaluation["model_called"],
+                "prematch": evaluation["prematch"]
             }
         }
         
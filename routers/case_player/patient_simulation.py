@@ -1,21 +1,26 @@
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage
-from langgraph.checkpoint.memory import MemorySaver
+from langchain_core.messages import HumanMessage, SystemMessage, AIMessageChunk, RemoveMessage, BaseMessage
 from langgraph.graph import START, MessagesState, StateGraph
+from langgraph.constants import TAG_NOSTREAM
 from datetime import datetime
 import uuid
 import os
 from dotenv import load_dotenv
-from utils.text_cleaner import clean_code_block
+from utils.text_cleaner import clean_code_block, JSONFieldStreamer
 from langchain_google_genai import ChatGoogleGenerativeAI, HarmCategory, HarmBlockThreshold
 from utils.session_manager import SessionManager
+from utils.case_repository import case_repository
+from utils.thread_checkpointer import SqliteLRUCheckpointer, PATIENT_THREADS_DB
 from auth.auth_api import get_user, get_user_from_token
 import json
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
+from collections import OrderedDict
+import threading
 
 # Load environment variables
 load_dotenv()
@@ -33,11 +38,8 @@ session_manager = SessionManager()
 
 def load_prompt_template(case_id: str = "1"):
     """Load the prompt template from file"""
-    print(f"Loading prompt template for case: {case_id}")
     try:
-        file_path = f"case-data/case{case_id}/patient_prompts/patient_persona.txt"
-        with open(file_path, "r") as file:
-            return file.read()
+        return case_repository.load_text(case_id, "patient_prompts/patient_persona.txt")
     except FileNotFoundError:
         raise Exception(f"Prompt template file not found for case: {case_id}")
 
@@ -58,31 +60,197 @@ gemini_model = ChatGoogleGenerativeAI(
     }
 )
 
-# Define custom state type
-class PatientSimState(MessagesState):
-    case_id: str  # Add the new field while inheriting messages from MessagesState
+# Compiled `prompt | model` chains per (case, model). A chain is reused while the
+# persona text returned by case_repository is unchanged; the repository stats the
+# file on each lookup, so edits to patient_persona.txt (persona regeneration,
+# add-phrase-to-avoid, another worker) rebuild the chain on the next message.
+PERSONA_CHAIN_CACHE_MAX_ENTRIES = int(os.getenv("PERSONA_CHAIN_CACHE_MAX_ENTRIES", "128"))
+_persona_chains: "OrderedDict[tuple, tuple]" = OrderedDict()
+_persona_chains_lock = threading.Lock()
 
-# Define the graph workflow for OpenAI
-workflow = StateGraph(PatientSimState)
+def get_patient_chain(case_id: str, provider: str = "openai", system_template: Optional[str] = None):
+    """
+    Return the compiled patient chain for a case.
 
-# Define the graph workflow for Gemini
-gemini_workflow = StateGraph(PatientSimState)
+    Args:
+        case_id: Case whose patient persona is used as the system prompt
+        provider: "openai" or "gemini"
+        system_template: Persona text already loaded by the caller; read from the case when omitted
 
-async def call_gemini_model(state: PatientSimState):
-    # Access both messages and case_id
-    case_id = state["case_id"]
-    
-    # Create prompt template with system message and message history
-    system_template = load_prompt_template(case_id)
+    Returns:
+        Runnable `ChatPromptTemplate | model`
+    """
+    if system_template is None:
+        system_template = load_prompt_template(case_id)
+    key = (str(case_id), provider)
+    with _persona_chains_lock:
+        cached = _persona_chains.get(key)
+        if cached is not None and cached[0] == system_template:
+            _persona_chains.move_to_end(key)
+            return cached[1]
+
+    print(f"[PATIENT_SIMULATION] 🔧 Compiling {provider} patient chain for case {case_id}")
     prompt = ChatPromptTemplate.from_messages([
-        ("system", system_template),
+        # The running summary of folded turns is appended to the persona (see build_prompt_window)
+        ("system", system_template + "{conversation_summary}"),
         MessagesPlaceholder(variable_name="messages")
     ])
+    chain = prompt | (gemini_model if provider == "gemini" else model)
+
+    with _persona_chains_lock:
+        _persona_chains[key] = (system_template, chain)
+        _persona_chains.move_to_end(key)
+        while len(_persona_chains) > PERSONA_CHAIN_CACHE_MAX_ENTRIES:
+            _persona_chains.popitem(last=False)
+    return chain
+
+# Conversation memory: "window" keeps the last `max_turns` turns verbatim and folds
+# older turns into a running summary; "full" (the default) sends the whole thread every time.
+# Cases can override these in case_cover.json under "conversation_memory".
+PATIENT_MEMORY_MODE = os.getenv("PATIENT_MEMORY_MODE", "full")
+PATIENT_MEMORY_MAX_TURNS = int(os.getenv("PATIENT_MEMORY_MAX_TURNS", "12"))
+PATIENT_MEMORY_TOKEN_BUDGET = int(os.getenv("PATIENT_MEMORY_TOKEN_BUDGET", "6000"))
+# Turns that must pile up beyond the window before a (model-backed) fold runs
+PATIENT_MEMORY_FOLD_TURNS = int(os.getenv("PATIENT_MEMORY_FOLD_TURNS", "4"))
 
-    # Create the chain
-    chain = prompt | gemini_model
+with open("prompts/patient_memory_summary.txt", "r") as file:
+    PATIENT_MEMORY_SUMMARY_PROMPT = file.read()
+
+# Summaries are bookkeeping, not persona replies: use deterministic models for them
+summary_model = ChatOpenAI(
+    model_name="gpt-4o-mini",
+    temperature=0,
+    api_key=os.getenv("OPENAI_API_KEY")
+)
+gemini_summary_model = ChatGoogleGenerativeAI(
+    model="gemini-2.0-flash",
+    temperature=0,
+    google_api_key=os.getenv("GOOGLE_API_KEY"),
+    safety_settings={
+        HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+    }
+)
+
+def estimate_tokens(text: str) -> int:
+    """Cheap provider-independent token estimate (~4 characters per token)."""
+    return (len(text) + 3) // 4
+
+def _message_text(message: BaseMessage) -> str:
+    if isinstance(message.content, str):
+        return message.content
+    return " ".join(part.get("text", "") for part in message.content if isinstance(part, dict))
+
+def get_memory_settings(case_id: str) -> Dict[str, Any]:
+    """Memory settings for a case: environment defaults overridden by case_cover.json."""
+    settings = {
+        "mode": PATIENT_MEMORY_MODE,
+        "max_turns": PATIENT_MEMORY_MAX_TURNS,
+        "token_budget": PATIENT_MEMORY_TOKEN_BUDGET,
+    }
+    try:
+        overrides = case_repository.load_json(case_id, "case_cover.json").get("conversation_memory") or {}
+    except (FileNotFoundError, ValueError):
+        overrides = {}
+    if not isinstance(overrides, dict):
+        overrides = {}
 
-    response = await chain.ainvoke(state)
+    mode = overrides.get("mode")
+    if mode is not None:
+        if mode in ("window", "full"):
+            settings["mode"] = mode
+        else:
+            print(f"[PATIENT_SIMULATION] ⚠️ Ignoring conversation_memory.mode={mode!r} for case {case_id}")
+    for key in ("max_turns", "token_budget"):
+        if overrides.get(key) is None:
+            continue
+        try:
+            value = int(overrides[key])
+        except (TypeError, ValueError):
+            value = 0
+        if value > 0:
+            settings[key] = value
+        else:
+            print(f"[PATIENT_SIMULATION] ⚠️ Ignoring conversation_memory.{key}={overrides[key]!r} for case {case_id}")
+    return settings
+
+async def summarize_turns(provider: str, summary: str, turns: List[BaseMessage]) -> str:
+    """Fold conversation turns into the running summary."""
+    summarizer = gemini_summary_model if provider == "gemini" else summary_model
+    transcript = "\n".join(
+        f"{'Student' if message.type == 'human' else 'Patient'}: {_message_text(message)}"
+        for message in turns
+    )
+    response = await summarizer.ainvoke(
+        [
+            SystemMessage(content=PATIENT_MEMORY_SUMMARY_PROMPT),
+            HumanMessage(content=f"Existing summary:\n{summary or '(none)'}\n\nConversation turns to fold in:\n{transcript}")
+        ],
+        # Keep summary tokens out of the SSE answer stream
+        config={"tags": [TAG_NOSTREAM]}
+    )
+    return _message_text(response).strip()
+
+async def build_prompt_window(state: "PatientSimState", provider: str, system_template: str):
+    """
+    Decide which messages go to the model this turn.
+
+    Returns:
+        (prompt variables, state updates, memory stats)
+    """
+    messages = state["messages"]
+    summary = state.get("summary") or ""
+    settings = get_memory_settings(state["case_id"])
+    persona_tokens = estimate_tokens(system_template)
+    message_tokens = [estimate_tokens(_message_text(message)) for message in messages]
+
+    def prompt_tokens(start: int, summary_text: str) -> int:
+        return persona_tokens + estimate_tokens(summary_text) + sum(message_tokens[start:])
+
+    split = 0
+    if settings["mode"] == "window":
+        keep = settings["max_turns"] * 2
+        overflow = len(messages) - keep
+        over_budget = prompt_tokens(0, summary) > settings["token_budget"]
+        # Fold in batches so the summary call does not run on every turn
+        if overflow >= PATIENT_MEMORY_FOLD_TURNS * 2 or (over_budget and overflow > 0):
+            split = max(overflow, 0)
+        # Still over budget: drop whole turns from the window, always keeping the new question
+        while split < len(messages) - 1 and prompt_tokens(split, summary) > settings["token_budget"]:
+            split += 1
+        # Start the window on a student message
+        while 0 < split < len(messages) - 1 and messages[split].type != "human":
+            split += 1
+
+    updates: Dict[str, Any] = {}
+    folded = messages[:split]
+    if folded:
+        summary = await summarize_turns(provider, summary, folded)
+        updates["summary"] = summary
+        updates["removed"] = [RemoveMessage(id=message.id) for message in folded]
+
+    stats = {
+        "mode": settings["mode"],
+        "prompt_tokens_estimate": prompt_tokens(split, summary),
+        "token_budget": settings["token_budget"],
+        "window_messages": len(messages) - split,
+        "folded_messages": len(folded),
+        "summary_tokens_estimate": estimate_tokens(summary),
+    }
+    summary_block = f"\n\n#### Earlier in this conversation\n{summary}" if summary else ""
+    return {"messages": messages[split:], "conversation_summary": summary_block}, updates, stats
+
+async def run_patient_turn(state: "PatientSimState", provider: str) -> Dict[str, Any]:
+    """Answer the latest student message as the patient."""
+    case_id = state["case_id"]
+    system_template = load_prompt_template(case_id)
+
+    # Compiled prompt template (system persona + summary + message window) and model
+    chain = get_patient_chain(case_id, provider, system_template)
+    prompt_input, updates, stats = await build_prompt_window(state, provider, system_template)
+    print(f"[PATIENT_SIMULATION] 📏 Prompt ~{stats['prompt_tokens_estimate']} tokens "
+          f"({stats['window_messages']} messages, {stats['folded_messages']} folded, mode={stats['mode']})")
+
+    response = await chain.ainvoke(prompt_input)
     
     # Format response as a dict with metadata
     formatted_response = {
@@ -94,62 +262,123 @@ async def call_gemini_model(state: PatientSimState):
         "type": "ai",
         "case_id": case_id
     }
-    
-    return {"messages": formatted_response, "case_id": case_id}
+
+    result = {
+        "messages": updates.get("removed", []) + [formatted_response],
+        "case_id": case_id,
+        "memory_stats": stats
+    }
+    if "summary" in updates:
+        result["summary"] = updates["summary"]
+    return result
+
+# Define custom state type
+class PatientSimState(MessagesState):
+    case_id: str  # Add the new field while inheriting messages from MessagesState
+    summary: str  # Running summary of turns folded out of the message window
+    memory_stats: Dict[str, Any]  # Prompt size of the latest turn
+
+# Define the graph workflow for OpenAI
+workflow = StateGraph(PatientSimState)
+
+# Define the graph workflow for Gemini
+gemini_workflow = StateGraph(PatientSimState)
+
+async def call_gemini_model(state: PatientSimState):
+    return await run_patient_turn(state, "gemini")
 
 # Add the model node to the graph
 gemini_workflow.add_edge(START, "model")
 gemini_workflow.add_node("model", call_gemini_model)
 
-# Initialize memory for Gemini
-gemini_memory = MemorySaver()
+# Conversation threads live in SQLite (shared by workers, survive restarts) with a
+# bounded in-memory LRU of active threads. Each graph keeps its own database.
+gemini_memory = SqliteLRUCheckpointer(PATIENT_THREADS_DB.replace(".db", "_gemini.db"))
 gemini_app = gemini_workflow.compile(checkpointer=gemini_memory)
 
 async def call_model(state: PatientSimState):
-    # Now we have type-safe access to both messages and case_id
-    case_id = state["case_id"]
-    
-    # Create prompt template with system message and message history
-    system_template = load_prompt_template(case_id)
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", system_template),
-        MessagesPlaceholder(variable_name="messages")
-    ])
-
-    # Create the chain
-    chain = prompt | model
-
     """Process the message through the model and return response"""
-    response = await chain.ainvoke(state)
-    
-    # Format response as a dict with metadata
-    formatted_response = {
-        "id": str(uuid.uuid4()),
-        "sender": "Patient",
-        "content": response.content,
-        "step": "patient-history",
-        "timestamp": datetime.utcnow().isoformat() + "Z",  # Use UTC time with Z suffix for ISO 8601
-        "type": "ai",
-        "case_id": case_id
-    }
-    
-    return {"messages": formatted_response, "case_id": case_id}
+    return await run_patient_turn(state, "openai")
 
 # Add the model node to the graph
 workflow.add_edge(START, "model")
 workflow.add_node("model", call_model)
 
 # Initialize memory
-memory = MemorySaver()
+memory = SqliteLRUCheckpointer(PATIENT_THREADS_DB)
 app = workflow.compile(checkpointer=memory)
 
-# Initialize streaming model
-streaming_model = ChatOpenAI(
-    model_name="gpt-4-mini",
-    temperature=1,
-    streaming=True,  # Enable streaming
-    api_key=os.getenv("OPENAI_API_KEY")
-)
+def _sse(payload: Dict[str, Any]) -> str:
+    """Format one Server-Sent Events message."""
+    return f"data: {json.dumps(payload)}\n\n"
+
+async def stream_patient_answer(graph, log_tag: str, student_query: str, case_id: str,
+                                thread_id: str, student_id: str):
+    """
+    Run the patient graph and yield its answer as Server-Sent Events.
+
+    Emits `{"type": "token", "content": ...}` as the model's answer arrives,
+    then a single `{"type": "done", ...}` event with the same fields as the
+    non-streaming endpoints. The persona prompt makes the model reply with a
+    JSON envelope, so tokens carry only the text of its "content" field. The answer is written to the session only
+    after the stream completes.
+    """
+    config = {"configurable": {"thread_id": thread_id}}
+    initial_state: PatientSimState = {
+        "messages": [HumanMessage(content=student_query)],
+        "case_id": case_id
+    }
+
+    try:
+        print(f"[{log_tag}] 🤖 Streaming model response...")
+        answer_stream = JSONFieldStreamer("content")
+        # "messages" mode surfaces the LLM tokens produced inside the model node
+        async for message, metadata in graph.astream(initial_state, config=config, stream_mode="messages"):
+            if isinstance(message, AIMessageChunk) and isinstance(message.content, str) and message.content:
+                text = answer_stream.feed(message.content)
+                if text:
+                    yield _sse({"type": "token", "content": text})
+
+        # The checkpointed state holds the complete answer for this turn
+        state = await graph.aget_state(config)
+        content = clean_code_block(state.values["messages"][-1].content)
+        try:
+            response_obj = json.loads(content)
+            answer = response_obj.get('content', content)
+        except json.JSONDecodeError:
+            answer = content
+
+        # Track the history-taking question in the session
+        await session_manager.add_history_question(student_id, case_id, student_query, answer)
+
+        print(f"[{log_tag}] ✅ Streamed answer for thread {thread_id}")
+        yield _sse({
+            "type": "done",
+            "response": content,
+            "answer": answer,
+            "thread_id": thread_id,
+            "case_id": case_id,
+            "student_id": student_id,
+            "memory": state.values.get("memory_stats")
+        })
+    except Exception as e:
+        print(f"[{log_tag}] ❌ Error streaming student query: {str(e)}")
+        yield _sse({"type": "error", "error": str(e), "thread_id": thread_id})
+
+async def _authenticate_student(token: str, log_tag: str) -> str:
+    """Resolve the student id from a bearer token, raising 401 on failure."""
+    try:
+        user_response = await get_user_from_token(token)
+    except Exception as auth_error:
+        print(f"[{log_tag}] ❌ Unexpected error during authentication: {str(auth_error)}")
+        raise HTTPException(status_code=401, detail="Authentication failed")
+    if not user_response["success"]:
+        error_message = user_response.get("error", "Authentication required")
+        print(f"[{log_tag}] ❌ Authentication failed: {error_message}")
+        raise HTTPException(status_code=401, detail=error_message)
+    return user_response["user"]["id"]
+
+_SSE_HEADERS = {"Cache-Control": "no-cache", "Connection": "keep-alive", "X-Accel-Buffering": "no"}
 
 @router.post("/simulate")
 async def simulate_patient_response(
@@ -246,7 +475,7 @@ async def ask_patient(
                 answer = content
             
             # Track the history-taking question in the session
-            session_manager.add_history_question(student_id, case_id, student_query, answer)
+            await session_manager.add_history_question(student_id, case_id, student_query, answer)
             
             # Log interaction details
             print(f"[PATIENT_SIMULATION] ℹ️ Interaction Details:")
@@ -261,7 +490,8 @@ async def ask_patient(
                 "response": content,
                 "thread_id": thread_id,
                 "case_id": case_id,
-                "student_id": student_id
+                "student_id": student_id,
+                "memory": response.get("memory_stats")
             }
             
         except Exception as e:
@@ -330,7 +560,7 @@ async def ask_patient_gemini(
                 answer = content
             
             # Track the history-taking question in the session
-            session_manager.add_history_question(student_id, case_id, student_query, answer)
+            await session_manager.add_history_question(student_id, case_id, student_query, answer)
             
             # Log interaction details
             print(f"[PATIENT_SIMULATION_GEMINI] ℹ️ Interaction Details:")
@@ -345,7 +575,8 @@ async def ask_patient_gemini(
                 "response": content,
                 "thread_id": thread_id,
                 "case_id": case_id,
-                "student_id": student_id
+                "student_id": student_id,
+                "memory": response.get("memory_stats")
             }
             
         except Exception as e:
@@ -357,5 +588,47 @@ async def ask_patient_gemini(
         raise auth_error
     except Exception as auth_error:
         print(f"[PATIENT_SIMULATION_GEMINI] ❌ Unexpected error during authentication: {str(auth_error)}")
-        raise HTTPException(status_code=401, detail="Authentication failed") 
- 
\ No newline at end of file
+        raise HTTPException(status_code=401, detail="Authentication failed")
+
+@router.get("/ask-stream")
+async def ask_patient_stream(
+    student_query: str,
+    case_id: str = "1",
+    thread_id: str = None,
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    """
+    Streaming variant of /patient/ask: tokens are sent as Server-Sent Events as
+    the model produces them. Shares conversation memory with /patient/ask.
+    """
+    print(f"[PATIENT_SIMULATION] 💬 Processing streaming student query for case {case_id}")
+    student_id = await _authenticate_student(credentials.credentials, "PATIENT_SIMULATION")
+
+    return StreamingResponse(
+        stream_patient_answer(app, "PATIENT_SIMULATION", student_query, case_id,
+                              thread_id or str(uuid.uuid4()), student_id),
+        media_type="text/event-stream",
+        headers=_SSE_HEADERS
+    )
+
+@router.get("/ask-gemini-stream")
+async def ask_patient_gemini_stream(
+    student_query: str,
+    case_id: str = "1",
+    thread_id: str = None,
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    """
+    Streaming variant of /patient/ask-gemini: tokens are sent as Server-Sent
+    Events as the model produces them. Shares conversation memory with
+    /patient/ask-gemini.
+    """
+    print(f"[PATIENT_SIMULATION_GEMINI] 💬 Processing streaming student query for case {case_id}")
+    student_id = await _authenticate_student(credentials.credentials, "PATIENT_SIMULATION_GEMINI")
+
+    return StreamingResponse(
+        stream_patient_answer(gemini_app, "PATIENT_SIMULATION_GEMINI", student_query, case_id,
+                              thread_id or str(uuid.uuid4()), student_id),
+        media_type="text/event-stream",
+        headers=_SSE_HEADERS
+    )
@@ -1,17 +1,15 @@
-import asyncio
 import json
 from datetime import datetime
-from pathlib import Path
 from fastapi import APIRouter, HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
-import os
 from dotenv import load_dotenv
-import google.generativeai as genai
+from utils.llm_gateway import llm_gateway
 from typing import Dict, Any, List, Literal
 from enum import Enum
-from utils.text_cleaner import clean_code_block
+from utils.text_cleaner import clean_code_block, is_json_response
 from utils.session_manager import SessionManager
+from utils.case_repository import case_repository
 from auth.auth_api import get_user_from_token
 
 # Load environment variables
@@ -47,22 +45,18 @@ class TestValidationRequest(BaseModel):
             }
         }
 
-# Initialize the Gemini client
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-
 async def load_case_context(case_id: str) -> str:
     """Load the case context for the specified case."""
     try:
-        file_path = Path(f"case-data/case{case_id}/case_context.md")
-        if not file_path.exists():
+        file_name = "case_context.md"
+        if not case_repository.exists(case_id, file_name):
             # Try alternative file name
-            file_path = Path(f"case-data/case{case_id}/case_doc.txt")
-            if not file_path.exists():
+            file_name = "case_doc.txt"
+            if not case_repository.exists(case_id, file_name):
                 print(f"[DEBUG] No case context found for case {case_id}")
                 return "No detailed case context available."
         
-        with open(file_path, 'r') as file:
-            return file.read()
+        return case_repository.load_text(case_id, file_name)
     except Exception as e:
         print(f"[WARNING] Failed to load case context: {str(e)}")
         return "Error loading case context."
@@ -76,13 +70,11 @@ def extract_test_names(test_exam_data: Dict[str, Any], test_type: str) -> List[s
 async def load_test_exam_data(case_id: str) -> Dict[str, Any]:
     """Load the test and exam data for the specified case."""
     try:
-        file_path = Path(f"case-data/case{case_id}/test_exam_data.json")
-        if not file_path.exists():
+        if not case_repository.exists(case_id, "test_exam_data.json"):
             print(f"[WARNING] test_exam_data.json not found for case {case_id}")
             return {"physical_exam": {}, "lab_test": {}}
         
-        with open(file_path, 'r') as file:
-            return json.load(file)
+        return case_repository.load_json(case_id, "test_exam_data.json")
     except json.JSONDecodeError as e:
         print(f"[WARNING] Failed to parse test_exam_data.json for case {case_id}: {str(e)}")
         return {"physical_exam": {}, "lab_test": {}}
@@ -135,7 +127,7 @@ async def validate_test(
         
         if not test_names:
             # Store the unmatched test in session
-            session_manager.add_test_order(
+            await session_manager.add_test_order(
                 student_id=student_id,
                 case_id=request.case_id,
                 test_type=request.test_type,
@@ -156,7 +148,7 @@ async def validate_test(
         start_time = datetime.now()
         
         # Configure the model
-        model = genai.GenerativeModel('gemini-2.0-flash')
+        model = llm_gateway.model('gemini-2.0-flash', route="test_validation")
         generation_config = {
             "temperature": 0.2,  # Lower temperature for more deterministic responses
             "top_p": 0.95,
@@ -182,9 +174,10 @@ async def validate_test(
         }
         
         # Generate the response
+        # The prompt holds only case data and the typed test name, so repeat orders are served from cache
         print("[DEBUG] Sending prompt to Gemini model...")
-        response = await asyncio.to_thread(model.generate_content, **content)
-        print("[DEBUG] Received response from Gemini model")
+        response = await model.generate_content(**content, cache=True, cache_validator=is_json_response)
+        print(f"[DEBUG] Received response from Gemini model (cached: {response.cached})")
         
         # Process the response content
         response_content = response.text
@@ -217,7 +210,7 @@ async def validate_test(
                 final_test_name = matched_test_name  # Use matched name
         
         # Always store the test in session - either matched or unmatched
-        session_manager.add_test_order(
+        await session_manager.add_test_order(
             student_id=student_id,
             case_id=request.case_id,
             test_type=request.test_type,
@@ -1,15 +1,17 @@
-from typing import List
+from typing import List, Dict, Any, Optional
 from fastapi import APIRouter, HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from datetime import datetime
 import os
 from dotenv import load_dotenv
 import json
+import asyncio
 from pathlib import Path
 from pydantic import BaseModel
-import google.generativeai as genai
+from utils.llm_gateway import llm_gateway
 from utils.text_cleaner import clean_code_block
-import asyncio
+from utils.case_repository import case_repository
+from utils.auth_utils import get_authenticated_session_data, session_manager
 from auth.auth_api import get_user_from_token
 
 # Load environment variables
@@ -18,6 +20,9 @@ load_dotenv()
 # Define the security scheme
 security = HTTPBearer()
 
+# Per-section deadline of the combined treatment review; sections still running are reported as timed out
+TREATMENT_REVIEW_SECTION_TIMEOUT = float(os.getenv("TREATMENT_REVIEW_SECTION_TIMEOUT", "60"))
+
 router = APIRouter(
     prefix="/feedback",
     tags=["case-player"]
@@ -50,6 +55,23 @@ class PreTreatmentFeedbackRequest(BaseModel):
             }
         }
 
+class TreatmentReviewRequest(PreTreatmentFeedbackRequest):
+    drug_line: str | None = None
+    student_reasoning: str | None = None
+    first_line: bool = False
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "case_id": "16",
+                "student_inputs_pre_treatment": ["test1", "test2"],
+                "student_inputs_monitoring": ["monitor1", "monitor2"],
+                "drug_line": "amoxicillin 500mg PO TID",
+                "student_reasoning": "First line treatment for bacterial infection",
+                "first_line": True
+            }
+        }
+
 class TreatmentProtocolRequest(BaseModel):
     case_id: str
     drug_line: str
@@ -66,9 +88,6 @@ class TreatmentProtocolRequest(BaseModel):
             }
         }
 
-# Initialize the Gemini client
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-
 def load_prompt(file_path: str) -> str:
     """Load the prompt from a specified file."""
     try:
@@ -85,15 +104,12 @@ TREATMENT_FEEDBACK_PROMPT = load_prompt("prompts/treatment_feedback.txt")
 async def load_case_context(case_id: int) -> str:
     """Load the treatment context from the case file."""
     try:
-        file_path = Path(f"case-data/case{case_id}/treatment_context.json")
-        if not file_path.exists():
+        if not case_repository.exists(case_id, "treatment_context.json"):
             raise FileNotFoundError(f"Context file not found for case {case_id}")
         
-        with open(file_path, 'r') as file:
-            # Load the JSON data
-            context_data = json.load(file)
-            # Return the JSON data as a string for the prompt
-            return json.dumps(context_data, indent=2)
+        context_data = case_repository.load_json(case_id, "treatment_context.json")
+        # Return the JSON data as a string for the prompt
+        return json.dumps(context_data, indent=2)
     except Exception as e:
         raise HTTPException(
             status_code=404, 
@@ -120,6 +136,93 @@ async def save_feedback_response(case_id: str, response_data: dict) -> dict:
         print(f"Error saving feedback response: {e}")
         return {"status": "error", "message": str(e)}
 
+# Sampling for the per-test evaluations: high temperature for more creative responses
+TEST_FEEDBACK_GENERATION_CONFIG = {
+    "temperature": 0.9,  # High temperature for more creative responses
+    "top_p": 0.8,       # Slightly lower top_p to maintain some consistency
+    "top_k": 40         # Reasonable top_k for diverse but relevant outputs
+}
+
+PROTOCOL_FEEDBACK_GENERATION_CONFIG = {
+    "temperature": 0.7,
+    "top_p": 0.8,
+    "top_k": 40
+}
+
+async def evaluate_test(prompt: str, context: str, test: str, route: str) -> Dict[str, Any]:
+    """Evaluate one pre-treatment or monitoring test."""
+    model = llm_gateway.model('gemini-2.0-flash', route=route)
+    content = {
+        "contents": [
+            {
+                "parts": [
+                    {"text": prompt},
+                    {"text": f"\nContext: {context}"},
+                    {"text": f"\nTest: {test}"}
+                ]
+            }
+        ],
+        "generation_config": TEST_FEEDBACK_GENERATION_CONFIG
+    }
+    
+    print(f"[{datetime.now()}] Evaluating test: {test}")
+    response = await model.generate_content(**content)
+    response_content = response.text
+    print(f"[DEBUG] Raw response content for {test}: {response_content[:100]}...")
+    
+    # Clean the response and parse as JSON
+    try:
+        return json.loads(clean_code_block(response_content))
+    except json.JSONDecodeError as je:
+        print(f"[DEBUG] JSON parse error: {str(je)}")
+        return {
+            "match": "NA",
+            "specific": "Error parsing response",
+            "general": "",
+            "lateral": ""
+        }
+
+async def evaluate_tests(prompt: str, context: str, tests: List[str], route: str) -> Dict[str, Any]:
+    """Evaluate tests concurrently (bounded by the LLM gateway's concurrency limit), keyed by test name."""
+    results = await asyncio.gather(*[evaluate_test(prompt, context, test, route) for test in tests])
+    return dict(zip(tests, results))
+
+async def evaluate_treatment_protocol(context: str, drug_line: str, student_reasoning: Optional[str],
+                                      first_line: bool) -> Dict[str, Any]:
+    """Evaluate the student's drug line against the case's treatment context."""
+    model = llm_gateway.model('gemini-2.0-flash', route="treatment_protocol_feedback")
+    
+    # Prepare the prompt with the specific inputs
+    formatted_prompt = TREATMENT_FEEDBACK_PROMPT.format(
+        drug_line=drug_line,
+        student_reasoning=student_reasoning or "No reasoning provided",
+        first_line=str(first_line),
+        case_context=context
+    )
+    print(f"[DEBUG] Formatted prompt first 200 chars: {formatted_prompt[:200]}...")
+    
+    content = {
+        "contents": [{"parts": [{"text": formatted_prompt}]}],
+        "generation_config": PROTOCOL_FEEDBACK_GENERATION_CONFIG
+    }
+    
+    print("[DEBUG] Sending prompt to Gemini model...")
+    response = await model.generate_content(**content)
+    response_content = response.text
+    print(f"[DEBUG] Raw response content: {response_content}")
+    
+    # Clean the response and parse as JSON
+    try:
+        feedback_result = json.loads(clean_code_block(response_content))
+        print(f"[DEBUG] Parsed JSON result: {json.dumps(feedback_result, indent=2)}")
+        return feedback_result
+    except json.JSONDecodeError as je:
+        print(f"[DEBUG] JSON parse error: {str(je)}")
+        return {
+            "match": "NA",
+            "reason": f"Error parsing model response: {str(je)}"
+        }
+
 @router.post("/evaluate")
 async def evaluate_treatment(
     treatment_data: dict,
@@ -179,57 +282,13 @@ async def get_pre_treatment_feedback(request: PreTreatmentFeedbackRequest):
         print(f"[DEBUG] Successfully loaded context length: {len(context)}")
         
         start_time = datetime.now()
-        feedback_results = {}
-        
-        # Configure the model with high temperature for more creative responses
-        model = genai.GenerativeModel('gemini-2.0-flash')
-        generation_config = {
-            "temperature": 0.9,  # High temperature for more creative responses
-            "top_p": 0.8,       # Slightly lower top_p to maintain some consistency
-            "top_k": 40         # Reasonable top_k for diverse but relevant outputs
-        }
         
-        # Process each test input
-        for test in request.get_pre_treatment_inputs():
-            print(f"[{datetime.now()}] Evaluating test: {test}")
-            
-            # Prepare the prompt with the specific test
-            content = {
-                "contents": [
-                    {
-                        "parts": [
-                            {"text": PRE_TREATMENT_FEEDBACK_PROMPT},
-                            {"text": f"\nContext: {context}"},
-                            {"text": f"\nTest: {test}"}
-                        ]
-                    }
-                ],
-                "generation_config": generation_config
-            }
-            
-            # Generate the response
-            print("[DEBUG] Sending prompt to Gemini model...")
-            print(f"[DEBUG] Content structure: {json.dumps(content, indent=2)}")
-            response = await asyncio.to_thread(model.generate_content, **content)
-            print("[DEBUG] Received response from Gemini model")
-            
-            # Process the response content
-            response_content = response.text
-            print(f"[DEBUG] Raw response content: {response_content[:100]}...")
-            
-            # Clean the response and parse as JSON
-            try:
-                cleaned_content = clean_code_block(response_content)
-                print(f"[DEBUG] Cleaned content: {cleaned_content[:100]}...")
-                feedback_results[test] = json.loads(cleaned_content)
-            except json.JSONDecodeError as je:
-                print(f"[DEBUG] JSON parse error: {str(je)}")
-                feedback_results[test] = {
-                    "match": "NA",
-                    "specific": "Error parsing response",
-                    "general": "",
-                    "lateral": ""
-                }
+        generation_config = TEST_FEEDBACK_GENERATION_CONFIG
+        
+        # Evaluate all tests concurrently
+        feedback_results = await evaluate_tests(
+            PRE_TREATMENT_FEEDBACK_PROMPT, context, request.get_pre_treatment_inputs(), "pre_treatment_feedback"
+        )
         
         end_time = datetime.now()
         processing_time = (end_time - start_time).total_seconds()
@@ -241,7 +300,7 @@ async def get_pre_treatment_feedback(request: PreTreatmentFeedbackRequest):
             "metadata": {
                 "total_tests_evaluated": len(request.get_pre_treatment_inputs()),
                 "processing_time_seconds": processing_time,
-                "model_version": model.model_name,
+                "model_version": "models/gemini-2.0-flash",
                 "generation_config": generation_config  # Include config in metadata
             }
         }
@@ -254,7 +313,6 @@ async def get_pre_treatment_feedback(request: PreTreatmentFeedbackRequest):
 
     except json.JSONDecodeError as e:
         print(f"[{datetime.now()}] ❌ JSON parsing error: {str(e)}")
-        print(f"[DEBUG] Failed JSON content: {response_content}")
         raise HTTPException(status_code=400, detail=f"Invalid response format: {str(e)}")
     except Exception as e:
         error_timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -281,57 +339,13 @@ async def get_monitoring_feedback(request: PreTreatmentFeedbackRequest):
         context = await load_case_context(int(request.case_id))
         
         start_time = datetime.now()
-        feedback_results = {}
-        
-        # Configure the model with high temperature for more creative responses
-        model = genai.GenerativeModel('gemini-2.0-flash')
-        generation_config = {
-            "temperature": 0.9,  # High temperature for more creative responses
-            "top_p": 0.8,       # Slightly lower top_p to maintain some consistency
-            "top_k": 40         # Reasonable top_k for diverse but relevant outputs
-        }
         
-        # Process each test input
-        for test in request.get_monitoring_inputs():
-            print(f"[{datetime.now()}] Evaluating test: {test}")
-            
-            # Prepare the prompt with the specific test
-            content = {
-                "contents": [
-                    {
-                        "parts": [
-                            {"text": MONITORING_FEEDBACK_PROMPT},
-                            {"text": f"\nContext: {context}"},
-                            {"text": f"\nTest: {test}"}
-                        ]
-                    }
-                ],
-                "generation_config": generation_config
-            }
-            
-            # Generate the response
-            print("[DEBUG] Sending prompt to Gemini model...")
-            print(f"[DEBUG] Content structure: {json.dumps(content, indent=2)}")
-            response = await asyncio.to_thread(model.generate_content, **content)
-            print("[DEBUG] Received response from Gemini model")
-            
-            # Process the response content
-            response_content = response.text
-            print(f"[DEBUG] Raw response content: {response_content[:100]}...")
-            
-            # Clean the response and parse as JSON
-            try:
-                cleaned_content = clean_code_block(response_content)
-                print(f"[DEBUG] Cleaned content: {cleaned_content[:100]}...")
-                feedback_results[test] = json.loads(cleaned_content)
-            except json.JSONDecodeError as je:
-                print(f"[DEBUG] JSON parse error: {str(je)}")
-                feedback_results[test] = {
-                    "match": "NA",
-                    "specific": "Error parsing response",
-                    "general": "",
-                    "lateral": ""
-                }
+        generation_config = TEST_FEEDBACK_GENERATION_CONFIG
+        
+        # Evaluate all tests concurrently
+        feedback_results = await evaluate_tests(
+            MONITORING_FEEDBACK_PROMPT, context, request.get_monitoring_inputs(), "monitoring_feedback"
+        )
         
         end_time = datetime.now()
         processing_time = (end_time - start_time).total_seconds()
@@ -356,7 +370,6 @@ async def get_monitoring_feedback(request: PreTreatmentFeedbackRequest):
 
     except json.JSONDecodeError as e:
         print(f"[{datetime.now()}] ❌ JSON parsing error: {str(e)}")
-        print(f"[DEBUG] Failed JSON content: {response_content}")
         raise HTTPException(status_code=400, detail=f"Invalid response format: {str(e)}")
     except Exception as e:
         error_timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -381,52 +394,12 @@ async def get_treatment_protocol_feedback(request: TreatmentProtocolRequest):
         
         start_time = datetime.now()
         
-        # Configure the model
-        model = genai.GenerativeModel('gemini-2.0-flash')
-        generation_config = {
-            "temperature": 0.7,
-            "top_p": 0.8,
-            "top_k": 40
-        }
+        generation_config = PROTOCOL_FEEDBACK_GENERATION_CONFIG
         print(f"[DEBUG] Model configuration: {generation_config}")
         
-        # Prepare the prompt with the specific inputs
-        formatted_prompt = TREATMENT_FEEDBACK_PROMPT.format(
-            drug_line=request.drug_line,
-            student_reasoning=request.student_reasoning or "No reasoning provided",
-            first_line=str(request.first_line),
-            case_context=context
+        feedback_result = await evaluate_treatment_protocol(
+            context, request.drug_line, request.student_reasoning, request.first_line
         )
-        print(f"[DEBUG] Formatted prompt first 200 chars: {formatted_prompt[:200]}...")
-        
-        # Prepare the content for generation
-        content = {
-            "contents": [{"parts": [{"text": formatted_prompt}]}],
-            "generation_config": generation_config
-        }
-        
-        # Generate the response
-        print("[DEBUG] Sending prompt to Gemini model...")
-        response = await asyncio.to_thread(model.generate_content, **content)
-        print("[DEBUG] Received response from Gemini model")
-        
-        # Process the response content
-        response_content = response.text
-        print(f"[DEBUG] Raw response content: {response_content}")
-        
-        # Clean the response and parse as JSON
-        try:
-            cleaned_content = clean_code_block(response_content)
-            print(f"[DEBUG] Cleaned content: {cleaned_content}")
-            feedback_result = json.loads(cleaned_content)
-            print(f"[DEBUG] Parsed JSON result: {json.dumps(feedback_result, indent=2)}")
-        except json.JSONDecodeError as je:
-            print(f"[DEBUG] JSON parse error: {str(je)}")
-            print(f"[DEBUG] Failed content: {cleaned_content}")
-            feedback_result = {
-                "match": "NA",
-                "reason": f"Error parsing model response: {str(je)}"
-            }
         
         end_time = datetime.now()
         processing_time = (end_time - start_time).total_seconds()
@@ -437,7 +410,7 @@ async def get_treatment_protocol_feedback(request: TreatmentProtocolRequest):
             "feedback": feedback_result,
             "metadata": {
                 "processing_time_seconds": processing_time,
-                "model_version": model.model_name,
+                "model_version": "models/gemini-2.0-flash",
                 "generation_config": generation_config
             }
         }
@@ -451,7 +424,6 @@ async def get_treatment_protocol_feedback(request: TreatmentProtocolRequest):
 
     except json.JSONDecodeError as e:
         error_msg = f"[{datetime.now()}] ❌ JSON parsing error: {str(e)}\n"
-        error_msg += f"[DEBUG] Failed JSON content: {response_content}\n"
         error_msg += f"[DEBUG] Exception details: {str(e)}"
         print(error_msg)
         raise HTTPException(status_code=400, detail=error_msg)
@@ -461,4 +433,86 @@ async def get_treatment_protocol_feedback(request: TreatmentProtocolRequest):
         error_msg += f"[DEBUG] Error message: {str(e)}\n"
         error_msg += f"[DEBUG] Request data: {request.model_dump_json()}"
         print(error_msg)
-        raise HTTPException(status_code=500, detail=error_msg)
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=error_msg)
+@router.post("/treatment_review")
+async def get_treatment_review(
+    request: TreatmentReviewRequest,
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    """
+    Evaluate pre-treatment tests, monitoring and the treatment protocol in one request.
+
+    The case context is loaded once and the three sections run concurrently
+    (each bounded by the LLM gateway's concurrency limit). A section that does
+    not finish within TREATMENT_REVIEW_SECTION_TIMEOUT is reported with status
+    "timeout" while the finished sections are still returned, and the finished
+    sections are recorded to the session in a single write (a section that fails
+    on a retry keeps its earlier result).
+    """
+    try:
+        print(f"\n[{datetime.now()}] 🔍 Starting treatment review for case {request.case_id}")
+        student_id, _ = await get_authenticated_session_data(credentials.credentials)
+
+        context = await load_case_context(int(request.case_id))
+        start_time = datetime.now()
+
+        section_calls = {}
+        pre_treatment_inputs = request.get_pre_treatment_inputs()
+        if pre_treatment_inputs:
+            section_calls["pre_treatment"] = evaluate_tests(
+                PRE_TREATMENT_FEEDBACK_PROMPT, context, pre_treatment_inputs, "pre_treatment_feedback"
+            )
+        monitoring_inputs = request.get_monitoring_inputs()
+        if monitoring_inputs:
+            section_calls["monitoring"] = evaluate_tests(
+                MONITORING_FEEDBACK_PROMPT, context, monitoring_inputs, "monitoring_feedback"
+            )
+        if request.drug_line:
+            section_calls["treatment_protocol"] = evaluate_treatment_protocol(
+                context, request.drug_line, request.student_reasoning, request.first_line
+            )
+        if not section_calls:
+            raise HTTPException(status_code=400, detail="No treatment inputs provided")
+
+        tasks = {name: asyncio.create_task(call) for name, call in section_calls.items()}
+        done, pending = await asyncio.wait(tasks.values(), timeout=TREATMENT_REVIEW_SECTION_TIMEOUT)
+        for task in pending:
+            task.cancel()
+
+        sections = {}
+        for name, task in tasks.items():
+            if task in pending:
+                print(f"[{datetime.now()}] ⏱️ Treatment review section '{name}' timed out")
+                sections[name] = {"status": "timeout", "error": f"No response within {TREATMENT_REVIEW_SECTION_TIMEOUT:g}s"}
+            elif task.exception() is not None:
+                print(f"[{datetime.now()}] ❌ Treatment review section '{name}' failed: {task.exception()}")
+                sections[name] = {"status": "error", "error": str(task.exception())}
+            else:
+                sections[name] = {"status": "complete", "feedback": task.result()}
+
+        # One session write for the finished sections
+        await session_manager.add_treatment_review(student_id, sections)
+
+        processing_time = (datetime.now() - start_time).total_seconds()
+        completed = sum(1 for section in sections.values() if section["status"] == "complete")
+        print(f"[{datetime.now()}] ✅ Treatment review finished: {completed}/{len(sections)} sections in {processing_time:.2f}s")
+
+        return {
+            "case_id": request.case_id,
+            "timestamp": datetime.now().isoformat(),
+            "sections": sections,
+            "complete": completed == len(sections),
+            "metadata": {
+                "processing_time_seconds": processing_time,
+                "model_version": "models/gemini-2.0-flash",
+                "section_timeout_seconds": TREATMENT_REVIEW_SECTION_TIMEOUT
+            }
+        }
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"[{datetime.now()}] ❌ Error in get_treatment_review: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
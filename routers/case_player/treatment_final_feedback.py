@@ -2,16 +2,14 @@ from typing import Dict, Any, Optional
 from fastapi import APIRouter, HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from datetime import datetime
-import os
 from dotenv import load_dotenv
 import json
 from pathlib import Path
-import google.generativeai as genai
+from utils.llm_gateway import llm_gateway
 from utils.text_cleaner import clean_code_block
 from utils.session_manager import SessionManager
 from utils.auth_utils import get_authenticated_session_data
 from auth.auth_api import get_user, get_user_from_token
-import asyncio
 
 # Load environment variables
 load_dotenv()
@@ -29,8 +27,7 @@ router = APIRouter(
     tags=["case-player"]
 )
 
-# Initialize the Gemini client and SessionManager
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+# Initialize the SessionManager
 session_manager = SessionManager()
 
 def load_prompt(file_path: str) -> str:
@@ -152,7 +149,7 @@ async def get_treatment_final_feedback(
         history_context = await load_history_context(int(case_id))
         
         # Configure the model
-        model = genai.GenerativeModel('gemini-2.0-flash')
+        model = llm_gateway.model('gemini-2.0-flash', route="treatment_final_feedback")
         generation_config = {
             "temperature": 0.7,
             "top_p": 0.8,
@@ -184,7 +181,7 @@ async def get_treatment_final_feedback(
         }
         
         print("[DEBUG] Sending prompt to Gemini model...")
-        response = await asyncio.to_thread(model.generate_content, **content)
+        response = await model.generate_content(**content)
         print("[DEBUG] Received response from Gemini model")
         
         # Process the response
@@ -193,7 +190,7 @@ async def get_treatment_final_feedback(
         
         # Save feedback to session
         try:
-            session_manager.add_treatment_feedback(
+            await session_manager.add_treatment_feedback(
                 student_id=student_id,
                 feedback_result=feedback_result
             )
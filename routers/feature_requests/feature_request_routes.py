@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException
 from datetime import datetime
 from auth.auth_api import get_authenticated_client, get_user
+from db.supabase_async import execute
 
 feature_router = APIRouter()
 
@@ -22,24 +23,26 @@ async def request_feature_access(title: str):
             supabase = get_authenticated_client()
             
             # First, try to get existing request count
-            existing_request = supabase.table('feature_requests')\
-                .select('request_count')\
-                .match({'feature_name': title, 'student_id': student_id})\
-                .execute()
+            existing_request = await execute(
+                supabase.table('feature_requests')
+                .select('request_count')
+                .match({'feature_name': title, 'student_id': student_id})
+            )
             
             new_count = 1
             if existing_request.data:
                 new_count = existing_request.data[0]['request_count'] + 1
             
             # Now upsert with the correct count
-            result = supabase.table('feature_requests')\
+            result = await execute(
+                supabase.table('feature_requests')
                 .upsert({
                     'feature_name': title,
                     'student_id': student_id,
                     'request_count': new_count,
                     'updated_at': datetime.now().isoformat()
-                }, on_conflict='feature_name,student_id')\
-                .execute()
+                }, on_conflict='feature_name,student_id')
+            )
 
             return {
                 "success": True,
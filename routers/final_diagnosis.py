@@ -46,7 +46,7 @@ async def record_final_diagnosis(
         
         try:
             session_manager = SessionManager()
-            session_data = session_manager.add_final_diagnosis(
+            session_data = await session_manager.add_final_diagnosis(
                 student_id=user_id,
                 case_id=diagnosis_data["case_id"],
                 final_diagnosis_data=diagnosis_data
@@ -175,7 +175,7 @@ async def get_comment_count(doc_id: str):
     """Get the count of unresolved comments for a specific Google Doc"""
     try:
         docs_manager = GoogleDocsManager()
-        comment_count = docs_manager.get_unresolved_comment_count(doc_id)
+        comment_count = await asyncio.to_thread(docs_manager.get_unresolved_comment_count, doc_id)
         return {"documentId": doc_id, "unresolvedCommentCount": comment_count}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -191,7 +191,8 @@ async def get_document_comments(doc_id: str, include_deleted: bool = False):
     """
     try:
         docs_manager = GoogleDocsManager()
-        comments = docs_manager.get_document_comments(
+        comments = await asyncio.to_thread(
+            docs_manager.get_document_comments,
             doc_id, 
             include_deleted=include_deleted
         )
@@ -205,7 +206,7 @@ async def delete_google_doc(doc_id: str):
     try:
         # Delete from Google Drive
         docs_manager = GoogleDocsManager()
-        docs_manager.delete_doc(doc_id)
+        await asyncio.to_thread(docs_manager.delete_doc, doc_id)
         
         # Delete from Supabase
         await SupabaseDocumentOps.delete_document(doc_id)
@@ -231,7 +232,7 @@ async def delete_multiple_google_docs(doc_ids: List[str]):
         for doc_id in doc_ids:
             try:
                 # Delete from Google Drive
-                docs_manager.delete_doc(doc_id)
+                await asyncio.to_thread(docs_manager.delete_doc, doc_id)
                 
                 # Delete from Supabase
                 await SupabaseDocumentOps.delete_document(doc_id)
@@ -1,13 +1,12 @@
 from typing import List, Dict, Optional
 from fastapi import APIRouter, HTTPException, Query, Depends
-from tavily import TavilyClient
 from pydantic import BaseModel
-import os
 from dotenv import load_dotenv
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from datetime import datetime
 import json
 from auth.auth_api import get_user_from_token
+from utils.search_gateway import search_gateway
 
 # Load environment variables
 load_dotenv()
@@ -21,9 +20,6 @@ router = APIRouter(
     tags=["image-search"]
 )
 
-# Initialize Tavily client
-tavily_client = TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
-
 # Define response models
 class ImageResult(BaseModel):
     url: str
@@ -101,7 +97,7 @@ async def search_images_with_descriptions(
                 search_params["exclude_domains"] = request.exclude_domains
             
             # Perform search using Tavily
-            response = tavily_client.search(**search_params)
+            response = await search_gateway.search("tavily", search_params)
             
             # Process images
             images = []
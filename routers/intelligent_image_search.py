@@ -3,16 +3,15 @@ from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
 from datetime import datetime
-from pathlib import Path
 import json
 import os
-import google.generativeai as genai
-import asyncio
+from utils.llm_gateway import llm_gateway
 from typing import List, Dict, Any, Optional
-from tavily import TavilyClient
-from serpapi import GoogleSearch
-from utils.text_cleaner import clean_code_block
+from utils.search_gateway import search_gateway, search_status
+from utils.text_cleaner import clean_code_block, is_json_response
+from utils.case_repository import case_repository
 from auth.auth_api import get_user_from_token
+from auth.dependencies import get_admin_user
 from routers.case_creator.upload_test_image import TestType
 import traceback
 
@@ -25,12 +24,6 @@ router = APIRouter(
     tags=["intelligent-image-search"]
 )
 
-# Initialize Gemini client
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-
-# Initialize Tavily client
-tavily_client = TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
-
 # Response models
 class ImageResult(BaseModel):
     url: str
@@ -131,12 +124,10 @@ Now generate the search query focusing primarily on the test finding:
 async def load_diagnosis_context(case_id: str) -> Dict[str, Any]:
     """Load the diagnosis context for the specified case."""
     try:
-        file_path = Path(f"case-data/case{case_id}/diagnosis_context.json")
-        if not file_path.exists():
+        if not case_repository.exists(case_id, "diagnosis_context.json"):
             raise FileNotFoundError(f"Diagnosis context not found for case {case_id}")
         
-        with open(file_path, 'r') as file:
-            return json.load(file)
+        return case_repository.load_json(case_id, "diagnosis_context.json")
     except Exception as e:
         raise HTTPException(
             status_code=404, 
@@ -147,7 +138,7 @@ async def generate_intelligent_query(primary_diagnosis: str, test_type: str, tes
     """Generate an intelligent search query using Gemini."""
     try:
         # Configure the model
-        model = genai.GenerativeModel('gemini-2.0-flash')
+        model = llm_gateway.model('gemini-2.0-flash', route="image_search_query")
         generation_config = {
             "temperature": 0.3,  # Lower temperature for more focused results
             "top_p": 0.8,
@@ -164,10 +155,11 @@ async def generate_intelligent_query(primary_diagnosis: str, test_type: str, tes
         
         # Generate the query
         print(f"[INTELLIGENT_SEARCH] 🧠 Generating query with Gemini for: {test_name}")
-        response = await asyncio.to_thread(
-            model.generate_content,
+        response = await model.generate_content(
             formatted_prompt,
-            generation_config=generation_config
+            generation_config=generation_config,
+            cache=True,
+            cache_validator=is_json_response
         )
         
         # Parse the response
@@ -190,6 +182,14 @@ async def generate_intelligent_query(primary_diagnosis: str, test_type: str, tes
             "alternative_contexts": [f"Clinical images showing {test_finding} in {primary_diagnosis} cases"]
         }
 
+@router.get("/search-gateway/stats")
+async def search_gateway_stats(admin_user: dict = Depends(get_admin_user)):
+    """Get per-provider call, failure and timeout counters for the image search gateway"""
+    return {
+        "success": True,
+        "stats": search_gateway.stats()
+    }
+
 @router.post("/search", response_model=IntelligentImageSearchResponse)
 async def intelligent_image_search(
     request: IntelligentSearchRequest,
@@ -271,7 +271,7 @@ async def intelligent_image_search(
             }
             
             # Step 3: Run parallel searches if we have alternative queries (for AI-generated queries only)
-            all_search_tasks = []
+            all_search_params = []
             all_queries_used = [main_query]
             
             if query_data.get("alternative_contexts") and not request.search_query:
@@ -281,30 +281,24 @@ async def intelligent_image_search(
                 
                 print(f"[INTELLIGENT_SEARCH] 🚀 Running {len(all_queries)} parallel searches for optimal speed and coverage")
                 
-                # Create search tasks for parallel execution
                 for i, query in enumerate(all_queries):
                     search_params_copy = search_params.copy()
                     search_params_copy["query"] = query
                     search_params_copy["max_results"] = 15 if i == 0 else 10  # Main query gets more sources
-                    
-                    async def search_with_query(params):
-                        try:
-                            return tavily_client.search(**params)
-                        except Exception as e:
-                            print(f"[WARNING] Search failed for query '{params['query']}': {str(e)}")
-                            return {"images": [], "results": []}
-                    
-                    all_search_tasks.append(search_with_query(search_params_copy))
+                    all_search_params.append(search_params_copy)
                 
-                # Execute all searches in parallel
-                print(f"[INTELLIGENT_SEARCH] ⚡ Executing {len(all_search_tasks)} searches in parallel...")
-                all_responses = await asyncio.gather(*all_search_tasks, return_exceptions=True)
+                # Execute all searches in parallel; a query that fails or misses its deadline is skipped
+                print(f"[INTELLIGENT_SEARCH] ⚡ Executing {len(all_search_params)} searches in parallel...")
+                search_outcomes = await search_gateway.search_many("tavily", all_search_params)
+                all_responses = [outcome["response"] for outcome in search_outcomes if outcome["status"] == "complete"]
                 
             else:
                 # Single search for user-provided queries
                 search_params["max_results"] = request.max_results
-                tavily_response = tavily_client.search(**search_params)
-                all_responses = [tavily_response]
+                search_outcomes = await search_gateway.search_many("tavily", [search_params])
+                if search_outcomes[0]["status"] != "complete":
+                    raise Exception(search_outcomes[0]["error"])
+                all_responses = [search_outcomes[0]["response"]]
             
             # Aggregate and deduplicate results
             all_images = []
@@ -388,6 +382,7 @@ async def intelligent_image_search(
                     "original_keyword_query": query_data.get("original_keyword_query", ""),
                     "queries_used": all_queries_used,
                     "parallel_searches": len(all_queries_used) if not request.search_query else 1,
+                    "search_status": search_status(search_outcomes),
                     "domain_restrictions": "none",
                     "gemini_model": "gemini-2.0-flash",
                     "tavily_search_depth": request.search_depth,
@@ -464,22 +459,27 @@ async def intelligent_image_search_stream(
                     "topic": "general"
                 }
                 
-                # Step 4: Execute searches sequentially and stream results one by one
+                # Step 4: Execute searches concurrently and stream each batch as its search completes
                 if query_data.get("alternative_contexts") and not request.search_query:
                     all_queries = [main_query] + query_data.get("alternative_contexts", [])[:2]
                     
-                    print(f"[STREAM] 🚀 Executing {len(all_queries)} searches sequentially...")
+                    print(f"[STREAM] 🚀 Executing {len(all_queries)} searches concurrently...")
                     
+                    all_search_params = []
                     for i, query in enumerate(all_queries):
                         search_params_copy = search_params.copy()
                         search_params_copy["query"] = query
                         search_params_copy["max_results"] = 15 if i == 0 else 10
+                        all_search_params.append(search_params_copy)
+                    
+                    batches_sent = 0
+                    async for outcome in search_gateway.search_as_completed("tavily", all_search_params):
+                        i = outcome["index"]
+                        query = outcome["query"]
+                        batches_sent += 1
                         
-                        try:
-                            print(f"[STREAM] 🔍 Starting search {i+1}/3: {query[:50]}...")
-                            
-                            # Execute single search
-                            response = tavily_client.search(**search_params_copy)
+                        if outcome["status"] == "complete":
+                            response = outcome["response"]
                             
                             # Process images from this search
                             batch_images = []
@@ -502,7 +502,7 @@ async def intelligent_image_search_stream(
                                 "query_used": query,
                                 "images": batch_images,
                                 "batch_size": len(batch_images),
-                                "is_final": i == len(all_queries) - 1,
+                                "is_final": batches_sent == len(all_queries),
                                 "case_id": request.case_id,
                                 "test_name": request.test_name,
                                 "test_finding": request.test_finding,
@@ -512,16 +512,17 @@ async def intelligent_image_search_stream(
                             
                             yield f"data: {json.dumps(batch_result)}\n\n"
                             
-                        except Exception as e:
-                            print(f"[STREAM] ❌ Search {i+1} failed: {str(e)}")
+                        else:
+                            print(f"[STREAM] ❌ Search {i+1} {outcome['status']}: {outcome['error']}")
                             error_batch = {
                                 "batch_number": i + 1,
                                 "total_batches": len(all_queries),
-                                "error": str(e),
+                                "error": outcome["error"],
+                                "status": outcome["status"],
                                 "query_used": query,
                                 "images": [],
                                 "batch_size": 0,
-                                "is_final": i == len(all_queries) - 1,
+                                "is_final": batches_sent == len(all_queries),
                                 "case_id": request.case_id,
                                 "test_name": request.test_name,
                                 "test_finding": request.test_finding,
@@ -533,7 +534,7 @@ async def intelligent_image_search_stream(
                     # Single search for user-provided queries
                     print(f"[STREAM] 🔍 Executing single search: {main_query[:50]}...")
                     search_params["query"] = main_query
-                    response = tavily_client.search(**search_params)
+                    response = await search_gateway.search("tavily", search_params)
                     
                     batch_images = []
                     if "images" in response and response["images"]:
@@ -666,16 +667,13 @@ async def intelligent_image_search_serpapi(
             }
             
             # Step 4: Execute searches - check single_search flag
-            all_search_tasks = []
+            all_search_params = [search_params]
             all_queries_used = [main_query]
              
             if request.single_search or request.search_query:
                 # Single search mode: Use main query with maximum results
                 print(f"[SERPAPI_SEARCH] 🎯 Single search mode - Using main query with {request.max_results} results")
                 search_params["num"] = min(request.max_results, 100)  # SerpApi max limit
-                search = GoogleSearch(search_params)
-                serpapi_response = await asyncio.to_thread(search.get_dict)
-                all_responses = [serpapi_response]
                 
             elif query_data.get("alternative_contexts"):
                 # Parallel search mode: Use main + alternative queries
@@ -684,33 +682,21 @@ async def intelligent_image_search_serpapi(
                 
                 print(f"[SERPAPI_SEARCH] 🚀 Parallel search mode - Running {len(all_queries)} SerpApi searches")
                 
-                # Create search tasks for parallel execution
+                all_search_params = []
                 for i, query in enumerate(all_queries):
                     search_params_copy = search_params.copy()
                     search_params_copy["q"] = query
                     search_params_copy["num"] = min(20 if i == 0 else 15, request.max_results)  # Main query gets more results
-                    
-                    async def search_with_serpapi(params):
-                        try:
-                            # Execute SerpApi search in thread since it's synchronous
-                            search = GoogleSearch(params)
-                            return await asyncio.to_thread(search.get_dict)
-                        except Exception as e:
-                            print(f"[WARNING] SerpApi search failed for query '{params['q']}': {str(e)}")
-                            return {"images_results": [], "error": str(e)}
-                    
-                    all_search_tasks.append(search_with_serpapi(search_params_copy))
-                
-                # Execute all searches in parallel
-                print(f"[SERPAPI_SEARCH] ⚡ Executing {len(all_search_tasks)} SerpApi searches in parallel...")
-                all_responses = await asyncio.gather(*all_search_tasks, return_exceptions=True)
+                    all_search_params.append(search_params_copy)
                 
             else:
                 # Fallback: Single search for cases without alternatives
                 search_params["num"] = min(request.max_results, 100)
-                search = GoogleSearch(search_params)
-                serpapi_response = await asyncio.to_thread(search.get_dict)
-                all_responses = [serpapi_response]
+            
+            # Execute all searches in parallel; a query that fails or misses its deadline is skipped
+            print(f"[SERPAPI_SEARCH] ⚡ Executing {len(all_search_params)} SerpApi searches in parallel...")
+            search_outcomes = await search_gateway.search_many("serpapi", all_search_params)
+            all_responses = [outcome["response"] for outcome in search_outcomes if outcome["status"] == "complete"]
             
             # Step 5: Process and aggregate SerpApi results
             all_images = []
@@ -782,6 +768,7 @@ async def intelligent_image_search_serpapi(
                     "queries_used": all_queries_used,
                     "parallel_searches": len(all_queries_used) if not (request.search_query or request.single_search) else 1,
                     "search_mode": "single_search" if (request.single_search or request.search_query) else "parallel_search",
+                    "search_status": search_status(search_outcomes),
                     "search_engine": "google_images_serpapi",
                     "gemini_model": "gemini-2.0-flash",
                     "serpapi_safe_search": "active",
@@ -869,8 +856,7 @@ async def intelligent_image_search_serpapi_stream(
                     search_params["q"] = main_query
                     search_params["num"] = min(request.max_results, 100)
                     
-                    search = GoogleSearch(search_params)
-                    response = await asyncio.to_thread(search.get_dict)
+                    response = await search_gateway.search("serpapi", search_params)
                     
                     batch_images = []
                     if "images_results" in response and response["images_results"]:
@@ -905,19 +891,24 @@ async def intelligent_image_search_serpapi_stream(
                     # Parallel search mode (sequential execution for streaming)
                     all_queries = [main_query] + query_data.get("alternative_contexts", [])[:2]
                     
-                    print(f"[SERPAPI_STREAM] 🚀 Parallel search mode - Executing {len(all_queries)} SerpApi searches sequentially...")
+                    print(f"[SERPAPI_STREAM] 🚀 Parallel search mode - Executing {len(all_queries)} SerpApi searches concurrently...")
                     
+                    all_search_params = []
                     for i, query in enumerate(all_queries):
                         search_params_copy = search_params.copy()
                         search_params_copy["q"] = query
                         search_params_copy["num"] = min(20 if i == 0 else 15, request.max_results)
+                        all_search_params.append(search_params_copy)
+                    
+                    # Stream each batch as soon as its search completes
+                    batches_sent = 0
+                    async for outcome in search_gateway.search_as_completed("serpapi", all_search_params):
+                        i = outcome["index"]
+                        query = outcome["query"]
+                        batches_sent += 1
                         
-                        try:
-                            print(f"[SERPAPI_STREAM] 🔍 Starting SerpApi search {i+1}/3: {query[:50]}...")
-                            
-                            # Execute single SerpApi search
-                            search = GoogleSearch(search_params_copy)
-                            response = await asyncio.to_thread(search.get_dict)
+                        if outcome["status"] == "complete":
+                            response = outcome["response"]
                             
                             # Process images from this search
                             batch_images = []
@@ -939,7 +930,7 @@ async def intelligent_image_search_serpapi_stream(
                                 "query_used": query,
                                 "images": batch_images,
                                 "batch_size": len(batch_images),
-                                "is_final": i == len(all_queries) - 1,
+                                "is_final": batches_sent == len(all_queries),
                                 "case_id": request.case_id,
                                 "test_name": request.test_name,
                                 "primary_diagnosis": primary_diagnosis,
@@ -949,16 +940,17 @@ async def intelligent_image_search_serpapi_stream(
                             
                             yield f"data: {json.dumps(batch_result)}\n\n"
                             
-                        except Exception as e:
-                            print(f"[SERPAPI_STREAM] ❌ SerpApi search {i+1} failed: {str(e)}")
+                        else:
+                            print(f"[SERPAPI_STREAM] ❌ SerpApi search {i+1} {outcome['status']}: {outcome['error']}")
                             error_batch = {
                                 "batch_number": i + 1,
                                 "total_batches": len(all_queries),
-                                "error": str(e),
+                                "error": outcome["error"],
+                                "status": outcome["status"],
                                 "query_used": query,
                                 "images": [],
                                 "batch_size": 0,
-                                "is_final": i == len(all_queries) - 1,
+                                "is_final": batches_sent == len(all_queries),
                                 "case_id": request.case_id,
                                 "test_name": request.test_name,
                                 "primary_diagnosis": primary_diagnosis,
@@ -972,8 +964,7 @@ async def intelligent_image_search_serpapi_stream(
                     search_params["q"] = main_query
                     search_params["num"] = min(request.max_results, 100)
                     
-                    search = GoogleSearch(search_params)
-                    response = await asyncio.to_thread(search.get_dict)
+                    response = await search_gateway.search("serpapi", search_params)
                     
                     batch_images = []
                     if "images_results" in response and response["images_results"]:
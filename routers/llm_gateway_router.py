@@ -0,0 +1,16 @@
+from fastapi import APIRouter, Depends
+from auth.dependencies import get_admin_user
+from utils.llm_gateway import llm_gateway
+
+router = APIRouter(
+    prefix="/llm-gateway",
+    tags=["llm-gateway"]
+)
+
+@router.get("/stats")
+async def llm_gateway_stats(admin_user: dict = Depends(get_admin_user)):
+    """Get per-provider call, retry and timeout counters and response cache statistics for the LLM gateway"""
+    return {
+        "success": True,
+        "stats": llm_gateway.stats()
+    }
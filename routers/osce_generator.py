@@ -2,14 +2,12 @@ from fastapi import APIRouter, HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
 from datetime import datetime
-from pathlib import Path
 import json
-import os
-import google.generativeai as genai
-import asyncio
+from utils.llm_gateway import llm_gateway
 from typing import List, Dict, Any, Optional
 from utils.text_cleaner import clean_code_block
 from utils.session_manager import SessionManager
+from utils.case_repository import case_repository
 from auth.auth_api import get_user, get_user_from_token
 
 # Define the security scheme
@@ -21,9 +19,6 @@ router = APIRouter(
     tags=["osce-generator"]
 )
 
-# Initialize Gemini client
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-
 # Initialize session manager
 session_manager = SessionManager()
 
@@ -48,12 +43,10 @@ def load_prompt(file_path: str) -> str:
 async def load_case_doc(case_id: str) -> str:
     """Load the case document for the specified case."""
     try:
-        file_path = Path(f"case-data/case{case_id}/case_doc.txt")
-        if not file_path.exists():
+        if not case_repository.exists(case_id, "case_doc.txt"):
             raise FileNotFoundError(f"Case document not found for case {case_id}")
         
-        with open(file_path, 'r') as file:
-            return file.read()
+        return case_repository.load_text(case_id, "case_doc.txt")
     except Exception as e:
         raise HTTPException(
             status_code=404, 
@@ -63,13 +56,11 @@ async def load_case_doc(case_id: str) -> str:
 async def get_department(case_id: str) -> str:
     """Get the department from the case cover file."""
     try:
-        file_path = Path(f"case-data/case{case_id}/case_cover.json")
-        if not file_path.exists():
+        if not case_repository.exists(case_id, "case_cover.json"):
             raise FileNotFoundError(f"Cover file not found for case {case_id}")
         
-        with open(file_path, 'r') as file:
-            cover_data = json.load(file)
-            return cover_data.get("department", "General Medicine")
+        cover_data = case_repository.load_json(case_id, "case_cover.json")
+        return cover_data.get("department", "General Medicine")
     except Exception as e:
         print(f"Error loading department: {str(e)}")
         return "General Medicine"  # Default fallback
@@ -112,12 +103,12 @@ async def generate_osce(
             department = await get_department(osce_data['case_id'])
             
             # Get student session data
-            session_data = session_manager.get_session(user_id, osce_data['case_id'])
+            session_data = await session_manager.get_session(user_id, osce_data['case_id'])
             if not session_data:
                 raise HTTPException(status_code=404, detail="No session data found for this case")
             
             # Configure the model
-            model = genai.GenerativeModel('gemini-2.0-flash')
+            model = llm_gateway.model('gemini-2.0-flash', route="osce_generation")
             generation_config = {
                 "temperature": 0.7,
                 "top_p": 0.8,
@@ -141,7 +132,7 @@ async def generate_osce(
             
             # Generate the OSCE questions
             print("[DEBUG] Sending prompt to Gemini model...")
-            response = await asyncio.to_thread(model.generate_content, **content)
+            response = await model.generate_content(**content)
             print("[DEBUG] Received response from Gemini model")
             
             # Process the response content
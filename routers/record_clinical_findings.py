@@ -49,7 +49,7 @@ async def record_clinical_findings(
             
             # Add each finding to the session
             for finding in findings_data["findings"]:
-                session_data = session_manager.add_clinical_finding(
+                session_data = await session_manager.add_clinical_finding(
                     student_id=user_id,
                     case_id=findings_data["case_id"],
                     finding=finding
@@ -60,7 +60,7 @@ async def record_diagnosis(
             
             # Add to session
             session_manager = SessionManager()
-            session_data = session_manager.add_diagnosis_submission(
+            session_data = await session_manager.add_diagnosis_submission(
                 student_id=user_id,
                 case_id=diagnosis_data["case_id"],
                 diagnosis_data=diagnosis_data
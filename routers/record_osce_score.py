@@ -83,7 +83,7 @@ async def record_osce_score(
         
         print(f"[OSCE_SCORE] 💾 Adding OSCE score to session data using SessionManager...")
         # Add to session using the specialized method
-        session_data = session_manager.add_osce_score(
+        session_data = await session_manager.add_osce_score(
             student_id=student_id,
             case_id=request.case_id,
             osce_score_data=osce_score_data
@@ -46,7 +46,7 @@ async def record_pre_treatment_monitoring(
         
         try:
             session_manager = SessionManager()
-            session_data = session_manager.add_pre_treatment_monitoring(
+            session_data = await session_manager.add_pre_treatment_monitoring(
                 student_id=user_id,
                 case_id=monitoring_data["case_id"],
                 monitoring_data=monitoring_data["monitoring_data"]
@@ -93,7 +93,7 @@ async def submit_treatment_monitoring(
 
     try:
         # Add to session
-        session_data = session_manager.add_treatment_monitoring_data(
+        session_data = await session_manager.add_treatment_monitoring_data(
             student_id=student_id,
             case_id=request.case_id,
             pre_treatment_checks=request.pre_treatment_checks,
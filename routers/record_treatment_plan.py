@@ -45,7 +45,7 @@ async def record_treatment_plan(
         
         try:
             session_manager = SessionManager()
-            session_data = session_manager.add_treatment_plan(
+            session_data = await session_manager.add_treatment_plan(
                 student_id=user_id,
                 case_id=treatment_data["case_id"],
                 treatment_plan=treatment_data["treatment_plan"]
@@ -9,8 +9,8 @@ import os
 from dotenv import load_dotenv
 import json
 from utils.text_cleaner import clean_code_block
-import google.generativeai as genai
-import asyncio
+from utils.case_repository import case_repository
+from utils.llm_gateway import llm_gateway
 from auth.auth_api import get_user_from_token
 
 # Load environment variables
@@ -32,9 +32,6 @@ model = ChatOpenAI(
     timeout=100
 )
 
-# Initialize the Gemini model
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-
 class StudentFindings(BaseModel):
     case_id: str
     findings: List[str]
@@ -48,11 +45,9 @@ class EvaluationResponse(BaseModel):
 def get_critical_findings(case_id: str) -> str:
     """Get the critical findings from the relevant points JSON file"""
     try:
-        findings_path = f"case-data/case{case_id}/clinical_findings_context.json"
-        with open(findings_path, 'r') as file:
-            findings_data = json.load(file)
-            # Format the critical findings as a bulleted list for the prompt
-            return "\n".join(f"- {item}" for item in findings_data["critical_findings_with_relevance"])
+        findings_data = case_repository.load_json(case_id, "clinical_findings_context.json")
+        # Format the critical findings as a bulleted list for the prompt
+        return "\n".join(f"- {item}" for item in findings_data["critical_findings_with_relevance"])
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail=f"Critical findings not found for case ID: {case_id}")
     except json.JSONDecodeError:
@@ -97,7 +92,7 @@ async def record_relevant_info_feedback(
         
         try:
             session_manager = SessionManager()
-            session_data = session_manager.add_relevant_info_feedback(
+            session_data = await session_manager.add_relevant_info_feedback(
                 student_id=user_id,
                 case_id=feedback_data["case_id"],
                 feedback=feedback_data["feedback"]
@@ -136,7 +131,7 @@ async def evaluate_findings_gemini(request: StudentFindings):
         )
         
         # Configure the model
-        model = genai.GenerativeModel('gemini-2.0-flash')
+        model = llm_gateway.model('gemini-2.0-flash', route="relevant_info_feedback")
         generation_config = {
             "temperature": 0.3,
             "top_p": 0.95,
@@ -153,7 +148,7 @@ async def evaluate_findings_gemini(request: StudentFindings):
         start_time = datetime.now()
         
         # Generate the response
-        response = await asyncio.to_thread(model.generate_content, **content)
+        response = await model.generate_content(**content)
         response_content = response.text
         
         end_time = datetime.now()
@@ -214,7 +209,7 @@ async def evaluate_single_finding(request: dict):
         print(f"[DEBUG] Retrieved critical findings, length: {len(critical_findings)}")
         
         # Configure the model
-        model = genai.GenerativeModel('gemini-2.0-flash')
+        model = llm_gateway.model('gemini-2.0-flash', route="relevant_info_single_finding")
         generation_config = {
             "temperature": 0.3,
             "top_p": 0.95,
@@ -235,7 +230,7 @@ async def evaluate_single_finding(request: dict):
         
         # Generate the response
         print(f"[DEBUG] Sending prompt to Gemini model")
-        response = await asyncio.to_thread(model.generate_content, **content)
+        response = await model.generate_content(**content)
         response_content = response.text
         print(f"[DEBUG] Received response from Gemini model")
         
@@ -2,12 +2,12 @@ from fastapi import APIRouter, HTTPException, Depends, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
-from utils.supabase_session import get_supabase_client
+from db.supabase_pool import get_anon_client
+from db.supabase_async import execute
 from auth.auth_api import get_user_from_token
+from utils.case_repository import case_repository
 from datetime import datetime
-import json
 import os
-from pathlib import Path
 
 # Use a prefix for better organization of routes
 performance_router = APIRouter()
@@ -73,16 +73,14 @@ class DepartmentSessionData(BaseModel):
 def get_primary_diagnosis(case_id: str) -> str:
     """Get the primary diagnosis for a case from its diagnosis_context.json file."""
     try:
-        diagnosis_file_path = Path(f"case-data/case{case_id}/diagnosis_context.json")
-        if not diagnosis_file_path.exists():
+        if not case_repository.exists(case_id, "diagnosis_context.json"):
             print(f"[PERFORMANCE_API] ⚠️ Diagnosis context file not found for case ID: {case_id}")
             return "Not available"
         
-        with open(diagnosis_file_path, 'r') as f:
-            diagnosis_data = json.load(f)
-            primary_diagnosis = diagnosis_data.get("primaryDiagnosis", "Not specified")
-            print(f"[PERFORMANCE_API] 📋 Found primary diagnosis for case {case_id}: {primary_diagnosis}")
-            return primary_diagnosis
+        diagnosis_data = case_repository.load_json(case_id, "diagnosis_context.json")
+        primary_diagnosis = diagnosis_data.get("primaryDiagnosis", "Not specified")
+        print(f"[PERFORMANCE_API] 📋 Found primary diagnosis for case {case_id}: {primary_diagnosis}")
+        return primary_diagnosis
     except Exception as e:
         print(f"[PERFORMANCE_API] ⚠️ Error reading diagnosis context file for case {case_id}: {str(e)}")
         return "Error reading diagnosis"
@@ -138,12 +136,12 @@ async def get_student_case_comparison(
         raise HTTPException(status_code=401, detail="Authentication failed")
 
     try:
-        # Get Supabase client
-        supabase = get_supabase_client()
+        # Get the shared Supabase client
+        supabase = get_anon_client()
         
         # Query the view for the authenticated student
         print(f"[PERFORMANCE_API] 🔍 Querying student_case_comparison_view for student ID: {student_id}")
-        result = supabase.table("student_case_comparison_view").select("*").eq("student_id", student_id).execute()
+        result = await execute(supabase.table("student_case_comparison_view").select("*").eq("student_id", student_id))
         
         if not result.data:
             print(f"[PERFORMANCE_API] ℹ️ No comparison data found for student ID: {student_id}")
@@ -216,16 +214,17 @@ async def get_student_case_comparison_by_case(
         raise HTTPException(status_code=401, detail="Authentication failed")
 
     try:
-        # Get Supabase client
-        supabase = get_supabase_client()
+        # Get the shared Supabase client
+        supabase = get_anon_client()
         
         # Query the view for the authenticated student and specific case
         print(f"[PERFORMANCE_API] 🔍 Querying student_case_comparison_view for student ID: {student_id}, case ID: {case_id}")
-        result = supabase.table("student_case_comparison_view") \
-            .select("*") \
-            .eq("student_id", student_id) \
-            .eq("case_id", case_id) \
-            .execute()
+        result = await execute(
+            supabase.table("student_case_comparison_view")
+            .select("*")
+            .eq("student_id", student_id)
+            .eq("case_id", case_id)
+        )
         
         if not result.data:
             print(f"[PERFORMANCE_API] ❌ No comparison data found for student ID: {student_id}, case ID: {case_id}")
@@ -311,18 +310,19 @@ async def get_all_student_sessions_for_case(
         raise HTTPException(status_code=401, detail="Authentication failed")
 
     try:
-        # Get Supabase client
-        supabase = get_supabase_client()
+        # Get the shared Supabase client
+        supabase = get_anon_client()
         
         # Query for all student sessions for the case
         print(f"[PERFORMANCE_API] 🔍 Querying student_case_sessions for case ID: {case_id}")
-        result = supabase.table("student_case_sessions") \
-            .select("id, student_id, case_id, session_start, session_end, rubric_scores, osce_score_summary, feedback_summary, inserted_at") \
-            .eq("case_id", case_id) \
-            .order("inserted_at", desc=True) \
-            .limit(limit) \
-            .offset(offset) \
-            .execute()
+        result = await execute(
+            supabase.table("student_case_sessions")
+            .select("id, student_id, case_id, session_start, session_end, rubric_scores, osce_score_summary, feedback_summary, inserted_at")
+            .eq("case_id", case_id)
+            .order("inserted_at", desc=True)
+            .limit(limit)
+            .offset(offset)
+        )
         
         if not result.data:
             print(f"[PERFORMANCE_API] ℹ️ No sessions found for case ID: {case_id}")
@@ -406,8 +406,8 @@ async def get_department_sessions(
         raise HTTPException(status_code=401, detail="Authentication failed")
 
     try:
-        # Get Supabase client
-        supabase = get_supabase_client()
+        # Get the shared Supabase client
+        supabase = get_anon_client()
         
         # Build the query
         query = supabase.table("teacher_department_sessions_view").select("*").eq("department", department)
@@ -420,7 +420,7 @@ async def get_department_sessions(
             
         # Execute the query
         print(f"[PERFORMANCE_API] 🔍 Querying teacher_department_sessions_view")
-        result = query.execute()
+        result = await execute(query)
         
         if not result.data:
             print(f"[PERFORMANCE_API] ℹ️ No sessions found for department: {department}")
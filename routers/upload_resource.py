@@ -2,15 +2,18 @@ from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Optional, List
 from pydantic import BaseModel
+import asyncio
 import sqlite3
 import os
 from datetime import datetime
-import shutil
 from pathlib import Path
 from utils.google_docs import GoogleDocsManager
 import re
 from auth.auth_api import get_supabase_client, get_user_from_token
+from auth.dependencies import get_admin_user
 from utils.supabase_document_ops import SupabaseDocumentOps
+from utils.pdf_utils import document_text_cache, schedule_text_extraction
+from utils.upload_store import ContentAddressedStore
 
 # Define the security scheme
 security = HTTPBearer()
@@ -20,6 +23,9 @@ router = APIRouter(
     tags=["documents"]
 )
 
+# Uploaded case documents, stored once per content hash
+upload_store = ContentAddressedStore(os.getenv("UPLOADS_DIR", "case-data/uploads"))
+
 class DocumentResponse(BaseModel):
     id: int
     title: str
@@ -103,10 +109,6 @@ async def upload_document(
             # Get department ID from name
             # department_id = await SupabaseDocumentOps.get_department_id(department_name)
             
-            # Create uploads directory if it doesn't exist
-            upload_dir = Path(os.getenv("UPLOADS_DIR", "case-data/uploads"))
-            upload_dir.mkdir(exist_ok=True)
-            
             responses = []
             uploaded_files = []
             
@@ -122,11 +124,11 @@ async def upload_document(
                             detail=f"A document with title '{title}' already exists in this department"
                         )
                     
-                    # Save the file
-                    file_path = upload_dir / file.filename
-                    uploaded_files.append(file_path)
-                    with file_path.open("wb") as buffer:
-                        shutil.copyfileobj(file.file, buffer)
+                    # Stream the file into the content-addressed upload store
+                    stored = await upload_store.save(file)
+                    file_path = stored["path"]
+                    if stored["created"]:
+                        uploaded_files.append(file_path)
                     
                     if file_path:
                         # Determine file type and handle accordingly
@@ -165,13 +167,17 @@ async def upload_document(
                             "google_doc_link": doc_data.get("google_doc_link")
                         }
                         
+                        if file_type == "PDF":
+                            # Parse now, off the event loop, so case creation from this upload finds the text cached
+                            schedule_text_extraction(file_path)
+                        
                         responses.append(DocumentResponse(**response))
                         
                 except Exception as e:
-                    # Clean up this file if there was an error
-                    if file_path and file_path.exists():
+                    # Clean up this file if there was an error (names that existed before this upload are kept)
+                    if file_path and file_path in uploaded_files:
                         try:
-                            os.remove(file_path)
+                            await upload_store.discard(file_path.name)
                         except:
                             pass
                     raise
@@ -182,8 +188,7 @@ async def upload_document(
             # Clean up any uploaded files
             for file_path in uploaded_files:
                 try:
-                    if file_path.exists():
-                        os.remove(file_path)
+                    await upload_store.discard(file_path.name)
                 except:
                     pass
             
@@ -213,10 +218,6 @@ async def upload_document_unauthenticated(
     print(f"[UPLOAD_RESOURCE] 📝 Uploading {len(files)} document(s) for department: {department_name} (unauthenticated)")
     
     try:
-        # Create uploads directory if it doesn't exist
-        upload_dir = Path(os.getenv("UPLOADS_DIR", "case-data/uploads"))
-        upload_dir.mkdir(exist_ok=True)
-        
         responses = []
         uploaded_files = []
         
@@ -232,11 +233,11 @@ async def upload_document_unauthenticated(
                         detail=f"A document with title '{title}' already exists in this department"
                     )
                 
-                # Save the file
-                file_path = upload_dir / file.filename
-                uploaded_files.append(file_path)
-                with file_path.open("wb") as buffer:
-                    shutil.copyfileobj(file.file, buffer)
+                # Stream the file into the content-addressed upload store
+                stored = await upload_store.save(file)
+                file_path = stored["path"]
+                if stored["created"]:
+                    uploaded_files.append(file_path)
                 
                 if file_path:
                     # Determine file type and handle accordingly
@@ -275,13 +276,17 @@ async def upload_document_unauthenticated(
                         "google_doc_link": doc_data.get("google_doc_link")
                     }
                     
+                    if file_type == "PDF":
+                        # Parse now, off the event loop, so case creation from this upload finds the text cached
+                        schedule_text_extraction(file_path)
+                    
                     responses.append(DocumentResponse(**response))
                     
             except Exception as e:
-                # Clean up this file if there was an error
-                if file_path and file_path.exists():
+                # Clean up this file if there was an error (names that existed before this upload are kept)
+                if file_path and file_path in uploaded_files:
                     try:
-                        os.remove(file_path)
+                        await upload_store.discard(file_path.name)
                     except:
                         pass
                 raise
@@ -292,8 +297,7 @@ async def upload_document_unauthenticated(
         # Clean up any uploaded files
         for file_path in uploaded_files:
             try:
-                if file_path.exists():
-                    os.remove(file_path)
+                await upload_store.discard(file_path.name)
             except:
                 pass
         
@@ -301,6 +305,14 @@ async def upload_document_unauthenticated(
             raise
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/text-cache/stats")
+async def document_text_cache_stats(admin_user: dict = Depends(get_admin_user)):
+    """Get hit/miss statistics for the extracted document text cache"""
+    return {
+        "success": True,
+        "stats": await asyncio.to_thread(document_text_cache.stats)
+    }
+
 @router.get("/topic/{topic_name}", response_model=List[DocumentResponse])
 async def get_topic_documents(
     topic_name: str,
@@ -0,0 +1,22 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("auth.router")
+
+UNRELATED_SUBSYSTEMS = ("utils.llm_gateway", "utils.pdf_utils", "utils.search_gateway")
+
+
+def test_auth_router_does_not_import_unrelated_subsystems():
+    # A fresh interpreter, so modules imported by other tests do not count
+    code = (
+        "import sys, auth.router; "
+        f"print([name for name in {UNRELATED_SUBSYSTEMS!r} if name in sys.modules])"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    assert result.stdout.strip().splitlines()[-1] == "[]"
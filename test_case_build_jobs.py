@@ -0,0 +1,157 @@
+import asyncio
+
+import pytest
+
+from utils.case_build_jobs import BuildStage, CaseBuildJobStore, CaseBuildRunner
+
+
+def recording_stage(name, log, delay=0.01, fail=None):
+    """Stage that logs its start and end; `fail` is a list whose first entry decides whether it raises."""
+    async def run(job):
+        log.append(("start", name))
+        await asyncio.sleep(delay)
+        if fail and fail[0]:
+            raise RuntimeError(f"{name} broke")
+        log.append(("end", name))
+        return {"name": name}
+    return run
+
+
+def make_runner(tmp_path, stages, **kwargs):
+    return CaseBuildRunner(stages, store=CaseBuildJobStore(str(tmp_path)), **kwargs)
+
+
+def run_job(runner, job):
+    async def scenario():
+        assert runner.start(job)
+        await runner._tasks[job["job_id"]]
+    asyncio.run(scenario())
+    return runner.store.load(job["job_id"])
+
+
+def test_stages_start_after_their_dependencies_and_independent_ones_overlap(tmp_path):
+    log = []
+    runner = make_runner(tmp_path, [
+        BuildStage("document", recording_stage("document", log), uses_llm=False),
+        BuildStage("persona", recording_stage("persona", log), ["document"]),
+        BuildStage("history", recording_stage("history", log), ["document"]),
+        BuildStage("cover", recording_stage("cover", log), ["persona", "history"]),
+    ])
+    job = run_job(runner, runner.create_job("7", inputs={}))
+
+    position = {event: i for i, event in enumerate(log)}
+    assert job["status"] == "complete"
+    assert position[("end", "document")] < position[("start", "persona")]
+    assert position[("end", "document")] < position[("start", "history")]
+    assert position[("end", "persona")] < position[("start", "cover")]
+    assert position[("end", "history")] < position[("start", "cover")]
+    # persona and history ran side by side
+    assert position[("start", "history")] < position[("end", "persona")]
+    assert job["stages"]["cover"]["artifact"] == {"name": "cover"}
+
+
+def test_llm_stages_share_the_concurrency_budget(tmp_path):
+    running = 0
+    peak = 0
+
+    async def llm_call(job):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.02)
+        running -= 1
+
+    runner = make_runner(tmp_path, [BuildStage(f"stage{i}", llm_call) for i in range(6)], llm_concurrency=2)
+    assert run_job(runner, runner.create_job("7", inputs={}))["status"] == "complete"
+    assert peak == 2
+
+
+def test_failed_stage_blocks_only_its_dependents(tmp_path):
+    log = []
+    runner = make_runner(tmp_path, [
+        BuildStage("document", recording_stage("document", log), uses_llm=False),
+        BuildStage("persona", recording_stage("persona", log, fail=[True]), ["document"]),
+        BuildStage("history", recording_stage("history", log), ["document"]),
+        BuildStage("cover", recording_stage("cover", log), ["persona"]),
+    ])
+    job = run_job(runner, runner.create_job("7", inputs={}))
+
+    assert job["status"] == "failed"
+    assert job["stages"]["persona"]["status"] == "failed"
+    assert job["stages"]["persona"]["error"] == "persona broke"
+    assert job["stages"]["cover"]["status"] == "blocked"
+    assert job["stages"]["history"]["status"] == "complete"
+    assert ("start", "cover") not in log
+
+
+def test_resume_reruns_only_unfinished_stages(tmp_path):
+    log = []
+    broken = [True]
+    runner = make_runner(tmp_path, [
+        BuildStage("document", recording_stage("document", log), uses_llm=False),
+        BuildStage("persona", recording_stage("persona", log, fail=broken), ["document"]),
+        BuildStage("cover", recording_stage("cover", log), ["persona"]),
+    ])
+    job = run_job(runner, runner.create_job("7", inputs={}))
+    assert job["status"] == "failed"
+
+    broken[0] = False
+    log.clear()
+
+    async def resume():
+        runner.resume(job["job_id"])
+        await runner._tasks[job["job_id"]]
+    asyncio.run(resume())
+
+    job = runner.store.load(job["job_id"])
+    assert job["status"] == "complete"
+    assert [name for event, name in log if event == "start"] == ["persona", "cover"]
+    assert job["stages"]["persona"]["attempts"] == 2
+    assert job["stages"]["document"]["attempts"] == 1
+
+
+def test_requested_stages_pull_in_their_dependencies(tmp_path):
+    stages = [
+        BuildStage("document", recording_stage("document", []), uses_llm=False),
+        BuildStage("persona", recording_stage("persona", []), ["document"]),
+        BuildStage("history", recording_stage("history", []), ["document"]),
+    ]
+    job = make_runner(tmp_path, stages).create_job("7", inputs={}, stages=["persona"])
+    assert list(job["stages"]) == ["document", "persona"]
+
+
+def test_invalid_graphs_are_rejected(tmp_path):
+    noop = recording_stage("noop", [])
+    with pytest.raises(ValueError):
+        make_runner(tmp_path, [BuildStage("a", noop, ["b"]), BuildStage("b", noop, ["a"])])
+    with pytest.raises(ValueError):
+        make_runner(tmp_path, [BuildStage("a", noop, ["missing"])])
+
+
+def test_running_job_without_a_worker_is_reported_interrupted(tmp_path):
+    pytest.importorskip("fcntl")
+    runner = make_runner(tmp_path, [
+        BuildStage("document", recording_stage("document", []), uses_llm=False),
+        BuildStage("persona", recording_stage("persona", []), ["document"]),
+    ])
+    job = runner.create_job("7", inputs={})
+    # State left behind by a worker that was recycled mid-build
+    job["status"] = "running"
+    job["stages"]["document"]["status"] = "complete"
+    job["stages"]["persona"]["status"] = "running"
+    runner.store.save(job)
+
+    other_worker = runner.store.claim(job["job_id"])
+    assert runner.load_job(job["job_id"])["status"] == "running"
+    other_worker.close()
+
+    job = runner.load_job(job["job_id"])
+    assert job["status"] == "interrupted"
+    assert job["stages"]["persona"]["status"] == "failed"
+    assert job["stages"]["document"]["status"] == "complete"
+
+    async def resume():
+        runner.resume(job["job_id"])
+        await runner._tasks[job["job_id"]]
+    asyncio.run(resume())
+    assert runner.load_job(job["job_id"])["status"] == "complete"
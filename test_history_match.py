@@ -0,0 +1,100 @@
+import asyncio
+import json
+
+import pytest
+
+history_match = pytest.importorskip("routers.case_player.history_match")
+
+from fastapi.security import HTTPAuthorizationCredentials
+
+from utils.llm_gateway import FakeLLMProvider, llm_gateway
+from utils.session_manager import SessionManager
+
+SMOKING = {"question": "Do you smoke or use tobacco?", "domain": "Social History"}
+ALLERGIES = {"question": "Do you have any allergies?", "domain": "Allergies"}
+EXPECTED_QUESTIONS = [SMOKING, ALLERGIES]
+CREDENTIALS = HTTPAuthorizationCredentials(scheme="Bearer", credentials="token")
+
+
+@pytest.fixture
+def gemini(monkeypatch, tmp_path):
+    """A history-taking session for student s1, with Gemini answering from `covered_by_model`."""
+    covered_by_model = []
+
+    def answer(model_name, prompt):
+        asked = [q for q in EXPECTED_QUESTIONS if json.dumps(q["question"]) in prompt]
+        # The single-turn prompt asks which questions are covered, the multi-turn one which are not
+        single_turn = "current_student_interaction" in prompt
+        return json.dumps([q for q in asked if (q in covered_by_model) == single_turn])
+
+    async def get_user_from_token(token):
+        return {"success": True, "user": {"id": "s1"}}
+
+    async def load_expected_questions(case_id):
+        return list(EXPECTED_QUESTIONS)
+
+    provider = FakeLLMProvider(handler=answer)
+    monkeypatch.setitem(llm_gateway._providers, "gemini", provider)
+    monkeypatch.setattr(llm_gateway, "_semaphores", {})
+    monkeypatch.setattr(history_match, "get_user_from_token", get_user_from_token)
+    monkeypatch.setattr(history_match, "load_expected_questions", load_expected_questions)
+    monkeypatch.setattr(history_match, "session_manager", SessionManager(base_dir=str(tmp_path)))
+    asyncio.run(history_match.session_manager.create_or_load_session("s1", "1"))
+    provider.covered_by_model = covered_by_model
+    return provider
+
+
+def ask(question, reply):
+    asyncio.run(history_match.session_manager.add_history_question("s1", "1", question, reply))
+
+
+def unmatched_questions(remaining=()):
+    request = history_match.UnmatchedQuestionsRequest(remaining_unmatched_questions=list(remaining))
+    return asyncio.run(history_match.get_unmatched_questions(request, CREDENTIALS))
+
+
+def stored_coverage():
+    return asyncio.run(history_match.session_manager.get_session("s1"))["history_coverage"]
+
+
+def test_client_list_filters_the_response_but_is_not_recorded_as_coverage(gemini):
+    ask("Where is the rash?", "On my elbows.")
+
+    response = unmatched_questions(remaining=[SMOKING])
+    assert response["unmatched_questions"] == [SMOKING]
+    assert stored_coverage()["covered"] == {}
+
+    assert unmatched_questions()["unmatched_questions"] == [SMOKING, ALLERGIES]
+
+
+def test_single_new_turn_is_matched_against_the_uncovered_questions(gemini):
+    gemini.covered_by_model.append(ALLERGIES)
+    ask("Are you allergic to anything?", "Penicillin.")
+
+    assert unmatched_questions()["unmatched_questions"] == [SMOKING]
+    # Only the related question is put to the model; smoking is settled locally for this turn
+    assert '"Do you have any allergies?"' in gemini.calls[0]["prompt"]
+    assert '"Do you smoke or use tobacco?"' not in gemini.calls[0]["prompt"]
+    # The open questions sit under their own heading, not inside the prompt's worked example
+    uncovered_block = gemini.calls[0]["prompt"].split("Uncovered expected questions for this interaction:")[1]
+    assert '"Do you have any allergies?"' in uncovered_block.split("**Output:**")[0]
+
+
+def test_locally_settled_turn_is_not_sent_again(gemini):
+    gemini.covered_by_model.append(SMOKING)
+    ask("Do you take cigarettes?", "Yes, about ten a day.")
+
+    # The paraphrase shares a topic with the smoking question, so it reaches the model;
+    # the allergies question is unrelated and settled locally
+    response = unmatched_questions()
+    assert response["unmatched_questions"] == [ALLERGIES]
+    assert [entry["method"] for entry in response["coverage"]] == ["model"]
+    assert '"Do you have any allergies?"' not in gemini.calls[0]["prompt"]
+    assert stored_coverage()["evaluated_interactions"] == 1
+
+    # A later turn is checked against the still-uncovered question; the old turn is not resent
+    ask("Are you allergic to anything?", "Penicillin.")
+    gemini.covered_by_model.append(ALLERGIES)
+    assert unmatched_questions()["unmatched_questions"] == []
+    assert "cigarettes" not in gemini.calls[1]["prompt"]
+    assert stored_coverage()["evaluated_interactions"] == 2
@@ -0,0 +1,97 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from utils.history_matcher import HistoryPreMatcher
+
+EXPECTED_QUESTIONS = [
+    {"question": "When did the rash first appear?", "domain": "History of Presenting Illness"},
+    {"question": "Do you smoke or use tobacco?", "domain": "Social History"},
+    {"question": "Are you currently taking any medications?", "domain": "Drug History"},
+    {"question": "Does anyone in your family have a similar skin condition?", "domain": "Family History"},
+    {"question": "Do you have any allergies?", "domain": "Allergies"},
+]
+
+# A second case, not used when choosing CONCEPTS or the thresholds
+CHEST_PAIN_QUESTIONS = [
+    {"question": "When did the chest pain start?", "domain": "History of Presenting Illness"},
+    {"question": "Does the pain radiate anywhere?", "domain": "History of Presenting Illness"},
+    {"question": "Does exertion bring on the pain?", "domain": "History of Presenting Illness"},
+    {"question": "Are you a smoker?", "domain": "Social History"},
+    {"question": "Do you drink alcohol?", "domain": "Social History"},
+    {"question": "What work do you do?", "domain": "Social History"},
+    {"question": "Is there a family history of heart disease?", "domain": "Family History"},
+    {"question": "Do you take any regular medicines?", "domain": "Drug History"},
+    {"question": "Have you had any shortness of breath?", "domain": "Review of Systems"},
+    {"question": "Any allergies to medications?", "domain": "Allergies"},
+]
+
+# Paraphrases a student might use, with little or no word overlap with the expected question
+PARAPHRASES = [
+    (EXPECTED_QUESTIONS, "Do you take cigarettes?", "Yes, about ten a day.", "Do you smoke or use tobacco?"),
+    (EXPECTED_QUESTIONS, "Are you on any pills currently?", "Just ibuprofen now and then.",
+     "Are you currently taking any medications?"),
+    (EXPECTED_QUESTIONS, "How long have you had this?", "About two weeks.", "When did the rash first appear?"),
+    (EXPECTED_QUESTIONS, "Do your parents or siblings have anything like this?", "My mother had psoriasis.",
+     "Does anyone in your family have a similar skin condition?"),
+    (CHEST_PAIN_QUESTIONS, "Did it come on suddenly, and when?", "About two hours ago.",
+     "When did the chest pain start?"),
+    (CHEST_PAIN_QUESTIONS, "Does it spread to your arm or jaw?", "Yes, down my left arm.",
+     "Does the pain radiate anywhere?"),
+    (CHEST_PAIN_QUESTIONS, "Does it come on when you walk or climb stairs?", "Yes, walking uphill.",
+     "Does exertion bring on the pain?"),
+    (CHEST_PAIN_QUESTIONS, "How many units a week?", "Maybe 10.", "Do you drink alcohol?"),
+    (CHEST_PAIN_QUESTIONS, "What's your job?", "I'm a lorry driver.", "What work do you do?"),
+    (CHEST_PAIN_QUESTIONS, "Any problems with your breathing?", "I get winded on stairs.",
+     "Have you had any shortness of breath?"),
+    (CHEST_PAIN_QUESTIONS, "Any reactions to drugs?", "Penicillin gives me a rash.", "Any allergies to medications?"),
+]
+
+
+def expected(question, questions=EXPECTED_QUESTIONS):
+    return next(q for q in questions if q["question"] == question)
+
+
+@pytest.mark.parametrize("questions,student_question,patient_reply,expected_question", PARAPHRASES)
+def test_paraphrases_are_escalated_not_rejected(questions, student_question, patient_reply, expected_question):
+    matcher = HistoryPreMatcher(questions)
+    interactions = [{"student_question": student_question, "patient_reply": patient_reply}]
+    split = matcher.classify(interactions, [expected(expected_question, questions)])
+
+    assert split["uncovered"] == []
+    assert split["covered"] + split["ambiguous"] == [expected(expected_question, questions)]
+    assert split["relevant_interactions"] == {0}
+
+
+def test_close_wording_is_covered_locally():
+    matcher = HistoryPreMatcher(EXPECTED_QUESTIONS)
+    interactions = [{"student_question": "Do you have allergies?", "patient_reply": "Only to penicillin."}]
+    split = matcher.classify(interactions, [expected("Do you have any allergies?")])
+    assert split["covered"] == [expected("Do you have any allergies?")]
+    assert split["best_interaction"] == {0: 0}
+
+
+def test_turn_about_one_topic_settles_unrelated_questions_locally():
+    matcher = HistoryPreMatcher(CHEST_PAIN_QUESTIONS)
+    interactions = [{"student_question": "Do you use cigarettes?", "patient_reply": "20 a day for 30 years."}]
+    split = matcher.classify(interactions, CHEST_PAIN_QUESTIONS)
+
+    assert split["ambiguous"] == [expected("Are you a smoker?", CHEST_PAIN_QUESTIONS)]
+    assert split["covered"] == []
+    assert len(split["uncovered"]) == len(CHEST_PAIN_QUESTIONS) - 1
+
+
+def test_shared_topic_alone_does_not_cover_a_question():
+    matcher = HistoryPreMatcher(CHEST_PAIN_QUESTIONS)
+    interactions = [{"student_question": "Do you drink coffee?", "patient_reply": "Three cups a day."}]
+    split = matcher.classify(interactions, [expected("Do you drink alcohol?", CHEST_PAIN_QUESTIONS)])
+    assert split["covered"] == []
+    assert split["ambiguous"] == [expected("Do you drink alcohol?", CHEST_PAIN_QUESTIONS)]
+
+
+def test_reject_zero_sends_every_interaction_with_every_open_question():
+    matcher = HistoryPreMatcher(EXPECTED_QUESTIONS, reject=0)
+    interactions = [{"student_question": "Any chance you are pregnant?", "patient_reply": "No."}]
+    split = matcher.classify(interactions, [expected("Do you have any allergies?")])
+    assert split["uncovered"] == []
+    assert split["relevant_interactions"] == {0}
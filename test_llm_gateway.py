@@ -0,0 +1,151 @@
+import asyncio
+
+import pytest
+
+from utils.llm_gateway import FakeLLMProvider, LLMGateway, LLMTimeoutError
+from utils.llm_response_cache import LLMResponseCache
+from utils.text_cleaner import is_json_response
+
+
+def make_gateway(provider, tmp_path=None, max_concurrency=None, **kwargs):
+    cache = LLMResponseCache(str(tmp_path / "cache.db")) if tmp_path is not None else None
+    gateway = LLMGateway(response_cache=cache, retry_base=0, **kwargs)
+    gateway.register_provider("fake", provider, max_concurrency=max_concurrency)
+    return gateway
+
+
+def test_identical_coalesced_calls_share_one_upstream_call():
+    provider = FakeLLMProvider(responses=['{"score": 7}'], delay=0.05)
+    model = make_gateway(provider).model("fake-model", provider="fake", route="test")
+
+    async def scenario():
+        return await asyncio.gather(*(model.generate_content("Grade this", coalesce=True) for _ in range(5)))
+
+    responses = asyncio.run(scenario())
+    assert len(provider.calls) == 1
+    assert [response.text for response in responses] == ['{"score": 7}'] * 5
+    assert sum(response.coalesced for response in responses) == 4
+
+
+def test_calls_without_coalesce_each_reach_the_provider():
+    provider = FakeLLMProvider(handler=lambda model_name, prompt: prompt.upper())
+    model = make_gateway(provider).model("fake-model", provider="fake")
+
+    async def scenario():
+        return await asyncio.gather(*(model.generate_content("same prompt") for _ in range(3)))
+
+    responses = asyncio.run(scenario())
+    assert len(provider.calls) == 3
+    assert {response.text for response in responses} == {"SAME PROMPT"}
+
+
+def test_provider_concurrency_is_capped():
+    running = 0
+    peak = 0
+
+    class CountingProvider(FakeLLMProvider):
+        async def generate(self, model_name, contents, generation_config=None):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            try:
+                return await super().generate(model_name, contents, generation_config)
+            finally:
+                running -= 1
+
+    model = make_gateway(CountingProvider(delay=0.02), max_concurrency=2).model("fake-model", provider="fake")
+
+    async def scenario():
+        await asyncio.gather(*(model.generate_content(f"prompt {i}") for i in range(6)))
+
+    asyncio.run(scenario())
+    assert peak == 2
+
+
+def test_slow_call_times_out_after_retries():
+    provider = FakeLLMProvider(delay=1)
+    model = make_gateway(provider, max_retries=1).model("fake-model", provider="fake")
+
+    with pytest.raises(LLMTimeoutError):
+        asyncio.run(model.generate_content("slow", timeout=0.05))
+    assert len(provider.calls) == 2
+
+
+def test_transient_errors_are_retried():
+    class ServiceUnavailable(Exception):
+        pass
+
+    def flaky(model_name, prompt):
+        if len(provider.calls) == 1:
+            raise ServiceUnavailable("try again")
+        return "ok"
+
+    provider = FakeLLMProvider(handler=flaky)
+    response = asyncio.run(make_gateway(provider).model("fake-model", provider="fake").generate_content("hi"))
+    assert response.text == "ok" and response.attempts == 2
+
+
+def test_cached_responses_are_replayed_and_invalid_ones_are_not_stored(tmp_path):
+    provider = FakeLLMProvider(responses=["not json", '{"ok": true}'])
+    model = make_gateway(provider, tmp_path).model("fake-model", provider="fake")
+
+    async def ask():
+        return await model.generate_content("Grade this", cache=True, cache_validator=is_json_response)
+
+    assert asyncio.run(ask()).text == "not json"
+    assert asyncio.run(ask()).text == '{"ok": true}'
+    replayed = asyncio.run(ask())
+    assert replayed.text == '{"ok": true}' and replayed.cached
+    assert len(provider.calls) == 2
+
+
+def test_coalesced_calls_with_different_prompts_do_not_share():
+    provider = FakeLLMProvider(handler=lambda model_name, prompt: prompt, delay=0.02)
+    model = make_gateway(provider).model("fake-model", provider="fake")
+
+    async def scenario():
+        return await asyncio.gather(
+            model.generate_content("student A session", coalesce=True),
+            model.generate_content("student B session", coalesce=True),
+        )
+
+    responses = asyncio.run(scenario())
+    assert len(provider.calls) == 2
+    assert [response.text for response in responses] == ["student A session", "student B session"]
+
+
+def test_coalesced_failure_reaches_every_waiter():
+    def failing(model_name, prompt):
+        raise ValueError("bad request")
+
+    provider = FakeLLMProvider(handler=failing, delay=0.02)
+    model = make_gateway(provider).model("fake-model", provider="fake")
+
+    async def scenario():
+        return await asyncio.gather(
+            *(model.generate_content("same", coalesce=True) for _ in range(3)), return_exceptions=True
+        )
+
+    results = asyncio.run(scenario())
+    assert len(provider.calls) == 1
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_cohort_requesting_capsules_together_costs_one_model_call(monkeypatch, tmp_path):
+    diagnosis_feedback = pytest.importorskip("routers.case_player.diagnosis_feedback_v2")
+    from utils.llm_gateway import llm_gateway
+
+    provider = FakeLLMProvider(responses=['{"capsules": []}'], delay=0.05)
+    monkeypatch.setitem(llm_gateway._providers, "gemini", provider)
+    monkeypatch.setattr(llm_gateway, "_semaphores", {})
+    monkeypatch.setattr(llm_gateway, "response_cache", LLMResponseCache(str(tmp_path / "cache.db")))
+    diagnosis_context = {"primary_diagnosis": "Psoriasis"}
+
+    async def cohort():
+        return await asyncio.gather(
+            *(diagnosis_feedback.generate_educational_capsules(diagnosis_context) for _ in range(4))
+        )
+
+    results = asyncio.run(cohort())
+    assert len(provider.calls) == 1
+    assert all(result == results[0] for result in results)
@@ -0,0 +1,65 @@
+import asyncio
+from collections import OrderedDict
+
+import pytest
+
+
+@pytest.fixture
+def patient_simulation():
+    return pytest.importorskip("routers.case_player.patient_simulation")
+
+
+def with_case_cover(monkeypatch, module, cover):
+    monkeypatch.setattr(module.case_repository, "load_json", lambda case_id, name: cover)
+
+
+def test_memory_defaults_to_full_thread(patient_simulation, monkeypatch):
+    with_case_cover(monkeypatch, patient_simulation, {})
+    assert patient_simulation.get_memory_settings("1")["mode"] == "full"
+
+
+def test_case_cover_overrides_are_cast_to_int(patient_simulation, monkeypatch):
+    with_case_cover(monkeypatch, patient_simulation, {
+        "conversation_memory": {"mode": "window", "max_turns": "6", "token_budget": "3000"}
+    })
+    settings = patient_simulation.get_memory_settings("1")
+    assert settings == {"mode": "window", "max_turns": 6, "token_budget": 3000}
+
+
+def test_invalid_case_cover_overrides_are_ignored(patient_simulation, monkeypatch):
+    with_case_cover(monkeypatch, patient_simulation, {
+        "conversation_memory": {"mode": "rolling", "max_turns": 0, "token_budget": "lots"}
+    })
+    settings = patient_simulation.get_memory_settings("1")
+    assert settings == {
+        "mode": patient_simulation.PATIENT_MEMORY_MODE,
+        "max_turns": patient_simulation.PATIENT_MEMORY_MAX_TURNS,
+        "token_budget": patient_simulation.PATIENT_MEMORY_TOKEN_BUDGET,
+    }
+
+
+def test_summaries_use_low_temperature_models(patient_simulation):
+    assert patient_simulation.summary_model.temperature == 0
+    assert patient_simulation.gemini_summary_model.temperature == 0
+
+
+def test_turn_reads_the_persona_once(patient_simulation, monkeypatch):
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from langchain_core.messages import HumanMessage
+
+    reads = []
+
+    def load_text(case_id, name):
+        reads.append(name)
+        return "You are the patient."
+
+    with_case_cover(monkeypatch, patient_simulation, {})
+    monkeypatch.setattr(patient_simulation.case_repository, "load_text", load_text)
+    monkeypatch.setattr(patient_simulation, "model", FakeListChatModel(responses=["Since last week."]))
+    monkeypatch.setattr(patient_simulation, "_persona_chains", OrderedDict())
+
+    state = {"case_id": "1", "messages": [HumanMessage(content="When did it start?")]}
+    result = asyncio.run(patient_simulation.run_patient_turn(state, "openai"))
+
+    assert result["messages"][-1]["content"] == "Since last week."
+    assert reads == ["patient_prompts/patient_persona.txt"]
@@ -0,0 +1,81 @@
+import asyncio
+import json
+
+import pytest
+
+from utils.text_cleaner import JSONFieldStreamer
+
+PERSONA_REPLY = "```json\n" + json.dumps({
+    "id": "8f14e45f-ceea-467f-a0e6-1e5e1c6f0c9d",
+    "sender": "Patient",
+    "content": "It started two weeks ago.\nIt's \"really\" itchy 😣",
+    "step": "patient-history",
+    "timestamp": "2024-11-29T12:00:00Z",
+    "type": "text",
+}, indent=2) + "\n```"
+
+
+def chunks(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 5, 16, 1000])
+def test_streamer_yields_only_the_content_field(size):
+    streamer = JSONFieldStreamer("content")
+    streamed = "".join(streamer.feed(chunk) for chunk in chunks(PERSONA_REPLY, size))
+    assert streamed == "It started two weeks ago.\nIt's \"really\" itchy 😣"
+
+
+def test_streamer_decodes_ascii_escaped_unicode_split_across_chunks():
+    reply = json.dumps({"sender": "Patient", "content": "café 😣"})
+    streamer = JSONFieldStreamer("content")
+    assert "".join(streamer.feed(chunk) for chunk in chunks(reply, 3)) == "café 😣"
+
+
+def test_streamer_passes_plain_text_replies_through():
+    streamer = JSONFieldStreamer("content")
+    assert "".join(streamer.feed(chunk) for chunk in ["\n I've", " had it", " for a week."]) == "I've had it for a week."
+
+
+class FakePatientGraph:
+    """Stands in for the compiled patient graph: streams a reply token by token."""
+
+    def __init__(self, reply, token_size=4):
+        self.reply = reply
+        self.token_size = token_size
+
+    async def astream(self, state, config=None, stream_mode=None):
+        from langchain_core.messages import AIMessageChunk
+        for token in chunks(self.reply, self.token_size):
+            yield AIMessageChunk(content=token), {}
+
+    async def aget_state(self, config):
+        from langchain_core.messages import AIMessage
+
+        class Snapshot:
+            values = {"messages": [AIMessage(content=self.reply)], "memory_stats": None}
+        return Snapshot()
+
+
+def test_ask_stream_sends_answer_text_not_the_json_envelope(monkeypatch):
+    patient_simulation = pytest.importorskip("routers.case_player.patient_simulation")
+    recorded = []
+
+    async def add_history_question(student_id, case_id, question, answer):
+        recorded.append(answer)
+
+    monkeypatch.setattr(patient_simulation.session_manager, "add_history_question", add_history_question)
+
+    async def collect():
+        return [event async for event in patient_simulation.stream_patient_answer(
+            FakePatientGraph(PERSONA_REPLY), "TEST", "When did it start?", "1", "thread-1", "student-1"
+        )]
+
+    events = [json.loads(event[len("data: "):]) for event in asyncio.run(collect())]
+    tokens = [event["content"] for event in events if event["type"] == "token"]
+    done = events[-1]
+
+    assert "".join(tokens) == "It started two weeks ago.\nIt's \"really\" itchy 😣"
+    assert not any("{" in token or "```" in token or "sender" in token for token in tokens)
+    assert done["type"] == "done" and done["answer"] == "".join(tokens)
+    assert recorded == [done["answer"]]
@@ -0,0 +1,81 @@
+import asyncio
+import os
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+pdf_utils = pytest.importorskip("utils.pdf_utils")
+
+
+class BrokenExecutor(Executor):
+    """Stands in for a process pool whose worker was killed."""
+
+    def __init__(self):
+        self.shut_down = False
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        future.set_exception(BrokenProcessPool("A process in the process pool was terminated abruptly"))
+        return future
+
+    def shutdown(self, wait=True, **kwargs):
+        self.shut_down = True
+
+
+def test_cache_evicts_least_recently_used_texts_over_limit(tmp_path):
+    cache = pdf_utils.DocumentTextCache(base_dir=str(tmp_path), max_bytes=3500)
+    for i, digest in enumerate(["aa01", "bb02", "cc03"]):
+        cache.put(digest, "x" * 1000)
+        os.utime(cache._path(digest), (1000 + i, 1000 + i))
+    # Reading the oldest entry makes it the most recently used
+    assert cache.get("aa01") == "x" * 1000
+    os.utime(cache._path("aa01"), (2000, 2000))
+
+    cache.put("dd04", "y" * 1000)
+
+    assert cache.get("bb02") is None
+    assert cache.get("aa01") is not None
+    assert cache.get("dd04") is not None
+    stats = cache.stats()
+    assert stats["bytes"] <= 3500
+    assert stats["evictions"] >= 1
+
+
+def test_cache_skips_text_larger_than_limit(tmp_path):
+    cache = pdf_utils.DocumentTextCache(base_dir=str(tmp_path), max_bytes=100)
+    cache.put("aa01", "x" * 101)
+    assert cache.get("aa01") is None
+    assert cache.stats()["rejected"] == 1
+
+
+def test_store_tracks_size_without_listing_directory(tmp_path, monkeypatch):
+    cache = pdf_utils.DocumentTextCache(base_dir=str(tmp_path), max_bytes=10_000)
+    cache.put("aa01", "x" * 1000)
+    listings = []
+    original = cache._entries
+    monkeypatch.setattr(cache, "_entries", lambda: listings.append(1) or original())
+
+    cache.put("bb02", "x" * 500)
+    cache.put("aa01", "x" * 200)
+
+    assert listings == []
+    stats = cache.stats()
+    assert (stats["entries"], stats["bytes"]) == (2, 700)
+    assert listings == []
+
+
+def test_broken_pool_is_replaced_and_call_retried(monkeypatch):
+    broken = BrokenExecutor()
+    healthy = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(pdf_utils, "_executor", broken)
+    monkeypatch.setattr(pdf_utils, "ProcessPoolExecutor", lambda *args, **kwargs: healthy)
+
+    try:
+        result = asyncio.run(pdf_utils._run_in_pool(str.upper, "pdf text"))
+    finally:
+        healthy.shutdown()
+
+    assert result == "PDF TEXT"
+    assert broken.shut_down
+    assert pdf_utils._executor is healthy
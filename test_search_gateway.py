@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from utils import search_gateway
+from utils.search_gateway import FakeSearchProvider, SearchError, SearchGateway, search_status
+
+
+def make_gateway(provider, max_concurrency=None, timeout=1.0):
+    gateway = SearchGateway(timeout=timeout)
+    gateway.register_provider("fake", provider, max_concurrency=max_concurrency)
+    return gateway
+
+
+def test_search_many_reports_slow_and_failing_queries_without_dropping_the_rest():
+    def handler(params):
+        if params["query"] == "broken":
+            raise SearchError("HTTP 500")
+        return {"results": [params["query"]]}
+
+    class SlowOnOneQuery(FakeSearchProvider):
+        async def search(self, params):
+            if params["query"] == "slow":
+                await asyncio.sleep(1)
+            return await super().search(params)
+
+    gateway = make_gateway(SlowOnOneQuery(handler=handler), timeout=0.1)
+    queries = [{"query": "rash"}, {"query": "slow"}, {"query": "broken"}]
+    outcomes = asyncio.run(gateway.search_many("fake", queries))
+
+    assert [outcome["status"] for outcome in outcomes] == ["complete", "timeout", "error"]
+    assert outcomes[0]["response"] == {"results": ["rash"]}
+    assert [status["query"] for status in search_status(outcomes)] == ["rash", "slow", "broken"]
+    assert "response" not in search_status(outcomes)[0]
+    stats = gateway.stats()["providers"]["fake"]
+    assert stats["timeouts"] == 1 and stats["failures"] == 1 and stats["in_flight"] == 0
+
+
+def test_search_as_completed_yields_fastest_first():
+    class DelayByQuery(FakeSearchProvider):
+        async def search(self, params):
+            await asyncio.sleep(params["delay"])
+            return await super().search(params)
+
+    gateway = make_gateway(DelayByQuery(handler=lambda params: {"query": params["query"]}))
+    queries = [{"query": "slow", "delay": 0.1}, {"query": "fast", "delay": 0.0}]
+
+    async def collect():
+        return [outcome["query"] async for outcome in gateway.search_as_completed("fake", queries)]
+
+    assert asyncio.run(collect()) == ["fast", "slow"]
+
+
+def test_provider_concurrency_is_capped():
+    running = 0
+    peak = 0
+
+    class CountingProvider(FakeSearchProvider):
+        async def search(self, params):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            try:
+                return await super().search(params)
+            finally:
+                running -= 1
+
+    provider = CountingProvider(response={"results": []}, delay=0.02)
+    gateway = make_gateway(provider, max_concurrency=3)
+    outcomes = asyncio.run(gateway.search_many("fake", [{"query": str(i)} for i in range(9)]))
+
+    assert peak == 3
+    assert len(provider.calls) == 9
+    assert all(outcome["status"] == "complete" for outcome in outcomes)
+
+
+def test_concurrency_limit_belongs_to_the_gateway_it_was_registered_on():
+    capped = make_gateway(FakeSearchProvider(), max_concurrency=1)
+    default = make_gateway(FakeSearchProvider())
+    asyncio.run(capped.search("fake", {"query": "rash"}))
+    asyncio.run(default.search("fake", {"query": "rash"}))
+
+    assert capped.stats()["providers"]["fake"]["max_concurrency"] == 1
+    assert default.stats()["providers"]["fake"]["max_concurrency"] == 4
+    assert "fake" not in search_gateway.SEARCH_MAX_CONCURRENCY
+
+
+def test_unknown_provider_is_an_error():
+    with pytest.raises(SearchError):
+        asyncio.run(SearchGateway().search("nope", {"query": "rash"}))
@@ -0,0 +1,193 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from utils import session_store
+from utils.session_manager import SessionCache, SessionManager
+from utils.session_store import (
+    FileSessionStore, JournalSessionStore, create_session_store, make_op, student_lock,
+)
+
+
+def new_session(student_id="s1", case_id="1"):
+    return {
+        "student_id": student_id,
+        "case_id": case_id,
+        "current_step": "History Taking",
+        "interactions": {"history_taking": []},
+    }
+
+
+def history_turn(question):
+    return make_op("append", ["interactions", "history_taking"], {"question": question, "response": "..."})
+
+
+@pytest.fixture(params=["json", "journal", "sqlite"])
+def worker_caches(request, tmp_path):
+    """Two caches over the same directory, standing in for two gunicorn workers."""
+    return (
+        SessionCache(create_session_store(request.param, str(tmp_path))),
+        SessionCache(create_session_store(request.param, str(tmp_path))),
+    )
+
+
+def test_write_is_visible_to_other_worker_immediately(worker_caches):
+    worker_a, worker_b = worker_caches
+    worker_a.mutate("s1", [make_op("reset", [], new_session())])
+    assert worker_b.get("s1")["interactions"]["history_taking"] == []
+
+    worker_a.mutate("s1", [history_turn("Where does it hurt?")])
+    turns = worker_b.get("s1")["interactions"]["history_taking"]
+    assert [turn["question"] for turn in turns] == ["Where does it hurt?"]
+
+
+def test_concurrent_workers_do_not_lose_each_others_turns(worker_caches):
+    worker_a, worker_b = worker_caches
+    worker_a.mutate("s1", [make_op("reset", [], new_session())])
+    worker_b.get("s1")
+    worker_a.mutate("s1", [history_turn("first")])
+    # worker_b's cached copy is stale; its write must land on top of worker_a's
+    worker_b.mutate("s1", [history_turn("second")])
+
+    fresh = SessionCache(worker_a.store)
+    turns = fresh.get("s1")["interactions"]["history_taking"]
+    assert [turn["question"] for turn in turns] == ["first", "second"]
+
+
+@pytest.mark.parametrize("make_stores", [
+    lambda base_dir: (FileSessionStore(base_dir), FileSessionStore(base_dir)),
+    # worker_b compacts on every write, so the racing write also swaps the journal
+    lambda base_dir: (JournalSessionStore(base_dir), JournalSessionStore(base_dir, compact_after=1)),
+], ids=["json", "journal"])
+def test_write_landing_while_other_worker_reloads_is_not_lost(tmp_path, monkeypatch, make_stores):
+    store_a, store_b = make_stores(str(tmp_path))
+    worker_a, worker_b = SessionCache(store_a), SessionCache(store_b)
+    worker_a.mutate("s1", [make_op("reset", [], new_session())])
+    worker_b.mutate("s1", [history_turn("first")])
+
+    # worker_b writes again right after worker_a opens the stale session for reloading
+    armed = True
+    real_open = open
+
+    def racing_open(path, mode='r', *args, **kwargs):
+        nonlocal armed
+        handle = real_open(path, mode, *args, **kwargs)
+        if armed and mode in ('r', 'rb'):
+            armed = False
+            worker_b.mutate("s1", [history_turn("third")])
+        return handle
+
+    monkeypatch.setattr(session_store, "open", racing_open, raising=False)
+    worker_a.mutate("s1", [history_turn("second")])
+    monkeypatch.undo()
+
+    # Neither the stored session nor worker_a's cached copy may miss worker_b's turn
+    for cache in (SessionCache(worker_a.store), worker_a):
+        turns = cache.get("s1")["interactions"]["history_taking"]
+        assert sorted(turn["question"] for turn in turns) == ["first", "second", "third"]
+
+
+def test_returned_session_is_not_changed_by_later_mutations(tmp_path):
+    cache = SessionCache(create_session_store("json", str(tmp_path)))
+    before = cache.mutate("s1", [make_op("reset", [], new_session())])
+    after = cache.mutate("s1", [history_turn("Any fever?")])
+
+    assert before["interactions"]["history_taking"] == []
+    assert len(after["interactions"]["history_taking"]) == 1
+    assert cache.get("s1") is after
+
+
+def test_failed_write_leaves_cached_session_unchanged(tmp_path):
+    cache = SessionCache(create_session_store("json", str(tmp_path)))
+    cache.mutate("s1", [make_op("reset", [], new_session())])
+
+    def failing_write(*args):
+        raise OSError("disk full")
+
+    cache.store.write = failing_write
+    with pytest.raises(OSError):
+        cache.mutate("s1", [history_turn("Any cough?")])
+    assert cache.get("s1")["interactions"]["history_taking"] == []
+
+
+def test_student_lock_times_out_instead_of_blocking_forever(tmp_path):
+    fcntl = pytest.importorskip("fcntl")
+    with student_lock(str(tmp_path), "s1"):
+        pass
+    with open(os.path.join(tmp_path, ".locks", "s1.lock"), 'a') as other_worker:
+        fcntl.flock(other_worker.fileno(), fcntl.LOCK_EX)
+        started = time.monotonic()
+        with pytest.raises(TimeoutError):
+            with student_lock(str(tmp_path), "s1", timeout=0.2):
+                pass
+        assert time.monotonic() - started < 1
+
+
+def test_session_manager_waits_for_locks_off_the_event_loop(tmp_path):
+    fcntl = pytest.importorskip("fcntl")
+    manager = SessionManager(base_dir=str(tmp_path))
+
+    async def scenario():
+        await manager.create_or_load_session("s1", "1")
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        with open(os.path.join(tmp_path, ".locks", "s1.lock"), 'a') as other_worker:
+            fcntl.flock(other_worker.fileno(), fcntl.LOCK_EX)
+            ticking = asyncio.create_task(ticker())
+            write = asyncio.create_task(manager.add_history_question("s1", "1", "Any rash?", "No."))
+            await asyncio.sleep(0.3)
+            assert not write.done()
+            fcntl.flock(other_worker.fileno(), fcntl.LOCK_UN)
+        session = await write
+        ticking.cancel()
+        return ticks, session
+
+    ticks, session = asyncio.run(scenario())
+    assert ticks >= 10
+    assert session["interactions"]["history_taking"][-1]["question"] == "Any rash?"
+
+
+def test_failed_treatment_review_retry_keeps_earlier_complete_section(tmp_path):
+    manager = SessionManager(base_dir=str(tmp_path))
+
+    async def scenario():
+        await manager.create_or_load_session("s1", "1")
+        await manager.add_treatment_review("s1", {
+            "pre_treatment": {"status": "complete", "feedback": {"score": 8}},
+            "monitoring": {"status": "timeout", "error": "No response within 45s"},
+        })
+        await manager.add_treatment_review("s1", {
+            "pre_treatment": {"status": "timeout", "error": "No response within 45s"},
+            "monitoring": {"status": "complete", "feedback": {"score": 6}},
+        })
+        return await manager.get_session("s1")
+
+    sections = asyncio.run(scenario())["interactions"]["feedback"]["treatment_review"]["sections"]
+    assert sections == {
+        "pre_treatment": {"status": "complete", "feedback": {"score": 8}},
+        "monitoring": {"status": "complete", "feedback": {"score": 6}},
+    }
+
+
+def test_default_store_appends_turns_to_sessions_written_as_json(tmp_path):
+    legacy = FileSessionStore(str(tmp_path))
+    with legacy.lock("s1"):
+        legacy.write("s1", new_session(), [])
+    manager = SessionManager(base_dir=str(tmp_path))
+
+    async def scenario():
+        return await manager.add_history_question("s1", "1", "Any fever?", "No.")
+
+    session = asyncio.run(scenario())
+    assert isinstance(manager.cache.store, JournalSessionStore)
+    assert [turn["question"] for turn in session["interactions"]["history_taking"]] == ["Any fever?"]
+    # The turn went to the journal instead of a rewrite of the whole document
+    assert legacy.load("s1")[0]["interactions"]["history_taking"] == []
@@ -0,0 +1,54 @@
+import json
+import os
+
+from utils.session_store import JournalSessionStore, make_op, with_session_ops
+
+
+def write_ops(store, student_id, ops):
+    """Apply ops the way SessionCache does: load, fold, write."""
+    with store.lock(student_id):
+        data, _ = store.load(student_id)
+        data = with_session_ops(data or {}, ops)
+        store.write(student_id, data, ops)
+    return data
+
+
+def test_journal_is_compacted_into_snapshot(tmp_path):
+    store = JournalSessionStore(str(tmp_path), compact_after=5)
+    write_ops(store, "s1", [make_op("reset", [], {"case_id": "1", "turns": []})])
+    for i in range(23):
+        write_ops(store, "s1", [make_op("append", ["turns"], i)])
+
+    with open(store.path_for("s1"), 'rb') as f:
+        assert len(f.read().splitlines()) < 5
+    reloaded, _ = JournalSessionStore(str(tmp_path)).load("s1")
+    assert reloaded["turns"] == list(range(23))
+
+
+def test_interrupted_compaction_neither_loses_nor_repeats_records(tmp_path):
+    store = JournalSessionStore(str(tmp_path), compact_after=1000)
+    write_ops(store, "s1", [make_op("reset", [], {"turns": []})])
+    data = write_ops(store, "s1", [make_op("append", ["turns"], "a")])
+
+    # Crash after the snapshot was written but before the empty journal replaced the old one
+    journal_path = store.path_for("s1")
+    with open(journal_path + ".crashed", 'wb'):
+        pass
+    store._write_snapshot("s1", data, 0, os.stat(journal_path + ".crashed").st_ino)
+
+    restarted = JournalSessionStore(str(tmp_path))
+    assert restarted.load("s1")[0]["turns"] == ["a"]
+    write_ops(restarted, "s1", [make_op("append", ["turns"], "b")])
+    assert JournalSessionStore(str(tmp_path)).load("s1")[0]["turns"] == ["a", "b"]
+
+
+def test_list_sessions_includes_snapshot_only_and_legacy_sessions(tmp_path):
+    store = JournalSessionStore(str(tmp_path))
+    write_ops(store, "journal_student", [make_op("reset", [], {"case_id": "1"})])
+    store._write_snapshot("snapshot_student", {"case_id": "1"}, 0, None)
+    with open(os.path.join(tmp_path, "legacy_student_case_session.json"), 'w') as f:
+        json.dump({"case_id": "2"}, f)
+
+    listed = {summary["student_id"] for summary in store.list_sessions()}
+    assert listed == {"journal_student", "snapshot_student", "legacy_student"}
+    assert [summary["student_id"] for summary in store.list_sessions("2")] == ["legacy_student"]
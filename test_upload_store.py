@@ -0,0 +1,132 @@
+import asyncio
+import io
+import json
+
+import pytest
+
+upload_store = pytest.importorskip("utils.upload_store")
+ContentAddressedStore = upload_store.ContentAddressedStore
+
+
+class FakeUpload:
+    """Minimal UploadFile: async chunked reads over in-memory bytes."""
+
+    def __init__(self, filename, data, content_type="application/pdf"):
+        self.filename = filename
+        self.content_type = content_type
+        self._data = io.BytesIO(data)
+
+    async def read(self, size=-1):
+        return self._data.read(size)
+
+
+def new_store(tmp_path):
+    return ContentAddressedStore(str(tmp_path / "uploads"), state_dir=str(tmp_path / "state"))
+
+
+def save(store, filename, data):
+    return asyncio.run(store.save(FakeUpload(filename, data)))
+
+
+def test_unindexed_file_with_same_name_is_not_overwritten(tmp_path):
+    (tmp_path / "uploads").mkdir()
+    (tmp_path / "uploads" / "case.pdf").write_bytes(b"uploaded before the store existed")
+    store = new_store(tmp_path)
+
+    stored = save(store, "case.pdf", b"a different document")
+
+    assert stored["created"]
+    assert stored["filename"] == f"case_{stored['sha256'][:8]}.pdf"
+    assert (tmp_path / "uploads" / "case.pdf").read_bytes() == b"uploaded before the store existed"
+    assert (tmp_path / "uploads" / stored["filename"]).read_bytes() == b"a different document"
+
+
+def test_unindexed_file_with_same_bytes_is_adopted(tmp_path):
+    (tmp_path / "uploads").mkdir()
+    (tmp_path / "uploads" / "case.pdf").write_bytes(b"same document")
+    store = new_store(tmp_path)
+
+    stored = save(store, "case.pdf", b"same document")
+
+    assert stored["filename"] == "case.pdf"
+    assert not stored["created"]
+    assert store.lookup("case.pdf")["sha256"] == stored["sha256"]
+    # A failed request cleaning up only names it created leaves the earlier file alone
+    assert (tmp_path / "uploads" / "case.pdf").read_bytes() == b"same document"
+
+
+def test_same_upload_twice_reuses_name_and_blob(tmp_path):
+    store = new_store(tmp_path)
+    first = save(store, "case.pdf", b"doc")
+    second = save(store, "case.pdf", b"doc")
+
+    assert first["created"] and not second["created"]
+    assert second["deduplicated"]
+    assert second["filename"] == "case.pdf"
+
+
+def test_save_waits_for_index_lock_off_the_event_loop(tmp_path):
+    fcntl = pytest.importorskip("fcntl")
+    store = new_store(tmp_path)
+    save(store, "first.pdf", b"first")
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        with open(store.state_dir / "index.lock", 'a') as other_worker:
+            fcntl.flock(other_worker.fileno(), fcntl.LOCK_EX)
+            ticking = asyncio.create_task(ticker())
+            saving = asyncio.create_task(store.save(FakeUpload("second.pdf", b"second")))
+            await asyncio.sleep(0.3)
+            assert not saving.done()
+            fcntl.flock(other_worker.fileno(), fcntl.LOCK_UN)
+        stored = await saving
+        ticking.cancel()
+        return ticks, stored
+
+    ticks, stored = asyncio.run(scenario())
+    assert ticks >= 10
+    assert stored["filename"] == "second.pdf"
+
+
+def test_store_bookkeeping_is_not_served_with_uploads(tmp_path):
+    pytest.importorskip("httpx")
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from utils.static_files import PublicStaticFiles
+
+    store = new_store(tmp_path)
+    stored = save(store, "case.pdf", b"case document")
+    app = FastAPI()
+    app.mount("/files", PublicStaticFiles(directory=str(store.root)), name="files")
+    client = TestClient(app)
+
+    assert not [path.name for path in store.root.iterdir() if path.name.startswith(".")]
+    assert client.get("/files/case.pdf").content == b"case document"
+    # Anything dot-prefixed left by older versions or in-flight writes is refused too
+    (store.root / ".index.json").write_text(json.dumps({"case.pdf": {"sha256": stored["sha256"]}}))
+    assert client.get("/files/.index.json").status_code == 404
+    assert client.get("/files/.blobs/ab/secret.pdf").status_code == 404
+
+
+def test_legacy_index_and_blobs_are_moved_out_of_upload_dir(tmp_path):
+    root = tmp_path / "uploads"
+    blob = root / ".blobs" / "ab" / "abcd.pdf"
+    blob.parent.mkdir(parents=True)
+    blob.write_bytes(b"old document")
+    (root / "old.pdf").write_bytes(b"old document")
+    (root / ".index.json").write_text(json.dumps({"old.pdf": {"sha256": "abcd", "size": 12}}))
+    store = new_store(tmp_path)
+
+    save(store, "new.pdf", b"new document")
+
+    assert store.lookup("old.pdf")["sha256"] == "abcd"
+    assert store.lookup("new.pdf") is not None
+    assert (store.blob_dir / "ab" / "abcd.pdf").read_bytes() == b"old document"
+    assert sorted(path.name for path in root.iterdir()) == ["new.pdf", "old.pdf"]
@@ -28,7 +28,7 @@ async def get_authenticated_session_data(token: str) -> Tuple[str, Dict[str, Any
     student_id = user_response["user"]["id"]
     
     # Retrieve session data for the student
-    session_data = session_manager.get_session(student_id)
+    session_data = await session_manager.get_session(student_id)
     if not session_data:
         raise HTTPException(status_code=404, detail="No active session found")
     
@@ -0,0 +1,337 @@
+import asyncio
+import json
+import os
+import re
+import threading
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines: no cross-process claim
+    fcntl = None
+
+# Case builds run as background jobs; their records are shared by every worker
+CASE_BUILD_DIR = os.getenv("CASE_BUILD_DIR", "session-data/case-builds")
+# LLM-backed stages running at once in this worker, across all builds
+CASE_BUILD_LLM_CONCURRENCY = int(os.getenv("CASE_BUILD_LLM_CONCURRENCY", "4"))
+CASE_BUILD_STAGE_TIMEOUT = float(os.getenv("CASE_BUILD_STAGE_TIMEOUT", "300"))
+
+# Stage states: pending -> running -> complete | failed; stages whose dependencies failed are "blocked"
+# Job states: queued -> running -> complete | failed, or "interrupted" if the worker running it stopped
+StageFunc = Callable[[Dict[str, Any]], Awaitable[Optional[Dict[str, Any]]]]
+
+
+class BuildStage:
+    """
+    One node of the case build graph.
+
+    `run` receives the job record and returns the stage's artifact summary
+    (file paths and small metadata, never the generated content), which is
+    persisted with the job.
+    """
+
+    def __init__(self, name: str, run: StageFunc, depends_on: Sequence[str] = (), uses_llm: bool = True):
+        self.name = name
+        self.run = run
+        self.depends_on = tuple(depends_on)
+        self.uses_llm = uses_llm
+
+
+def _now() -> str:
+    return datetime.now().isoformat()
+
+
+class CaseBuildJobStore:
+    """One JSON file per job, replaced atomically on every update."""
+
+    def __init__(self, base_dir: str = CASE_BUILD_DIR):
+        self.base_dir = base_dir
+        self._lock = threading.Lock()
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.base_dir, f"{job_id}.json")
+
+    def load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        if not re.fullmatch(r"[0-9a-f]{32}", job_id):
+            return None
+        try:
+            with open(self._path(job_id), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save(self, job: Dict[str, Any]) -> None:
+        job["updated_at"] = _now()
+        with self._lock:
+            os.makedirs(self.base_dir, exist_ok=True)
+            tmp_path = self._path(job["job_id"]) + ".tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(job, f, indent=2)
+            os.replace(tmp_path, self._path(job["job_id"]))
+
+    def claim(self, job_id: str):
+        """
+        Take the cross-process run claim for a job, or return None if another
+        worker holds it. The claim is released when the returned file is closed
+        or the worker dies.
+        """
+        os.makedirs(os.path.join(self.base_dir, ".locks"), exist_ok=True)
+        lock_file = open(os.path.join(self.base_dir, ".locks", f"{job_id}.lock"), 'a')
+        if fcntl is None:
+            return lock_file
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return None
+        return lock_file
+
+
+class CaseBuildRunner:
+    """
+    Runs case builds as a dependency graph in the background.
+
+    Every stage whose dependencies are complete is started at once; LLM-backed
+    stages additionally share a per-worker budget of CASE_BUILD_LLM_CONCURRENCY
+    (calls made through the LLM gateway are also bound by its provider limits).
+    A failed stage blocks only its dependents, so independent branches still
+    finish. Stage status and artifacts are persisted after every transition,
+    and `resume` re-runs whatever is not complete. A build whose worker went
+    away (recycled by gunicorn's --max-requests, crashed) is reported as
+    "interrupted" by `load_job`.
+    """
+
+    def __init__(self, stages: Sequence[BuildStage], store: Optional[CaseBuildJobStore] = None,
+                 llm_concurrency: int = CASE_BUILD_LLM_CONCURRENCY,
+                 stage_timeout: float = CASE_BUILD_STAGE_TIMEOUT):
+        self.stages = {stage.name: stage for stage in stages}
+        self.order = self._topological_order(stages)
+        self.store = store or CaseBuildJobStore()
+        self.llm_concurrency = llm_concurrency
+        self.stage_timeout = stage_timeout
+        self._llm_slots: Optional[asyncio.Semaphore] = None
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    @staticmethod
+    def _topological_order(stages: Sequence[BuildStage]) -> List[str]:
+        names = {stage.name for stage in stages}
+        remaining = {stage.name: set(stage.depends_on) for stage in stages}
+        for name, deps in remaining.items():
+            unknown = deps - names
+            if unknown:
+                raise ValueError(f"Stage '{name}' depends on unknown stages: {sorted(unknown)}")
+        order = []
+        while remaining:
+            ready = sorted(name for name, deps in remaining.items() if not deps & remaining.keys())
+            if not ready:
+                raise ValueError(f"Case build stages contain a cycle: {sorted(remaining)}")
+            order.extend(ready)
+            for name in ready:
+                del remaining[name]
+        return order
+
+    def create_job(self, case_id: Any, inputs: Dict[str, Any], created_by: Optional[str] = None,
+                   stages: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        """
+        Create and persist a job record.
+
+        Args:
+            case_id: Case being built
+            inputs: Stage inputs (file name, department, ...), available to stages as job["inputs"]
+            created_by: User ID of the requester
+            stages: Subset of stages to run; their dependencies are added automatically
+
+        Returns:
+            The job record
+        """
+        selected = set(stages or self.order)
+        unknown = selected - self.stages.keys()
+        if unknown:
+            raise ValueError(f"Unknown case build stages: {sorted(unknown)}")
+        # Pull in dependencies of the requested stages
+        for name in reversed(self.order):
+            if name in selected:
+                selected.update(self.stages[name].depends_on)
+
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "case_id": case_id,
+            "status": "queued",
+            "created_by": created_by,
+            "created_at": _now(),
+            "inputs": inputs,
+            "stages": {
+                name: {
+                    "status": "pending",
+                    "depends_on": list(self.stages[name].depends_on),
+                    "attempts": 0,
+                }
+                for name in self.order if name in selected
+            },
+        }
+        self.store.save(job)
+        return job
+
+    def start(self, job: Dict[str, Any]) -> bool:
+        """Run the job in the background. Returns False if a worker is already running it."""
+        running = self._tasks.get(job["job_id"])
+        if running is not None and not running.done():
+            return False
+        claim = self.store.claim(job["job_id"])
+        if claim is None:
+            return False
+        task = asyncio.create_task(self._run(job, claim))
+        self._tasks[job["job_id"]] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job["job_id"], None))
+        return True
+
+    def load_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Load a job record, detecting builds whose worker stopped.
+
+        A job saved as "running" whose run claim is free is no longer run by
+        any worker; it is marked "interrupted" (its running stages failed) so
+        clients stop polling and can resume it.
+
+        Returns:
+            The job record, or None if the job does not exist
+        """
+        job = self.store.load(job_id)
+        if job is None or job["status"] != "running" or job_id in self._tasks or fcntl is None:
+            return job
+        claim = self.store.claim(job_id)
+        if claim is None:
+            return job
+        try:
+            # Re-read under the claim: the runner saves its final status before releasing it
+            job = self.store.load(job_id)
+            if job is not None and job["status"] == "running":
+                print(f"[CASE_BUILD] ⚠️ Build {job_id} lost its worker; marking it interrupted")
+                self._mark_interrupted(job)
+                self.store.save(job)
+        finally:
+            claim.close()
+        return job
+
+    @staticmethod
+    def _mark_interrupted(job: Dict[str, Any]) -> None:
+        job["status"] = "interrupted"
+        job["finished_at"] = _now()
+        for stage in job["stages"].values():
+            if stage["status"] == "running":
+                stage["status"] = "failed"
+                stage["error"] = "Build interrupted"
+
+    def resume(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Re-run every stage of a job that is not complete.
+
+        Returns:
+            The job record, or None if the job does not exist
+
+        Raises:
+            RuntimeError: If the job is still running in some worker
+        """
+        job = self.store.load(job_id)
+        if job is None:
+            return None
+        for stage in job["stages"].values():
+            if stage["status"] != "complete":
+                stage["status"] = "pending"
+                stage.pop("error", None)
+        if not self.start(job):
+            raise RuntimeError(f"Case build {job_id} is already running")
+        return job
+
+    async def _run(self, job: Dict[str, Any], claim) -> None:
+        if self._llm_slots is None:
+            self._llm_slots = asyncio.Semaphore(self.llm_concurrency)
+        job_id = job["job_id"]
+        running: Dict[asyncio.Task, str] = {}
+        try:
+            job["status"] = "running"
+            job["started_at"] = _now()
+            job.pop("finished_at", None)
+            self.store.save(job)
+            print(f"[CASE_BUILD] 🚀 Build {job_id} started for case {job['case_id']}: {list(job['stages'])}")
+
+            while True:
+                self._block_dependents(job)
+                for name in self._ready_stages(job):
+                    job["stages"][name]["status"] = "running"
+                    running[asyncio.create_task(self._run_stage(job, name))] = name
+                if not running:
+                    break
+                self.store.save(job)
+                done, _ = await asyncio.wait(running.keys(), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    running.pop(task)
+                self.store.save(job)
+
+            statuses = [stage["status"] for stage in job["stages"].values()]
+            job["status"] = "complete" if all(s == "complete" for s in statuses) else "failed"
+            job["finished_at"] = _now()
+            self.store.save(job)
+            print(f"[CASE_BUILD] {'✅' if job['status'] == 'complete' else '❌'} Build {job_id} {job['status']}: "
+                  f"{statuses.count('complete')}/{len(statuses)} stages complete")
+        except asyncio.CancelledError:
+            for task in running:
+                task.cancel()
+            self._mark_interrupted(job)
+            self.store.save(job)
+            raise
+        finally:
+            claim.close()
+
+    def _ready_stages(self, job: Dict[str, Any]) -> List[str]:
+        stages = job["stages"]
+        return [
+            name for name, stage in stages.items()
+            if stage["status"] == "pending"
+            and all(stages.get(dep, {"status": "complete"})["status"] == "complete" for dep in stage["depends_on"])
+        ]
+
+    def _block_dependents(self, job: Dict[str, Any]) -> None:
+        stages = job["stages"]
+        for name in self.order:
+            stage = stages.get(name)
+            if stage is None or stage["status"] != "pending":
+                continue
+            failed = [dep for dep in stage["depends_on"] if stages.get(dep, {}).get("status") in ("failed", "blocked")]
+            if failed:
+                stage["status"] = "blocked"
+                stage["error"] = f"Dependency failed: {', '.join(failed)}"
+
+    async def _run_stage(self, job: Dict[str, Any], name: str) -> None:
+        stage = job["stages"][name]
+        definition = self.stages[name]
+        stage["attempts"] += 1
+        try:
+            if definition.uses_llm:
+                async with self._llm_slots:
+                    stage["started_at"] = _now()
+                    artifact = await asyncio.wait_for(definition.run(job), timeout=self.stage_timeout)
+            else:
+                stage["started_at"] = _now()
+                artifact = await asyncio.wait_for(definition.run(job), timeout=self.stage_timeout)
+            stage["status"] = "complete"
+            stage["artifact"] = artifact or {}
+            stage.pop("error", None)
+            print(f"[CASE_BUILD] ✅ Stage '{name}' of build {job['job_id']} complete")
+        except asyncio.TimeoutError:
+            stage["status"] = "failed"
+            stage["error"] = f"Stage timed out after {self.stage_timeout:g}s"
+            print(f"[CASE_BUILD] ⏱️ Stage '{name}' of build {job['job_id']} timed out")
+        except Exception as e:
+            stage["status"] = "failed"
+            stage["error"] = getattr(e, "detail", None) or str(e) or type(e).__name__
+            print(f"[CASE_BUILD] ❌ Stage '{name}' of build {job['job_id']} failed: {stage['error']}")
+        finally:
+            stage["finished_at"] = _now()
+            started = stage.get("started_at")
+            if started:
+                stage["duration_seconds"] = round(
+                    (datetime.fromisoformat(stage["finished_at"]) - datetime.fromisoformat(started)).total_seconds(), 2
+                )
@@ -0,0 +1,141 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from copy import deepcopy
+from pathlib import Path
+from typing import Dict, Any, Optional, Tuple
+
+# Parsed case artifacts kept in memory per worker
+CASE_CACHE_MAX_ENTRIES = int(os.getenv("CASE_CACHE_MAX_ENTRIES", "256"))
+CASE_DATA_DIR = os.getenv("CASE_DATA_DIR", "case-data")
+
+# Stamp of a file on disk: (mtime_ns, size)
+FileStamp = Tuple[int, int]
+
+
+class CaseRepository:
+    """
+    Read-through LRU cache of case artifacts (test_exam_data.json, case_cover.json,
+    *_context.json, patient_prompts/patient_persona.txt, case_doc.txt, ...).
+
+    Every lookup stats the file and compares (mtime_ns, size) with the cached
+    copy, so edits made by the case creator routes, by another worker or by hand
+    are picked up on the next request without explicit invalidation; only the
+    open + parse is skipped on a hit.
+
+    JSON documents are shared between callers. Pass `copy=True` when the
+    result is going to be modified.
+    """
+
+    def __init__(self, base_dir: str = CASE_DATA_DIR, max_entries: int = CASE_CACHE_MAX_ENTRIES):
+        self.base_dir = base_dir
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str, str], Tuple[FileStamp, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def case_dir(self, case_id) -> Path:
+        return Path(self.base_dir) / f"case{case_id}"
+
+    def path_for(self, case_id, name: str) -> Path:
+        """Path of an artifact, e.g. path_for(3, "patient_prompts/patient_persona.txt")."""
+        return self.case_dir(case_id) / name
+
+    def exists(self, case_id, name: str) -> bool:
+        return self.path_for(case_id, name).is_file()
+
+    def _load(self, case_id, name: str, kind: str) -> Any:
+        path = self.path_for(case_id, name)
+        # Raises FileNotFoundError for a missing artifact, like open() did
+        stat = os.stat(path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        key = (str(case_id), name, kind)
+
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and cached[0] == stamp:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+            if cached is not None:
+                self.reloads += 1
+
+        with open(path, 'r', encoding='utf-8') as file:
+            value = json.load(file) if kind == "json" else file.read()
+
+        with self._lock:
+            self._entries[key] = (stamp, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def load_json(self, case_id, name: str, copy: bool = False) -> Any:
+        """
+        Return a parsed JSON artifact.
+
+        Raises:
+            FileNotFoundError: If the artifact does not exist
+            json.JSONDecodeError: If the artifact is not valid JSON
+        """
+        value = self._load(case_id, name, "json")
+        return deepcopy(value) if copy else value
+
+    def load_text(self, case_id, name: str) -> str:
+        """
+        Return a text artifact.
+
+        Raises:
+            FileNotFoundError: If the artifact does not exist
+        """
+        return self._load(case_id, name, "text")
+
+    def save_json(self, case_id, name: str, data: Any) -> None:
+        """Write a JSON artifact atomically and drop any cached copy."""
+        path = self.path_for(case_id, name)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, 'w') as file:
+                json.dump(data, file, indent=2)
+            os.replace(tmp_path, path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        self.invalidate(case_id, name)
+
+    def invalidate(self, case_id=None, name: Optional[str] = None) -> None:
+        """Drop cached artifacts for one file, one case, or everything."""
+        with self._lock:
+            keys = [
+                key for key in self._entries
+                if (case_id is None or key[0] == str(case_id)) and (name is None or key[1] == name)
+            ]
+            for key in keys:
+                del self._entries[key]
+            self.invalidations += len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and current occupancy."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "reloads": self.reloads,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+# Shared instance used by the case player routes
+case_repository = CaseRepository()
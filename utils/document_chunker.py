@@ -0,0 +1,74 @@
+import re
+from typing import List
+
+# Markdown headings start a new section; PDF text arrives as one whitespace-collapsed line
+HEADING_PATTERN = re.compile(r"^#{1,6}\s", re.MULTILINE)
+SENTENCE_END_PATTERN = re.compile(r"[.!?][\"')\]]?\s")
+
+
+def _split_sections(text: str) -> List[str]:
+    """Split at markdown headings, falling back to blank-line paragraphs."""
+    starts = [m.start() for m in HEADING_PATTERN.finditer(text)]
+    if starts:
+        bounds = sorted({0, *starts})
+        sections = [text[a:b] for a, b in zip(bounds, bounds[1:] + [len(text)])]
+    else:
+        sections = re.split(r"\n\s*\n", text)
+    return [section.strip() for section in sections if section.strip()]
+
+
+def _split_long(text: str, max_chars: int, overlap: int) -> List[str]:
+    """Cut text longer than max_chars at sentence ends (else whitespace), repeating `overlap` characters."""
+    pieces = []
+    start = 0
+    while len(text) - start > max_chars:
+        window = text[start:start + max_chars]
+        cut = max((m.end() for m in SENTENCE_END_PATTERN.finditer(window)), default=0)
+        if cut < max_chars // 2:
+            cut = window.rfind(" ") + 1
+        if cut < max_chars // 2:
+            cut = max_chars
+        pieces.append(window[:cut].strip())
+        next_start = start + cut - overlap
+        if overlap:
+            # Begin the overlap on a word boundary
+            space = text.find(" ", next_start, start + cut)
+            next_start = space + 1 if space != -1 else next_start
+        start = max(next_start, start + 1)
+    pieces.append(text[start:].strip())
+    return [piece for piece in pieces if piece]
+
+
+def split_document(text: str, max_chars: int, overlap: int = 0) -> List[str]:
+    """
+    Split a case document into chunks of at most max_chars characters.
+
+    Sections (markdown headings or paragraphs) are packed together while they
+    fit; a section longer than max_chars is cut at sentence ends, with
+    `overlap` characters repeated so a fact straddling the cut is seen whole
+    by at least one chunk.
+
+    Args:
+        text: Document text
+        max_chars: Upper bound on chunk length
+        overlap: Characters repeated between pieces of an oversized section
+
+    Returns:
+        List of chunks in document order
+    """
+    chunks: List[str] = []
+    current = ""
+    for section in _split_sections(text):
+        if len(section) > max_chars:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.extend(_split_long(section, max_chars, overlap))
+        elif current and len(current) + 2 + len(section) > max_chars:
+            chunks.append(current)
+            current = section
+        else:
+            current = f"{current}\n\n{section}" if current else section
+    if current:
+        chunks.append(current)
+    return chunks
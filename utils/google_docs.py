@@ -391,11 +391,9 @@ class GoogleDocsManager:
             ).execute()
             files = results.get('files', [])
 
-            # Get Supabase client and log auth info
+            # Shared Supabase client (this method runs off the event loop via asyncio.to_thread)
             supabase = get_supabase_client()
-            session = supabase.auth.get_session()
             
-            # Query will automatically include auth headers
             query = supabase.table("documents")\
                 .select("google_doc_id, status, approved_by, approved_at, approved_by_email, approved_by_username, department_id")
             
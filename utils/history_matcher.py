@@ -0,0 +1,271 @@
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+# Local pre-matching of student history questions against a case's expected questions.
+# Clear matches and clear non-matches are settled here; only the rest goes to Gemini.
+HISTORY_PREMATCH_ENABLED = os.getenv("HISTORY_PREMATCH_ENABLED", "true").lower() == "true"
+# Student question similarity at or above this covers the expected question
+HISTORY_PREMATCH_ACCEPT = float(os.getenv("HISTORY_PREMATCH_ACCEPT", "0.6"))
+# Question and reply similarity, by words and by topic (CONCEPTS), all below this leaves
+# the expected question uncovered without asking Gemini; 0 turns local rejection off.
+# Calibrated against the paraphrase pairs in test_history_matcher.py: the lowest paraphrase
+# scores about 0.2, while about 95% of unrelated question pairs score below 0.12.
+HISTORY_PREMATCH_REJECT = float(os.getenv("HISTORY_PREMATCH_REJECT", "0.12"))
+HISTORY_MATCHER_CACHE_MAX_ENTRIES = int(os.getenv("HISTORY_MATCHER_CACHE_MAX_ENTRIES", "128"))
+
+# Words that say nothing about which line of inquiry a question belongs to
+STOPWORDS = frozenset("""
+a about after all also am an and any anything are as at be been before being but by can could
+did do does doing for from had has have having he her him his how i if in into is it its just
+like me my no not of on or other our she so some than that the their them then there these they
+this to up was we were what when where which while who why will with would yes you your
+tell please ever feel describe
+""".split())
+
+# History-taking topics students ask about in many different words. Two texts naming
+# the same topic are related even without a shared word ("Do you take cigarettes?" and
+# "Do you smoke or use tobacco?"), so the expected question is escalated, not rejected.
+# Topics never settle coverage on their own: "Do you drink coffee?" names alcohol too.
+CONCEPTS = {
+    "onset": "start started starting began begin beginning first appear appeared appearing onset "
+             "long since ago duration noticed notice",
+    "smoking": "smoke smoker smokes smoking smoked cigarette cigarettes cigar cigars tobacco vape vaping "
+               "vapes nicotine",
+    "alcohol": "alcohol alcoholic drink drinks drinking drank beer beers wine spirits booze units",
+    "recreational_drugs": "recreational cannabis marijuana weed cocaine heroin illicit",
+    "medication": "medication medications medicine medicines meds pills pill tablets tablet prescription "
+                  "prescriptions prescribed drugs dose treatment treatments cream creams ointment ointments "
+                  "supplements",
+    "allergy": "allergy allergies allergic reaction reactions",
+    "family": "family parents parent mother mum mom father dad siblings sibling brother brothers sister "
+              "sisters relatives relative children grandparents household home",
+    "occupation": "occupation job jobs work working works employed employment career profession",
+    "travel": "travel travelled traveled traveling travelling abroad overseas trip holiday vacation "
+              "country",
+    "fever": "fever fevers temperature temperatures feverish chills shivers sweats",
+    "weight": "weight kilos kg pounds lbs thinner heavier",
+    "surgery": "surgery surgeries operation operations operated procedure procedures",
+    "location": "location located site spread spreading area areas body arms legs face trunk "
+                "elbows knees hands feet",
+    "radiation": "radiate radiates radiating radiation spread spreads spreading arm jaw neck back shoulder",
+    "exertion": "exertion exert exercise exercising walk walking climb climbing stairs uphill running "
+                "effort activity",
+    "modifying": "better worse worsen worsens worsening improve improves relieve relieves aggravate "
+                 "aggravates triggers trigger helps help eases",
+    "sexual": "sexual sexually partner partners intercourse sex condoms",
+    "itch": "itch itchy itches itching itched scratch scratching pruritus",
+    "pain": "pain painful hurt hurts hurting sore ache aches aching tender",
+    "sleep": "sleep sleeping asleep insomnia",
+    "appetite": "appetite eating hungry",
+    "pregnancy": "pregnant pregnancy period periods menstrual contraception",
+    "past_illness": "previous past illnesses conditions diagnosed hospital",
+}
+
+
+def _concepts_by_word() -> Dict[str, List[str]]:
+    """Word form -> the CONCEPTS groups it belongs to ("spread" names a location and radiation)."""
+    index: Dict[str, List[str]] = {}
+    for concept, words in CONCEPTS.items():
+        for word in words.split():
+            index.setdefault(word, []).append(concept)
+    return index
+
+
+_CONCEPTS_OF = _concepts_by_word()
+_CONCEPT_COLUMNS = {concept: i for i, concept in enumerate(sorted(CONCEPTS))}
+
+QuestionKey = Tuple[str, str]
+
+
+def _tokens(text: str) -> List[str]:
+    return [word for word in re.findall(r"[a-z0-9]+", text.lower()) if word not in STOPWORDS]
+
+
+def _features(text: str) -> Counter:
+    """Word unigrams plus character trigrams, so 'smoke' and 'smoking' still overlap."""
+    features = Counter()
+    for word in _tokens(text):
+        features["w:" + word] += 1
+        padded = f"#{word}#"
+        for i in range(len(padded) - 2):
+            features["c:" + padded[i:i + 3]] += 0.5
+    return features
+
+
+def _concept_vectors(texts: Sequence[str]) -> np.ndarray:
+    """L2-normalized counts of the CONCEPTS topics each text names (zero rows for none)."""
+    matrix = np.zeros((len(texts), len(_CONCEPT_COLUMNS)), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word in _tokens(text):
+            for concept in _CONCEPTS_OF.get(word, ()):
+                matrix[row, _CONCEPT_COLUMNS[concept]] += 1
+    norms = np.linalg.norm(matrix, axis=1)
+    norms[norms == 0] = 1.0
+    return matrix / norms[:, None]
+
+
+class HistoryPreMatcher:
+    """
+    TF-IDF vectors of one case's expected questions, built once per case.
+
+    Student questions and patient replies are projected onto the same
+    vocabulary and scored against every expected question with one matrix
+    product. Out-of-vocabulary features still count towards a text's norm,
+    so a long, unrelated question is not inflated into a match. A second,
+    topic-level score (CONCEPTS) only decides what is related enough to
+    escalate; coverage is accepted on word similarity alone.
+    """
+
+    def __init__(self, expected_questions: Sequence[Dict[str, str]],
+                 accept: float = HISTORY_PREMATCH_ACCEPT, reject: float = HISTORY_PREMATCH_REJECT):
+        self.accept = accept
+        self.reject = reject
+        self.keys: List[QuestionKey] = [(q["question"], q["domain"]) for q in expected_questions]
+        self.index: Dict[QuestionKey, int] = {key: i for i, key in enumerate(self.keys)}
+
+        documents = [_features(q["question"]) for q in expected_questions]
+        document_frequency = Counter()
+        for features in documents:
+            document_frequency.update(features.keys())
+        self.vocabulary = {feature: i for i, feature in enumerate(sorted(document_frequency))}
+        total = len(documents)
+        self.idf = np.array(
+            [math.log((1 + total) / (1 + document_frequency[f])) + 1 for f in sorted(document_frequency)],
+            dtype=np.float32,
+        )
+        self.max_idf = float(self.idf.max()) if len(self.idf) else 1.0
+        self.matrix = self._vectorize(documents)
+        self.concept_matrix = _concept_vectors([q["question"] for q in expected_questions])
+
+    def _vectorize(self, feature_counts: Sequence[Counter]) -> np.ndarray:
+        """L2-normalized TF-IDF rows over the case vocabulary."""
+        matrix = np.zeros((len(feature_counts), len(self.vocabulary)), dtype=np.float32)
+        norms = np.zeros(len(feature_counts), dtype=np.float32)
+        for row, features in enumerate(feature_counts):
+            oov = 0.0
+            for feature, count in features.items():
+                column = self.vocabulary.get(feature)
+                if column is None:
+                    oov += (count * self.max_idf) ** 2
+                else:
+                    matrix[row, column] = count * self.idf[column]
+            norms[row] = math.sqrt(float(np.dot(matrix[row], matrix[row])) + oov)
+        norms[norms == 0] = 1.0
+        return matrix / norms[:, None]
+
+    def _question_rows(self, questions: Sequence[Dict[str, str]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Rows of the expected-question word and topic matrices; questions not in
+        the case file are vectorized on the fly.
+        """
+        rows = [self.index.get((q["question"], q["domain"])) for q in questions]
+        if all(row is not None for row in rows):
+            return self.matrix[rows], self.concept_matrix[rows]
+        extra = [i for i, row in enumerate(rows) if row is None]
+        words = np.zeros((len(questions), self.matrix.shape[1]), dtype=np.float32)
+        topics = np.zeros((len(questions), self.concept_matrix.shape[1]), dtype=np.float32)
+        for i, row in enumerate(rows):
+            if row is not None:
+                words[i] = self.matrix[row]
+                topics[i] = self.concept_matrix[row]
+        words[extra] = self._vectorize([_features(questions[i]["question"]) for i in extra])
+        topics[extra] = _concept_vectors([questions[i]["question"] for i in extra])
+        return words, topics
+
+    def classify(self, interactions: Sequence[Dict[str, str]],
+                 questions: Sequence[Dict[str, str]]) -> Dict[str, Any]:
+        """
+        Split expected questions into locally covered, locally uncovered and ambiguous.
+
+        A question is covered when a student question's word similarity
+        reaches `accept`, and uncovered when no student question or patient
+        reply reaches `reject` by word or topic similarity. With `reject` at 0
+        nothing is locally uncovered and every interaction is relevant to every
+        ambiguous question.
+
+        Args:
+            interactions: Dicts with student_question and patient_reply
+            questions: Expected questions (question, domain) still to be checked
+
+        Returns:
+            Dict with "covered", "uncovered" and "ambiguous" question lists (input
+            order preserved), "relevant_interactions", the indexes of the
+            interactions that scored above the reject threshold for an ambiguous
+            question, and "best_interaction", the best-scoring interaction index
+            per covered or ambiguous question position
+        """
+        result = {"covered": [], "uncovered": [], "ambiguous": [], "relevant_interactions": set(),
+                  "best_interaction": {}}
+        if not questions:
+            return result
+        if not interactions:
+            result["uncovered"] = list(questions)
+            return result
+
+        expected, expected_topics = self._question_rows(questions)
+        asked_text = [i.get("student_question", "") for i in interactions]
+        reply_text = [i.get("patient_reply", "") for i in interactions]
+        # (interactions x questions) cosine scores
+        question_scores = self._vectorize([_features(text) for text in asked_text]) @ expected.T
+        reply_scores = self._vectorize([_features(text) for text in reply_text]) @ expected.T
+        related = np.maximum.reduce([
+            question_scores,
+            reply_scores,
+            _concept_vectors(asked_text) @ expected_topics.T,
+            _concept_vectors(reply_text) @ expected_topics.T,
+        ])
+        best_question = question_scores.max(axis=0)
+        best_any = related.max(axis=0)
+        best_index = related.argmax(axis=0)
+
+        for i, question in enumerate(questions):
+            if best_question[i] >= self.accept:
+                result["covered"].append(question)
+                result["best_interaction"][i] = int(question_scores[:, i].argmax())
+            elif self.reject > 0 and best_any[i] < self.reject:
+                result["uncovered"].append(question)
+            else:
+                result["ambiguous"].append(question)
+                result["best_interaction"][i] = int(best_index[i])
+                relevant = np.nonzero(related[:, i] >= self.reject)[0]
+                result["relevant_interactions"].update(int(j) for j in relevant)
+        return result
+
+
+_matchers: "OrderedDict[str, Tuple[Tuple[QuestionKey, ...], HistoryPreMatcher]]" = OrderedDict()
+_matchers_lock = threading.Lock()
+
+
+def get_history_matcher(case_id, expected_questions: Sequence[Dict[str, str]]) -> HistoryPreMatcher:
+    """
+    Return the pre-matcher for a case, rebuilding it when the expected questions change.
+
+    Args:
+        case_id: Case identifier
+        expected_questions: The case's expected_questions_with_domains
+
+    Returns:
+        HistoryPreMatcher for the case
+    """
+    keys = tuple((q["question"], q["domain"]) for q in expected_questions)
+    with _matchers_lock:
+        cached = _matchers.get(str(case_id))
+        if cached is not None and cached[0] == keys:
+            _matchers.move_to_end(str(case_id))
+            return cached[1]
+
+    matcher = HistoryPreMatcher(expected_questions)
+    print(f"[HISTORY_MATCHER] 🧮 Built pre-matcher for case {case_id}: "
+          f"{len(keys)} questions, {len(matcher.vocabulary)} features")
+    with _matchers_lock:
+        _matchers[str(case_id)] = (keys, matcher)
+        _matchers.move_to_end(str(case_id))
+        while len(_matchers) > HISTORY_MATCHER_CACHE_MAX_ENTRIES:
+            _matchers.popitem(last=False)
+    return matcher
@@ -0,0 +1,423 @@
+import asyncio
+import copy
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from dotenv import load_dotenv
+
+from utils.llm_response_cache import LLMResponseCache, llm_response_cache
+
+# Load environment variables
+load_dotenv()
+
+# Every feedback route goes through this gateway instead of wrapping the
+# synchronous SDKs in asyncio.to_thread: calls are native async (and therefore
+# cancellable), each provider has one long-lived client and its own concurrency
+# cap, and every call gets a deadline plus jittered retries on transient errors.
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "90"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "0.5"))
+LLM_MAX_CONCURRENCY = {
+    "gemini": int(os.getenv("LLM_MAX_CONCURRENCY_GEMINI", "16")),
+    "openai": int(os.getenv("LLM_MAX_CONCURRENCY_OPENAI", "16")),
+}
+
+# Gemini-style request contents: a prompt string or [{"parts": [{"text": ...}, ...]}, ...]
+Contents = Union[str, List[Dict[str, Any]]]
+
+# Transient provider errors (google.api_core / openai exception class names)
+RETRYABLE_ERRORS = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError",
+    "DeadlineExceeded", "GatewayTimeout", "RateLimitError", "APITimeoutError", "APIConnectionError",
+    "LLMTimeoutError",
+}
+
+
+class LLMError(Exception):
+    """Raised when a model call fails after all retries."""
+
+
+class LLMTimeoutError(LLMError):
+    """Raised when a single model call exceeds its deadline."""
+
+
+class LLMResponse:
+    """Provider-independent model response; `.text` matches the Gemini SDK response."""
+
+    def __init__(self, text: str, provider: str, model: str, raw: Any = None,
+                 usage: Optional[Dict[str, int]] = None):
+        self.text = text
+        self.provider = provider
+        self.model = model
+        self.raw = raw
+        self.usage = usage or {}
+        self.latency = 0.0
+        self.attempts = 1
+        self.cached = False
+        self.coalesced = False
+
+    def shared_copy(self) -> "LLMResponse":
+        """Copy handed to a request that joined another request's in-flight call."""
+        response = copy.copy(self)
+        response.coalesced = True
+        return response
+
+
+def contents_to_text(contents: Contents) -> str:
+    """Flatten Gemini-style contents into one prompt string."""
+    if isinstance(contents, str):
+        return contents
+    texts = []
+    for content in contents:
+        for part in content.get("parts", []):
+            if isinstance(part, str):
+                texts.append(part)
+            elif "text" in part:
+                texts.append(part["text"])
+    return "".join(texts)
+
+
+class GeminiProvider:
+    """google-generativeai, using the SDK's native async call and one model object per model name."""
+
+    name = "gemini"
+
+    def __init__(self, api_key: Optional[str] = None):
+        self.api_key = api_key or os.getenv("GOOGLE_API_KEY")
+        self._models: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._genai = None
+
+    def _model(self, model_name: str):
+        with self._lock:
+            if self._genai is None:
+                import google.generativeai as genai
+                genai.configure(api_key=self.api_key)
+                self._genai = genai
+            if model_name not in self._models:
+                self._models[model_name] = self._genai.GenerativeModel(model_name)
+            return self._models[model_name]
+
+    async def generate(self, model_name: str, contents: Contents,
+                       generation_config: Optional[Dict[str, Any]] = None) -> LLMResponse:
+        response = await self._model(model_name).generate_content_async(
+            contents=contents, generation_config=generation_config
+        )
+        usage = {}
+        metadata = getattr(response, "usage_metadata", None)
+        if metadata is not None:
+            usage = {
+                "prompt_tokens": getattr(metadata, "prompt_token_count", 0),
+                "completion_tokens": getattr(metadata, "candidates_token_count", 0),
+            }
+        return LLMResponse(response.text, self.name, model_name, raw=response, usage=usage)
+
+
+class OpenAIProvider:
+    """OpenAI chat completions through one shared AsyncOpenAI client."""
+
+    name = "openai"
+
+    def __init__(self, api_key: Optional[str] = None):
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _get_client(self):
+        with self._lock:
+            if self._client is None:
+                from openai import AsyncOpenAI
+                self._client = AsyncOpenAI(api_key=self.api_key, max_retries=0)
+            return self._client
+
+    async def generate(self, model_name: str, contents: Contents,
+                       generation_config: Optional[Dict[str, Any]] = None) -> LLMResponse:
+        config = generation_config or {}
+        kwargs: Dict[str, Any] = {}
+        if "temperature" in config:
+            kwargs["temperature"] = config["temperature"]
+        if "top_p" in config:
+            kwargs["top_p"] = config["top_p"]
+        if "max_output_tokens" in config:
+            kwargs["max_tokens"] = config["max_output_tokens"]
+        response = await self._get_client().chat.completions.create(
+            model=model_name,
+            messages=[{"role": "user", "content": contents_to_text(contents)}],
+            **kwargs
+        )
+        usage = {}
+        if response.usage is not None:
+            usage = {
+                "prompt_tokens": response.usage.prompt_tokens,
+                "completion_tokens": response.usage.completion_tokens,
+            }
+        return LLMResponse(response.choices[0].message.content or "", self.name, model_name,
+                           raw=response, usage=usage)
+
+
+class FakeLLMProvider:
+    """
+    Deterministic provider for tests and load runs. Register it in place of a
+    real provider with `llm_gateway.register_provider("gemini", FakeLLMProvider(...))`.
+
+    Args:
+        responses: Texts returned in order (the last one repeats)
+        handler: Optional callable(model_name, prompt_text) -> text, used instead of `responses`
+        delay: Simulated latency in seconds
+    """
+
+    def __init__(self, responses: Optional[List[str]] = None,
+                 handler: Optional[Callable[[str, str], str]] = None, delay: float = 0.0,
+                 name: str = "fake"):
+        self.responses = list(responses or ["{}"])
+        self.handler = handler
+        self.delay = delay
+        self.name = name
+        self.calls: List[Dict[str, Any]] = []
+
+    async def generate(self, model_name: str, contents: Contents,
+                       generation_config: Optional[Dict[str, Any]] = None) -> LLMResponse:
+        prompt = contents_to_text(contents)
+        self.calls.append({"model": model_name, "prompt": prompt, "generation_config": generation_config})
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.handler is not None:
+            text = self.handler(model_name, prompt)
+        else:
+            text = self.responses[min(len(self.calls), len(self.responses)) - 1]
+        return LLMResponse(text, self.name, model_name)
+
+
+class GatewayModel:
+    """
+    Model handle with the Gemini SDK's call shape, so route code keeps building
+    the same `content` payload: `await model.generate_content(**content)`.
+    `route` labels the calls in the gateway's per-route metrics.
+    """
+
+    def __init__(self, gateway: "LLMGateway", model_name: str, provider: str, route: Optional[str] = None):
+        self._gateway = gateway
+        self.provider = provider
+        self.route = route
+        self.name = model_name
+        # Same form the Gemini SDK reports (e.g. "models/gemini-2.0-flash")
+        self.model_name = model_name if model_name.startswith("models/") or provider != "gemini" else f"models/{model_name}"
+
+    async def generate_content(self, contents: Contents, generation_config: Optional[Dict[str, Any]] = None,
+                               timeout: Optional[float] = None, cache: bool = False,
+                               cache_validator: Optional[Callable[[str], bool]] = None,
+                               coalesce: bool = False) -> LLMResponse:
+        return await self._gateway.generate(contents, provider=self.provider, model=self.name,
+                                            generation_config=generation_config, timeout=timeout,
+                                            cache=cache, cache_validator=cache_validator,
+                                            coalesce=coalesce, route=self.route)
+
+
+class LLMGateway:
+    """Routes model calls to providers with per-provider concurrency caps, deadlines and retries."""
+
+    def __init__(self, timeout: float = LLM_TIMEOUT_SECONDS, max_retries: int = LLM_MAX_RETRIES,
+                 retry_base: float = LLM_RETRY_BASE_SECONDS,
+                 response_cache: Optional[LLMResponseCache] = llm_response_cache):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.response_cache = response_cache
+        self._providers: Dict[str, Any] = {
+            "gemini": GeminiProvider(),
+            "openai": OpenAIProvider(),
+        }
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._route_stats: Dict[str, Dict[str, int]] = {}
+        # Calls currently running upstream, by request hash (single-flight)
+        self._inflight: Dict[str, "asyncio.Future[LLMResponse]"] = {}
+
+    def register_provider(self, name: str, provider: Any, max_concurrency: Optional[int] = None) -> None:
+        """Install or replace a provider (e.g. a FakeLLMProvider in tests)."""
+        with self._lock:
+            self._providers[name] = provider
+            if max_concurrency is not None:
+                LLM_MAX_CONCURRENCY[name] = max_concurrency
+            self._semaphores.pop(name, None)
+
+    def model(self, model_name: str, provider: str = "gemini", route: Optional[str] = None) -> GatewayModel:
+        return GatewayModel(self, model_name, provider, route)
+
+    def _semaphore(self, provider: str) -> asyncio.Semaphore:
+        with self._lock:
+            if provider not in self._semaphores:
+                self._semaphores[provider] = asyncio.Semaphore(LLM_MAX_CONCURRENCY.get(provider, 8))
+            return self._semaphores[provider]
+
+    def _record(self, provider: str, **counters: float) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(provider, {
+                "calls": 0, "failures": 0, "retries": 0, "timeouts": 0, "in_flight": 0, "total_latency": 0.0,
+            })
+            for counter, value in counters.items():
+                stats[counter] += value
+
+    def _record_route(self, route: Optional[str], **counters: int) -> None:
+        with self._lock:
+            stats = self._route_stats.setdefault(route or "unlabelled", {"requests": 0, "executed": 0, "coalesced": 0})
+            for counter, value in counters.items():
+                stats[counter] += value
+
+    async def generate(self, contents: Contents, provider: str = "gemini", model: str = "gemini-2.0-flash",
+                       generation_config: Optional[Dict[str, Any]] = None,
+                       timeout: Optional[float] = None, cache: bool = False,
+                       cache_validator: Optional[Callable[[str], bool]] = None,
+                       coalesce: bool = False, route: Optional[str] = None) -> LLMResponse:
+        """
+        Call a model, optionally through the content-addressed response cache.
+
+        Identical concurrent calls that opt in to `coalesce` (implied by `cache`)
+        share one upstream call: the first caller runs it, later callers with the
+        same request hash wait for its result instead of sending their own.
+
+        Args:
+            contents: Prompt string or Gemini-style contents list
+            provider: Registered provider name ("gemini", "openai", ...)
+            model: Provider model name
+            generation_config: temperature / top_p / top_k / max_output_tokens
+            timeout: Per-attempt deadline in seconds (defaults to LLM_TIMEOUT_SECONDS)
+            cache: Opt in to the response cache; only for calls whose prompt fully
+                determines an acceptable answer (no per-student variety expected)
+            cache_validator: Only responses for which this returns True are stored
+                (e.g. is_json_response), so a malformed answer is never replayed
+            coalesce: Share one upstream call between identical in-flight requests
+            route: Label for the per-route request/coalescing metrics
+
+        Returns:
+            LLMResponse with `.text`
+
+        Raises:
+            LLMTimeoutError: If the last attempt timed out
+            LLMError: If the provider is unknown
+            Exception: The provider's error if it is not transient or retries ran out
+        """
+        backend = self._providers.get(provider)
+        if backend is None:
+            raise LLMError(f"Unknown LLM provider: {provider}")
+        deadline = self.timeout if timeout is None else timeout
+
+        if not (cache or coalesce):
+            self._record_route(route, requests=1, executed=1)
+            return await self._call(backend, provider, model, contents, generation_config, deadline)
+
+        key = LLMResponseCache.key_for(provider, model, contents, generation_config)
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self._record_route(route, requests=1, coalesced=1)
+            # shield: a follower that is cancelled must not cancel the shared call
+            response = await asyncio.shield(inflight)
+            return response.shared_copy()
+
+        self._record_route(route, requests=1, executed=1)
+        task = asyncio.ensure_future(
+            self._generate_once(backend, provider, model, contents, generation_config, deadline,
+                                key if cache else None, cache_validator)
+        )
+        self._inflight[key] = task
+        task.add_done_callback(lambda done: self._finish_inflight(key, done))
+        return await asyncio.shield(task)
+
+    def _finish_inflight(self, key: str, task: "asyncio.Future[LLMResponse]") -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved in case every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    async def _generate_once(self, backend: Any, provider: str, model: str, contents: Contents,
+                             generation_config: Optional[Dict[str, Any]], deadline: float,
+                             cache_key: Optional[str],
+                             cache_validator: Optional[Callable[[str], bool]]) -> LLMResponse:
+        if cache_key is not None and (self.response_cache is None or not self.response_cache.enabled):
+            cache_key = None
+        if cache_key is not None:
+            try:
+                text = await asyncio.to_thread(self.response_cache.get, cache_key)
+            except Exception as e:
+                # The cache is an optimization; a broken store must not fail the request
+                print(f"[LLM_GATEWAY] ⚠️ Response cache lookup failed: {str(e)}")
+                text = None
+            if text is not None:
+                response = LLMResponse(text, provider, model)
+                response.cached = True
+                return response
+
+        response = await self._call(backend, provider, model, contents, generation_config, deadline)
+        if cache_key is not None and (cache_validator is None or cache_validator(response.text)):
+            try:
+                await asyncio.to_thread(self.response_cache.put, cache_key, provider, model, response.text)
+            except Exception as e:
+                print(f"[LLM_GATEWAY] ⚠️ Response cache store failed: {str(e)}")
+        return response
+
+    async def _call(self, backend: Any, provider: str, model: str, contents: Contents,
+                    generation_config: Optional[Dict[str, Any]], deadline: float) -> LLMResponse:
+        attempt = 0
+        while True:
+            attempt += 1
+            started = time.monotonic()
+            try:
+                async with self._semaphore(provider):
+                    self._record(provider, calls=1, in_flight=1)
+                    try:
+                        response = await asyncio.wait_for(
+                            backend.generate(model, contents, generation_config), timeout=deadline
+                        )
+                    except asyncio.TimeoutError:
+                        self._record(provider, timeouts=1)
+                        raise LLMTimeoutError(f"{provider}/{model} call timed out after {deadline} seconds")
+                    finally:
+                        self._record(provider, in_flight=-1, total_latency=time.monotonic() - started)
+                response.latency = time.monotonic() - started
+                response.attempts = attempt
+                return response
+            except Exception as e:
+                retryable = type(e).__name__ in RETRYABLE_ERRORS
+                if not retryable or attempt > self.max_retries:
+                    self._record(provider, failures=1)
+                    raise
+                # Exponential backoff with full jitter
+                backoff = random.uniform(0, self.retry_base * (2 ** (attempt - 1)))
+                self._record(provider, retries=1)
+                print(f"[LLM_GATEWAY] 🔁 {provider}/{model} attempt {attempt} failed ({type(e).__name__}), "
+                      f"retrying in {backoff:.2f}s")
+                await asyncio.sleep(backoff)
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-provider call counters, per-route coalescing ratios and response cache counters."""
+        with self._lock:
+            providers = {}
+            for provider, stats in self._stats.items():
+                calls = stats["calls"]
+                providers[provider] = {
+                    "calls": int(calls),
+                    "failures": int(stats["failures"]),
+                    "retries": int(stats["retries"]),
+                    "timeouts": int(stats["timeouts"]),
+                    "in_flight": int(stats["in_flight"]),
+                    "avg_latency_seconds": round(stats["total_latency"] / calls, 3) if calls else 0.0,
+                    "max_concurrency": LLM_MAX_CONCURRENCY.get(provider, 8),
+                }
+            routes = {
+                route: dict(stats, coalescing_ratio=round(stats["coalesced"] / stats["requests"], 4) if stats["requests"] else 0.0)
+                for route, stats in self._route_stats.items()
+            }
+        return {
+            "providers": providers,
+            "routes": routes,
+            "response_cache": self.response_cache.stats() if self.response_cache is not None else None,
+        }
+
+
+# Shared gateway used by the feedback routes
+llm_gateway = LLMGateway()
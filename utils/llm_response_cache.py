@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+# Responses of deterministic evaluation calls, shared by all workers
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_DB = os.getenv("LLM_CACHE_DB", "session-data/llm_response_cache.db")
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(128 * 1024 * 1024)))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+# Last-access times are refreshed at most this often per entry
+LLM_CACHE_TOUCH_INTERVAL = 60.0
+
+
+class LLMResponseCache:
+    """
+    Content-addressed store of model responses.
+
+    The key is a SHA-256 of (provider, model, generation_config, rendered
+    contents), so any change to the prompt template, the case data rendered
+    into it or the sampling settings is a different entry and nothing ever
+    needs explicit invalidation. Entries live in SQLite (WAL) so every gunicorn
+    worker shares them; once the stored text exceeds `max_bytes` the least
+    recently used entries are deleted, and entries older than `ttl_seconds`
+    are treated as misses.
+
+    Only routes that opt in (`cache=True` on the gateway call) use it.
+    """
+
+    def __init__(self, db_path: str = LLM_CACHE_DB, max_bytes: int = LLM_CACHE_MAX_BYTES,
+                 ttl_seconds: float = LLM_CACHE_TTL_SECONDS, enabled: bool = LLM_CACHE_ENABLED):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.rejected = 0
+        self.evictions = 0
+        if enabled:
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._connection().executescript('''
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    provider TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at);
+            ''')
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def key_for(provider: str, model: str, contents: Any,
+                generation_config: Optional[Dict[str, Any]] = None) -> str:
+        """Hash of everything that determines the response."""
+        if isinstance(contents, str):
+            # A bare prompt is the same request as a single-part contents list
+            contents = [{"parts": [{"text": contents}]}]
+        payload = json.dumps(
+            {"provider": provider, "model": model, "generation_config": generation_config or {}, "contents": contents},
+            sort_keys=True, ensure_ascii=False, default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response text, or None."""
+        now = time.time()
+        row = self._connection().execute(
+            "SELECT text, created_at, accessed_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or now - row[1] > self.ttl_seconds:
+            with self._lock:
+                self.misses += 1
+            return None
+        if now - row[2] > LLM_CACHE_TOUCH_INTERVAL:
+            self._connection().execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        with self._lock:
+            self.hits += 1
+        return row[0]
+
+    def put(self, key: str, provider: str, model: str, text: str) -> None:
+        """Store a response and evict least recently used entries past the size limit."""
+        size = len(text.encode("utf-8"))
+        if size > self.max_bytes:
+            with self._lock:
+                self.rejected += 1
+            return
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO responses (key, provider, model, text, size, created_at, accessed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, provider, model, text, size, now, now),
+        )
+        with self._lock:
+            self.stores += 1
+        self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Trim to 90% so eviction does not run on every subsequent store
+        excess = total - int(self.max_bytes * 0.9)
+        evicted = 0
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall():
+            if excess <= 0:
+                break
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            excess -= size
+            evicted += 1
+        with self._lock:
+            self.evictions += evicted
+        print(f"[LLM_CACHE] 🧹 Evicted {evicted} cached responses (limit {self.max_bytes} bytes)")
+
+    def clear(self) -> None:
+        """Delete every cached response."""
+        if self.enabled:
+            self._connection().execute("DELETE FROM responses")
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and current occupancy."""
+        entries, size = 0, 0
+        if self.enabled:
+            entries, size = self._connection().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": entries,
+                "bytes": size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "stores": self.stores,
+                "rejected": self.rejected,
+                "evictions": self.evictions,
+            }
+
+
+# Shared instance used by the LLM gateway
+llm_response_cache = LLMResponseCache()
@@ -1,36 +1,324 @@
 from fastapi import HTTPException
 import pdftotext
+import asyncio
+import hashlib
 import io
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Dict, Optional
 
-def extract_text_from_document(file) -> str:
-    """Extract text from a PDF or Markdown file."""
+# PDF parsing is CPU-bound, so it runs in a small process pool instead of the event loop
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", "2"))
+# Extracted text keyed by SHA-256 of the file bytes, shared by every worker
+PDF_TEXT_CACHE_ENABLED = os.getenv("PDF_TEXT_CACHE_ENABLED", "true").lower() == "true"
+PDF_TEXT_CACHE_DIR = os.getenv("PDF_TEXT_CACHE_DIR", "session-data/pdf-text-cache")
+PDF_TEXT_CACHE_MAX_BYTES = int(os.getenv("PDF_TEXT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Last-access times (file mtimes) are refreshed at most this often per entry
+PDF_TEXT_CACHE_TOUCH_INTERVAL = 60.0
+# Other workers' stores are only seen by listing the directory, which is redone at most this often
+PDF_TEXT_CACHE_RESCAN_INTERVAL = 300.0
+
+
+def _pdf_to_text(pdf_bytes: bytes) -> str:
+    """
+    Parse a PDF and collapse its whitespace one page at a time, so the full
+    un-normalized text is never held at once. Runs in the extraction pool.
+    """
+    pdf = pdftotext.PDF(io.BytesIO(pdf_bytes))
+    pages = []
+    for page in pdf:
+        words = page.split()
+        if words:
+            pages.append(" ".join(words))
+    return " ".join(pages)
+
+
+class DocumentTextCache:
+    """
+    Content-addressed store of extracted document text: one file per SHA-256
+    of the uploaded bytes, written atomically. A re-upload of the same PDF,
+    or any later generation from it, reads the text instead of parsing again.
+    A file's mtime is its last access; once the directory holds more than
+    `max_bytes` the least recently used files are deleted. The total size is
+    tracked in memory and the directory re-listed only on eviction or every
+    PDF_TEXT_CACHE_RESCAN_INTERVAL, so stores and stats stay cheap.
+    """
+
+    def __init__(self, base_dir: str = PDF_TEXT_CACHE_DIR, enabled: bool = PDF_TEXT_CACHE_ENABLED,
+                 max_bytes: int = PDF_TEXT_CACHE_MAX_BYTES):
+        self.base_dir = Path(base_dir)
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.rejected = 0
+        self.evictions = 0
+        # Size of the directory, listed once and then kept up to date by put/evict
+        self._count = 0
+        self._bytes: Optional[int] = None
+        self._scanned_at = 0.0
+
+    def _path(self, digest: str) -> Path:
+        return self.base_dir / digest[:2] / f"{digest}.txt"
+
+    def get(self, digest: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        path = self._path(digest)
+        try:
+            text = path.read_text(encoding="utf-8")
+            if time.time() - path.stat().st_mtime > PDF_TEXT_CACHE_TOUCH_INTERVAL:
+                os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return text
+
+    def put(self, digest: str, text: str) -> None:
+        if not self.enabled:
+            return
+        data = text.encode("utf-8")
+        if len(data) > self.max_bytes:
+            with self._lock:
+                self.rejected += 1
+            return
+        path = self._path(digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            replaced = path.stat().st_size
+        except FileNotFoundError:
+            replaced = None
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.stores += 1
+            if self._bytes is not None:
+                self._bytes += len(data) - (replaced or 0)
+                self._count += replaced is None
+            stale = self._bytes is None or time.monotonic() - self._scanned_at > PDF_TEXT_CACHE_RESCAN_INTERVAL
+        if stale:
+            self._scan()
+        if self._usage()[1] > self.max_bytes:
+            self._evict()
+
+    def _entries(self):
+        """(mtime, size, path) of every cached text file; files deleted meanwhile are skipped."""
+        entries = []
+        for path in self.base_dir.glob("*/*.txt"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _scan(self):
+        """Recount the directory, picking up files other workers stored or evicted."""
+        entries = self._entries()
+        with self._lock:
+            self._count = len(entries)
+            self._bytes = sum(size for _, size, _ in entries)
+            self._scanned_at = time.monotonic()
+        return entries
+
+    def _usage(self):
+        """(entries, bytes) as tracked by this worker; the directory is only listed on first use."""
+        with self._lock:
+            if self._bytes is not None:
+                return self._count, self._bytes
+        self._scan()
+        with self._lock:
+            return self._count, self._bytes
+
+    def _evict(self) -> None:
+        entries = self._scan()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+        # Trim to 90% so eviction does not run on every subsequent store
+        excess = total - int(self.max_bytes * 0.9)
+        evicted = 0
+        freed = 0
+        for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+            if excess <= 0:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass  # Another worker evicted it first
+            excess -= size
+            freed += size
+            evicted += 1
+        with self._lock:
+            self.evictions += evicted
+            self._count -= evicted
+            self._bytes -= freed
+        print(f"[PDF_UTILS] 🧹 Evicted {evicted} cached document texts (limit {self.max_bytes} bytes)")
+
+    def stats(self) -> Dict[str, Any]:
+        entries, size = self._usage() if self.enabled else (0, 0)
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": entries,
+                "bytes": size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "stores": self.stores,
+                "rejected": self.rejected,
+                "evictions": self.evictions,
+            }
+
+
+# Shared instance used by the extraction helpers
+document_text_cache = DocumentTextCache()
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn: forking a worker that already runs threads and an event loop is unsafe
+            _executor = ProcessPoolExecutor(max_workers=PDF_EXTRACT_WORKERS,
+                                            mp_context=multiprocessing.get_context("spawn"))
+        return _executor
+
+
+def _reset_executor(broken: ProcessPoolExecutor) -> None:
+    """Drop a pool whose worker process died, so the next call starts a fresh one."""
+    global _executor
+    with _executor_lock:
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False)
+
+
+async def _run_in_pool(func, *args):
+    """Run a function in the extraction pool, replacing the pool once if it is broken."""
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
     try:
-        # Get file extension
-        filename = file.filename.lower()
-        
+        return await loop.run_in_executor(executor, func, *args)
+    except BrokenProcessPool:
+        # A pool process died (OOM kill, parser crash); every later submit would fail the same way
+        print("[PDF_UTILS] ⚠️ Extraction pool broken, starting a new one and retrying")
+        _reset_executor(executor)
+        return await loop.run_in_executor(_get_executor(), func, *args)
+
+
+def _read_document(file) -> bytes:
+    try:
+        return file.file.read()
+    finally:
+        # Reset file pointer for potential future reads
+        file.file.seek(0)
+
+
+def _check_supported(filename: str) -> None:
+    if not filename.endswith(('.md', '.pdf')):
+        raise HTTPException(
+            status_code=400,
+            detail="Unsupported file format. Only .pdf and .md files are supported."
+        )
+
+
+_inflight: Dict[str, "asyncio.Future[str]"] = {}
+
+
+async def _parse_and_cache(digest: str, content: bytes, filename: str) -> str:
+    text = await _run_in_pool(_pdf_to_text, content)
+    await asyncio.to_thread(document_text_cache.put, digest, text)
+    print(f"[PDF_UTILS] 📄 Extracted {len(text)} characters from {filename} ({digest[:12]})")
+    return text
+
+
+async def extract_text_from_document_async(file) -> str:
+    """
+    Extract text from a PDF or Markdown file without blocking the event loop.
+
+    PDFs are looked up by the SHA-256 of their bytes first; on a miss they are
+    parsed in the extraction process pool (at most PDF_EXTRACT_WORKERS at a
+    time per worker) and the text is cached.
+
+    Args:
+        file: Object with `filename` and a binary `file` (UploadFile or a wrapper around open())
+
+    Returns:
+        The extracted text
+    """
+    filename = file.filename.lower()
+    _check_supported(filename)
+    try:
+        content = await asyncio.to_thread(_read_document, file)
+
         # Handle markdown files
         if filename.endswith('.md'):
-            content = file.file.read().decode('utf-8')
-            return content.strip()
-            
+            return content.decode('utf-8').strip()
+
         # Handle PDF files
-        elif filename.endswith('.pdf'):
-            pdf_bytes = file.file.read()
-            pdf = pdftotext.PDF(io.BytesIO(pdf_bytes))
-            text = "\n".join(pdf)
-            return " ".join(text.split()).strip()
-            
-        else:
-            raise HTTPException(
-                status_code=400,
-                detail="Unsupported file format. Only .pdf and .md files are supported."
-            )
-            
+        digest = await asyncio.to_thread(lambda: hashlib.sha256(content).hexdigest())
+        text = await asyncio.to_thread(document_text_cache.get, digest)
+        if text is not None:
+            print(f"[PDF_UTILS] ♻️ Reusing extracted text for {file.filename} ({digest[:12]})")
+            return text
+
+        # A parse of the same bytes already running in this worker (e.g. the upload prefetch) is shared
+        parse = _inflight.get(digest)
+        if parse is None:
+            parse = asyncio.ensure_future(_parse_and_cache(digest, content, file.filename))
+            _inflight[digest] = parse
+            parse.add_done_callback(lambda _: _inflight.pop(digest, None))
+        return await asyncio.shield(parse)
+
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error reading file: {str(e)}"
         )
+
+
+async def extract_text_from_path(file_path) -> str:
+    """Extract text from a document on disk (see extract_text_from_document_async)."""
+    class FileWrapper:
+        def __init__(self, filepath):
+            self.filename = Path(filepath).name
+            self.file = open(filepath, 'rb')
+
+    file_wrapper = FileWrapper(file_path)
+    try:
+        return await extract_text_from_document_async(file_wrapper)
     finally:
-        # Reset file pointer for potential future reads
-        file.file.seek(0)
+        file_wrapper.file.close()
+
+
+_prefetch_tasks = set()
+
+
+def schedule_text_extraction(file_path) -> None:
+    """Extract and cache an uploaded document's text in the background, so generation routes find it ready."""
+    async def prefetch():
+        try:
+            await extract_text_from_path(file_path)
+        except Exception as e:
+            print(f"[PDF_UTILS] ⚠️ Background extraction of {file_path} failed: {getattr(e, 'detail', e)}")
+
+    task = asyncio.create_task(prefetch())
+    _prefetch_tasks.add(task)
+    task.add_done_callback(_prefetch_tasks.discard)
@@ -0,0 +1,280 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+import aiohttp
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Image search routes call Tavily and SerpApi through this gateway instead of the
+# blocking SDK clients: requests are native async HTTP on one shared session per
+# provider, each provider has its own concurrency cap, and every query has a
+# deadline so a slow query is reported as timed out while the others return.
+SEARCH_TIMEOUT_SECONDS = float(os.getenv("SEARCH_TIMEOUT_SECONDS", "20"))
+SEARCH_MAX_CONCURRENCY = {
+    "tavily": int(os.getenv("SEARCH_MAX_CONCURRENCY_TAVILY", "8")),
+    "serpapi": int(os.getenv("SEARCH_MAX_CONCURRENCY_SERPAPI", "8")),
+}
+
+
+class SearchError(Exception):
+    """Raised when a search provider returns an error."""
+
+
+class SearchTimeoutError(SearchError):
+    """Raised when a single search query exceeds its deadline."""
+
+
+class HTTPSearchProvider:
+    """Base for search APIs called over HTTP, with one aiohttp session per event loop."""
+
+    name = "http"
+
+    def __init__(self):
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            # Deadlines are enforced by the gateway, so the session itself has none
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=None))
+            self._session_loop = loop
+        return self._session
+
+    async def _request(self, method: str, url: str, **kwargs) -> Dict[str, Any]:
+        async with self._get_session().request(method, url, **kwargs) as response:
+            if response.status >= 400:
+                body = await response.text()
+                raise SearchError(f"{self.name} returned HTTP {response.status}: {body[:200]}")
+            return await response.json(content_type=None)
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+class TavilyProvider(HTTPSearchProvider):
+    """Tavily search API; takes the same parameters as TavilyClient.search."""
+
+    name = "tavily"
+    url = "https://api.tavily.com/search"
+
+    def __init__(self, api_key: Optional[str] = None):
+        super().__init__()
+        self.api_key = api_key or os.getenv("TAVILY_API_KEY")
+
+    async def search(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        payload = {"api_key": self.api_key, **params}
+        return await self._request(
+            "POST", self.url, json=payload,
+            headers={"Authorization": f"Bearer {payload['api_key']}"}
+        )
+
+
+class SerpApiProvider(HTTPSearchProvider):
+    """SerpApi Google search; takes the same parameters as serpapi.GoogleSearch."""
+
+    name = "serpapi"
+    url = "https://serpapi.com/search"
+
+    def __init__(self, api_key: Optional[str] = None):
+        super().__init__()
+        self.api_key = api_key or os.getenv("SERPAPI_API_KEY")
+
+    async def search(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        query = {"engine": "google", "output": "json", "api_key": self.api_key, **params}
+        return await self._request("GET", self.url, params=query)
+
+
+class FakeSearchProvider:
+    """
+    Deterministic provider for tests and load runs. Register it in place of a
+    real provider with `search_gateway.register_provider("tavily", FakeSearchProvider(...))`.
+
+    Args:
+        response: Dict returned for every query
+        handler: Optional callable(params) -> dict, used instead of `response`
+        delay: Simulated latency in seconds
+    """
+
+    def __init__(self, response: Optional[Dict[str, Any]] = None,
+                 handler: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+                 delay: float = 0.0, name: str = "fake"):
+        self.response = response or {}
+        self.handler = handler
+        self.delay = delay
+        self.name = name
+        self.calls: List[Dict[str, Any]] = []
+
+    async def search(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        self.calls.append(params)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return self.handler(params) if self.handler is not None else self.response
+
+
+def search_status(outcomes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Per-query status of search_many / search_as_completed outcomes, without the responses."""
+    return [
+        {key: outcome[key] for key in ("query", "status", "error", "latency")}
+        for outcome in outcomes
+    ]
+
+
+class SearchGateway:
+    """Routes search queries to providers with per-provider concurrency caps and per-query deadlines."""
+
+    def __init__(self, timeout: float = SEARCH_TIMEOUT_SECONDS):
+        self.timeout = timeout
+        self._providers: Dict[str, Any] = {
+            "tavily": TavilyProvider(),
+            "serpapi": SerpApiProvider(),
+        }
+        self._limits: Dict[str, int] = dict(SEARCH_MAX_CONCURRENCY)
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def register_provider(self, name: str, provider: Any, max_concurrency: Optional[int] = None) -> None:
+        """Install or replace a provider (e.g. a FakeSearchProvider in tests)."""
+        with self._lock:
+            self._providers[name] = provider
+            if max_concurrency is not None:
+                self._limits[name] = max_concurrency
+            self._semaphores.pop(name, None)
+
+    def _semaphore(self, provider: str) -> asyncio.Semaphore:
+        with self._lock:
+            if provider not in self._semaphores:
+                self._semaphores[provider] = asyncio.Semaphore(self._limits.get(provider, 4))
+            return self._semaphores[provider]
+
+    def _record(self, provider: str, **counters: float) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(provider, {
+                "calls": 0, "failures": 0, "timeouts": 0, "in_flight": 0, "total_latency": 0.0,
+            })
+            for counter, value in counters.items():
+                stats[counter] += value
+
+    async def search(self, provider: str, params: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Run one search query.
+
+        Args:
+            provider: Registered provider name ("tavily", "serpapi", ...)
+            params: Provider search parameters
+            timeout: Deadline in seconds, including the wait for a free slot
+                (defaults to SEARCH_TIMEOUT_SECONDS)
+
+        Returns:
+            The provider's JSON response
+
+        Raises:
+            SearchTimeoutError: If the query missed its deadline
+            SearchError: If the provider is unknown or returned an error
+        """
+        backend = self._providers.get(provider)
+        if backend is None:
+            raise SearchError(f"Unknown search provider: {provider}")
+        deadline = self.timeout if timeout is None else timeout
+        try:
+            return await asyncio.wait_for(self._call(backend, provider, params), timeout=deadline)
+        except asyncio.TimeoutError:
+            self._record(provider, timeouts=1)
+            raise SearchTimeoutError(f"{provider} search timed out after {deadline} seconds")
+
+    async def _call(self, backend: Any, provider: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        async with self._semaphore(provider):
+            started = time.monotonic()
+            self._record(provider, calls=1, in_flight=1)
+            try:
+                return await backend.search(params)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self._record(provider, failures=1)
+                raise
+            finally:
+                self._record(provider, in_flight=-1, total_latency=time.monotonic() - started)
+
+    async def _outcome(self, index: int, provider: str, params: Dict[str, Any],
+                       timeout: Optional[float]) -> Dict[str, Any]:
+        started = time.monotonic()
+        outcome = {
+            "index": index,
+            "query": params.get("query", params.get("q", "")),
+            "status": "complete",
+            "response": None,
+            "error": None,
+        }
+        try:
+            outcome["response"] = await self.search(provider, params, timeout)
+        except SearchTimeoutError as e:
+            outcome.update(status="timeout", error=str(e))
+        except Exception as e:
+            outcome.update(status="error", error=str(e))
+        outcome["latency"] = round(time.monotonic() - started, 3)
+        if outcome["status"] != "complete":
+            print(f"[SEARCH_GATEWAY] ⚠️ {provider} query '{outcome['query'][:60]}' {outcome['status']}: {outcome['error']}")
+        return outcome
+
+    async def search_many(self, provider: str, params_list: List[Dict[str, Any]],
+                          timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Run several queries at once and return what finished within each query's deadline.
+
+        Returns:
+            One outcome per query, in order: {"index", "query", "status"
+            ("complete" / "error" / "timeout"), "response", "error", "latency"}
+        """
+        return list(await asyncio.gather(
+            *(self._outcome(i, provider, params, timeout) for i, params in enumerate(params_list))
+        ))
+
+    async def search_as_completed(self, provider: str, params_list: List[Dict[str, Any]],
+                                  timeout: Optional[float] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Like search_many, but yields each outcome as soon as its query finishes (for streaming routes)."""
+        tasks = [
+            asyncio.ensure_future(self._outcome(i, provider, params, timeout))
+            for i, params in enumerate(params_list)
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # The client went away mid-stream: stop the queries still running
+            for task in tasks:
+                task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-provider call, failure and timeout counters."""
+        with self._lock:
+            providers = {}
+            for provider, stats in self._stats.items():
+                calls = stats["calls"]
+                providers[provider] = {
+                    "calls": int(calls),
+                    "failures": int(stats["failures"]),
+                    "timeouts": int(stats["timeouts"]),
+                    "in_flight": int(stats["in_flight"]),
+                    "avg_latency_seconds": round(stats["total_latency"] / calls, 3) if calls else 0.0,
+                    "max_concurrency": self._limits.get(provider, 4),
+                }
+        return {"providers": providers, "timeout_seconds": self.timeout}
+
+    async def close(self) -> None:
+        """Close the providers' HTTP sessions (called on shutdown)."""
+        for provider in list(self._providers.values()):
+            if hasattr(provider, "close"):
+                await provider.close()
+
+
+# Shared instance used by the image search routes
+search_gateway = SearchGateway()
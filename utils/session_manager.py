@@ -1,28 +1,244 @@
-import json
+import asyncio
 import os
+import threading
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime
-from pathlib import Path
 from typing import Dict, Any, Optional, Literal, List
 
+from utils.session_store import SessionOp, Stamp, make_op, with_session_ops, create_session_store
+
+# Session cache size (shared by every SessionManager in the process)
+SESSION_CACHE_MAX_ENTRIES = int(os.getenv("SESSION_CACHE_MAX_ENTRIES", "512"))
+# Storage engine: "journal" (append-only JSONL + snapshots), "json" (one document per
+# student, rewritten in full on every change) or "sqlite" (WAL database shared by all
+# workers). Every change is written through, so the default is the engine whose write
+# cost does not grow with the session; it reads sessions left by "json" as they are.
+SESSION_STORE = os.getenv("SESSION_STORE", "journal")
+
+
+class _KeyLock:
+    """Re-entrant lock for one student. Weak-referenceable so idle locks are dropped."""
+
+    __slots__ = ("_lock", "__weakref__")
+
+    def __init__(self):
+        self._lock = threading.RLock()
+
+    def acquire(self, blocking: bool = True) -> bool:
+        return self._lock.acquire(blocking)
+
+    def release(self) -> None:
+        self._lock.release()
+
+    def __enter__(self):
+        self._lock.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._lock.release()
+
+
+class _CachedSession:
+    """A cached session and the store stamp it was read or written at."""
+
+    __slots__ = ("data", "stamp", "lock")
+
+    def __init__(self, data: Dict[str, Any], stamp: Stamp, lock: _KeyLock):
+        self.data = data
+        self.stamp = stamp
+        # Keeps the student's lock alive for as long as the entry is cached
+        self.lock = lock
+
+
+class SessionCache:
+    """
+    Bounded read cache in front of a session store (see utils.session_store).
+
+    Every mutation is written through to the store before it returns, so a
+    request served by the other gunicorn worker sees it, and a killed worker
+    loses nothing. Cached copies are re-validated against the store's stamp on
+    each access, so writes made by another worker are picked up on the next
+    request; if the stamp moved before a write, the operations are applied on
+    top of the newer copy rather than overwriting it.
+
+    Sessions are replaced copy-on-write (see with_session_ops) instead of being
+    deep-copied on every get and mutate: the dict handed back is shared with the
+    cache and must be treated as read-only. Changes go through `mutate`.
+
+    Locking: each student has their own lock, so requests for different
+    students never wait on each other's disk I/O. `_lock` only guards the LRU
+    bookkeeping. Writes additionally take the store's cross-process lock, and
+    the stamp is re-checked under it, so two workers cannot interleave a
+    read-modify-write of the same session.
+    """
+
+    def __init__(self, store, max_entries: int = SESSION_CACHE_MAX_ENTRIES):
+        self.store = store
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, _CachedSession]" = OrderedDict()
+        self._key_locks: "weakref.WeakValueDictionary[str, _KeyLock]" = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.rebases = 0
+        self.lock_waits = 0
+
+    def _key_lock(self, student_id: str) -> _KeyLock:
+        with self._lock:
+            lock = self._key_locks.get(student_id)
+            if lock is None:
+                lock = _KeyLock()
+                self._key_locks[student_id] = lock
+            return lock
+
+    @contextmanager
+    def _locked(self, student_id: str):
+        """Hold the student's lock, counting how often a caller had to wait for it."""
+        lock = self._key_lock(student_id)
+        if not lock.acquire(blocking=False):
+            with self._lock:
+                self.lock_waits += 1
+            lock.acquire()
+        try:
+            yield lock
+        finally:
+            lock.release()
+
+    def _refresh(self, student_id: str, entry: _CachedSession) -> None:
+        """Pick up writes made by another process."""
+        current = self.store.stamp(student_id)
+        if current == entry.stamp:
+            return
+        fresh, stamp = self.store.load(student_id)
+        entry.data = fresh if fresh is not None else {}
+        entry.stamp = stamp
+        with self._lock:
+            self.rebases += 1
+
+    def _entry(self, student_id: str, lock: _KeyLock) -> Optional[_CachedSession]:
+        """Return the cached entry (refreshed) or load it. Caller holds `lock`."""
+        with self._lock:
+            entry = self._entries.get(student_id)
+            if entry is not None:
+                self._entries.move_to_end(student_id)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if entry is not None:
+            self._refresh(student_id, entry)
+            return entry
+
+        data, stamp = self.store.load(student_id)
+        if data is None:
+            return None
+        entry = _CachedSession(data, stamp, lock)
+        with self._lock:
+            self._entries[student_id] = entry
+        return entry
+
+    def _evict(self) -> None:
+        """Drop least recently used entries beyond `max_entries` (nothing is unwritten)."""
+        with self._lock:
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, student_id: str) -> Optional[Dict[str, Any]]:
+        """Return the session (shared with the cache, read-only), or None if it does not exist."""
+        with self._locked(student_id) as lock:
+            entry = self._entry(student_id, lock)
+            result = entry.data if entry else None
+        self._evict()
+        return result
+
+    def exists(self, student_id: str) -> bool:
+        """Check whether a session exists."""
+        return self.get(student_id) is not None
+
+    def mutate(self, student_id: str, ops: List[SessionOp]) -> Dict[str, Any]:
+        """
+        Apply operations to the session, write them to the store and return the
+        new session. If the write fails the cached session is left unchanged.
+        """
+        with self._locked(student_id) as lock:
+            entry = self._entry(student_id, lock)
+            if entry is None:
+                entry = _CachedSession({}, None, lock)
+                with self._lock:
+                    self._entries[student_id] = entry
+            with self.store.lock(student_id):
+                self._refresh(student_id, entry)
+                data = with_session_ops(entry.data, ops)
+                entry.stamp = self.store.write(student_id, data, ops)
+                entry.data = data
+            with self._lock:
+                self.writes += 1
+        self._evict()
+        return data
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "rebases": self.rebases,
+                "lock_waits": self.lock_waits,
+            }
+
+
+# One cache per storage directory, shared by every SessionManager instance so
+# routers that construct their own manager still see each other's writes.
+_caches: Dict[str, SessionCache] = {}
+_caches_lock = threading.Lock()
+
+
+def _get_cache(base_dir: str) -> SessionCache:
+    key = os.path.abspath(base_dir)
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = SessionCache(create_session_store(SESSION_STORE, base_dir))
+        return _caches[key]
+
+
 class SessionManager:
+    """
+    Session operations for the routers. Every method is async: the cache and
+    store work (file locks, fsync, SQLite) runs in a worker thread, so waiting
+    on another worker's lock or on the disk never stalls the event loop.
+    """
+
     def __init__(self, base_dir: str = "session-data"):
         """Initialize the session manager with a base directory for storing session files."""
         self.base_dir = base_dir
-        # Create the base directory if it doesn't exist
-        Path(base_dir).mkdir(parents=True, exist_ok=True)
+        self.cache = _get_cache(base_dir)
 
     def _get_session_file_path(self, student_id: str, case_id: str = None) -> str:
         """Generate the file path for a session file."""
-        return os.path.join(self.base_dir, f"{student_id}_case_session.json")
+        return self.cache.store.path_for(student_id)
+
+    async def _apply(self, student_id: str, ops: List[SessionOp]) -> Dict[str, Any]:
+        """Apply and write operations through the session cache and return the updated session."""
+        return await asyncio.to_thread(self.cache.mutate, student_id, ops)
 
-    def create_or_load_session(self, student_id: str, case_id: str) -> Dict[str, Any]:
+    async def _exists(self, student_id: str) -> bool:
+        """Check whether a session exists."""
+        return await asyncio.to_thread(self.cache.exists, student_id)
+
+    async def _ensure_session(self, student_id: str, case_id: str) -> None:
+        """Create the session if it does not exist yet."""
+        if not await self._exists(student_id):
+            await self.create_or_load_session(student_id, case_id)
+
+    async def create_or_load_session(self, student_id: str, case_id: str) -> Dict[str, Any]:
         """Create a new session file or load an existing one."""
-        file_path = self._get_session_file_path(student_id, case_id)
-        
-        if os.path.exists(file_path):
-            with open(file_path, 'r') as f:
-                return json.load(f)
-        
+        session_data = await asyncio.to_thread(self.cache.get, student_id)
+        if session_data is not None:
+            return session_data
+
         # Create new session data
         session_data = {
             "student_id": student_id,
@@ -40,15 +256,12 @@ class SessionManager:
                 "clinical_findings": []
             }
         }
-        
+
         # Save the new session
-        self._save_session(file_path, session_data)
-        return session_data
+        return await self._apply(student_id, [make_op("reset", [], session_data)])
 
-    def clear_session(self, student_id: str, case_id: str) -> Dict[str, Any]:
+    async def clear_session(self, student_id: str, case_id: str) -> Dict[str, Any]:
         """Clear and reinitialize a session for a student-case combination."""
-        file_path = self._get_session_file_path(student_id, case_id)
-        
         # Create fresh session data
         session_data = {
             "student_id": student_id,
@@ -69,340 +282,313 @@ class SessionManager:
 
             }
         }
-        
+
         # Save the fresh session
-        self._save_session(file_path, session_data)
+        session_data = await self._apply(student_id, [make_op("reset", [], session_data)])
         print(f"[{datetime.now()}] 🔄 Cleared session for student {student_id} on case {case_id}")
         return session_data
 
-    def add_history_question(self, student_id: str, case_id: str, question: str, response: str) -> Dict[str, Any]:
+    async def add_history_question(self, student_id: str, case_id: str, question: str, response: str) -> Dict[str, Any]:
         """Add a history-taking question and response to the session."""
-        file_path = self._get_session_file_path(student_id, case_id)
-        session_data = self.create_or_load_session(student_id, case_id)
-        
+        await self._ensure_session(student_id, case_id)
+
         # Add the new question and response
         interaction_entry = {
             "question": question,
             "response": response,
             "timestamp": datetime.now().isoformat()
         }
-        session_data["interactions"]["history_taking"].append(interaction_entry)
-        
-        # Save the updated session
-        self._save_session(file_path, session_data)
-        return session_data
+        return await self._apply(student_id, [make_op("append", ["interactions", "history_taking"], interaction_entry)])
 
-    def add_test_order(self, student_id: str, case_id: str, test_type: Literal["physical_exam", "lab_test"], 
+    async def add_test_order(self, student_id: str, case_id: str, test_type: Literal["physical_exam", "lab_test"],
                       test_name: str) -> Dict[str, Any]:
         """Add a test order to the session."""
-        file_path = self._get_session_file_path(student_id, case_id)
-        session_data = self.create_or_load_session(student_id, case_id)
-        
+        await self._ensure_session(student_id, case_id)
+
         # Create test order entry
         test_entry = {
             "test_name": test_name,
             "timestamp": datetime.now().isoformat()
         }
-        
+
         # Add to appropriate list based on test type
         if test_type == "physical_exam":
-            session_data["interactions"]["physical_examinations"].append(test_entry)
+            key = "physical_examinations"
         else:  # lab_test
-            session_data["interactions"]["tests_ordered"].append(test_entry)
-        
-        # Save the updated session
-        self._save_session(file_path, session_data)
-        return session_data
+            key = "tests_ordered"
+
+        return await self._apply(student_id, [make_op("append", ["interactions", key], test_entry)])
 
-    def add_clinical_finding(self, student_id: str, case_id: str, finding: str) -> Dict[str, Any]:
+    async def add_clinical_finding(self, student_id: str, case_id: str, finding: str) -> Dict[str, Any]:
         """Add a clinical finding to the session.
-        
+
         Args:
             student_id (str): The ID of the student
             case_id (str): The ID of the case
             finding (str): The clinical finding to add
-            
+
         Returns:
             Dict[str, Any]: The updated session data
         """
-        file_path = self._get_session_file_path(student_id, case_id)
-        session_data = self.create_or_load_session(student_id, case_id)
-        
+        await self._ensure_session(student_id, case_id)
+
         # Add the finding directly to the array
-        session_data["interactions"]["clinical_findings"].append(finding)
-        session_data["current_step"] = "Clinical Findings"
-        
-        # Save the updated session
-        self._save_session(file_path, session_data)
-        return session_data
+        return await self._apply(student_id, [
+            make_op("append", ["interactions", "clinical_findings"], finding),
+            make_op("set", ["current_step"], "Clinical Findings"),
+        ])
 
-    def add_diagnosis_submission(self, student_id: str, case_id: str, diagnosis_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def add_diagnosis_submission(self, student_id: str, case_id: str, diagnosis_data: Dict[str, Any]) -> Dict[str, Any]:
         """Add a diagnosis submission to the session.
-        
+
         Args:
             student_id (str): The ID of the student
             case_id (str): The ID of the case
             diagnosis_data (Dict[str, Any]): The diagnosis submission data
-            
+
         Returns:
             Dict[str, Any]: The updated session data
         """
-        file_path = self._get_session_file_path(student_id, case_id)
-        session_data = self.create_or_load_session(student_id, case_id)
-        
+        await self._ensure_session(student_id, case_id)
+
         # Update the diagnosis submission
-        session_data["interactions"]["diagnosis_submission"] = diagnosis_data
-        session_data["current_step"] = "Primary Diagnosis"
-        # Save the updated session
-        self._save_session(file_path, session_data)
-        return session_data
+        return await self._apply(student_id, [
+            make_op("set", ["interactions", "diagnosis_submission"], diagnosis_data),
+            make_op("set", ["current_step"], "Primary Diagnosis"),
+        ])
 
-    def add_final_diagnosis(self, student_id: str, case_id: str, final_diagnosis_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def add_final_diagnosis(self, student_id: str, case_id: str, final_diagnosis_data: Dict[str, Any]) -> Dict[str, Any]:
         """Add a final diagnosis submission to the session.
-        
+
         Args:
             student_id (str): The ID of the student
             case_id (str): The ID of the case
             final_diagnosis_data (Dict[str, Any]): The final diagnosis submission data
-            
+
         Returns:
             Dict[str, Any]: The updated session data
         """
-        file_path = self._get_session_file_path(student_id, case_id)
-        session_data = self.create_or_load_session(student_id, case_id)
-        
+        await self._ensure_session(student_id, case_id)
+
         # Update the final diagnosis submission
-        session_data["interactions"]["final_diagnosis"] = final_diagnosis_data
-        session_data["current_step"] = "Final Diagnosis"
-        
-        # Save the updated session
-        self._save_session(file_path, session_data)
-        return session_data
+        return await self._apply(student_id, [
+            make_op("set", ["interactions", "final_diagnosis"], final_diagnosis_data),
+            make_op("set", ["current_step"], "Final Diagnosis"),
+        ])
 
-    def add_treatment_monitoring_data(self, student_id: str, case_id: str, pre_treatment_checks: List[str], post_treatment_monitoring: List[str]) -> Dict[str, Any]:
+    async def add_treatment_monitoring_data(self, student_id: str, case_id: str, pre_treatment_checks: List[str], post_treatment_monitoring: List[str]) -> Dict[str, Any]:
         """Add pre-treatment checks and post-treatment monitoring data to the session.
-        
+
         Args:
             student_id (str): The ID of the student
             case_id (str): The ID of the case
             pre_treatment_checks (List[str]): List of pre-treatment checks
             post_treatment_monitoring (List[str]): List of post-treatment monitoring parameters
-            
+
         Returns:
             Dict[str, Any]: The updated session data
         """
-        file_path = self._get_session_file_path(student_id, case_id)
-        session_data = self.create_or_load_session(student_id, case_id)
-        
-        # Create monitoring data structure with timestamp
-        monitoring_data = {
-            "pre_treatment_checks": pre_treatment_checks,
-            "post_treatment_monitoring": post_treatment_monitoring,
-            "timestamp": datetime.now().isoformat()
-        }
-        
+        await self._ensure_session(student_id, case_id)
+
         # Update both pre-treatment checks and post-treatment monitoring
-        session_data["interactions"]["pre_treatment_checks"] = pre_treatment_checks
-        session_data["interactions"]["post_treatment_monitoring"] = post_treatment_monitoring
-        session_data["current_step"] = "Treatment Monitoring"
-        
-        # Save the updated session
-        self._save_session(file_path, session_data)
-        return session_data
+        return await self._apply(student_id, [
+            make_op("set", ["interactions", "pre_treatment_checks"], pre_treatment_checks),
+            make_op("set", ["interactions", "post_treatment_monitoring"], post_treatment_monitoring),
+            make_op("set", ["current_step"], "Treatment Monitoring"),
+        ])
 
-    def add_treatment_plan(self, student_id: str, case_id: str, treatment_plan: List[str]) -> Dict[str, Any]:
+    async def add_treatment_plan(self, student_id: str, case_id: str, treatment_plan: List[str]) -> Dict[str, Any]:
         """Add treatment plan to the session.
-        
+
         Args:
             student_id (str): The ID of the student
             case_id (str): The ID of the case
             treatment_plan (List[str]): List of treatment steps/medications
-            
+
         Returns:
             Dict[str, Any]: The updated session data
         """
-        file_path = self._get_session_file_path(student_id, case_id)
-        session_data = self.create_or_load_session(student_id, case_id)
-        
+        await self._ensure_session(student_id, case_id)
+
         # Create treatment plan data structure with timestamp
         plan_data = {
             "treatment_steps": treatment_plan,
             "timestamp": datetime.now().isoformat()
         }
-        
+
         # Update the treatment plan
-        session_data["interactions"]["treatment_plan"] = plan_data
-        session_data["current_step"] = "Treatment Plan"
-        
-        # Save the updated session
-        self._save_session(file_path, session_data)
-        return session_data
+        return await self._apply(student_id, [
+            make_op("set", ["interactions", "treatment_plan"], plan_data),
+            make_op("set", ["current_step"], "Treatment Plan"),
+        ])
 
-    def add_history_feedback(self, student_id: str, analysis_result: Dict[str, Any], domain_feedback: Dict[str, Any]) -> Dict[str, Any]:
+    async def add_history_feedback(self, student_id: str, analysis_result: Dict[str, Any], domain_feedback: Dict[str, Any]) -> Dict[str, Any]:
         """Add history taking feedback results to the session.
-        
+
         Args:
             student_id (str): The ID of the student
             analysis_result (Dict[str, Any]): Results from the analysis step
             domain_feedback (Dict[str, Any]): Results from the domain feedback step
-            
+
         Returns:
             Dict[str, Any]: The updated session data
         """
-        file_path = self._get_session_file_path(student_id)
-        session_data = self.get_session(student_id)
-        
-        if not session_data:
+        if not await self._exists(student_id):
             raise ValueError("No active session found")
-        
+
         # Add feedback data to the session
-        if "feedback" not in session_data["interactions"]:
-            session_data["interactions"]["feedback"] = {}
-            
-        session_data["interactions"]["feedback"]["history_taking"] = {
-            "analysis": analysis_result,
-            "domain_feedback": domain_feedback,
-            "timestamp": datetime.now().isoformat()
-        }
-        
-        # Save the updated session
-        self._save_session(file_path, session_data)
-        return session_data
+        return await self._apply(student_id, [
+            make_op("set", ["interactions", "feedback", "history_taking"], {
+                "analysis": analysis_result,
+                "domain_feedback": domain_feedback,
+                "timestamp": datetime.now().isoformat()
+            })
+        ])
 
-    def add_history_analysis(self, student_id: str, analysis_result: Dict[str, Any]) -> Dict[str, Any]:
+    async def add_history_analysis(self, student_id: str, analysis_result: Dict[str, Any]) -> Dict[str, Any]:
         """Add history taking analysis results to the session.
-        
+
         Args:
             student_id (str): The ID of the student
             analysis_result (Dict[str, Any]): The analysis results to store
-            
+
         Returns:
             Dict[str, Any]: The updated session data
         """
-        file_path = self._get_session_file_path(student_id)
-        session_data = self.get_session(student_id)
-        
-        if not session_data:
+        if not await self._exists(student_id):
             raise ValueError("No active session found")
-        
-        # Initialize feedback structure if it doesn't exist
-        if "feedback" not in session_data["interactions"]:
-            session_data["interactions"]["feedback"] = {}
-            
-        if "history_taking" not in session_data["interactions"]["feedback"]:
-            session_data["interactions"]["feedback"]["history_taking"] = {}
-            
-        # Store the analysis results
-        session_data["interactions"]["feedback"]["history_taking"]["analysis"] = analysis_result
-        
-        # Save the updated session
-        self._save_session(file_path, session_data)
-        return session_data
 
-    def add_diagnosis_feedback(self, student_id: str, feedback_result: Dict[str, Any]) -> Dict[str, Any]:
+        # Store the analysis results (feedback structure is created if missing)
+        return await self._apply(student_id, [
+            make_op("set", ["interactions", "feedback", "history_taking", "analysis"], analysis_result)
+        ])
+
+    async def update_history_coverage(self, student_id: str, fingerprint: str, covered: Dict[str, Dict[str, Any]],
+                                evaluated_interactions: Optional[int] = None, reset: bool = False) -> Dict[str, Any]:
+        """Record which expected history questions are covered, and by which interaction.
+
+        Args:
+            student_id (str): The ID of the student
+            fingerprint (str): Fingerprint of the case's expected questions the state refers to
+            covered (Dict[str, Dict[str, Any]]): Newly covered questions keyed by question index
+            evaluated_interactions (Optional[int]): Number of history interactions evaluated so far
+            reset (bool): Discard the stored state first (expected questions changed)
+
+        Returns:
+            Dict[str, Any]: The updated session data
+        """
+        if not await self._exists(student_id):
+            raise ValueError("No active session found")
+
+        coverage_path = ["history_coverage"]
+        ops = []
+        if reset:
+            ops.append(make_op("set", coverage_path, {
+                "fingerprint": fingerprint,
+                "evaluated_interactions": 0,
+                "covered": {}
+            }))
+        if covered:
+            ops.append(make_op("update", coverage_path + ["covered"], covered))
+        if evaluated_interactions is not None:
+            ops.append(make_op("set", coverage_path + ["evaluated_interactions"], evaluated_interactions))
+        ops.append(make_op("set", coverage_path + ["fingerprint"], fingerprint))
+        return await self._apply(student_id, ops)
+
+    async def add_diagnosis_feedback(self, student_id: str, feedback_result: Dict[str, Any]) -> Dict[str, Any]:
         """Add diagnosis feedback results to the session.
-        
+
         Args:
-            student_id (str): The ID of the student  
+            student_id (str): The ID of the student
             feedback_result (Dict[str, Any]): The feedback results to store (should contain keys like 'primaryDiagnosis', 'differentialDiagnosis', 'educationalCapsules')
-            
+
         Returns:
             Dict[str, Any]: The updated session data
         """
-        file_path = self._get_session_file_path(student_id)
-        session_data = self.get_session(student_id)
-        
-        if not session_data:
+        if not await self._exists(student_id):
             raise ValueError("No active session found")
-        
-        # Initialize feedback structure if it doesn't exist
-        if "feedback" not in session_data["interactions"]:
-            session_data["interactions"]["feedback"] = {}
-            
-        # Initialize diagnosis feedback if it doesn't exist
-        if "diagnosis" not in session_data["interactions"]["feedback"]:
-            session_data["interactions"]["feedback"]["diagnosis"] = {
-                "feedback": {},
-                "timestamp": datetime.now().isoformat()
-            }
-        
+
         # Merge new feedback results with existing ones instead of overwriting
-        session_data["interactions"]["feedback"]["diagnosis"]["feedback"].update(feedback_result)
-        session_data["interactions"]["feedback"]["diagnosis"]["timestamp"] = datetime.now().isoformat()
-        
-        # Save the updated session
-        self._save_session(file_path, session_data)
-        return session_data
+        diagnosis_path = ["interactions", "feedback", "diagnosis"]
+        return await self._apply(student_id, [
+            make_op("update", diagnosis_path + ["feedback"], feedback_result),
+            make_op("set", diagnosis_path + ["timestamp"], datetime.now().isoformat()),
+        ])
 
-    def add_osce_score(self, student_id: str, case_id: str, osce_score_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def add_osce_score(self, student_id: str, case_id: str, osce_score_data: Dict[str, Any]) -> Dict[str, Any]:
         """Add OSCE score data to the session feedback.
-        
+
         Args:
             student_id (str): The ID of the student
             case_id (str): The ID of the case
             osce_score_data (Dict[str, Any]): The OSCE score data including overall performance and by question type
-            
+
         Returns:
             Dict[str, Any]: The updated session data
         """
-        file_path = self._get_session_file_path(student_id, case_id)
-        session_data = self.create_or_load_session(student_id, case_id)
-        
-        # Ensure feedback object exists
-        if "feedback" not in session_data["interactions"]:
-            session_data["interactions"]["feedback"] = {}
-        
-        # Add OSCE score to feedback
-        session_data["interactions"]["feedback"]["osce_score"] = osce_score_data
-        session_data["current_step"] = "OSCE Evaluation"
-        
-        # Save the updated session
-        self._save_session(file_path, session_data)
-        return session_data
+        await self._ensure_session(student_id, case_id)
 
-    def _save_session(self, file_path: str, session_data: Dict[str, Any]) -> None:
-        """Save the session data to file."""
-        with open(file_path, 'w') as f:
-            json.dump(session_data, f, indent=2)
+        # Add OSCE score to feedback
+        return await self._apply(student_id, [
+            make_op("set", ["interactions", "feedback", "osce_score"], osce_score_data),
+            make_op("set", ["current_step"], "OSCE Evaluation"),
+        ])
 
-    def get_session(self, student_id: str, case_id: str = None) -> Optional[Dict[str, Any]]:
+    async def get_session(self, student_id: str, case_id: str = None) -> Optional[Dict[str, Any]]:
         """Retrieve a session if it exists."""
-        file_path = self._get_session_file_path(student_id, case_id)
-        if os.path.exists(file_path):
-            with open(file_path, 'r') as f:
-                return json.load(f)
-        return None
+        return await asyncio.to_thread(self.cache.get, student_id)
 
-    def get_session_by_id(self, session_id: str) -> Optional[Dict[str, Any]]:
+    async def list_sessions(self, case_id: str = None) -> List[Dict[str, Any]]:
+        """List stored sessions (student, case, current step, start time), optionally for one case."""
+        return await asyncio.to_thread(self.cache.store.list_sessions, case_id)
+
+    async def get_session_by_id(self, session_id: str) -> Optional[Dict[str, Any]]:
         """Retrieve a session by its ID (student_id in our case)."""
-        return self.get_session(session_id)
+        return await self.get_session(session_id)
 
-    def add_treatment_feedback(self, student_id: str, feedback_result: Dict[str, Any]) -> Dict[str, Any]:
+    async def add_treatment_feedback(self, student_id: str, feedback_result: Dict[str, Any]) -> Dict[str, Any]:
         """Add treatment plan feedback results to the session.
-        
+
         Args:
             student_id (str): The ID of the student
             feedback_result (Dict[str, Any]): The treatment feedback results to store
-            
+
         Returns:
             Dict[str, Any]: The updated session data
         """
-        file_path = self._get_session_file_path(student_id)
-        session_data = self.get_session(student_id)
-        
-        if not session_data:
+        if not await self._exists(student_id):
             raise ValueError("No active session found")
-        
-        # Initialize feedback structure if it doesn't exist
-        if "feedback" not in session_data["interactions"]:
-            session_data["interactions"]["feedback"] = {}
-            
+
         # Store the feedback results
-        session_data["interactions"]["feedback"]["treatment_plan"] = {
-            "feedback": feedback_result,
-            "timestamp": datetime.now().isoformat()
-        }
-        
-        # Save the updated session
-        self._save_session(file_path, session_data)
-        return session_data 
\ No newline at end of file
+        return await self._apply(student_id, [
+            make_op("set", ["interactions", "feedback", "treatment_plan"], {
+                "feedback": feedback_result,
+                "timestamp": datetime.now().isoformat()
+            })
+        ])
+
+    async def add_treatment_review(self, student_id: str, sections: Dict[str, Any]) -> Dict[str, Any]:
+        """Record the combined treatment review (pre-treatment, monitoring, protocol) in one write.
+
+        Only sections with status "complete" are stored, so a retry in which a
+        section times out or fails keeps the result stored by an earlier attempt.
+
+        Args:
+            student_id (str): The ID of the student
+            sections (Dict[str, Any]): Section name -> {"status", "feedback" or "error"}
+
+        Returns:
+            Dict[str, Any]: The updated session data
+        """
+        if not await self._exists(student_id):
+            raise ValueError("No active session found")
+
+        completed = {name: section for name, section in sections.items() if section.get("status") == "complete"}
+        if not completed:
+            return await self.get_session(student_id)
+
+        review_path = ["interactions", "feedback", "treatment_review"]
+        return await self._apply(student_id, [
+            make_op("update", review_path + ["sections"], completed),
+            make_op("set", review_path + ["timestamp"], datetime.now().isoformat()),
+        ])
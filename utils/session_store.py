@@ -0,0 +1,563 @@
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, Optional, List, Tuple, Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines: no cross-process locking
+    fcntl = None
+
+# A session mutation is recorded as a small, JSON-serialisable operation so it
+# can be replayed on top of a newer copy of the session:
+#   {"op": "reset",  "path": [],                                   "value": {...full session...}}
+#   {"op": "set",    "path": ["interactions", "final_diagnosis"],  "value": {...}}
+#   {"op": "append", "path": ["interactions", "history_taking"],   "value": {...}}
+#   {"op": "update", "path": ["interactions", "feedback", "diagnosis", "feedback"], "value": {...}}
+# Intermediate dicts along `path` are created when missing.
+SessionOp = Dict[str, Any]
+
+# Opaque value a store uses to detect writes made by another process
+Stamp = Optional[Tuple[int, ...]]
+
+# How long a write waits for another worker's lock on the same student, and how often it retries
+SESSION_LOCK_TIMEOUT_SECONDS = float(os.getenv("SESSION_LOCK_TIMEOUT_SECONDS", "10"))
+SESSION_LOCK_RETRY_SECONDS = 0.01
+
+
+@contextmanager
+def student_lock(base_dir: str, student_id: str, timeout: float = SESSION_LOCK_TIMEOUT_SECONDS):
+    """
+    Exclusive cross-process lock for one student's session, held while a worker
+    checks the stored stamp and writes. gunicorn workers therefore never
+    interleave a read-modify-write of the same session.
+
+    The lock is polled without blocking until `timeout`. Callers run in a
+    worker thread (SessionManager uses asyncio.to_thread), so the polling
+    never holds up the event loop.
+
+    Raises:
+        TimeoutError: If another process held the lock for longer than `timeout`
+    """
+    if fcntl is None:
+        yield
+        return
+    lock_dir = os.path.join(base_dir, ".locks")
+    os.makedirs(lock_dir, exist_ok=True)
+    with open(os.path.join(lock_dir, f"{student_id}.lock"), 'a') as lock_file:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"Timed out after {timeout}s waiting for the session lock of {student_id}")
+                time.sleep(SESSION_LOCK_RETRY_SECONDS)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def _stat_stamp(stat: os.stat_result) -> Stamp:
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def _session_summary(student_id: str, session_data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "student_id": session_data.get("student_id", student_id),
+        "case_id": session_data.get("case_id"),
+        "current_step": session_data.get("current_step"),
+        "session_start": session_data.get("session_start"),
+    }
+
+
+def make_op(op: str, path: List[str], value: Any) -> SessionOp:
+    """Build a session operation."""
+    return {"op": op, "path": list(path), "value": value}
+
+
+def apply_session_ops(session_data: Dict[str, Any], ops: List[SessionOp]) -> Dict[str, Any]:
+    """Apply operations to session data in place and return it."""
+    for operation in ops:
+        op = operation["op"]
+        path = operation["path"]
+        value = copy.deepcopy(operation["value"])
+
+        if op == "reset":
+            session_data.clear()
+            session_data.update(value)
+            continue
+
+        parent = session_data
+        for key in path[:-1]:
+            if not isinstance(parent.get(key), dict):
+                parent[key] = {}
+            parent = parent[key]
+        key = path[-1]
+
+        if op == "set":
+            parent[key] = value
+        elif op == "append":
+            if not isinstance(parent.get(key), list):
+                parent[key] = []
+            parent[key].append(value)
+        elif op == "update":
+            if not isinstance(parent.get(key), dict):
+                parent[key] = {}
+            parent[key].update(value)
+        else:
+            raise ValueError(f"Unknown session operation: {op}")
+    return session_data
+
+
+def with_session_ops(session_data: Dict[str, Any], ops: List[SessionOp]) -> Dict[str, Any]:
+    """
+    Return a new session with `ops` applied, leaving `session_data` untouched.
+    Only the dicts and lists along each operation's path are copied; the rest
+    is shared, so a session handed out earlier never changes under its reader.
+    """
+    result = session_data
+    for operation in ops:
+        op = operation["op"]
+        path = operation["path"]
+        value = copy.deepcopy(operation["value"])
+
+        if op == "reset":
+            result = value
+            continue
+
+        result = dict(result)
+        parent = result
+        for key in path[:-1]:
+            child = parent.get(key)
+            parent[key] = dict(child) if isinstance(child, dict) else {}
+            parent = parent[key]
+        key = path[-1]
+        current = parent.get(key)
+
+        if op == "set":
+            parent[key] = value
+        elif op == "append":
+            parent[key] = (list(current) if isinstance(current, list) else []) + [value]
+        elif op == "update":
+            parent[key] = {**(current if isinstance(current, dict) else {}), **value}
+        else:
+            raise ValueError(f"Unknown session operation: {op}")
+    return result
+
+
+class FileSessionStore:
+    """Stores each student's session as one JSON document in `base_dir`."""
+
+    def __init__(self, base_dir: str = "session-data"):
+        self.base_dir = base_dir
+        Path(base_dir).mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, student_id: str) -> str:
+        return os.path.join(self.base_dir, f"{student_id}_case_session.json")
+
+    def stamp(self, student_id: str) -> Stamp:
+        """Return (inode, mtime_ns, size) of the session file, or None if it does not exist."""
+        try:
+            return _stat_stamp(os.stat(self.path_for(student_id)))
+        except FileNotFoundError:
+            return None
+
+    def load(self, student_id: str) -> Tuple[Optional[Dict[str, Any]], Stamp]:
+        """Read a session and the stamp it was read at."""
+        file_path = self.path_for(student_id)
+        try:
+            with open(file_path, 'r') as f:
+                # Stamp the file actually read; the path may already name a newer replacement
+                stamp = _stat_stamp(os.fstat(f.fileno()))
+                return json.load(f), stamp
+        except FileNotFoundError:
+            return None, None
+
+    def lock(self, student_id: str):
+        return student_lock(self.base_dir, student_id)
+
+    def write(self, student_id: str, session_data: Dict[str, Any], ops: List[SessionOp]) -> Stamp:
+        """
+        Persist the full session. `ops` are the changes since the last write.
+        The document is written to a temp file and renamed into place, so readers
+        never see a half-written session.
+        """
+        file_path = self.path_for(student_id)
+        tmp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(session_data, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, file_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return self.stamp(student_id)
+
+    def list_sessions(self, case_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Summarise stored sessions by scanning the directory."""
+        summaries = []
+        for file_name in os.listdir(self.base_dir):
+            if not file_name.endswith("_case_session.json"):
+                continue
+            student_id = file_name[:-len("_case_session.json")]
+            session_data, _ = self.load(student_id)
+            if session_data and (case_id is None or str(session_data.get("case_id")) == str(case_id)):
+                summaries.append(_session_summary(student_id, session_data))
+        return summaries
+
+
+class JournalSessionStore:
+    """
+    Append-only storage engine: every session operation is appended as one JSON
+    line to `{student_id}_case_session.jsonl`, so a write costs O(1) instead of
+    rewriting the whole document.
+
+    A snapshot (`{student_id}_case_session.snapshot.json`) records the folded
+    session state together with the journal it covers (inode) and the byte
+    offset it covers up to. Loading reads the snapshot and replays only the
+    journal after that offset. Once `compact_after` records have accumulated,
+    the journal is compacted: the current state is snapshotted and the journal
+    is replaced with an empty one, so its size stays bounded.
+
+    Compaction writes the snapshot (naming the new, empty journal) before the
+    new journal is renamed into place. If a crash lands in between, the
+    snapshot names a journal that does not exist. The old journal it replaced
+    holds nothing the snapshot lacks, so it is ignored and the next write
+    completes the compaction.
+    """
+
+    def __init__(self, base_dir: str = "session-data", compact_after: int = 50):
+        self.base_dir = base_dir
+        self.compact_after = compact_after
+        # Journal records written since the last snapshot, per student
+        self._tail_counts: Dict[str, int] = {}
+        # Journal inode each student's snapshot covers (None: legacy snapshot, any journal)
+        self._snapshot_journals: Dict[str, Optional[int]] = {}
+        Path(base_dir).mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, student_id: str) -> str:
+        return os.path.join(self.base_dir, f"{student_id}_case_session.jsonl")
+
+    def snapshot_path_for(self, student_id: str) -> str:
+        return os.path.join(self.base_dir, f"{student_id}_case_session.snapshot.json")
+
+    def lock(self, student_id: str):
+        return student_lock(self.base_dir, student_id)
+
+    def stamp(self, student_id: str) -> Stamp:
+        """Return (inode, mtime_ns, size) of the journal, or None if it does not exist."""
+        try:
+            return _stat_stamp(os.stat(self.path_for(student_id)))
+        except FileNotFoundError:
+            return None
+
+    def _read_snapshot(self, student_id: str) -> Tuple[Optional[Dict[str, Any]], int, Optional[int]]:
+        try:
+            with open(self.snapshot_path_for(student_id), 'r') as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            self._snapshot_journals.pop(student_id, None)
+            return None, 0, None
+        journal = snapshot.get("journal")
+        self._snapshot_journals[student_id] = journal
+        return snapshot["session"], snapshot["offset"], journal
+
+    def _write_snapshot(self, student_id: str, session_data: Dict[str, Any], offset: int,
+                        journal: Optional[int]) -> None:
+        snapshot_path = self.snapshot_path_for(student_id)
+        tmp_path = f"{snapshot_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"journal": journal, "offset": offset, "session": session_data}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, snapshot_path)
+        self._snapshot_journals[student_id] = journal
+        self._tail_counts[student_id] = 0
+
+    def _compact(self, student_id: str, session_data: Dict[str, Any]) -> None:
+        """Snapshot the full session and start an empty journal. Caller holds the student's lock."""
+        journal_path = self.path_for(student_id)
+        tmp_path = f"{journal_path}.{os.getpid()}.tmp"
+        open(tmp_path, 'wb').close()
+        try:
+            self._write_snapshot(student_id, session_data, 0, os.stat(tmp_path).st_ino)
+            os.replace(tmp_path, journal_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _covers_journal(self, student_id: str, stamp: Stamp) -> bool:
+        """Whether the snapshot belongs to the current journal (or is a legacy snapshot that fits any)."""
+        if student_id not in self._snapshot_journals:
+            self._read_snapshot(student_id)
+        journal = self._snapshot_journals.get(student_id)
+        if journal is None or (stamp is not None and journal == stamp[0]):
+            return True
+        # Another worker may have compacted since we last read the snapshot
+        self._read_snapshot(student_id)
+        journal = self._snapshot_journals.get(student_id)
+        return journal is None or (stamp is not None and journal == stamp[0])
+
+    def load(self, student_id: str) -> Tuple[Optional[Dict[str, Any]], Stamp]:
+        """Rebuild the session from the latest snapshot plus the journal tail."""
+        # Open and stamp the journal before reading the snapshot. If another
+        # worker compacts in between, the snapshot is newer than the stamp and
+        # the next stamp check reloads; the stamp is never newer than the data.
+        try:
+            journal_file = open(self.path_for(student_id), 'rb')
+        except FileNotFoundError:
+            journal_file = None
+        try:
+            stamp = _stat_stamp(os.fstat(journal_file.fileno())) if journal_file else None
+            session_data, offset, journal = self._read_snapshot(student_id)
+
+            if session_data is None and stamp is None:
+                # Migrate a session written by FileSessionStore
+                legacy_data, _ = FileSessionStore(self.base_dir).load(student_id)
+                if legacy_data is not None:
+                    self._write_snapshot(student_id, legacy_data, 0, None)
+                return legacy_data, stamp
+
+            if stamp is None or (journal is not None and journal != stamp[0]):
+                # No journal yet, compaction was interrupted, or the snapshot is
+                # from a compaction after we opened the journal: it is complete
+                self._tail_counts[student_id] = 0
+                return session_data, stamp
+
+            session_data = session_data if session_data is not None else {}
+            tail = 0
+            journal_file.seek(offset)
+            for line in journal_file:
+                if not line.endswith(b"\n"):
+                    # Torn final write from a crash; everything before it is intact
+                    break
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    print(f"[SESSION_JOURNAL] ⚠️ Skipping torn record in journal for {student_id}")
+                    continue
+                apply_session_ops(session_data, [record])
+                tail += 1
+            self._tail_counts[student_id] = tail
+            return session_data, stamp
+        finally:
+            if journal_file is not None:
+                journal_file.close()
+
+    def write(self, student_id: str, session_data: Dict[str, Any], ops: List[SessionOp]) -> Stamp:
+        """
+        Append `ops` to the journal, compacting it once the tail grows long.
+        Caller holds the student's lock.
+        """
+        if not self._covers_journal(student_id, self.stamp(student_id)):
+            # Finish an interrupted compaction instead of appending to a journal the snapshot ignores
+            self._compact(student_id, session_data)
+            return self.stamp(student_id)
+
+        timestamp = datetime.now().isoformat()
+        lines = b"".join(
+            json.dumps({**op, "ts": timestamp}).encode() + b"\n" for op in ops
+        )
+        with open(self.path_for(student_id), 'a+b') as f:
+            # Never glue a new record onto a torn line left by a crash
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+        self._tail_counts[student_id] = self._tail_counts.get(student_id, 0) + len(ops)
+        if self._tail_counts[student_id] >= self.compact_after:
+            self._compact(student_id, session_data)
+        return self.stamp(student_id)
+
+    def list_sessions(self, case_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Summarise stored sessions found as a journal, a snapshot or a legacy JSON document."""
+        suffixes = ("_case_session.jsonl", "_case_session.snapshot.json", "_case_session.json")
+        student_ids = set()
+        for file_name in os.listdir(self.base_dir):
+            for suffix in suffixes:
+                if file_name.endswith(suffix):
+                    student_ids.add(file_name[:-len(suffix)])
+                    break
+        summaries = []
+        for student_id in sorted(student_ids):
+            session_data, _ = self.load(student_id)
+            if session_data and (case_id is None or str(session_data.get("case_id")) == str(case_id)):
+                summaries.append(_session_summary(student_id, session_data))
+        return summaries
+
+    def iter_records(self, student_id: str) -> Iterator[Dict[str, Any]]:
+        """Yield the journal records written since the last compaction, oldest first."""
+        try:
+            with open(self.path_for(student_id), 'rb') as f:
+                for line in f:
+                    if not line.endswith(b"\n") or not line.strip():
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+        except FileNotFoundError:
+            return
+
+
+class SqliteSessionStore:
+    """
+    Stores sessions and their interaction history in a local SQLite database in
+    WAL mode, so several gunicorn workers can share session state and teacher or
+    analytics queries run as indexed SQL instead of directory scans.
+
+    Tables:
+        sessions(student_id PK, case_id, current_step, session_start, data, version, updated_at)
+        interactions(id, student_id, case_id, op, path, value, created_at)
+    both indexed on (student_id, case_id) and (case_id, student_id).
+    """
+
+    def __init__(self, base_dir: str = "session-data", db_name: str = "sessions.db"):
+        self.base_dir = base_dir
+        self.db_path = os.path.join(base_dir, db_name)
+        self._local = threading.local()
+        Path(base_dir).mkdir(parents=True, exist_ok=True)
+        self._init_schema()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self) -> None:
+        conn = self._connection()
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS sessions (
+                student_id TEXT PRIMARY KEY,
+                case_id TEXT,
+                current_step TEXT,
+                session_start TEXT,
+                data TEXT NOT NULL,
+                version INTEGER NOT NULL DEFAULT 0,
+                updated_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_sessions_student_case ON sessions (student_id, case_id);
+            CREATE INDEX IF NOT EXISTS idx_sessions_case_student ON sessions (case_id, student_id);
+
+            CREATE TABLE IF NOT EXISTS interactions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                student_id TEXT NOT NULL,
+                case_id TEXT,
+                op TEXT NOT NULL,
+                path TEXT NOT NULL,
+                value TEXT,
+                created_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_interactions_student_case ON interactions (student_id, case_id);
+            CREATE INDEX IF NOT EXISTS idx_interactions_case_student ON interactions (case_id, student_id);
+        ''')
+
+    def path_for(self, student_id: str) -> str:
+        return self.db_path
+
+    def lock(self, student_id: str):
+        return student_lock(self.base_dir, student_id)
+
+    def stamp(self, student_id: str) -> Stamp:
+        """Return the session row's version, or None if it does not exist."""
+        row = self._connection().execute(
+            "SELECT version FROM sessions WHERE student_id = ?", (student_id,)
+        ).fetchone()
+        return (row["version"], 0) if row else None
+
+    def load(self, student_id: str) -> Tuple[Optional[Dict[str, Any]], Stamp]:
+        row = self._connection().execute(
+            "SELECT data, version FROM sessions WHERE student_id = ?", (student_id,)
+        ).fetchone()
+        if row:
+            return json.loads(row["data"]), (row["version"], 0)
+
+        # Import a session written by FileSessionStore
+        legacy_data, _ = FileSessionStore(self.base_dir).load(student_id)
+        if legacy_data is None:
+            return None, None
+        stamp = self.write(student_id, legacy_data, [])
+        return legacy_data, stamp
+
+    def write(self, student_id: str, session_data: Dict[str, Any], ops: List[SessionOp]) -> Stamp:
+        """Upsert the session row and record `ops` as interaction rows in one transaction."""
+        now = datetime.now().isoformat()
+        case_id = session_data.get("case_id")
+        case_id = str(case_id) if case_id is not None else None
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute('''
+                INSERT INTO sessions (student_id, case_id, current_step, session_start, data, version, updated_at)
+                VALUES (?, ?, ?, ?, ?, 1, ?)
+                ON CONFLICT(student_id) DO UPDATE SET
+                    case_id = excluded.case_id,
+                    current_step = excluded.current_step,
+                    session_start = excluded.session_start,
+                    data = excluded.data,
+                    version = sessions.version + 1,
+                    updated_at = excluded.updated_at
+            ''', (
+                student_id,
+                case_id,
+                session_data.get("current_step"),
+                session_data.get("session_start"),
+                json.dumps(session_data),
+                now,
+            ))
+            conn.executemany('''
+                INSERT INTO interactions (student_id, case_id, op, path, value, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', [
+                (student_id, case_id, op["op"], ".".join(op["path"]), json.dumps(op["value"]), now)
+                for op in ops
+            ])
+            version = conn.execute(
+                "SELECT version FROM sessions WHERE student_id = ?", (student_id,)
+            ).fetchone()["version"]
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return (version, 0)
+
+    def list_sessions(self, case_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Summarise stored sessions, optionally for one case, using the case index."""
+        query = "SELECT student_id, case_id, current_step, session_start FROM sessions"
+        params: Tuple[Any, ...] = ()
+        if case_id is not None:
+            query += " WHERE case_id = ?"
+            params = (str(case_id),)
+        return [dict(row) for row in self._connection().execute(query, params).fetchall()]
+
+
+def create_session_store(kind: str, base_dir: str):
+    """Build the storage engine named by `kind` ("json", "journal" or "sqlite")."""
+    if kind == "json":
+        return FileSessionStore(base_dir)
+    if kind == "journal":
+        return JournalSessionStore(base_dir)
+    if kind == "sqlite":
+        return SqliteSessionStore(base_dir)
+    raise ValueError(f"Unknown session store: {kind}")
@@ -0,0 +1,17 @@
+from fastapi.staticfiles import StaticFiles
+from starlette.exceptions import HTTPException
+
+
+class PublicStaticFiles(StaticFiles):
+    """
+    StaticFiles that never serves dotfiles or dot-directories.
+
+    Upload and case directories may hold bookkeeping files (temporary writes,
+    lock files, legacy store indexes) that must not be downloadable.
+    """
+
+    def get_path(self, scope) -> str:
+        path = super().get_path(scope)
+        if any(part.startswith(".") and part != "." for part in path.replace("\\", "/").split("/")):
+            raise HTTPException(status_code=404)
+        return path
@@ -1,5 +1,7 @@
 from typing import Dict, Any, List, Optional
-from auth.auth_api import get_supabase_client, get_user, get_user_from_token
+from auth.auth_api import get_user, get_user_from_token
+from db.supabase_pool import get_anon_client, get_service_client
+from db.supabase_async import execute
 from fastapi import HTTPException
 import os
 from dotenv import load_dotenv
@@ -17,8 +19,10 @@ class SupabaseDocumentOps:
     
     @staticmethod
     def get_client(use_service_role: bool = False):
-        """Get Supabase client with appropriate permissions"""
-        return get_supabase_client(use_service_role=use_service_role)
+        """Get the shared Supabase client with appropriate permissions"""
+        if use_service_role:
+            return get_service_client()
+        return get_anon_client()
 
     @staticmethod
     async def insert_document(
@@ -44,7 +48,7 @@ class SupabaseDocumentOps:
             
             supabase = SupabaseDocumentOps.get_client()
             
-            result = supabase.table("documents").insert({
+            result = await execute(supabase.table("documents").insert({
                 "title": safe_filename,  # Use safe filename as title
                 "type": file_type,
                 "url": url,
@@ -54,7 +58,7 @@ class SupabaseDocumentOps:
                 "department_id": department_id,
                 "status": "CASE_REVIEW_PENDING",
          
-            }).execute()
+            }))
             
             return result.data[0] if result.data else None
             
@@ -74,11 +78,12 @@ class SupabaseDocumentOps:
         try:
             supabase = SupabaseDocumentOps.get_client()
             
-            result = supabase.table("documents")\
-                .select("id")\
-                .eq("title", title)\
-                .eq("department_id", department_id)\
-                .execute()
+            result = await execute(
+                supabase.table("documents")
+                .select("id")
+                .eq("title", title)
+                .eq("department_id", department_id)
+            )
                 
             return bool(result.data)
             
@@ -95,10 +100,11 @@ class SupabaseDocumentOps:
         try:
             supabase = SupabaseDocumentOps.get_client()
             
-            result = supabase.table("departments")\
-                .select("id")\
-                .ilike("name", department_name)\
-                .execute()
+            result = await execute(
+                supabase.table("departments")
+                .select("id")
+                .ilike("name", department_name)
+            )
                 
             if not result.data:
                 raise HTTPException(
@@ -126,10 +132,11 @@ class SupabaseDocumentOps:
         try:
             supabase = SupabaseDocumentOps.get_client()
             
-            result = supabase.table("documents")\
-                .update({"status": status})\
-                .eq("google_doc_id", google_doc_id)\
-                .execute()
+            result = await execute(
+                supabase.table("documents")
+                .update({"status": status})
+                .eq("google_doc_id", google_doc_id)
+            )
                 
             if not result.data:
                 raise HTTPException(
@@ -154,14 +161,15 @@ class SupabaseDocumentOps:
         try:
             supabase = SupabaseDocumentOps.get_client()
             
-            result = supabase.table("documents")\
+            result = await execute(
+                supabase.table("documents")
                 .select(
                     "id, title, type, url, description, created_at, "
                     "google_doc_id, google_doc_link, status, "
                     "topics!inner(name)"
-                )\
-                .eq("topics.name", topic_name)\
-                .execute()
+                )
+                .eq("topics.name", topic_name)
+            )
                 
             return result.data
             
@@ -198,16 +206,17 @@ class SupabaseDocumentOps:
             print("Updating doc with ID:", repr(google_doc_id))
             
             # Update the document with approval info
-            result = supabase.table("documents")\
+            result = await execute(
+                supabase.table("documents")
                 .update({
                     "status": "CASE_REVIEW_COMPLETE",
                     "approved_by": user_info["id"],
                     "approved_by_email": user_info["email"],
                     "approved_by_username": user_info.get("username"),
                     "approved_at": "now()"  # Supabase will set server timestamp
-                })\
-                .eq("google_doc_id", google_doc_id)\
-                .execute()
+                })
+                .eq("google_doc_id", google_doc_id)
+            )
                 
             if not result.data:
                 raise HTTPException(
@@ -216,13 +225,14 @@ class SupabaseDocumentOps:
                 )
             
             # Get the complete document details including department
-            doc_details = supabase.table("documents")\
+            doc_details = await execute(
+                supabase.table("documents")
                 .select(
                     "*, departments(name)"
-                )\
-                .eq("google_doc_id", google_doc_id)\
-                .single()\
-                .execute()
+                )
+                .eq("google_doc_id", google_doc_id)
+                .single()
+            )
 
             if doc_details.data:
                 try:
@@ -245,10 +255,11 @@ class SupabaseDocumentOps:
                     print(f"Document exported successfully to: {full_path}")
                     
                     # Update document with file path
-                    supabase.table("documents")\
-                        .update({"exported_file_path": full_path})\
-                        .eq("google_doc_id", google_doc_id)\
-                        .execute()
+                    await execute(
+                        supabase.table("documents")
+                        .update({"exported_file_path": full_path})
+                        .eq("google_doc_id", google_doc_id)
+                    )
                         
                 except Exception as export_error:
                     print(f"Warning: Failed to export document: {str(export_error)}")
@@ -289,11 +300,12 @@ class SupabaseDocumentOps:
         try:
             supabase = SupabaseDocumentOps.get_client()
             
-            result = supabase.table("documents")\
-                .select("*")\
-                .eq("department_id", department_name)\
-                .order("created_at", desc=True)\
-                .execute()
+            result = await execute(
+                supabase.table("documents")
+                .select("*")
+                .eq("department_id", department_name)
+                .order("created_at", desc=True)
+            )
             
             print(f"Department documents query result: {result.data}")
             return result.data if result.data else []
@@ -312,10 +324,11 @@ class SupabaseDocumentOps:
             supabase = SupabaseDocumentOps.get_client()
             
             # Delete the document
-            result = supabase.table("documents")\
-                .delete()\
-                .eq("google_doc_id", google_doc_id)\
-                .execute()
+            result = await execute(
+                supabase.table("documents")
+                .delete()
+                .eq("google_doc_id", google_doc_id)
+            )
                 
             if not result.data:
                 raise HTTPException(
@@ -1,22 +1,19 @@
-import os
 import uuid
 import json
 from datetime import datetime
 from typing import Dict, Any
 from fastapi import HTTPException
-from supabase import create_client, Client
-
-# Set environment variables or hardcode for testing
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+from supabase import Client
+from db.supabase_pool import get_anon_client
+from db.supabase_async import execute
 
 def get_supabase_client() -> Client:
-    """Get a Supabase client instance."""
-    if not SUPABASE_URL or not SUPABASE_KEY:
-        print(f"[SUPABASE] Error: Missing environment variables - SUPABASE_URL: {'Set' if SUPABASE_URL else 'Not set'}, SUPABASE_KEY: {'Set' if SUPABASE_KEY else 'Not set'}")
+    """Get the shared, long-lived Supabase client."""
+    try:
+        return get_anon_client()
+    except EnvironmentError as e:
+        print(f"[SUPABASE] Error: {str(e)}")
         raise ValueError("Supabase URL and Key must be set in environment variables")
-    print(f"[SUPABASE] Client initialized with URL: {SUPABASE_URL[:20]}...")
-    return create_client(SUPABASE_URL, SUPABASE_KEY)
 
 def extract_rubric_scores(interactions: Dict[str, Any]) -> Dict[str, Any]:
     """Extract rubric scores from session interactions."""
@@ -118,7 +115,7 @@ async def submit_session_to_supabase(session_data: Dict[str, Any], department: s
         print(f"[SUPABASE] Executing insert to 'student_case_sessions' table...")
         
         # Insert into Supabase
-        result = supabase.table("student_case_sessions").insert(insertion_payload).execute()
+        result = await execute(supabase.table("student_case_sessions").insert(insertion_payload))
         
         print(f"[SUPABASE] Insert successful! Session ID: {session_id}")
         print(f"[SUPABASE] Supabase response: {result}")
@@ -1,3 +1,4 @@
+import json
 import re
 
 def clean_code_block(content: str) -> str:
@@ -48,4 +49,112 @@ def extract_code_blocks(content: str) -> list:
         return [content]  # Return original content in a list
 
     # Return trimmed content for each match
-    return [match.strip() for match in matches] 
\ No newline at end of file
+    return [match.strip() for match in matches] 
+
+def is_json_response(content: str) -> bool:
+    """
+    Checks whether a model response parses as JSON once code block markers are removed.
+    
+    Args:
+        content (str): The raw model response text
+        
+    Returns:
+        bool: True if the cleaned content is valid JSON
+    """
+    try:
+        json.loads(clean_code_block(content))
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+class JSONFieldStreamer:
+    """
+    Incrementally extracts one string field from a JSON object that arrives in chunks.
+
+    Used to stream model answers that are wrapped in a JSON envelope (optionally
+    inside a ```json code block): each chunk is passed to `feed`, which returns
+    only the newly decoded text of the field. Answers that do not start with a
+    JSON object are passed through unchanged.
+
+    Args:
+        field (str): Name of the string field to stream (default "content")
+    """
+
+    _ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+    def __init__(self, field: str = "content"):
+        self._key = re.compile(r'"%s"\s*:\s*"' % re.escape(field))
+        self._buffer = ""
+        self._mode = None  # None until the first visible character, then "json" or "text"
+        self._pos = None   # Next unread index of the field's value in the buffer
+        self._done = False
+
+    def feed(self, chunk: str) -> str:
+        """
+        Add a chunk of model output.
+
+        Args:
+            chunk (str): The next piece of the raw model output
+
+        Returns:
+            str: Text of the field decoded from this chunk (may be empty)
+        """
+        if self._done or not chunk:
+            return ""
+        self._buffer += chunk
+        if self._mode is None:
+            body = self._buffer.lstrip()
+            if body.startswith('`'):
+                # Skip the opening code fence once its line is complete
+                if '\n' not in body:
+                    return ""
+                body = body.split('\n', 1)[1].lstrip()
+            if not body:
+                return ""
+            self._mode = "json" if body.startswith('{') else "text"
+            if self._mode == "text":
+                return body
+        if self._mode == "text":
+            return chunk
+        return self._read_field()
+
+    def _read_field(self) -> str:
+        if self._pos is None:
+            match = self._key.search(self._buffer)
+            if match is None:
+                return ""
+            self._pos = match.end()
+        decoded = []
+        buffer, pos = self._buffer, self._pos
+        while pos < len(buffer):
+            char = buffer[pos]
+            if char == '"':
+                self._done = True
+                break
+            if char != '\\':
+                decoded.append(char)
+                pos += 1
+                continue
+            # Escape sequence: wait for the rest of it if the chunk ended mid-way
+            if pos + 1 >= len(buffer):
+                break
+            code = buffer[pos + 1]
+            if code != 'u':
+                decoded.append(self._ESCAPES.get(code, code))
+                pos += 2
+                continue
+            if pos + 6 > len(buffer):
+                break
+            codepoint = int(buffer[pos + 2:pos + 6], 16)
+            if 0xD800 <= codepoint < 0xDC00:
+                # High surrogate: decode together with the low surrogate that follows
+                if pos + 12 > len(buffer):
+                    break
+                decoded.append(json.loads('"%s"' % buffer[pos:pos + 12]))
+                pos += 12
+            else:
+                decoded.append(chr(codepoint))
+                pos += 6
+        self._pos = pos
+        return "".join(decoded)
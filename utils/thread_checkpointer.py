@@ -0,0 +1,430 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+)
+
+# Conversation threads for the patient simulation graphs
+PATIENT_THREADS_DB = os.getenv("PATIENT_THREADS_DB", "session-data/patient_threads.db")
+THREAD_CACHE_MAX_ENTRIES = int(os.getenv("THREAD_CACHE_MAX_ENTRIES", "512"))
+THREAD_CACHE_MAX_BYTES = int(os.getenv("THREAD_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+THREAD_CACHE_TTL_SECONDS = float(os.getenv("THREAD_CACHE_TTL_SECONDS", "1800"))
+# Threads untouched for this long are deleted from the database
+THREAD_RETENTION_SECONDS = float(os.getenv("THREAD_RETENTION_SECONDS", str(7 * 24 * 3600)))
+# Older checkpoints of a thread are pruned; only the latest ones are needed to continue it
+THREAD_KEEP_CHECKPOINTS = int(os.getenv("THREAD_KEEP_CHECKPOINTS", "2"))
+
+# A serialized value: (serde type, bytes)
+Serialized = Tuple[str, bytes]
+
+
+class _CachedThread:
+    """Latest serialized checkpoint of one (thread_id, checkpoint_ns), plus its pending writes."""
+
+    __slots__ = ("checkpoint_id", "parent_id", "checkpoint", "metadata", "writes", "size", "touched_at")
+
+    def __init__(self, checkpoint_id: str, parent_id: Optional[str], checkpoint: Serialized,
+                 metadata: Serialized, writes: List[Tuple[str, str, Serialized]]):
+        self.checkpoint_id = checkpoint_id
+        self.parent_id = parent_id
+        self.checkpoint = checkpoint
+        self.metadata = metadata
+        self.writes = writes
+        self.size = len(checkpoint[1]) + len(metadata[1]) + sum(len(value[1]) for _, _, value in writes)
+        self.touched_at = time.monotonic()
+
+
+class SqliteLRUCheckpointer(BaseCheckpointSaver):
+    """
+    LangGraph checkpointer that persists threads to SQLite (WAL, shared by all
+    gunicorn workers, survives restarts) and keeps the latest checkpoint of
+    recently active threads in a bounded in-process LRU.
+
+    - memory: at most `max_entries` threads and `max_bytes` of serialized state,
+      entries idle for `ttl_seconds` are dropped
+    - disk: only the newest `keep_checkpoints` checkpoints of a thread are kept,
+      threads idle for `retention_seconds` are deleted
+    - cached entries are validated against the newest checkpoint id in SQLite,
+      so a thread continued on another worker is never served stale
+    """
+
+    def __init__(self, db_path: str = PATIENT_THREADS_DB, max_entries: int = THREAD_CACHE_MAX_ENTRIES,
+                 max_bytes: int = THREAD_CACHE_MAX_BYTES, ttl_seconds: float = THREAD_CACHE_TTL_SECONDS,
+                 retention_seconds: float = THREAD_RETENTION_SECONDS,
+                 keep_checkpoints: int = THREAD_KEEP_CHECKPOINTS, serde=None):
+        super().__init__(serde=serde)
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.retention_seconds = retention_seconds
+        self.keep_checkpoints = max(keep_checkpoints, 1)
+        self._local = threading.local()
+        self._cache: "OrderedDict[Tuple[str, str], _CachedThread]" = OrderedDict()
+        self._cache_bytes = 0
+        self._lock = threading.Lock()
+        self._last_cleanup = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._init_schema()
+
+    # -- SQLite ---------------------------------------------------------------
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self) -> None:
+        self._connection().executescript('''
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL DEFAULT '',
+                checkpoint_id TEXT NOT NULL,
+                parent_checkpoint_id TEXT,
+                type TEXT,
+                checkpoint BLOB,
+                metadata_type TEXT,
+                metadata BLOB,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+            );
+            CREATE INDEX IF NOT EXISTS idx_checkpoints_updated ON checkpoints (updated_at);
+
+            CREATE TABLE IF NOT EXISTS writes (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL DEFAULT '',
+                checkpoint_id TEXT NOT NULL,
+                task_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                channel TEXT NOT NULL,
+                type TEXT,
+                value BLOB,
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+            );
+        ''')
+
+    def _latest_id(self, thread_id: str, checkpoint_ns: str) -> Optional[str]:
+        row = self._connection().execute(
+            "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+            "ORDER BY checkpoint_id DESC LIMIT 1",
+            (thread_id, checkpoint_ns),
+        ).fetchone()
+        return row["checkpoint_id"] if row else None
+
+    def _load_writes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> List[Tuple[str, str, Serialized]]:
+        rows = self._connection().execute(
+            "SELECT task_id, channel, type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return [(row["task_id"], row["channel"], (row["type"], row["value"])) for row in rows]
+
+    def _prune(self, conn: sqlite3.Connection, thread_id: str, checkpoint_ns: str) -> None:
+        """Delete all but the newest `keep_checkpoints` checkpoints (and their writes) of a thread."""
+        stale = [row["checkpoint_id"] for row in conn.execute(
+            "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+            "ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+            (thread_id, checkpoint_ns, self.keep_checkpoints),
+        ).fetchall()]
+        for checkpoint_id in stale:
+            conn.execute(
+                "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                (thread_id, checkpoint_ns, checkpoint_id),
+            )
+            conn.execute(
+                "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                (thread_id, checkpoint_ns, checkpoint_id),
+            )
+
+    def _cleanup_expired(self) -> None:
+        """Delete threads idle for longer than the retention period (at most every 10 minutes)."""
+        now = time.time()
+        if now - self._last_cleanup < 600:
+            return
+        self._last_cleanup = now
+        cutoff = now - self.retention_seconds
+        conn = self._connection()
+        expired = conn.execute(
+            "SELECT thread_id, checkpoint_ns FROM checkpoints GROUP BY thread_id, checkpoint_ns "
+            "HAVING MAX(updated_at) < ?",
+            (cutoff,),
+        ).fetchall()
+        if not expired:
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for row in expired:
+                conn.execute("DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?",
+                             (row["thread_id"], row["checkpoint_ns"]))
+                conn.execute("DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ?",
+                             (row["thread_id"], row["checkpoint_ns"]))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        print(f"[CHECKPOINTER] 🧹 Deleted {len(expired)} idle conversation threads")
+
+    # -- in-memory LRU ----------------------------------------------------------
+
+    def _cache_get(self, key: Tuple[str, str]) -> Optional[_CachedThread]:
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry.touched_at > self.ttl_seconds:
+                self._cache_drop(key)
+                return None
+            entry.touched_at = time.monotonic()
+            self._cache.move_to_end(key)
+            return entry
+
+    def _cache_put(self, key: Tuple[str, str], entry: _CachedThread) -> None:
+        with self._lock:
+            self._cache_drop(key)
+            if entry.size > self.max_bytes:
+                return
+            self._cache[key] = entry
+            self._cache_bytes += entry.size
+            while len(self._cache) > self.max_entries or self._cache_bytes > self.max_bytes:
+                oldest = next(iter(self._cache))
+                self._cache_drop(oldest)
+                self.evictions += 1
+
+    def _cache_drop(self, key: Tuple[str, str]) -> None:
+        """Remove an entry. Caller holds `_lock`."""
+        entry = self._cache.pop(key, None)
+        if entry is not None:
+            self._cache_bytes -= entry.size
+
+    def _to_tuple(self, thread_id: str, checkpoint_ns: str, entry: _CachedThread) -> CheckpointTuple:
+        return CheckpointTuple(
+            config={"configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": entry.checkpoint_id,
+            }},
+            checkpoint=self.serde.loads_typed(entry.checkpoint),
+            metadata=self.serde.loads_typed(entry.metadata),
+            parent_config={"configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": entry.parent_id,
+            }} if entry.parent_id else None,
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed(value)) for task_id, channel, value in entry.writes
+            ],
+        )
+
+    def _load_entry(self, thread_id: str, checkpoint_ns: str, checkpoint_id: Optional[str]) -> Optional[_CachedThread]:
+        if checkpoint_id:
+            row = self._connection().execute(
+                "SELECT * FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                (thread_id, checkpoint_ns, checkpoint_id),
+            ).fetchone()
+        else:
+            row = self._connection().execute(
+                "SELECT * FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                "ORDER BY checkpoint_id DESC LIMIT 1",
+                (thread_id, checkpoint_ns),
+            ).fetchone()
+        if row is None:
+            return None
+        return _CachedThread(
+            row["checkpoint_id"],
+            row["parent_checkpoint_id"],
+            (row["type"], row["checkpoint"]),
+            (row["metadata_type"], row["metadata"]),
+            self._load_writes(thread_id, checkpoint_ns, row["checkpoint_id"]),
+        )
+
+    # -- BaseCheckpointSaver ------------------------------------------------------
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        key = (thread_id, checkpoint_ns)
+
+        entry = self._cache_get(key)
+        if entry is not None:
+            wanted = checkpoint_id or self._latest_id(thread_id, checkpoint_ns)
+            if wanted == entry.checkpoint_id:
+                with self._lock:
+                    self.hits += 1
+                return self._to_tuple(thread_id, checkpoint_ns, entry)
+
+        with self._lock:
+            self.misses += 1
+        entry = self._load_entry(thread_id, checkpoint_ns, checkpoint_id)
+        if entry is None:
+            return None
+        if not checkpoint_id:
+            self._cache_put(key, entry)
+        return self._to_tuple(thread_id, checkpoint_ns, entry)
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        clauses, params = [], []
+        if config is not None:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            checkpoint_ns = config["configurable"].get("checkpoint_ns")
+            if checkpoint_ns is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            checkpoint_id = get_checkpoint_id(config)
+            if checkpoint_id:
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before is not None:
+            clauses.append("checkpoint_id < ?")
+            params.append(get_checkpoint_id(before))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._connection().execute(
+            f"SELECT * FROM checkpoints {where} ORDER BY checkpoint_id DESC", params
+        ).fetchall()
+
+        returned = 0
+        for row in rows:
+            if limit is not None and returned >= limit:
+                break
+            entry = _CachedThread(
+                row["checkpoint_id"],
+                row["parent_checkpoint_id"],
+                (row["type"], row["checkpoint"]),
+                (row["metadata_type"], row["metadata"]),
+                self._load_writes(row["thread_id"], row["checkpoint_ns"], row["checkpoint_id"]),
+            )
+            item = self._to_tuple(row["thread_id"], row["checkpoint_ns"], entry)
+            if filter and not all(item.metadata.get(k) == v for k, v in filter.items()):
+                continue
+            returned += 1
+            yield item
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        parent_id = config["configurable"].get("checkpoint_id")
+        serialized_checkpoint = self.serde.dumps_typed(checkpoint)
+        serialized_metadata = self.serde.dumps_typed(metadata)
+
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO checkpoints (thread_id, checkpoint_ns, checkpoint_id, "
+                "parent_checkpoint_id, type, checkpoint, metadata_type, metadata, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, checkpoint["id"], parent_id,
+                 serialized_checkpoint[0], serialized_checkpoint[1],
+                 serialized_metadata[0], serialized_metadata[1], time.time()),
+            )
+            self._prune(conn, thread_id, checkpoint_ns)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        self._cache_put((thread_id, checkpoint_ns), _CachedThread(
+            checkpoint["id"], parent_id, serialized_checkpoint, serialized_metadata, []
+        ))
+        self._cleanup_expired()
+        return {"configurable": {
+            "thread_id": thread_id,
+            "checkpoint_ns": checkpoint_ns,
+            "checkpoint_id": checkpoint["id"],
+        }}
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        # Special channels (errors, interrupts) overwrite; regular writes are kept once
+        verb = "INSERT OR REPLACE" if all(channel in WRITES_IDX_MAP for channel, _ in writes) else "INSERT OR IGNORE"
+        serialized = [
+            (WRITES_IDX_MAP.get(channel, idx), channel, self.serde.dumps_typed(value))
+            for idx, (channel, value) in enumerate(writes)
+        ]
+
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                f"{verb} INTO writes (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, value[0], value[1])
+                 for idx, channel, value in serialized],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        # Keep the cached latest checkpoint in step with its pending writes
+        key = (thread_id, checkpoint_ns)
+        entry = self._cache_get(key)
+        if entry is not None and entry.checkpoint_id == checkpoint_id:
+            self._cache_put(key, _CachedThread(
+                entry.checkpoint_id, entry.parent_id, entry.checkpoint, entry.metadata,
+                self._load_writes(thread_id, checkpoint_ns, checkpoint_id),
+            ))
+
+    # SQLite calls are short; run them off the event loop all the same
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return cache occupancy and hit/miss counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._cache),
+                "bytes": self._cache_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
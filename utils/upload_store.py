@@ -0,0 +1,278 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import HTTPException, UploadFile
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines: no cross-process locking
+    fcntl = None
+
+# Uploads are streamed to disk in chunks of this size, so memory per upload stays bounded
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(200 * 1024 * 1024)))
+# Blobs, index and lock live here, outside the statically served upload directories
+UPLOAD_STORE_STATE_DIR = os.getenv("UPLOAD_STORE_STATE_DIR", "session-data/upload-store")
+
+
+def safe_filename(filename: str) -> str:
+    """Base name with everything except letters, digits, '-', '_' and '.' replaced by '_'."""
+    name = re.sub(r'[^a-zA-Z0-9-_.]', '_', os.path.basename(filename or ""))
+    return name.lstrip(".") or "upload"
+
+
+class ContentAddressedStore:
+    """
+    Upload directory whose bytes are stored once per SHA-256.
+
+    The store's own files live in a per-directory state folder under
+    `state_dir` (`<state_dir>/<hash of root>/`), never inside the upload
+    directory, which is served statically: each blob is
+    `blobs/<sha[:2]>/<sha><ext>` and `index.json` maps every visible name to its
+    hash, size and upload time. The visible file names in the directory are
+    hard links to their blob (copies if the state folder is on another
+    filesystem), so existing code that opens `<dir>/<filename>` keeps working.
+
+    Uploading bytes that are already stored adds no new blob. A different file
+    uploaded under a name already in use (indexed, or a file written before the
+    store existed) gets `<stem>_<sha[:8]><ext>` instead of replacing the earlier file.
+
+    Disk writes and the cross-process index lock run in worker threads, so a
+    large upload or a busy lock never stalls the event loop.
+    """
+
+    def __init__(self, root: str, chunk_size: int = UPLOAD_CHUNK_SIZE, max_bytes: int = UPLOAD_MAX_BYTES,
+                 state_dir: str = UPLOAD_STORE_STATE_DIR):
+        self.root = Path(root)
+        root_key = hashlib.sha256(str(self.root.resolve()).encode("utf-8")).hexdigest()[:16]
+        self.state_dir = Path(state_dir) / root_key
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @property
+    def blob_dir(self) -> Path:
+        return self.state_dir / "blobs"
+
+    @property
+    def index_path(self) -> Path:
+        return self.state_dir / "index.json"
+
+    @contextmanager
+    def _index_lock(self):
+        """Serialize index updates across threads and gunicorn workers."""
+        with self._lock:
+            self.state_dir.mkdir(parents=True, exist_ok=True)
+            if fcntl is None:
+                self._migrate_legacy_state()
+                yield
+                return
+            with open(self.state_dir / "index.lock", 'a') as lock_file:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    self._migrate_legacy_state()
+                    yield
+                finally:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _migrate_legacy_state(self) -> None:
+        """Move index and blobs that earlier versions kept inside the served upload directory."""
+        legacy_index = self.root / ".index.json"
+        legacy_blobs = self.root / ".blobs"
+        if not legacy_index.exists() and not legacy_blobs.exists():
+            return
+        if legacy_index.exists():
+            with open(legacy_index, 'r') as f:
+                index = json.load(f)
+            index.update(self._load_index())
+            self._save_index(index)
+            legacy_index.unlink()
+        if legacy_blobs.exists():
+            for blob in legacy_blobs.glob("*/*"):
+                target = self.blob_dir / blob.parent.name / blob.name
+                target.parent.mkdir(parents=True, exist_ok=True)
+                if target.exists():
+                    blob.unlink()
+                else:
+                    shutil.move(str(blob), str(target))
+            shutil.rmtree(legacy_blobs)
+        try:
+            (self.root / ".index.lock").unlink()
+        except FileNotFoundError:
+            pass
+        print(f"[UPLOAD_STORE] 📦 Moved store index and blobs out of {self.root} to {self.state_dir}")
+
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.index_path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save_index(self, index: Dict[str, Dict[str, Any]]) -> None:
+        tmp_path = self.index_path.with_name(f"index.{os.getpid()}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def _link(self, blob_path: Path, name_path: Path) -> None:
+        """Point name_path at the blob, replacing whatever was there atomically."""
+        tmp_path = name_path.with_name(f".{name_path.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            os.link(blob_path, tmp_path)
+        except OSError:
+            # Filesystems without hard links: fall back to a copy
+            with open(blob_path, 'rb') as src, open(tmp_path, 'wb') as dst:
+                while chunk := src.read(self.chunk_size):
+                    dst.write(chunk)
+        os.replace(tmp_path, name_path)
+
+    def _file_sha256(self, path: Path) -> str:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            while chunk := f.read(self.chunk_size):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _occupant_sha256(self, index: Dict[str, Dict[str, Any]], name: str) -> Optional[str]:
+        """Hash of the file currently at `name`, or None if the name is free."""
+        name_path = self.root / name
+        if not name_path.exists():
+            return None
+        entry = index.get(name)
+        if entry is not None:
+            return entry["sha256"]
+        # Not in the index (uploaded before the store existed, or copied in by hand)
+        return self._file_sha256(name_path)
+
+    @staticmethod
+    def _write_chunk(out, digest, chunk: bytes) -> None:
+        digest.update(chunk)
+        out.write(chunk)
+
+    def _store_blob(self, tmp_path: Path, sha256: str, ext: str) -> Tuple[Path, bool]:
+        """Move a finished upload to its blob path; returns (blob_path, already_stored)."""
+        blob_path = self.blob_dir / sha256[:2] / f"{sha256}{ext}"
+        blob_path.parent.mkdir(parents=True, exist_ok=True)
+        deduplicated = blob_path.exists()
+        if deduplicated:
+            tmp_path.unlink()
+        else:
+            os.replace(tmp_path, blob_path)
+        return blob_path, deduplicated
+
+    def _claim_name(self, name: str, blob_path: Path, sha256: str, size: int,
+                    content_type: Optional[str]) -> Tuple[str, bool]:
+        """
+        Point a visible name at the blob without replacing a different file.
+
+        Returns:
+            (name actually used, whether that name is new)
+        """
+        with self._index_lock():
+            index = self._load_index()
+            stem, name_ext = os.path.splitext(name)
+            # Fall back to the full hash in the unlikely case the short suffix is taken too
+            for candidate in (name, f"{stem}_{sha256[:8]}{name_ext}", f"{stem}_{sha256}{name_ext}"):
+                occupant = self._occupant_sha256(index, candidate)
+                if occupant is None or occupant == sha256:
+                    name = candidate
+                    break
+            else:
+                raise HTTPException(status_code=409, detail=f"Could not find a free name for {name}")
+            created = occupant is None
+            if created or name not in index:
+                self._link(blob_path, self.root / name)
+                index[name] = {
+                    "sha256": sha256,
+                    "size": size,
+                    "content_type": content_type,
+                    "uploaded_at": datetime.now().isoformat(),
+                }
+                self._save_index(index)
+        return name, created
+
+    async def save(self, file: UploadFile, filename: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Stream an upload into the store, hashing it on the way.
+
+        Args:
+            file: The uploaded file
+            filename: Name to store it under (defaults to the upload's own name); it is made filesystem-safe
+
+        Returns:
+            Dict with "path" (Path of the visible file), "filename", "sha256", "size",
+            "deduplicated" (the bytes were already stored) and "created" (the name is new;
+            False when the same bytes were already at that name)
+
+        Raises:
+            HTTPException: 413 if the upload is larger than max_bytes
+        """
+        name = safe_filename(filename or file.filename)
+        ext = os.path.splitext(name)[1].lower()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+
+        digest = hashlib.sha256()
+        size = 0
+        tmp_path = self.blob_dir / f"upload-{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, 'wb') as out:
+                while chunk := await file.read(self.chunk_size):
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise HTTPException(
+                            status_code=413,
+                            detail=f"File too large. Maximum size is {self.max_bytes / 1024 / 1024:.0f}MB"
+                        )
+                    await asyncio.to_thread(self._write_chunk, out, digest, chunk)
+
+            sha256 = digest.hexdigest()
+            blob_path, deduplicated = await asyncio.to_thread(self._store_blob, tmp_path, sha256, ext)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+        name, created = await asyncio.to_thread(
+            self._claim_name, name, blob_path, sha256, size, file.content_type
+        )
+        name_path = self.root / name
+
+        print(f"[UPLOAD_STORE] {'♻️ Deduplicated' if deduplicated else '💾 Stored'} {name} "
+              f"({size} bytes, {sha256[:12]}) in {self.root}")
+        return {
+            "path": name_path,
+            "filename": name,
+            "sha256": sha256,
+            "size": size,
+            "deduplicated": deduplicated,
+            "created": created,
+        }
+
+    async def discard(self, filename: str) -> None:
+        """Remove a visible name (e.g. after a failed upload); the blob stays for other names."""
+        await asyncio.to_thread(self._discard, filename)
+
+    def _discard(self, filename: str) -> None:
+        with self._index_lock():
+            index = self._load_index()
+            if index.pop(filename, None) is not None:
+                self._save_index(index)
+            try:
+                (self.root / filename).unlink()
+            except FileNotFoundError:
+                pass
+
+    def lookup(self, filename: str) -> Optional[Dict[str, Any]]:
+        """Index entry (sha256, size, content_type, uploaded_at) of a visible name."""
+        return self._load_index().get(filename)